@@ -9,10 +9,19 @@ import sys
 import sqlite3
 import os
 import json
+import time
 from datetime import datetime, timedelta
+from functools import lru_cache
 import warnings
 warnings.filterwarnings('ignore')
 from src.utils.weather_intelligence import analyze_weather_impact_for_report, get_weather_intelligence
+from src.utils.db_pool import get_connection, connection
+from src.utils.period_loader import load_restaurant_period
+from src.utils.market_cube import ensure_market_cube, market_rollup, market_benchmarks
+from src.utils.weather_store import get_weather_store
+from src.utils.report_model import RestaurantReport, render_console, save_report, REPORT_EXTENSIONS
+from src.utils.report_cache import get_report_cache
+from src.utils.section_graph import SectionGraph
 
 # ML Детективный анализ - ОБНОВЛЕННАЯ ВЕРСИЯ
 try:
@@ -33,12 +42,16 @@ from dotenv import load_dotenv
 from src.utils.weather_intelligence import analyze_weather_impact_for_report, get_weather_intelligence
 
 # Фолбэк функция локации, если отсутствует API/утилита
+@lru_cache(maxsize=None)
+def _restaurant_locations_map():
+	"""Локальная JSON карта ресторанов (читается один раз на процесс)"""
+	with open('data/bali_restaurant_locations.json', 'r', encoding='utf-8') as f:
+		return json.load(f)
+
 def get_restaurant_location(restaurant_name: str):
 	try:
 		# Попытка получить из локальной JSON карты
-		import json
-		with open('data/bali_restaurant_locations.json', 'r', encoding='utf-8') as f:
-			data = json.load(f)
+		data = _restaurant_locations_map()
 		for item in data.get('restaurants', []):
 			if item.get('name') == restaurant_name:
 				return {
@@ -146,47 +159,38 @@ class WeatherAPI:
         self.base_url = "https://archive-api.open-meteo.com/v1/archive"
         self.current_url = "https://api.open-meteo.com/v1/forecast"
         
+    def prefetch(self, start_date, end_date, lat=-8.4095, lon=115.1889):
+        """Загружает погоду за весь период одним запросом в локальное хранилище"""
+        return get_weather_store().prefetch(lat, lon, start_date, end_date)
+    
     def get_weather_data(self, date, lat=-8.4095, lon=115.1889):
         """Получает РЕАЛЬНЫЕ данные о погоде за конкретную дату из Open-Meteo по точным координатам"""
         try:
-            # Open-Meteo Historical Weather API
-            params = {
-                'latitude': lat,
-                'longitude': lon,
-                'start_date': date,
-                'end_date': date,
-                'hourly': 'temperature_2m,relative_humidity_2m,precipitation,weather_code,cloud_cover',
-                'timezone': 'Asia/Jakarta'  # Бали
-            }
+            # Почасовые данные из локального хранилища (HTTP только при промахе)
+            hourly = get_weather_store().get_hourly(lat, lon, date)
             
-            response = requests.get(self.base_url, params=params, timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                hourly = data.get('hourly', {})
+            if not hourly.empty:
+                # Берем среднее за день
+                temps = hourly['temperature'].dropna().tolist()
+                humidity = hourly['humidity'].dropna().tolist()
+                precipitation = hourly['precipitation'].dropna().tolist()
+                weather_codes = hourly['weather_code'].dropna().astype(int).tolist()
                 
-                if hourly and len(hourly.get('time', [])) > 0:
-                    # Берем среднее за день
-                    temps = hourly.get('temperature_2m', [28])
-                    humidity = hourly.get('relative_humidity_2m', [75])
-                    precipitation = hourly.get('precipitation', [0])
-                    weather_codes = hourly.get('weather_code', [0])
-                    
-                    avg_temp = sum(temps) / len(temps) if temps else 28
-                    avg_humidity = sum(humidity) / len(humidity) if humidity else 75
-                    total_rain = sum(precipitation) if precipitation else 0
-                    
-                    # Определяем условия по WMO коду
-                    main_weather_code = max(set(weather_codes), key=weather_codes.count) if weather_codes else 0
-                    condition = self._weather_code_to_condition(main_weather_code)
-                    
-                    return {
-                        'temperature': avg_temp,
-                        'humidity': avg_humidity,
-                        'condition': condition,
-                        'rain': total_rain,
-                        'source': 'Open-Meteo (реальные данные)'
-                    }
+                avg_temp = sum(temps) / len(temps) if temps else 28
+                avg_humidity = sum(humidity) / len(humidity) if humidity else 75
+                total_rain = sum(precipitation) if precipitation else 0
+                
+                # Определяем условия по WMO коду
+                main_weather_code = max(set(weather_codes), key=weather_codes.count) if weather_codes else 0
+                condition = self._weather_code_to_condition(main_weather_code)
+                
+                return {
+                    'temperature': avg_temp,
+                    'humidity': avg_humidity,
+                    'condition': condition,
+                    'rain': total_rain,
+                    'source': 'Open-Meteo (реальные данные)'
+                }
             
             # Fallback к симуляции если API недоступно
             return self._simulate_weather(date)
@@ -242,9 +246,18 @@ class CalendarAPI:
     def __init__(self):
         self.api_key = os.getenv('CALENDAR_API_KEY')
         self.base_url = "https://calendarific.com/api/v2"
+        # Праздники по (год, страна) - один запрос на экземпляр
+        self._holidays = {}
         
     def get_holidays(self, year, country='ID'):
         """Получает список праздников за год"""
+        key = (year, country)
+        if key not in self._holidays:
+            self._holidays[key] = self._fetch_holidays(year, country)
+        return self._holidays[key]
+    
+    def _fetch_holidays(self, year, country='ID'):
+        """Праздники года из Calendarific API (без ключа - локальная база)"""
         if not self.api_key:
             return self._get_indonesia_holidays(year)
             
@@ -706,128 +719,114 @@ class OpenAIAnalyzer:
             insights.append(f"   • ROAS: {(roas * 1.1):.1f}x (+10%)")
         
         return '\n'.join(insights)
-def get_restaurant_data_full(restaurant_name, start_date, end_date, db_path="database.sqlite"):
-    """Получает ВСЕ доступные данные ресторана из grab_stats и gojek_stats"""
-    conn = sqlite3.connect(db_path)
-    
-    # Получаем ID ресторана с обработкой специальных случаев
-    if restaurant_name == "Only_Eggs":
-        # Специальная обработка для Only_Eggs -> "Only Eggs"
-        restaurant_query = "SELECT id FROM restaurants WHERE name = ?"
-        restaurant_result = pd.read_sql_query(restaurant_query, conn, params=("Only Eggs",))
-    else:
-        restaurant_query = "SELECT id FROM restaurants WHERE name = ?"
-        restaurant_result = pd.read_sql_query(restaurant_query, conn, params=(restaurant_name,))
-    
-    if len(restaurant_result) == 0:
-        conn.close()
-        print(f"❌ Ресторан '{restaurant_name}' не найден")
-        return pd.DataFrame()
-    
-    restaurant_id = restaurant_result.iloc[0]['id']
-    
-    # РАСШИРЕННЫЙ запрос для Grab (ВСЕ поля)
-    grab_query = """
-    SELECT 
-        stat_date as date,
-        'grab' as platform,
-        sales as total_sales,
-        orders,
-        rating,
-        COALESCE(ads_spend, 0) as marketing_spend,
-        COALESCE(ads_sales, 0) as marketing_sales,
-        COALESCE(ads_orders, 0) as marketing_orders,
-        CASE WHEN ads_spend > 0 THEN 1 ELSE 0 END as ads_on,
-        COALESCE(cancelation_rate, 0) as cancel_rate,
-        COALESCE(offline_rate, 0) as offline_rate,
-        COALESCE(cancelled_orders, 0) as cancelled_orders,
-        COALESCE(store_is_closed, 0) as store_is_closed,
-        COALESCE(store_is_busy, 0) as store_is_busy,
-        COALESCE(store_is_closing_soon, 0) as store_is_closing_soon,
-        COALESCE(out_of_stock, 0) as out_of_stock,
-        COALESCE(ads_ctr, 0) as ads_ctr,
-        COALESCE(impressions, 0) as impressions,
-        COALESCE(unique_impressions_reach, 0) as unique_impressions_reach,
-        COALESCE(unique_menu_visits, 0) as unique_menu_visits,
-        COALESCE(unique_add_to_carts, 0) as unique_add_to_carts,
-        COALESCE(unique_conversion_reach, 0) as unique_conversion_reach,
-        COALESCE(new_customers, 0) as new_customers,
-        COALESCE(earned_new_customers, 0) as earned_new_customers,
-        COALESCE(repeated_customers, 0) as repeated_customers,
-        COALESCE(earned_repeated_customers, 0) as earned_repeated_customers,
-        COALESCE(reactivated_customers, 0) as reactivated_customers,
-        COALESCE(earned_reactivated_customers, 0) as earned_reactivated_customers,
-        COALESCE(total_customers, 0) as total_customers,
-        COALESCE(payouts, 0) as payouts,
-        NULL as accepting_time,
-        NULL as preparation_time,
-        NULL as delivery_time,
-        NULL as lost_orders,
-        NULL as realized_orders_percentage,
-        NULL as one_star_ratings,
-        NULL as two_star_ratings,
-        NULL as three_star_ratings,
-        NULL as four_star_ratings,
-        NULL as five_star_ratings
-    FROM grab_stats 
-    WHERE restaurant_id = ? AND stat_date BETWEEN ? AND ?
-    ORDER BY stat_date
-    """
+def _grab_platform_frame(grab):
+    """Строки grab_stats -> унифицированный формат платформы (все поля)"""
+    return pd.DataFrame({
+        'date': grab['stat_date'],
+        'platform': 'grab',
+        'total_sales': grab['sales'],
+        'orders': grab['orders'],
+        'rating': grab['rating'],
+        'marketing_spend': grab['ads_spend'].fillna(0),
+        'marketing_sales': grab['ads_sales'].fillna(0),
+        'marketing_orders': grab['ads_orders'].fillna(0),
+        'ads_on': (grab['ads_spend'].fillna(0) > 0).astype(int),
+        'cancel_rate': grab['cancelation_rate'].fillna(0),
+        'offline_rate': grab['offline_rate'].fillna(0),
+        'cancelled_orders': grab['cancelled_orders'].fillna(0),
+        'store_is_closed': grab['store_is_closed'].fillna(0),
+        'store_is_busy': grab['store_is_busy'].fillna(0),
+        'store_is_closing_soon': grab['store_is_closing_soon'].fillna(0),
+        'out_of_stock': grab['out_of_stock'].fillna(0),
+        'ads_ctr': grab['ads_ctr'].fillna(0),
+        'impressions': grab['impressions'].fillna(0),
+        'unique_impressions_reach': grab['unique_impressions_reach'].fillna(0),
+        'unique_menu_visits': grab['unique_menu_visits'].fillna(0),
+        'unique_add_to_carts': grab['unique_add_to_carts'].fillna(0),
+        'unique_conversion_reach': grab['unique_conversion_reach'].fillna(0),
+        'new_customers': grab['new_customers'].fillna(0),
+        'earned_new_customers': grab['earned_new_customers'].fillna(0),
+        'repeated_customers': grab['repeated_customers'].fillna(0),
+        'earned_repeated_customers': grab['earned_repeated_customers'].fillna(0),
+        'reactivated_customers': grab['reactivated_customers'].fillna(0),
+        'earned_reactivated_customers': grab['earned_reactivated_customers'].fillna(0),
+        'total_customers': grab['total_customers'].fillna(0),
+        'payouts': grab['payouts'].fillna(0),
+        'accepting_time': None,
+        'preparation_time': None,
+        'delivery_time': None,
+        'lost_orders': None,
+        'realized_orders_percentage': None,
+        'one_star_ratings': None,
+        'two_star_ratings': None,
+        'three_star_ratings': None,
+        'four_star_ratings': None,
+        'five_star_ratings': None,
+    })
+
+def _gojek_platform_frame(gojek):
+    """Строки gojek_stats -> унифицированный формат платформы (все поля)"""
+    return pd.DataFrame({
+        'date': gojek['stat_date'],
+        'platform': 'gojek',
+        'total_sales': gojek['sales'],
+        'orders': gojek['orders'],
+        'rating': gojek['rating'],
+        'marketing_spend': gojek['ads_spend'].fillna(0),
+        'marketing_sales': gojek['ads_sales'].fillna(0),
+        'marketing_orders': gojek['ads_orders'].fillna(0),
+        'ads_on': (gojek['ads_spend'].fillna(0) > 0).astype(int),
+        'cancel_rate': 0,
+        'offline_rate': 0,
+        'cancelled_orders': gojek['cancelled_orders'].fillna(0),
+        'store_is_closed': gojek['store_is_closed'].fillna(0),
+        'store_is_busy': gojek['store_is_busy'].fillna(0),
+        'store_is_closing_soon': 0,
+        'out_of_stock': gojek['out_of_stock'].fillna(0),
+        'ads_ctr': 0,
+        'impressions': 0,
+        'unique_impressions_reach': 0,
+        'unique_menu_visits': 0,
+        'unique_add_to_carts': 0,
+        'unique_conversion_reach': 0,
+        'new_customers': gojek['new_client'].fillna(0),
+        'earned_new_customers': 0,
+        'repeated_customers': gojek['active_client'].fillna(0),
+        'earned_repeated_customers': 0,
+        'reactivated_customers': gojek['returned_client'].fillna(0),
+        'earned_reactivated_customers': 0,
+        # Как COALESCE(a + b + c, 0) в SQL: NULL в любом слагаемом дает 0
+        'total_customers': (gojek['new_client'] + gojek['active_client'] + gojek['returned_client']).fillna(0),
+        'payouts': gojek['payouts'].fillna(0),
+        'accepting_time': gojek['accepting_time'],
+        'preparation_time': gojek['preparation_time'],
+        'delivery_time': gojek['delivery_time'],
+        'lost_orders': gojek['lost_orders'].fillna(0),
+        'realized_orders_percentage': gojek['realized_orders_percentage'].fillna(0),
+        'one_star_ratings': gojek['one_star_ratings'].fillna(0),
+        'two_star_ratings': gojek['two_star_ratings'].fillna(0),
+        'three_star_ratings': gojek['three_star_ratings'].fillna(0),
+        'four_star_ratings': gojek['four_star_ratings'].fillna(0),
+        'five_star_ratings': gojek['five_star_ratings'].fillna(0),
+    })
+
+def get_restaurant_data_full(restaurant_name, start_date, end_date, db_path="database.sqlite", period=None):
+    """Получает ВСЕ доступные данные ресторана из grab_stats и gojek_stats
     
-    # РАСШИРЕННЫЙ запрос для Gojek (ВСЕ поля)
-    gojek_query = """
-    SELECT 
-        stat_date as date,
-        'gojek' as platform,
-        sales as total_sales,
-        orders,
-        rating,
-        COALESCE(ads_spend, 0) as marketing_spend,
-        COALESCE(ads_sales, 0) as marketing_sales,
-        COALESCE(ads_orders, 0) as marketing_orders,
-        CASE WHEN ads_spend > 0 THEN 1 ELSE 0 END as ads_on,
-        0 as cancel_rate,
-        0 as offline_rate,
-        COALESCE(cancelled_orders, 0) as cancelled_orders,
-        COALESCE(store_is_closed, 0) as store_is_closed,
-        COALESCE(store_is_busy, 0) as store_is_busy,
-        0 as store_is_closing_soon,
-        COALESCE(out_of_stock, 0) as out_of_stock,
-        0 as ads_ctr,
-        0 as impressions,
-        0 as unique_impressions_reach,
-        0 as unique_menu_visits,
-        0 as unique_add_to_carts,
-        0 as unique_conversion_reach,
-        COALESCE(new_client, 0) as new_customers,
-        0 as earned_new_customers,
-        COALESCE(active_client, 0) as repeated_customers,
-        0 as earned_repeated_customers,
-        COALESCE(returned_client, 0) as reactivated_customers,
-        0 as earned_reactivated_customers,
-        COALESCE(new_client + active_client + returned_client, 0) as total_customers,
-        COALESCE(payouts, 0) as payouts,
-        accepting_time,
-        preparation_time,
-        delivery_time,
-        COALESCE(lost_orders, 0) as lost_orders,
-        COALESCE(realized_orders_percentage, 0) as realized_orders_percentage,
-        COALESCE(one_star_ratings, 0) as one_star_ratings,
-        COALESCE(two_star_ratings, 0) as two_star_ratings,
-        COALESCE(three_star_ratings, 0) as three_star_ratings,
-        COALESCE(four_star_ratings, 0) as four_star_ratings,
-        COALESCE(five_star_ratings, 0) as five_star_ratings
-    FROM gojek_stats 
-    WHERE restaurant_id = ? AND stat_date BETWEEN ? AND ?
-    ORDER BY stat_date
+    period - уже загруженный RestaurantPeriodData (один запрос на весь отчет).
+    Если не передан, загружается здесь.
     """
+    if period is None:
+        # Алиасы CLI (Only_Eggs -> "Only Eggs") разрешает загрузчик
+        period = load_restaurant_period(restaurant_name, start_date, end_date, db_path)
     
-    # Используем прямую подстановку
-    grab_query_formatted = grab_query.replace('?', f'{restaurant_id}', 1).replace('?', f"'{start_date}'", 1).replace('?', f"'{end_date}'", 1)
-    gojek_query_formatted = gojek_query.replace('?', f'{restaurant_id}', 1).replace('?', f"'{start_date}'", 1).replace('?', f"'{end_date}'", 1)
+    if period is None:
+        print(f"❌ Ресторан '{restaurant_name}' не найден")
+        return pd.DataFrame(), pd.DataFrame()
     
-    grab_data = pd.read_sql_query(grab_query_formatted, conn)
-    gojek_data = pd.read_sql_query(gojek_query_formatted, conn)
+    # Все поля обеих платформ из одного набора данных
+    grab_data = _grab_platform_frame(period.grab)
+    gojek_data = _gojek_platform_frame(period.gojek)
     
     # Объединяем данные
     all_data = pd.concat([grab_data, gojek_data], ignore_index=True)
@@ -911,125 +910,11 @@ def get_restaurant_data_full(restaurant_name, start_date, end_date, db_path="dat
     else:
         data = pd.DataFrame()
     
-    conn.close()
     return data, all_data
 
 def calculate_market_benchmark(metric_type):
-    """Рассчитывает реальные рыночные бенчмарки из всех данных в базе"""
-    
-    try:
-        conn = sqlite3.connect("database.sqlite")
-        
-        if metric_type == 'avg_order_value':
-            # Средний чек по всему рынку
-            query = """
-            WITH market_data AS (
-                SELECT 
-                    r.name,
-                    SUM(COALESCE(g.sales, 0) + COALESCE(gj.sales, 0)) as total_sales,
-                    SUM(COALESCE(g.orders, 0) + COALESCE(gj.orders, 0)) as total_orders
-                FROM restaurants r
-                LEFT JOIN grab_stats g ON r.id = g.restaurant_id
-                LEFT JOIN gojek_stats gj ON r.id = gj.restaurant_id AND g.stat_date = gj.stat_date
-                WHERE g.stat_date IS NOT NULL OR gj.stat_date IS NOT NULL
-                GROUP BY r.id, r.name
-                HAVING total_orders > 0
-            )
-            SELECT AVG(total_sales / total_orders) as market_avg_order_value
-            FROM market_data
-            """
-            
-        elif metric_type == 'roas':
-            # ROAS по всему рынку
-            query = """
-            WITH market_data AS (
-                SELECT 
-                    r.name,
-                    SUM(COALESCE(g.ads_sales, 0)) as total_marketing_sales,
-                    SUM(COALESCE(g.ads_spend, 0)) as total_marketing_spend
-                FROM restaurants r
-                LEFT JOIN grab_stats g ON r.id = g.restaurant_id
-                WHERE g.ads_spend > 0
-                GROUP BY r.id, r.name
-                HAVING total_marketing_spend > 0
-            )
-            SELECT AVG(total_marketing_sales / total_marketing_spend) as market_avg_roas
-            FROM market_data
-            """
-            
-        elif metric_type == 'rating':
-            # Средний рейтинг по всему рынку
-            query = """
-            WITH market_data AS (
-                SELECT 
-                    r.name,
-                    AVG(COALESCE(g.rating, gj.rating)) as avg_rating
-                FROM restaurants r
-                LEFT JOIN grab_stats g ON r.id = g.restaurant_id
-                LEFT JOIN gojek_stats gj ON r.id = gj.restaurant_id AND g.stat_date = gj.stat_date
-                WHERE (g.rating IS NOT NULL OR gj.rating IS NOT NULL)
-                GROUP BY r.id, r.name
-            )
-            SELECT AVG(avg_rating) as market_avg_rating
-            FROM market_data
-            """
-            
-        elif metric_type == 'repeat_rate':
-            # Процент повторных клиентов по всему рынку
-            query = """
-            WITH market_data AS (
-                SELECT 
-                    r.name,
-                    SUM(COALESCE(g.repeated_customers, 0) + COALESCE(gj.active_client, 0)) as total_repeat,
-                    SUM(COALESCE(g.new_customers, 0) + COALESCE(gj.new_client, 0)) as total_new,
-                    SUM(COALESCE(g.reactivated_customers, 0) + COALESCE(gj.returned_client, 0)) as total_reactive
-                FROM restaurants r
-                LEFT JOIN grab_stats g ON r.id = g.restaurant_id
-                LEFT JOIN gojek_stats gj ON r.id = gj.restaurant_id AND g.stat_date = gj.stat_date
-                WHERE g.stat_date IS NOT NULL OR gj.stat_date IS NOT NULL
-                GROUP BY r.id, r.name
-                HAVING (total_repeat + total_new + total_reactive) > 0
-            )
-            SELECT AVG(total_repeat * 100.0 / (total_repeat + total_new + total_reactive)) as market_repeat_rate
-            FROM market_data
-            """
-            
-        elif metric_type == 'conversion_rate':
-            # Конверсия рекламы по всему рынку
-            query = """
-            WITH market_data AS (
-                SELECT 
-                    r.name,
-                    SUM(COALESCE(g.ads_orders, 0)) as total_ad_orders,
-                    SUM(COALESCE(g.unique_menu_visits, 0)) as total_visits
-                FROM restaurants r
-                LEFT JOIN grab_stats g ON r.id = g.restaurant_id
-                WHERE g.ads_orders > 0 AND g.unique_menu_visits > 0
-                GROUP BY r.id, r.name
-                HAVING total_visits > 0
-            )
-            SELECT AVG(total_ad_orders * 100.0 / total_visits) as market_conversion_rate
-            FROM market_data
-            """
-        else:
-            return 0
-            
-        result = pd.read_sql_query(query, conn).iloc[0, 0]
-        conn.close()
-        
-        return result if result and not pd.isna(result) else 0
-        
-    except Exception as e:
-        print(f"⚠️ Ошибка расчета бенчмарка {metric_type}: {e}")
-        # Возвращаем старые значения по умолчанию
-        defaults = {
-            'avg_order_value': 350000, 
-            'roas': 4.0, 
-            'rating': 4.5,
-            'repeat_rate': 30.0,  # Реальный рыночный показатель
-            'conversion_rate': 16.0  # Реальный рыночный показатель
-        }
-        return defaults.get(metric_type, 0)
+    """Рыночный бенчмарк по всем ресторанам за всю историю (свертка куба market_cube)"""
+    return _market_benchmarks().get(metric_type, 0)
 
 def generate_only_eggs_specific_insights(data, grab_data, gojek_data):
     """Генерирует специфические инсайты для Only Eggs на основе реальных данных"""
@@ -1089,7 +974,7 @@ def generate_only_eggs_specific_insights(data, grab_data, gojek_data):
    4. Добавить upsell предложения в меню"""
     
     return insights
-def analyze_platform_downtime(restaurant_id, start_date, end_date):
+def analyze_platform_downtime(restaurant_id, start_date, end_date, period=None):
     """Анализирует выключения платформ (Close Time) используя только данные из базы
     
     - GOJEK close_time: строки "H:M:S" 
@@ -1130,31 +1015,32 @@ def analyze_platform_downtime(restaurant_id, start_date, end_date):
         # offline_rate всегда в минутах, конвертируем в секунды
         return int(offline_rate * 60)
     
-    conn = sqlite3.connect('database.sqlite')
     results = []
     
     try:
-        # GOJEK данные
-        gojek_query = '''
-        SELECT stat_date, close_time, sales, orders
-        FROM gojek_stats 
-        WHERE restaurant_id = ? AND stat_date BETWEEN ? AND ?
-        AND close_time IS NOT NULL AND close_time != '0:0:0'
-        ORDER BY stat_date
-        '''
-        
-        gojek_data = pd.read_sql_query(gojek_query, conn, params=(restaurant_id, start_date, end_date))
-        
-        # GRAB данные
-        grab_query = '''
-        SELECT stat_date, offline_rate, sales, orders
-        FROM grab_stats 
-        WHERE restaurant_id = ? AND stat_date BETWEEN ? AND ?
-        AND offline_rate IS NOT NULL AND offline_rate > 0
-        ORDER BY stat_date
-        '''
-        
-        grab_data = pd.read_sql_query(grab_query, conn, params=(restaurant_id, start_date, end_date))
+        if period is not None:
+            # Данные уже загружены для отчета - без повторных запросов
+            gojek_data = period.gojek[['stat_date', 'close_time', 'sales', 'orders']]
+            grab_data = period.grab[['stat_date', 'offline_rate', 'sales', 'orders']]
+        else:
+            with connection() as conn:
+                gojek_data = pd.read_sql_query('''
+                SELECT stat_date, close_time, sales, orders
+                FROM gojek_stats 
+                WHERE restaurant_id = ? AND stat_date BETWEEN ? AND ?
+                ORDER BY stat_date
+                ''', conn, params=(restaurant_id, start_date, end_date))
+                grab_data = pd.read_sql_query('''
+                SELECT stat_date, offline_rate, sales, orders
+                FROM grab_stats 
+                WHERE restaurant_id = ? AND stat_date BETWEEN ? AND ?
+                ORDER BY stat_date
+                ''', conn, params=(restaurant_id, start_date, end_date))
+        
+        # GOJEK: close_time задан; GRAB: offline_rate > 0
+        gojek_data = gojek_data[gojek_data['close_time'].notna() & (gojek_data['close_time'] != '0:0:0')]
+        grab_offline = pd.to_numeric(grab_data['offline_rate'], errors='coerce')
+        grab_data = grab_data[grab_offline.notna() & (grab_offline > 0)]
         
         if gojek_data.empty and grab_data.empty:
             return ["📊 Данных о выключениях платформ не найдено"]
@@ -1243,42 +1129,220 @@ def analyze_platform_downtime(restaurant_id, start_date, end_date):
     except Exception as e:
         results.append(f"❌ Ошибка анализа выключений: {str(e)}")
     
-    finally:
-        conn.close()
-    
     return results
 
 
-def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
-    """ПОЛНЫЙ анализ ресторана с использованием ВСЕХ доступных параметров + ВСЕ API"""
-    print(f"\n🔬 ПОЛНЫЙ АНАЛИЗ ВСЕХ ПАРАМЕТРОВ + API: {restaurant_name.upper()}")
-    print("=" * 80)
+@lru_cache(maxsize=None)
+def get_shared_apis():
+    """WeatherAPI, CalendarAPI и OpenAIAnalyzer - один раз на процесс"""
+    return WeatherAPI(), CalendarAPI(), OpenAIAnalyzer()
+
+@lru_cache(maxsize=None)
+def get_shared_sales_analyzer():
+    """ProductionSalesAnalyzer (праздники, локации, fake orders) - один раз на процесс"""
+    from src.analyzers import ProductionSalesAnalyzer
+    return ProductionSalesAnalyzer()
+
+def _fake_orders_summary(restaurant_name, start_date, end_date):
+    from src.utils.fake_orders_filter import get_fake_orders_filter
+    return get_fake_orders_filter().get_fake_orders_summary(restaurant_name, start_date, end_date)
+
+def _collect_period_weather(weather_api, data, location):
+    """Погода и продажи по всем дням периода: (api_available, дни, продажи по условиям погоды)"""
+    all_dates = data['date'].unique()
+    weather_sales_data = []
+    weather_groups = {}  # Группировка продаж по погодным условиям
+    
+    # Вся погода периода - одним запросом в локальное хранилище
+    weather_api.prefetch(
+        min(all_dates), max(all_dates),
+        lat=location['latitude'], 
+        lon=location['longitude']
+    )
+    
+    # Проверяем доступность API на первом запросе
+    test_weather = weather_api.get_weather_data(
+        all_dates[0], 
+        lat=location['latitude'], 
+        lon=location['longitude']
+    )
+    api_available = test_weather.get('source', '').startswith('Open-Meteo')
     
+    # Собираем данные о погоде для всех дней
+    for i, date in enumerate(all_dates):
+        if api_available or i == 0:  # Делаем запрос только если API доступен или это первый запрос
+            weather = weather_api.get_weather_data(
+                date, 
+                lat=location['latitude'], 
+                lon=location['longitude']
+            )
+        else:
+            # Используем симуляцию для остальных дней если API недоступен
+            weather = weather_api._simulate_weather(date)
+        day_sales = data[data['date'] == date]['total_sales'].sum()
+        condition = weather['condition']
+        
+        weather_sales_data.append({
+            'date': date,
+            'condition': condition,
+            'temperature': weather['temperature'],
+            'rain': weather.get('rain', 0),
+            'wind': weather.get('wind_speed', 10),
+            'sales': day_sales
+        })
+        
+        # Группируем продажи по погодным условиям
+        if condition not in weather_groups:
+            weather_groups[condition] = []
+        weather_groups[condition].append(day_sales)
+    return api_available, weather_sales_data, weather_groups
+
+def _summarize_weather_impact(restaurant_name, weather, location):
+    """Влияние погоды по дням периода и средний эффект"""
+    _, weather_sales_data, _ = weather
+    restaurant_zone = location.get('zone', 'Unknown')
+    total_weather_impact = 0
+    impact_details = []
+    critical_days = []
+    
+    for item in weather_sales_data:
+        day_weather = {
+            'temperature': item['temperature'],
+            'rain': item['rain'],
+            'wind': item['wind']
+        }
+        
+        # Анализируем влияние погоды на этот день
+        weather_analysis = analyze_weather_impact_for_report(
+            day_weather, 
+            zone=restaurant_zone, 
+            restaurant_name=restaurant_name
+        )
+        
+        day_impact = weather_analysis['total_impact']
+        total_weather_impact += day_impact
+        
+        day_details = {
+            'date': item['date'],
+            'sales': item['sales'],
+            'impact': day_impact,
+            'primary_factor': weather_analysis['primary_factor'],
+            'weather': day_weather
+        }
+        impact_details.append(day_details)
+        
+        # Критическими считаем только дни с экстремальным влиянием
+        if abs(day_impact) > 40:
+            critical_days.append(dict(day_details))
+    
+    # Общие рекомендации - по средней погоде периода
+    sample_weather = {
+        'temperature': sum(item['temperature'] for item in weather_sales_data) / len(weather_sales_data),
+        'rain': sum(item['rain'] for item in weather_sales_data) / len(weather_sales_data),
+        'wind': sum(item['wind'] for item in weather_sales_data) / len(weather_sales_data)
+    }
+    general_analysis = analyze_weather_impact_for_report(sample_weather, zone=restaurant_zone)
+    
+    return {
+        'avg_weather_impact': total_weather_impact / len(weather_sales_data) if weather_sales_data else 0,
+        'impact_details': impact_details,
+        'critical_days': critical_days,
+        'days': len(weather_sales_data),
+        'general_analysis': general_analysis,
+    }
+
+def _split_holiday_sales(data, holidays, start_date, end_date):
+    """Праздничные даты периода и продажи: (даты, продажи в праздники, продажи в обычные дни)"""
+    holiday_dates = [h['date'] for h in holidays if start_date <= h['date'] <= end_date]
+    holiday_sales = data[data['date'].isin(holiday_dates)]['total_sales']
+    regular_sales = data[~data['date'].isin(holiday_dates)]['total_sales']
+    return holiday_dates, holiday_sales, regular_sales
+
+def _ai_insights(restaurant_name, data, platform_data, openai_analyzer, start_date, end_date,
+                 weather_impact, holidays):
+    """Текст раздела 8 (AI-инсайты) по эффектам погоды и праздников"""
+    _, holiday_sales, regular_sales = _split_holiday_sales(data, holidays, start_date, end_date)
+    holiday_effect = 0
+    if not holiday_sales.empty and not regular_sales.empty:
+        regular_avg = regular_sales.mean()
+        holiday_effect = ((holiday_sales.mean() - regular_avg) / regular_avg * 100) if regular_avg > 0 else 0
+    weather_data = {"weather_impact": weather_impact['avg_weather_impact']}
+    holiday_data = {"holiday_effect": holiday_effect}
+    
+    # Специфический анализ для Only Eggs
+    if restaurant_name == "Only_Eggs":
+        grab_platform_data = platform_data[platform_data['platform'] == 'grab'] if not platform_data.empty else pd.DataFrame()
+        gojek_platform_data = platform_data[platform_data['platform'] == 'gojek'] if not platform_data.empty else pd.DataFrame()
+        return generate_only_eggs_specific_insights(data, grab_platform_data, gojek_platform_data)
+    return openai_analyzer.generate_insights(data, weather_data, holiday_data)
+
+def _market_benchmarks():
+    """Рыночные бенчмарки раздела 9 - один проход по кубу на все метрики"""
+    try:
+        return market_benchmarks()
+    except Exception as e:
+        print(f"⚠️ Ошибка расчета рыночных бенчмарков: {e}")
+        # Возвращаем старые значения по умолчанию
+        return {
+            'avg_order_value': 350000, 
+            'roas': 4.0, 
+            'rating': 4.5,
+            'repeat_rate': 30.0,  # Реальный рыночный показатель
+            'conversion_rate': 16.0  # Реальный рыночный показатель
+        }
+
+def build_restaurant_report(restaurant_name, start_date=None, end_date=None):
+    """
+    ПОЛНЫЙ анализ ресторана с использованием ВСЕХ доступных параметров + ВСЕ API
+    
+    Медленные шаги (погода, праздники, AI, ML, бенчмарки) выполняются
+    параллельно в графе SectionGraph; разделы пишутся в прежнем порядке.
+    
+    Returns:
+        RestaurantReport (разделы с текстом и метриками) или None, если нет данных
+    """
+    with SectionGraph() as graph:
+        return _build_restaurant_report(graph, restaurant_name, start_date, end_date)
+
+def _build_restaurant_report(graph, restaurant_name, start_date=None, end_date=None):
     # Устанавливаем период по умолчанию
     if not start_date or not end_date:
         start_date = "2025-04-01"
         end_date = "2025-06-30"
     
-    print(f"📅 Период анализа: {start_date} → {end_date}")
-    print()
+    report = RestaurantReport(restaurant_name, start_date, end_date)
+    out = report.add
     
     # Технические блоки ограничений и методологии убраны - не нужны в пользовательских отчетах
     
-    # Инициализируем API
-    weather_api = WeatherAPI()
-    calendar_api = CalendarAPI()
-    openai_analyzer = OpenAIAnalyzer()
+    # API - общие для процесса (в analyze-all не пересоздаются на каждый ресторан)
+    weather_api, calendar_api, openai_analyzer = get_shared_apis()
     
-    # Получаем данные
-    data, platform_data = get_restaurant_data_full(restaurant_name, start_date, end_date)
+    # Получаем данные: один запрос grab_stats + gojek_stats на весь отчет
+    period = load_restaurant_period(restaurant_name, start_date, end_date)
+    if period is None:
+        print(f"❌ Ресторан '{restaurant_name}' не найден")
+        return None
+    data, platform_data = get_restaurant_data_full(restaurant_name, start_date, end_date, period=period)
     
     if data.empty:
         print("❌ Нет данных для анализа")
-        return
+        return None
+    
+    # Медленные шаги (БД, внешние API, ML) - сразу в граф; разделы ниже забирают результаты по порядку
+    graph.add('fake_orders', _fake_orders_summary, restaurant_name, start_date, end_date)
+    graph.add('location', get_restaurant_location, restaurant_name)
+    graph.add('weather', _collect_period_weather, weather_api, data, after=['location'])
+    graph.add('weather_impact', _summarize_weather_impact, restaurant_name, after=['weather', 'location'])
+    graph.add('holidays', calendar_api.get_holidays, int(start_date[:4]))
+    graph.add('ai', _ai_insights, restaurant_name, data, platform_data, openai_analyzer, start_date, end_date,
+              after=['weather_impact', 'holidays'])
+    graph.add('ml_detective', get_shared_sales_analyzer().analyze_restaurant_performance,
+              restaurant_name, start_date, end_date, use_ml=True)
+    graph.add('benchmarks', _market_benchmarks)
     
     # Подготавливаем детальный анализ
-    print("📊 1. ИСПОЛНИТЕЛЬНОЕ РЕЗЮМЕ")
-    print("-" * 40)
+    report.section('summary', "📊 1. ИСПОЛНИТЕЛЬНОЕ РЕЗЮМЕ")
     
     # Основные метрики
     total_sales = data['total_sales'].sum()
@@ -1297,7 +1361,7 @@ def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
     # Выручка по платформам
     grab_sales = platform_data[platform_data['platform'] == 'grab']['total_sales'].sum() if not platform_data.empty else 0
     gojek_sales = platform_data[platform_data['platform'] == 'gojek']['total_sales'].sum() if not platform_data.empty else 0
-    print(f"💰 Общая выручка: {total_sales:,.0f} IDR (GRAB: {grab_sales:,.0f} + GOJEK: {gojek_sales:,.0f})")
+    out(f"💰 Общая выручка: {total_sales:,.0f} IDR (GRAB: {grab_sales:,.0f} + GOJEK: {gojek_sales:,.0f})")
     # Получаем детализацию заказов по платформам из исходных данных
     grab_orders = platform_data[platform_data['platform'] == 'grab']['orders'].sum() if not platform_data.empty else 0
     gojek_orders = platform_data[platform_data['platform'] == 'gojek']['orders'].sum() if not platform_data.empty else 0
@@ -1309,9 +1373,7 @@ def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
     
     # Рассчитываем успешные заказы с учетом fake
     try:
-        from src.utils.fake_orders_filter import get_fake_orders_filter
-        _fo = get_fake_orders_filter()
-        _fo_summary = _fo.get_fake_orders_summary(restaurant_name, start_date, end_date)
+        _fo_summary = graph.result('fake_orders')
         grab_fake = int(_fo_summary.get('by_platform', {}).get('Grab', 0))
         gojek_fake = int(_fo_summary.get('by_platform', {}).get('Gojek', 0))
     except Exception:
@@ -1323,16 +1385,16 @@ def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
     # Проверяем консистентность данных
     platform_total_orders = grab_orders + gojek_orders
     if total_orders != platform_total_orders:
-        print(f"⚠️ ВНИМАНИЕ: Несоответствие в данных заказов!")
-        print(f"   Агрегированные данные: {total_orders:,.0f}")
-        print(f"   Сумма по платформам: {platform_total_orders:,.0f}")
-        print(f"   Разница: {abs(total_orders - platform_total_orders):,.0f}")
-        print()
+        out(f"⚠️ ВНИМАНИЕ: Несоответствие в данных заказов!")
+        out(f"   Агрегированные данные: {total_orders:,.0f}")
+        out(f"   Сумма по платформам: {platform_total_orders:,.0f}")
+        out(f"   Разница: {abs(total_orders - platform_total_orders):,.0f}")
+        out()
     
-    print(f"📦 Общие заказы: {total_orders:,.0f}")
-    print(f"   ├── 📱 GRAB: {grab_orders:,.0f} (успешно: {grab_successful:,.0f}, отменено: {grab_cancelled}, fake: {grab_fake})")
-    print(f"   └── 🛵 GOJEK: {gojek_orders:,.0f} (успешно: {gojek_successful:,.0f}, отменено: {gojek_cancelled}, потеряно: {gojek_lost}, fake: {gojek_fake})")
-    print(f"   💡 Успешных заказов: {grab_successful + gojek_successful:,.0f}")
+    out(f"📦 Общие заказы: {total_orders:,.0f}")
+    out(f"   ├── 📱 GRAB: {grab_orders:,.0f} (успешно: {grab_successful:,.0f}, отменено: {grab_cancelled}, fake: {grab_fake})")
+    out(f"   └── 🛵 GOJEK: {gojek_orders:,.0f} (успешно: {gojek_successful:,.0f}, отменено: {gojek_cancelled}, потеряно: {gojek_lost}, fake: {gojek_fake})")
+    out(f"   💡 Успешных заказов: {grab_successful + gojek_successful:,.0f}")
     
     # Рассчитываем средний чек по платформам
     grab_sales = platform_data[platform_data['platform'] == 'grab']['total_sales'].sum() if not platform_data.empty else 0
@@ -1341,19 +1403,19 @@ def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
     grab_avg_check = grab_sales / grab_orders if grab_orders > 0 else 0
     gojek_avg_check = gojek_sales / gojek_orders if gojek_orders > 0 else 0
     
-    print(f"💵 Средний чек: {avg_order_value:,.0f} IDR")
-    print(f"   ├── 📱 GRAB: {grab_avg_check:,.0f} IDR ({grab_sales:,.0f} ÷ {grab_successful})")
-    print(f"   └── 🛵 GOJEK: {gojek_avg_check:,.0f} IDR ({gojek_sales:,.0f} ÷ {gojek_successful})")
-    print(f"📊 Дневная выручка: {daily_avg_sales:,.0f} IDR (средняя по рабочим дням)")
-    print(f"⭐ Средний рейтинг: {avg_rating:.2f}/5.0")
+    out(f"💵 Средний чек: {avg_order_value:,.0f} IDR")
+    out(f"   ├── 📱 GRAB: {grab_avg_check:,.0f} IDR ({grab_sales:,.0f} ÷ {grab_successful})")
+    out(f"   └── 🛵 GOJEK: {gojek_avg_check:,.0f} IDR ({gojek_sales:,.0f} ÷ {gojek_successful})")
+    out(f"📊 Дневная выручка: {daily_avg_sales:,.0f} IDR (средняя по рабочим дням)")
+    out(f"⭐ Средний рейтинг: {avg_rating:.2f}/5.0")
     # Правильное распределение клиентов по платформам
     grab_customers = platform_data[platform_data['platform'] == 'grab']['total_customers'].sum()
     gojek_customers = platform_data[platform_data['platform'] == 'gojek']['total_customers'].sum()
     
-    print(f"👥 Обслужено клиентов:")
-    print(f"   ├── 📱 GRAB: {grab_customers:,.0f} (детальная статистика)")
-    print(f"   └── 🛵 GOJEK: {gojek_customers:,.0f} (ограниченная API статистика)")
-    print(f"   💡 Общий охват: {total_customers:,.0f} уникальных клиентов")
+    out(f"👥 Обслужено клиентов:")
+    out(f"   ├── 📱 GRAB: {grab_customers:,.0f} (детальная статистика)")
+    out(f"   └── 🛵 GOJEK: {gojek_customers:,.0f} (ограниченная API статистика)")
+    out(f"   💡 Общий охват: {total_customers:,.0f} уникальных клиентов")
     
     # Рассчитываем маркетинговый бюджет по платформам из исходных данных
     grab_marketing_budget = platform_data[platform_data['platform'] == 'grab']['marketing_spend'].sum() if not platform_data.empty else 0
@@ -1362,24 +1424,24 @@ def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
     # Проверяем консистентность маркетингового бюджета
     platform_total_marketing = grab_marketing_budget + gojek_marketing_budget
     if abs(total_marketing - platform_total_marketing) > 1:  # Допускаем погрешность округления
-        print(f"⚠️ ВНИМАНИЕ: Несоответствие в маркетинговом бюджете!")
-        print(f"   Агрегированные данные: {total_marketing:,.0f} IDR")
-        print(f"   Сумма по платформам: {platform_total_marketing:,.0f} IDR")
-        print(f"   Разница: {abs(total_marketing - platform_total_marketing):,.0f} IDR")
-        print()
-    
-    print(f"💸 Маркетинговый бюджет: {total_marketing:,.0f} IDR ({total_marketing/total_sales*100:.1f}% от выручки)")
-    print("📊 Детализация маркетинговых затрат:")
-    print("   ┌─ 📱 GRAB:")
-    print(f"   │  💰 Бюджет: {grab_marketing_budget:,.0f} IDR ({grab_marketing_budget/total_marketing*100:.1f}% общего бюджета)")
+        out(f"⚠️ ВНИМАНИЕ: Несоответствие в маркетинговом бюджете!")
+        out(f"   Агрегированные данные: {total_marketing:,.0f} IDR")
+        out(f"   Сумма по платформам: {platform_total_marketing:,.0f} IDR")
+        out(f"   Разница: {abs(total_marketing - platform_total_marketing):,.0f} IDR")
+        out()
+    
+    out(f"💸 Маркетинговый бюджет: {total_marketing:,.0f} IDR ({total_marketing/total_sales*100:.1f}% от выручки)")
+    out("📊 Детализация маркетинговых затрат:")
+    out("   ┌─ 📱 GRAB:")
+    out(f"   │  💰 Бюджет: {grab_marketing_budget:,.0f} IDR ({grab_marketing_budget/total_marketing*100:.1f}% общего бюджета)")
     grab_share_of_total_sales = (grab_marketing_budget/total_sales*100) if total_sales>0 else 0
     gojek_share_of_total_sales = (gojek_marketing_budget/total_sales*100) if total_sales>0 else 0
     grab_sales_only = platform_data[platform_data['platform']=='grab']['total_sales'].sum() if not platform_data.empty else 0
     gojek_sales_only = platform_data[platform_data['platform']=='gojek']['total_sales'].sum() if not platform_data.empty else 0
-    print(f"   │  📈 {grab_share_of_total_sales:.1f}% от общей выручки | {(grab_marketing_budget/max(grab_sales_only,1))*100:.1f}% от выручки GRAB")
-    print("   └─ 🛵 GOJEK:")
-    print(f"      💰 Бюджет: {gojek_marketing_budget:,.0f} IDR ({gojek_marketing_budget/total_marketing*100:.1f}% общего бюджета)")
-    print(f"      📈 {gojek_share_of_total_sales:.1f}% от общей выручки | {(gojek_marketing_budget/max(gojek_sales_only,1))*100:.1f}% от выручки GOJEK")
+    out(f"   │  📈 {grab_share_of_total_sales:.1f}% от общей выручки | {(grab_marketing_budget/max(grab_sales_only,1))*100:.1f}% от выручки GRAB")
+    out("   └─ 🛵 GOJEK:")
+    out(f"      💰 Бюджет: {gojek_marketing_budget:,.0f} IDR ({gojek_marketing_budget/total_marketing*100:.1f}% общего бюджета)")
+    out(f"      📈 {gojek_share_of_total_sales:.1f}% от общей выручки | {(gojek_marketing_budget/max(gojek_sales_only,1))*100:.1f}% от выручки GOJEK")
     # Получаем данные по платформам отдельно для корректного ROAS анализа
     try:
         # Получаем отдельные данные по платформам из исходных данных
@@ -1398,7 +1460,7 @@ def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
         else:
             roas_breakdown = generate_roas_breakdown(grab_marketing_sales, grab_marketing_spend, 
                                                    gojek_marketing_sales, gojek_marketing_spend)
-        print(roas_breakdown)
+        out(roas_breakdown)
         
         # Блок проверки точности убран - не нужен в пользовательских отчетах
         
@@ -1407,22 +1469,22 @@ def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
         avg_roas = total_roas
         
     except Exception as e:
-        print(f"🎯 ROAS: {avg_roas:.2f}x (ошибка расчета по платформам: {e})")
+        out(f"🎯 ROAS: {avg_roas:.2f}x (ошибка расчета по платформам: {e})")
     
     # Эффективность периода
     roi_percentage = ((marketing_sales - total_marketing) / total_marketing * 100) if total_marketing > 0 else 0
     
     # Добавляем объяснение разницы между общими продажами и продажами от рекламы
-    print()
-    print("📊 РАЗБИВКА ПРОДАЖ:")
-    print(f"💰 Общая выручка: {total_sales:,.0f} IDR (все продажи)")
-    print(f"📈 Продажи от рекламы: {marketing_sales:,.0f} IDR (только от рекламных кампаний)")
+    out()
+    out("📊 РАЗБИВКА ПРОДАЖ:")
+    out(f"💰 Общая выручка: {total_sales:,.0f} IDR (все продажи)")
+    out(f"📈 Продажи от рекламы: {marketing_sales:,.0f} IDR (только от рекламных кампаний)")
     organic_sales = total_sales - marketing_sales
     organic_percentage = (organic_sales / total_sales * 100) if total_sales > 0 else 0
     marketing_percentage = (marketing_sales / total_sales * 100) if total_sales > 0 else 0
-    print(f"🌱 Органические продажи: {organic_sales:,.0f} IDR ({organic_percentage:.1f}%)")
-    print(f"📊 Доля рекламы в общих продажах: {marketing_percentage:.1f}%")
-    print()
+    out(f"🌱 Органические продажи: {organic_sales:,.0f} IDR ({organic_percentage:.1f}%)")
+    out(f"📊 Доля рекламы в общих продажах: {marketing_percentage:.1f}%")
+    out()
     
     # ROI по платформам
     grab_roi = ((grab_marketing_sales - grab_marketing_spend) / grab_marketing_spend * 100) if grab_marketing_spend > 0 else 0
@@ -1435,13 +1497,13 @@ def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
         else:
             return f"+{roi_value:.0f}%"
     
-    print(f"📈 ROI маркетинга: {format_roi(roi_percentage)} (GRAB + GOJEK)")
-    print(f"   ├── 📱 GRAB: {format_roi(grab_roi)}")
-    print(f"   └── 🛵 GOJEK: {format_roi(gojek_roi)}")
+    out(f"📈 ROI маркетинга: {format_roi(roi_percentage)} (GRAB + GOJEK)")
+    out(f"   ├── 📱 GRAB: {format_roi(grab_roi)}")
+    out(f"   └── 🛵 GOJEK: {format_roi(gojek_roi)}")
     
     # Добавляем раздел PAYOUTS
-    print()
-    print("💰 РЕАЛЬНЫЕ ВЫПЛАТЫ РЕСТОРАНУ (PAYOUTS):")
+    out()
+    out("💰 РЕАЛЬНЫЕ ВЫПЛАТЫ РЕСТОРАНУ (PAYOUTS):")
     grab_payouts = platform_data[platform_data['platform'] == 'grab']['payouts'].sum()
     gojek_payouts = platform_data[platform_data['platform'] == 'gojek']['payouts'].sum()
     total_payouts = grab_payouts + gojek_payouts
@@ -1450,19 +1512,19 @@ def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
     gojek_commission_pct = ((gojek_platform_data['total_sales'].sum() - gojek_payouts) / gojek_platform_data['total_sales'].sum() * 100) if not gojek_platform_data.empty and gojek_platform_data['total_sales'].sum() > 0 else 0
     avg_commission = ((total_sales - total_payouts) / total_sales * 100) if total_sales > 0 else 0
     
-    print(f"💸 Общие выплаты: {total_payouts:,.0f} IDR ({100-avg_commission:.1f}% от продаж)")
-    print(f"   ├── 📱 GRAB: {grab_payouts:,.0f} IDR (комиссия: {grab_commission_pct:.1f}%)")
-    print(f"   └── 🛵 GOJEK: {gojek_payouts:,.0f} IDR (комиссия: {gojek_commission_pct:.1f}%)")
-    print(f"📊 Средняя комиссия: {avg_commission:.1f}%")
+    out(f"💸 Общие выплаты: {total_payouts:,.0f} IDR ({100-avg_commission:.1f}% от продаж)")
+    out(f"   ├── 📱 GRAB: {grab_payouts:,.0f} IDR (комиссия: {grab_commission_pct:.1f}%)")
+    out(f"   └── 🛵 GOJEK: {gojek_payouts:,.0f} IDR (комиссия: {gojek_commission_pct:.1f}%)")
+    out(f"📊 Средняя комиссия: {avg_commission:.1f}%")
     
     better_platform = "GOJEK" if gojek_commission_pct < grab_commission_pct else "GRAB"
     commission_diff = abs(grab_commission_pct - gojek_commission_pct)
     if commission_diff > 0.1:
-        print(f"🏆 Лучшие условия: {better_platform} (комиссия на {commission_diff:.1f}% {'ниже' if better_platform == 'GOJEK' else 'выше'})")
+        out(f"🏆 Лучшие условия: {better_platform} (комиссия на {commission_diff:.1f}% {'ниже' if better_platform == 'GOJEK' else 'выше'})")
     
     # Автоматические инсайты по ROI
-    print()
-    print("💡 ИНСАЙТЫ ПО ЭФФЕКТИВНОСТИ ПЛАТФОРМ:")
+    out()
+    out("💡 ИНСАЙТЫ ПО ЭФФЕКТИВНОСТИ ПЛАТФОРМ:")
     
     # Определяем более эффективную платформу
     if grab_roi > gojek_roi:
@@ -1483,9 +1545,9 @@ def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
     # Инсайт 1: Сравнение эффективности
     if less_efficient_roi > 0:
         efficiency_ratio = more_efficient_roi / less_efficient_roi
-        print(f"• {more_efficient_emoji} {more_efficient} БОЛЕЕ ЭФФЕКТИВЕН: {format_roi(more_efficient_roi)} vs {format_roi(less_efficient_roi)} (в {efficiency_ratio:.1f} раза)")
+        out(f"• {more_efficient_emoji} {more_efficient} БОЛЕЕ ЭФФЕКТИВЕН: {format_roi(more_efficient_roi)} vs {format_roi(less_efficient_roi)} (в {efficiency_ratio:.1f} раза)")
     else:
-        print(f"• {more_efficient_emoji} {more_efficient} БОЛЕЕ ЭФФЕКТИВЕН: {format_roi(more_efficient_roi)} vs {format_roi(less_efficient_roi)}")
+        out(f"• {more_efficient_emoji} {more_efficient} БОЛЕЕ ЭФФЕКТИВЕН: {format_roi(more_efficient_roi)} vs {format_roi(less_efficient_roi)}")
     
     # Инсайт 2: Анализ бюджетов и ROAS
     grab_roas = grab_marketing_sales / grab_marketing_spend if grab_marketing_spend > 0 else 0
@@ -1502,12 +1564,12 @@ def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
         smaller_budget = "GRAB"
         smaller_budget_amount = grab_marketing_spend / 1000000
     
-    print(f"• 💰 {bigger_budget}: больший бюджет ({bigger_budget_amount:.1f}M IDR), {smaller_budget}: меньший бюджет ({smaller_budget_amount:.1f}M IDR)")
-    print(f"• 🎯 ROAS: GRAB {grab_roas:.1f}x, GOJEK {gojek_roas:.1f}x")
+    out(f"• 💰 {bigger_budget}: больший бюджет ({bigger_budget_amount:.1f}M IDR), {smaller_budget}: меньший бюджет ({smaller_budget_amount:.1f}M IDR)")
+    out(f"• 🎯 ROAS: GRAB {grab_roas:.1f}x, GOJEK {gojek_roas:.1f}x")
     
     # Инсайт 3: Стратегические рекомендации
-    print()
-    print("🎯 СТРАТЕГИЧЕСКИЕ РЕКОМЕНДАЦИИ:")
+    out()
+    out("🎯 СТРАТЕГИЧЕСКИЕ РЕКОМЕНДАЦИИ:")
     
     # Общая оценка ROI
     if roi_percentage > 1000:
@@ -1519,23 +1581,30 @@ def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
     else:
         roi_assessment = "ТРЕБУЕТ ВНИМАНИЯ"
     
-    print(f"• 📊 Общий ROI {roi_assessment} ({format_roi(roi_percentage)}) - обе платформы прибыльны")
+    out(f"• 📊 Общий ROI {roi_assessment} ({format_roi(roi_percentage)}) - обе платформы прибыльны")
     
     # Рекомендация по более эффективной платформе
     if more_efficient_roi > less_efficient_roi * 1.5:  # Если разница больше 50%
-        print(f"• 🚀 ПРИОРИТЕТ: Увеличить бюджет {more_efficient} - самая высокая отдача")
-        print(f"• 🔧 Оптимизировать {less_efficient} - потенциал роста эффективности")
+        out(f"• 🚀 ПРИОРИТЕТ: Увеличить бюджет {more_efficient} - самая высокая отдача")
+        out(f"• 🔧 Оптимизировать {less_efficient} - потенциал роста эффективности")
     else:
-        print(f"• ⚖️ Обе платформы показывают сопоставимую эффективность")
-        print(f"• 📈 Рекомендуется пропорциональное увеличение бюджетов")
-    
-    print()
-    print(f"📅 Период: {len(data)} дней")
-    print()
+        out(f"• ⚖️ Обе платформы показывают сопоставимую эффективность")
+        out(f"• 📈 Рекомендуется пропорциональное увеличение бюджетов")
+    
+    out()
+    out(f"📅 Период: {len(data)} дней")
+    out()
+    for name, value in [
+        ('days', len(data)), ('total_sales', total_sales), ('grab_sales', grab_sales), ('gojek_sales', gojek_sales),
+        ('total_orders', total_orders), ('successful_orders', grab_successful + gojek_successful),
+        ('avg_order_value', avg_order_value), ('daily_avg_sales', daily_avg_sales), ('avg_rating', avg_rating),
+        ('total_customers', total_customers), ('marketing_spend', total_marketing), ('marketing_sales', marketing_sales),
+        ('roas', avg_roas), ('roi_percent', roi_percentage), ('payouts', total_payouts), ('commission_percent', avg_commission),
+    ]:
+        report.metric(name, value)
     
     # 2. ДЕТАЛЬНЫЙ АНАЛИЗ ПРОДАЖ И ТРЕНДОВ
-    print("📈 2. АНАЛИЗ ПРОДАЖ И ТРЕНДОВ")
-    print("-" * 40)
+    report.section('sales', "📈 2. АНАЛИЗ ПРОДАЖ И ТРЕНДОВ")
     
     # Тренды по неделям
     data_sorted = data.copy()
@@ -1546,16 +1615,18 @@ def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
     weekly_sales = data_sorted.groupby('week')['total_sales'].sum()
     monthly_sales = data_sorted.groupby('month')['total_sales'].sum()
     
-    print("📊 Динамика по месяцам:")
-    month_names = {4: "Апрель", 5: "Май", 6: "Июнь"}
+    out("📊 Динамика по месяцам:")
+    month_names = {1: "Январь", 2: "Февраль", 3: "Март", 4: "Апрель", 5: "Май", 6: "Июнь",
+                   7: "Июль", 8: "Август", 9: "Сентябрь", 10: "Октябрь", 11: "Ноябрь", 12: "Декабрь"}
     for month, sales in monthly_sales.items():
         month_name = month_names.get(month, f"Месяц {month}")
         month_data = data_sorted[data_sorted['month'] == month]
         days_in_month = len(month_data)
         daily_avg = sales / days_in_month if days_in_month > 0 else 0
-        print(f"  {month_name}: {sales:,.0f} IDR ({days_in_month} дней, {daily_avg:,.0f} IDR/день)")
+        out(f"  {month_name}: {sales:,.0f} IDR ({days_in_month} дней, {daily_avg:,.0f} IDR/день)")
     
     # Анализ выходных vs будни
+    report.metric('monthly_sales', {month_names.get(month, str(month)): sales for month, sales in monthly_sales.items()})
     weekend_sales = data[data['is_weekend'] == 1]['total_sales']
     weekday_sales = data[data['is_weekend'] == 0]['total_sales']
     
@@ -1564,87 +1635,75 @@ def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
         weekday_avg = weekday_sales.mean()
         weekend_effect = ((weekend_avg - weekday_avg) / weekday_avg * 100) if weekday_avg > 0 else 0
         
-        print(f"\n🗓️ Выходные vs Будни:")
-        print(f"  📅 Средние продажи в выходные: {weekend_avg:,.0f} IDR")
-        print(f"  📅 Средние продажи в будни: {weekday_avg:,.0f} IDR")
-        print(f"  📊 Эффект выходных: {weekend_effect:+.1f}%")
+        out(f"\n🗓️ Выходные vs Будни:")
+        out(f"  📅 Средние продажи в выходные: {weekend_avg:,.0f} IDR")
+        out(f"  📅 Средние продажи в будни: {weekday_avg:,.0f} IDR")
+        out(f"  📊 Эффект выходных: {weekend_effect:+.1f}%")
+        report.metric('weekend_effect_percent', weekend_effect)
     
     # Отделяем аномальные дни (нулевые продажи) от рабочих дней
     zero_sales_days = data[data['total_sales'] == 0]
     working_days = data[data['total_sales'] > 0]
     
     if len(zero_sales_days) > 0:
-        print(f"\n⚠️ ОБНАРУЖЕНЫ АНОМАЛЬНЫЕ ДНИ ({len(zero_sales_days)} из {len(data)}):")
+        out(f"\n⚠️ ОБНАРУЖЕНЫ АНОМАЛЬНЫЕ ДНИ ({len(zero_sales_days)} из {len(data)}):")
         for _, day in zero_sales_days.iterrows():
-            print(f"   📅 {day['date']} - 0 IDR (ресторан закрыт/технический сбой)")
-        print(f"   💡 Эти дни исключены из статистического анализа")
-        print()
+            out(f"   📅 {day['date']} - 0 IDR (ресторан закрыт/технический сбой)")
+        out(f"   💡 Эти дни исключены из статистического анализа")
+        out()
     
     if len(working_days) > 1:
         # Анализ только рабочих дней
         best_day = working_days.loc[working_days['total_sales'].idxmax()]
         worst_day = working_days.loc[working_days['total_sales'].idxmin()]
         
-        print(f"📊 АНАЛИЗ РАБОЧИХ ДНЕЙ ({len(working_days)} дней):")
-        print(f"🏆 Лучший день: {best_day['date']} - {best_day['total_sales']:,.0f} IDR")
-        print(f"📉 Худший день: {worst_day['date']} - {worst_day['total_sales']:,.0f} IDR")
+        out(f"📊 АНАЛИЗ РАБОЧИХ ДНЕЙ ({len(working_days)} дней):")
+        out(f"🏆 Лучший день: {best_day['date']} - {best_day['total_sales']:,.0f} IDR")
+        out(f"📉 Худший день: {worst_day['date']} - {worst_day['total_sales']:,.0f} IDR")
         
         # Корректный расчет разброса для рабочих дней
         sales_variance = ((best_day['total_sales'] - worst_day['total_sales']) / worst_day['total_sales'] * 100)
-        print(f"📊 Разброс продаж: {sales_variance:.1f}% (только рабочие дни)")
+        out(f"📊 Разброс продаж: {sales_variance:.1f}% (только рабочие дни)")
         
         # Дополнительная статистика рабочих дней
         avg_working = working_days['total_sales'].mean()
         std_working = working_days['total_sales'].std()
         cv_working = (std_working / avg_working) * 100 if avg_working > 0 else 0
-        print(f"📈 Средние продажи: {avg_working:,.0f} IDR/день")
-        print(f"📊 Коэффициент вариации: {cv_working:.1f}% (стабильность продаж)")
+        out(f"📈 Средние продажи: {avg_working:,.0f} IDR/день")
+        out(f"📊 Коэффициент вариации: {cv_working:.1f}% (стабильность продаж)")
+        report.metric('best_day', {'date': best_day['date'], 'sales': best_day['total_sales']})
+        report.metric('worst_day', {'date': worst_day['date'], 'sales': worst_day['total_sales']})
+        report.metric('variation_percent', cv_working)
     else:
-        print(f"\n⚠️ Недостаточно рабочих дней для анализа ({len(working_days)} дней)")
+        out(f"\n⚠️ Недостаточно рабочих дней для анализа ({len(working_days)} дней)")
         if len(data) > 0:
             total_day = data.iloc[0]  # Берем любой день для показа
-            print(f"📅 Единственный день с данными: {total_day['date']} - {total_day['total_sales']:,.0f} IDR")
-    print()
+            out(f"📅 Единственный день с данными: {total_day['date']} - {total_day['total_sales']:,.0f} IDR")
+    out()
     # 3. УГЛУБЛЕННЫЙ АНАЛИЗ КЛИЕНТСКОЙ БАЗЫ
-    print("👥 3. ДЕТАЛЬНЫЙ АНАЛИЗ КЛИЕНТСКОЙ БАЗЫ")
-    print("-" * 40)
-    # Получаем restaurant_id для запросов
-    import sqlite3
-    conn_temp = sqlite3.connect("database.sqlite")
-    restaurant_query = "SELECT id FROM restaurants WHERE name = ?"
-    restaurant_result = pd.read_sql_query(restaurant_query, conn_temp, params=(restaurant_name,))
-    restaurant_id = restaurant_result.iloc[0]['id'] if not restaurant_result.empty else None
-    
-    if restaurant_id is None:
-        print("❌ Не удалось найти ID ресторана")
-        conn_temp.close()
-        return
-    
-    # Получаем данные напрямую из базы для разделения по платформам
-    grab_customers_query = f"""
-    SELECT 
-        SUM(new_customers) as grab_new,
-        SUM(repeated_customers) as grab_repeat, 
-        SUM(reactivated_customers) as grab_reactive,
-        SUM(earned_new_customers) as grab_earned_new,
-        SUM(earned_repeated_customers) as grab_earned_repeat,
-        SUM(earned_reactivated_customers) as grab_earned_reactive
-    FROM grab_stats 
-    WHERE restaurant_id = {restaurant_id} AND stat_date BETWEEN '{start_date}' AND '{end_date}'
-    """
-    
-    gojek_customers_query = f"""
-    SELECT 
-        SUM(new_client) as gojek_new,
-        SUM(active_client) as gojek_repeat,
-        SUM(returned_client) as gojek_reactive
-    FROM gojek_stats 
-    WHERE restaurant_id = {restaurant_id} AND stat_date BETWEEN '{start_date}' AND '{end_date}'
-    """
+    report.section('customers', "👥 3. ДЕТАЛЬНЫЙ АНАЛИЗ КЛИЕНТСКОЙ БАЗЫ")
+    restaurant_id = period.restaurant_id
+    
+    # Разделение по платформам из загруженных данных периода
+    grab_totals = period.totals('grab', [
+        'new_customers', 'repeated_customers', 'reactivated_customers',
+        'earned_new_customers', 'earned_repeated_customers', 'earned_reactivated_customers'
+    ])
+    grab_customers = {
+        'grab_new': grab_totals['new_customers'],
+        'grab_repeat': grab_totals['repeated_customers'],
+        'grab_reactive': grab_totals['reactivated_customers'],
+        'grab_earned_new': grab_totals['earned_new_customers'],
+        'grab_earned_repeat': grab_totals['earned_repeated_customers'],
+        'grab_earned_reactive': grab_totals['earned_reactivated_customers'],
+    }
     
-    grab_customers = pd.read_sql_query(grab_customers_query, conn_temp).iloc[0]
-    gojek_customers = pd.read_sql_query(gojek_customers_query, conn_temp).iloc[0]
-    conn_temp.close()
+    gojek_totals = period.totals('gojek', ['new_client', 'active_client', 'returned_client'])
+    gojek_customers = {
+        'gojek_new': gojek_totals['new_client'],
+        'gojek_repeat': gojek_totals['active_client'],
+        'gojek_reactive': gojek_totals['returned_client'],
+    }
     
     # Общие данные (обе платформы)
     new_customers = data['new_customers'].sum()
@@ -1666,82 +1725,72 @@ def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
     reactivated_customer_revenue = grab_customers['grab_earned_reactive'] or 0
     
     # Структура клиентской базы
-    print("📊 Структура клиентской базы (GRAB + GOJEK):")
+    out("📊 Структура клиентской базы (GRAB + GOJEK):")
     if total_customers > 0:
         new_rate = (new_customers / total_customers) * 100
         repeat_rate = (repeated_customers / total_customers) * 100
         reactive_rate = (reactivated_customers / total_customers) * 100
         
-        print(f"  🆕 Новые клиенты: {new_customers:,.0f} ({new_rate:.1f}%)")
-        print(f"    📱 GRAB: {grab_new:,.0f} | 🛵 GOJEK: {gojek_new:,.0f}")
-        print(f"  🔄 Повторные клиенты: {repeated_customers:,.0f} ({repeat_rate:.1f}%)")
-        print(f"    📱 GRAB: {grab_repeat:,.0f} | 🛵 GOJEK: {gojek_repeat:,.0f}")
-        print(f"  📲 Реактивированные: {reactivated_customers:,.0f} ({reactive_rate:.1f}%)")
-        print(f"    📱 GRAB: {grab_reactive:,.0f} | 🛵 GOJEK: {gojek_reactive:,.0f}")
+        out(f"  🆕 Новые клиенты: {new_customers:,.0f} ({new_rate:.1f}%)")
+        out(f"    📱 GRAB: {grab_new:,.0f} | 🛵 GOJEK: {gojek_new:,.0f}")
+        out(f"  🔄 Повторные клиенты: {repeated_customers:,.0f} ({repeat_rate:.1f}%)")
+        out(f"    📱 GRAB: {grab_repeat:,.0f} | 🛵 GOJEK: {gojek_repeat:,.0f}")
+        out(f"  📲 Реактивированные: {reactivated_customers:,.0f} ({reactive_rate:.1f}%)")
+        out(f"    📱 GRAB: {grab_reactive:,.0f} | 🛵 GOJEK: {gojek_reactive:,.0f}")
         
         # Доходность по типам клиентов (только GRAB)
-        print(f"\n💰 Доходность по типам клиентов (только GRAB):")
+        out(f"\n💰 Доходность по типам клиентов (только GRAB):")
         if new_customer_revenue > 0 and grab_new > 0:
             avg_new = new_customer_revenue / grab_new
             avg_repeat = repeated_customer_revenue / grab_repeat if grab_repeat > 0 else 0
             avg_reactive = reactivated_customer_revenue / grab_reactive if grab_reactive > 0 else 0
             
-            print(f"  🆕 Новые: {new_customer_revenue:,.0f} IDR (средний чек: {avg_new:,.0f} IDR) - только {grab_new} клиентов GRAB")
-            print(f"  🔄 Повторные: {repeated_customer_revenue:,.0f} IDR (средний чек: {avg_repeat:,.0f} IDR) - только {grab_repeat} клиентов GRAB")
+            out(f"  🆕 Новые: {new_customer_revenue:,.0f} IDR (средний чек: {avg_new:,.0f} IDR) - только {grab_new} клиентов GRAB")
+            out(f"  🔄 Повторные: {repeated_customer_revenue:,.0f} IDR (средний чек: {avg_repeat:,.0f} IDR) - только {grab_repeat} клиентов GRAB")
             if reactivated_customer_revenue > 0:
-                print(f"  📲 Реактивированные: {reactivated_customer_revenue:,.0f} IDR (средний чек: {avg_reactive:,.0f} IDR) - только {grab_reactive} клиентов GRAB")
+                out(f"  📲 Реактивированные: {reactivated_customer_revenue:,.0f} IDR (средний чек: {avg_reactive:,.0f} IDR) - только {grab_reactive} клиентов GRAB")
             
-            print(f"\n  ⚠️ КРИТИЧНО: Данные о доходах от {gojek_new + gojek_repeat + gojek_reactive} клиентов GOJEK ОТСУТСТВУЮТ в базе данных")
-            print(f"  📊 Это означает, что реальная доходность может быть выше указанной")
+            out(f"\n  ⚠️ КРИТИЧНО: Данные о доходах от {gojek_new + gojek_repeat + gojek_reactive} клиентов GOJEK ОТСУТСТВУЮТ в базе данных")
+            out(f"  📊 Это означает, что реальная доходность может быть выше указанной")
             
             # Анализ лояльности (только GRAB)
             if avg_repeat > avg_new:
                 loyalty_premium = ((avg_repeat - avg_new) / avg_new * 100)
-                print(f"  🏆 Премия лояльности (GRAB): +{loyalty_premium:.1f}% к среднему чеку")
+                out(f"  🏆 Премия лояльности (GRAB): +{loyalty_premium:.1f}% к среднему чеку")
     
     # Динамика приобретения клиентов
     monthly_new_customers = data_sorted.groupby('month')['new_customers'].sum()
-    print(f"\n📈 Приобретение новых клиентов по месяцам:")
+    report.metric('new_customers', new_customers)
+    report.metric('repeated_customers', repeated_customers)
+    report.metric('reactivated_customers', reactivated_customers)
+    out(f"\n📈 Приобретение новых клиентов по месяцам:")
     for month, customers in monthly_new_customers.items():
         month_name = month_names.get(month, f"Месяц {month}")
-        print(f"  {month_name}: {customers:,.0f} новых клиентов")
+        out(f"  {month_name}: {customers:,.0f} новых клиентов")
     
-    print()
+    out()
     
     # 4. МАРКЕТИНГОВАЯ ЭФФЕКТИВНОСТЬ И ВОРОНКА
-    print("📈 4. МАРКЕТИНГОВАЯ ЭФФЕКТИВНОСТЬ И ВОРОНКА")
-    print("-" * 40)
+    report.section('marketing', "📈 4. МАРКЕТИНГОВАЯ ЭФФЕКТИВНОСТЬ И ВОРОНКА")
     
     # Получаем раздельные данные по платформам для маркетинга
-    gojek_marketing_query = f"""
-    SELECT 
-        SUM(ads_spend) as total_ads_spend,
-        SUM(ads_sales) as total_ads_sales,
-        SUM(ads_orders) as total_ads_orders
-    FROM gojek_stats 
-    WHERE restaurant_id = {restaurant_id} AND stat_date BETWEEN '{start_date}' AND '{end_date}'
-    """
-    
-    conn_marketing = sqlite3.connect("database.sqlite")
-    gojek_marketing_data = pd.read_sql_query(gojek_marketing_query, conn_marketing).iloc[0]
-    conn_marketing.close()
+    gojek_ads = period.totals('gojek', ['ads_spend', 'ads_sales', 'ads_orders'])
+    gojek_marketing_data = {
+        'total_ads_spend': gojek_ads['ads_spend'],
+        'total_ads_sales': gojek_ads['ads_sales'],
+        'total_ads_orders': gojek_ads['ads_orders'],
+    }
     gojek_marketing_spend = gojek_marketing_data['total_ads_spend'] or 0
     gojek_marketing_sales = gojek_marketing_data['total_ads_sales'] or 0
     gojek_marketing_orders = gojek_marketing_data['total_ads_orders'] or 0
     
     # Получаем чистые данные GRAB для маркетинга
-    grab_marketing_query = f"""
-    SELECT 
-        SUM(ads_spend) as grab_spend,
-        SUM(ads_sales) as grab_sales,
-        SUM(ads_orders) as grab_orders
-    FROM grab_stats 
-    WHERE restaurant_id = {restaurant_id} AND stat_date BETWEEN '{start_date}' AND '{end_date}'
-    """
-    
-    conn_grab = sqlite3.connect("database.sqlite")
-    grab_marketing_raw = pd.read_sql_query(grab_marketing_query, conn_grab).iloc[0]
-    conn_grab.close()
+    grab_ads = period.totals('grab', ['ads_spend', 'ads_sales', 'ads_orders'])
+    grab_marketing_raw = {
+        'grab_spend': grab_ads['ads_spend'],
+        'grab_sales': grab_ads['ads_sales'],
+        'grab_orders': grab_ads['ads_orders'],
+    }
     
     # Данные воронки (только GRAB)
     total_impressions = data['impressions'].sum()
@@ -1752,29 +1801,34 @@ def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
     grab_marketing_spend = grab_marketing_raw['grab_spend'] or 0
     grab_marketing_sales = grab_marketing_raw['grab_sales'] or 0
     
-    print("📊 Маркетинговая воронка (только GRAB - GOJEK не предоставляет данные воронки):")
+    # Дни без рекламы на обеих платформах
+    ads_off_days = int((data['marketing_spend'] <= 0).sum()) if 'marketing_spend' in data.columns else 0
+    out(f"📉 Дни с отключенной рекламой (оба канала): {ads_off_days}")
+    report.metric('ads_off_days', ads_off_days)
+    
+    out("📊 Маркетинговая воронка (только GRAB - GOJEK не предоставляет данные воронки):")
     if total_impressions > 0:
         ctr = (total_menu_visits / total_impressions) * 100
         add_to_cart_rate = (total_add_to_carts / total_menu_visits) * 100 if total_menu_visits > 0 else 0
         cart_to_order_rate = (grab_marketing_orders / total_add_to_carts) * 100 if total_add_to_carts > 0 else 0
         overall_conversion = (grab_marketing_orders / total_menu_visits) * 100 if total_menu_visits > 0 else 0
         
-        print(f"  👁️ Показы рекламы: {total_impressions:,.0f} (только GRAB)")
-        print(f"  🔗 Посещения меню: {total_menu_visits:,.0f} (CTR: {ctr:.2f}%) (только GRAB)")
-        print(f"  🛒 Добавления в корзину: {total_add_to_carts:,.0f} (конверсия: {add_to_cart_rate:.2f}% от кликов) (только GRAB)")
-        print(f"  📦 Заказы от рекламы: {grab_marketing_orders:,.0f} (конверсия: {cart_to_order_rate:.1f}% от корзины) (только GRAB)")
-        print(f"  ")
-        print(f"  📊 КЛЮЧЕВЫЕ КОНВЕРСИИ:")
+        out(f"  👁️ Показы рекламы: {total_impressions:,.0f} (только GRAB)")
+        out(f"  🔗 Посещения меню: {total_menu_visits:,.0f} (CTR: {ctr:.2f}%) (только GRAB)")
+        out(f"  🛒 Добавления в корзину: {total_add_to_carts:,.0f} (конверсия: {add_to_cart_rate:.2f}% от кликов) (только GRAB)")
+        out(f"  📦 Заказы от рекламы: {grab_marketing_orders:,.0f} (конверсия: {cart_to_order_rate:.1f}% от корзины) (только GRAB)")
+        out(f"  ")
+        out(f"  📊 КЛЮЧЕВЫЕ КОНВЕРСИИ:")
         
         # Основная конверсия: показ → заказ
         impression_to_order = (grab_marketing_orders / total_impressions * 100) if total_impressions > 0 else 0
-        print(f"  • 🎯 Показ → Заказ: {impression_to_order:.2f}% (основная метрика эффективности)")
-        print(f"  • 🔗 Клик → Заказ: {overall_conversion:.1f}% (качество трафика)")
-        print(f"  • 🛒 Корзина → Заказ: {cart_to_order_rate:.1f}% (качество UX)")
+        out(f"  • 🎯 Показ → Заказ: {impression_to_order:.2f}% (основная метрика эффективности)")
+        out(f"  • 🔗 Клик → Заказ: {overall_conversion:.1f}% (качество трафика)")
+        out(f"  • 🛒 Корзина → Заказ: {cart_to_order_rate:.1f}% (качество UX)")
         
         # Добавляем методическое примечание для воронки
         funnel_note = generate_methodology_note('conversion')
-        print(f"\n⚠️ МЕТОДИКА: {funnel_note}")
+        out(f"\n⚠️ МЕТОДИКА: {funnel_note}")
         
         # Стоимость привлечения (только GRAB - есть данные воронки)
         # ИСПРАВЛЕНО: Используем только GRAB бюджет для GRAB метрик
@@ -1783,70 +1837,100 @@ def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
         cost_per_conversion = grab_only_spend / total_conversions if total_conversions > 0 else 0
         cost_per_order = grab_only_spend / grab_marketing_orders if grab_marketing_orders > 0 else 0
         
-        print(f"\n💸 Стоимость привлечения (только GRAB):")
-        print(f"  💰 Стоимость клика: {cost_per_click:,.0f} IDR")
-        print(f"  💰 Стоимость заказа: {cost_per_order:,.0f} IDR")
+        out(f"\n💸 Стоимость привлечения (только GRAB):")
+        out(f"  💰 Стоимость клика: {cost_per_click:,.0f} IDR")
+        out(f"  💰 Стоимость заказа: {cost_per_order:,.0f} IDR")
         
         # Финансовые данные по платформам
         total_marketing_spend = grab_marketing_spend + gojek_marketing_spend
         total_marketing_sales = grab_marketing_sales + gojek_marketing_sales
         total_marketing_orders = grab_marketing_orders + gojek_marketing_orders
         
-        print(f"\n💰 Финансовые показатели маркетинга:")
-        print(f"  📱 GRAB: {grab_marketing_spend:,.0f} IDR бюджет → {grab_marketing_sales:,.0f} IDR доход ({grab_marketing_orders} заказов)")
-        print(f"  🛵 GOJEK: {gojek_marketing_spend:,.0f} IDR бюджет → {gojek_marketing_sales:,.0f} IDR доход ({gojek_marketing_orders} заказов)")
-        print(f"  🎯 ИТОГО: {total_marketing_spend:,.0f} IDR бюджет → {total_marketing_sales:,.0f} IDR доход ({total_marketing_orders} заказов)")
+        out(f"\n💰 Финансовые показатели маркетинга:")
+        out(f"  📱 GRAB: {grab_marketing_spend:,.0f} IDR бюджет → {grab_marketing_sales:,.0f} IDR доход ({grab_marketing_orders} заказов)")
+        out(f"  🛵 GOJEK: {gojek_marketing_spend:,.0f} IDR бюджет → {gojek_marketing_sales:,.0f} IDR доход ({gojek_marketing_orders} заказов)")
+        out(f"  🎯 ИТОГО: {total_marketing_spend:,.0f} IDR бюджет → {total_marketing_sales:,.0f} IDR доход ({total_marketing_orders} заказов)")
         
         if total_marketing_spend > 0:
             # Используем новую функцию для корректного отображения ROAS
             roas_breakdown = generate_roas_breakdown(grab_marketing_sales, grab_marketing_spend,
                                                    gojek_marketing_sales, gojek_marketing_spend)
-            print(roas_breakdown)
-        
-        # Эффективность кампаний по месяцам (GRAB + GOJEK) - используем точные расчеты
-        print(f"\n🎯 ROAS по месяцам (GRAB + GOJEK):")
-        
-        # Апрель (месяц 4) - преобразуем date в datetime
-        april_grab_sales = grab_platform_data[pd.to_datetime(grab_platform_data['date']).dt.month == 4]['marketing_sales'].sum() if not grab_platform_data.empty else 0
-        april_grab_spend = grab_platform_data[pd.to_datetime(grab_platform_data['date']).dt.month == 4]['marketing_spend'].sum() if not grab_platform_data.empty else 0
-        april_gojek_sales = gojek_platform_data[pd.to_datetime(gojek_platform_data['date']).dt.month == 4]['marketing_sales'].sum() if not gojek_platform_data.empty else 0
-        april_gojek_spend = gojek_platform_data[pd.to_datetime(gojek_platform_data['date']).dt.month == 4]['marketing_spend'].sum() if not gojek_platform_data.empty else 0
-        
-        april_total_sales = april_grab_sales + april_gojek_sales
-        april_total_spend = april_grab_spend + april_gojek_spend
-        april_roas = april_total_sales / april_total_spend if april_total_spend > 0 else 0
-        
-        # Май (месяц 5) - преобразуем date в datetime
-        may_grab_sales = grab_platform_data[pd.to_datetime(grab_platform_data['date']).dt.month == 5]['marketing_sales'].sum() if not grab_platform_data.empty else 0
-        may_grab_spend = grab_platform_data[pd.to_datetime(grab_platform_data['date']).dt.month == 5]['marketing_spend'].sum() if not grab_platform_data.empty else 0
-        may_gojek_sales = gojek_platform_data[pd.to_datetime(gojek_platform_data['date']).dt.month == 5]['marketing_sales'].sum() if not gojek_platform_data.empty else 0
-        may_gojek_spend = gojek_platform_data[pd.to_datetime(gojek_platform_data['date']).dt.month == 5]['marketing_spend'].sum() if not gojek_platform_data.empty else 0
-        
-        may_total_sales = may_grab_sales + may_gojek_sales
-        may_total_spend = may_grab_spend + may_gojek_spend
-        may_roas = may_total_sales / may_total_spend if may_total_spend > 0 else 0
-        
-        print(f"  Апрель: {april_roas:.2f}x")
-        print(f"  Май: {may_roas:.2f}x")
+            out(roas_breakdown)
+        
+        # Детальная воронка и потенциал (только GRAB)
+        bounce_rate = ((total_menu_visits - total_add_to_carts) / total_menu_visits * 100) if total_menu_visits > 0 else 0
+        lost_from_bounce = max(0, total_menu_visits - total_add_to_carts)
+        cart_abandon_rate = ((total_add_to_carts - grab_marketing_orders) / total_add_to_carts * 100) if total_add_to_carts > 0 else 0
+        lost_from_abandon = max(0, total_add_to_carts - grab_marketing_orders)
+        potential_from_bounce = lost_from_bounce * 0.1 * avg_order_value
+        potential_from_abandon = lost_from_abandon * avg_order_value
+        out(f"\n🔍 ДЕТАЛЬНАЯ ВОРОНКА:")
+        out(f"  💔 Bounce rate: {bounce_rate:.1f}% ({lost_from_bounce:,.0f} ушли без покупки)")
+        out(f"  🛒 Брошенные корзины: {cart_abandon_rate:.1f}% ({lost_from_abandon:,.0f} добавили, но не купили)")
+        out(f"  💰 Потенциал оптимизации:")
+        out(f"  • Снижение bounce на 10%: +{potential_from_bounce:,.0f} IDR")
+        out(f"  • Устранение брошенных корзин: +{potential_from_abandon:,.0f} IDR")
+        if total_marketing_sales > 0:
+            improvement_percent = (potential_from_bounce + potential_from_abandon) / total_marketing_sales * 100
+            out(f"  • Потенциальный рост к рекламным продажам: +{improvement_percent:.1f}%")
+        
+        # Расширенные метрики
+        mer = (marketing_sales / total_marketing) if total_marketing > 0 else 0
+        cpm = (grab_only_spend / total_impressions * 1000) if total_impressions > 0 else 0
+        reach = data['unique_impressions_reach'].sum() if 'unique_impressions_reach' in data.columns else 0
+        frequency = (total_impressions / reach) if reach > 0 else 0
+        out(f"📊 Расширенные метрики: MER {mer:.2f}x; CPM {cpm:,.0f} IDR; frequency {frequency:.2f}")
+        
+        # Эффективность кампаний по месяцам периода (GRAB + GOJEK)
+        out(f"\n🎯 ROAS по месяцам (GRAB + GOJEK):")
+        
+        def monthly_ads(platform_frame):
+            if platform_frame.empty:
+                return pd.DataFrame(columns=['marketing_sales', 'marketing_spend'])
+            months = pd.to_datetime(platform_frame['date']).dt.month
+            return platform_frame.groupby(months)[['marketing_sales', 'marketing_spend']].sum()
+        
+        def ratio(sales, spend):
+            return sales / spend if spend > 0 else 0
+        
+        grab_monthly = monthly_ads(grab_platform_data)
+        gojek_monthly = monthly_ads(gojek_platform_data)
+        roas_by_month = {}
+        platform_lines = []
+        for month in sorted(set(grab_monthly.index) | set(gojek_monthly.index)):
+            grab_month = grab_monthly.loc[month] if month in grab_monthly.index else pd.Series({'marketing_sales': 0, 'marketing_spend': 0})
+            gojek_month = gojek_monthly.loc[month] if month in gojek_monthly.index else pd.Series({'marketing_sales': 0, 'marketing_spend': 0})
+            month_name = month_names.get(month, f"Месяц {month}")
+            month_roas = ratio(grab_month['marketing_sales'] + gojek_month['marketing_sales'],
+                               grab_month['marketing_spend'] + gojek_month['marketing_spend'])
+            roas_by_month[month_name] = month_roas
+            out(f"  {month_name}: {month_roas:.2f}x")
+            platform_lines.append(
+                f"  {month_name}: 📱 GRAB {ratio(grab_month['marketing_sales'], grab_month['marketing_spend']):.2f}x | "
+                f"🛵 GOJEK {ratio(gojek_month['marketing_sales'], gojek_month['marketing_spend']):.2f}x"
+            )
         
         # Детализация по платформам
-        print(f"\n📊 Детализация ROAS по платформам:")
-        
-        april_grab_roas = april_grab_sales / april_grab_spend if april_grab_spend > 0 else 0
-        april_gojek_roas = april_gojek_sales / april_gojek_spend if april_gojek_spend > 0 else 0
-        may_grab_roas = may_grab_sales / may_grab_spend if may_grab_spend > 0 else 0
-        may_gojek_roas = may_gojek_sales / may_gojek_spend if may_gojek_spend > 0 else 0
-        
-        print(f"  Апрель: 📱 GRAB {april_grab_roas:.2f}x | 🛵 GOJEK {april_gojek_roas:.2f}x")
-        print(f"  Май: 📱 GRAB {may_grab_roas:.2f}x | 🛵 GOJEK {may_gojek_roas:.2f}x")
+        out(f"\n📊 Детализация ROAS по платформам:")
+        for line in platform_lines:
+            out(line)
+        
+        report.metric('impressions', total_impressions)
+        report.metric('ctr_percent', ctr)
+        report.metric('conversion_percent', overall_conversion)
+        report.metric('cost_per_order', cost_per_order)
+        report.metric('bounce_rate_percent', bounce_rate)
+        report.metric('cart_abandon_percent', cart_abandon_rate)
+        report.metric('mer', mer)
+        report.metric('cpm', cpm)
+        report.metric('roas_by_month', roas_by_month)
         
         # Методические ограничения уже указаны в начале отчета
     
-    print()
+    out()
     
     # 5. ОПЕРАЦИОННАЯ ЭФФЕКТИВНОСТЬ
-    print("⚠️ 5. ОПЕРАЦИОННАЯ ЭФФЕКТИВНОСТЬ")
-    print("-" * 40)
+    report.section('operations', "⚠️ 5. ОПЕРАЦИОННАЯ ЭФФЕКТИВНОСТЬ")
     
     # Анализ операционных проблем
     days_with_closure_cancellations = data['store_is_closed'].sum()
@@ -1855,16 +1939,21 @@ def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
     out_of_stock_days = data['out_of_stock'].sum()
     cancelled_orders = data['cancelled_orders'].sum()
     
-    print(f"🏪 Операционные показатели:")
-    print(f"  🚫 Дней с отменами 'ресторан закрыт': {days_with_closure_cancellations} ({(days_with_closure_cancellations/len(data)*100):.1f}%)")
-    print(f"  🔥 Дней занят: {busy_days} ({(busy_days/len(data)*100):.1f}%)")
-    print(f"  ⏰ Дней 'скоро закрытие': {closing_soon_days} ({(closing_soon_days/len(data)*100):.1f}%)")
-    print(f"  📦 Дней с дефицитом товара: {out_of_stock_days} ({(out_of_stock_days/len(data)*100):.1f}%)")
-    print(f"  ❌ Всего отмененных заказов: {cancelled_orders:,.0f}")
+    out(f"🏪 Операционные показатели:")
+    out(f"  🚫 Дней с отменами 'ресторан закрыт': {days_with_closure_cancellations} ({(days_with_closure_cancellations/len(data)*100):.1f}%)")
+    out(f"  🔥 Дней занят: {busy_days} ({(busy_days/len(data)*100):.1f}%)")
+    out(f"  ⏰ Дней 'скоро закрытие': {closing_soon_days} ({(closing_soon_days/len(data)*100):.1f}%)")
+    out(f"  📦 Дней с дефицитом товара: {out_of_stock_days} ({(out_of_stock_days/len(data)*100):.1f}%)")
+    out(f"  ❌ Всего отмененных заказов: {cancelled_orders:,.0f}")
+    report.metric('closure_cancellation_days', days_with_closure_cancellations)
+    report.metric('busy_days', busy_days)
+    report.metric('closing_soon_days', closing_soon_days)
+    report.metric('out_of_stock_days', out_of_stock_days)
+    report.metric('cancelled_orders', cancelled_orders)
     
     # Пояснение о причинах отмен
-    print(f"\n💡 Пояснение: 'Дни с отменами по закрытию' означают дни, когда сотрудники")
-    print(f"   отменяли заказы с причиной 'ресторан закрыт' (обычно поздние заказы)")
+    out(f"\n💡 Пояснение: 'Дни с отменами по закрытию' означают дни, когда сотрудники")
+    out(f"   отменяли заказы с причиной 'ресторан закрыт' (обычно поздние заказы)")
     
     # Расчет реальных потерь от операционных проблем
     avg_order_value = total_sales / data['orders'].sum() if data['orders'].sum() > 0 else 0
@@ -1879,37 +1968,37 @@ def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
     total_operational_losses = cancelled_orders_losses + operational_losses
     
     if total_operational_losses > 0:
-        print(f"\n💔 Реальные потери от операционных проблем:")
-        print(f"  💸 От отмененных заказов: {cancelled_orders_losses:,.0f} IDR ({cancelled_orders} × {avg_order_value:,.0f} IDR)")
-        print(f"  💸 От дней 'занят/нет товара': {operational_losses:,.0f} IDR")
-        print(f"  💸 Общие потери: {total_operational_losses:,.0f} IDR")
-        print(f"  📊 % от общей выручки: {(total_operational_losses/total_sales*100):.1f}%")
+        out(f"\n💔 Реальные потери от операционных проблем:")
+        out(f"  💸 От отмененных заказов: {cancelled_orders_losses:,.0f} IDR ({cancelled_orders} × {avg_order_value:,.0f} IDR)")
+        out(f"  💸 От дней 'занят/нет товара': {operational_losses:,.0f} IDR")
+        out(f"  💸 Общие потери: {total_operational_losses:,.0f} IDR")
+        out(f"  📊 % от общей выручки: {(total_operational_losses/total_sales*100):.1f}%")
+    report.metric('total_operational_losses', total_operational_losses)
     
     # Анализ выключений платформ (Close Time Analysis)
-    platform_downtime_analysis = analyze_platform_downtime(restaurant_id, start_date, end_date)
+    platform_downtime_analysis = analyze_platform_downtime(restaurant_id, start_date, end_date, period=period)
     if platform_downtime_analysis:
-        print(f"\n⏰ АНАЛИЗ ВЫКЛЮЧЕНИЙ ПЛАТФОРМ:")
+        out(f"\n⏰ АНАЛИЗ ВЫКЛЮЧЕНИЙ ПЛАТФОРМ:")
         for line in platform_downtime_analysis:
-            print(f"  {line}")
+            out(f"  {line}")
     
     # Анализ времени обслуживания (Gojek данные)
     if data['realized_orders_percentage'].mean() > 0:
         avg_realization = data['realized_orders_percentage'].mean()
         lost_orders = data['lost_orders'].sum()
         
-        print(f"\n⏱️ Качество обслуживания (Gojek):")
-        print(f"  ✅ Процент выполненных заказов: {avg_realization:.1f}%")
-        print(f"  ❌ Потерянные заказы: {lost_orders:,.0f}")
+        out(f"\n⏱️ Качество обслуживания (Gojek):")
+        out(f"  ✅ Процент выполненных заказов: {avg_realization:.1f}%")
+        out(f"  ❌ Потерянные заказы: {lost_orders:,.0f}")
         
         if avg_realization < 95:
             improvement_potential = (95 - avg_realization) / 100 * total_orders * avg_order_value
-            print(f"  📈 Потенциал улучшения до 95%: +{improvement_potential:,.0f} IDR")
+            out(f"  📈 Потенциал улучшения до 95%: +{improvement_potential:,.0f} IDR")
     
-    print()
+    out()
     
     # 6. КАЧЕСТВО ОБСЛУЖИВАНИЯ И УДОВЛЕТВОРЕННОСТЬ
-    print("⭐ 6. КАЧЕСТВО ОБСЛУЖИВАНИЯ И УДОВЛЕТВОРЕННОСТЬ")
-    print("-" * 40)
+    report.section('quality', "⭐ 6. КАЧЕСТВО ОБСЛУЖИВАНИЯ И УДОВЛЕТВОРЕННОСТЬ")
     
     # Правильный анализ рейтингов - только GOJEK имеет детальные данные по звездам
     gojek_ratings_data = gojek_platform_data if not gojek_platform_data.empty else pd.DataFrame()
@@ -1927,7 +2016,7 @@ def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
         # Средний рейтинг GRAB (только общий показатель)
         grab_avg_rating = grab_platform_data['rating'].mean() if not grab_platform_data.empty and 'rating' in grab_platform_data.columns else 0
         
-        print(f"📊 Детальные оценки клиентов GOJEK (всего: {total_gojek_ratings:,.0f}):")
+        out(f"📊 Детальные оценки клиентов GOJEK (всего: {total_gojek_ratings:,.0f}):")
         
         ratings_data = [
             (5, five_stars, "⭐⭐⭐⭐⭐"),
@@ -1939,23 +2028,27 @@ def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
         
         for stars, count, emoji in ratings_data:
             percentage = (count / total_gojek_ratings) * 100 if total_gojek_ratings > 0 else 0
-            print(f"  {emoji} {stars} звезд: {count:,.0f} ({percentage:.1f}%)")
+            out(f"  {emoji} {stars} звезд: {count:,.0f} ({percentage:.1f}%)")
         
         # Расчет индекса удовлетворенности GOJEK
         if total_gojek_ratings > 0:
             gojek_weighted_score = (five_stars * 5 + four_stars * 4 + three_stars * 3 + two_stars * 2 + one_stars * 1)
             gojek_satisfaction = gojek_weighted_score / total_gojek_ratings
-            print(f"\n📈 Индекс удовлетворенности GOJEK: {gojek_satisfaction:.2f}/5.0")
+            out(f"\n📈 Индекс удовлетворенности GOJEK: {gojek_satisfaction:.2f}/5.0")
+            report.metric('gojek_satisfaction', gojek_satisfaction)
         
         # Показываем GRAB рейтинг отдельно
         if grab_avg_rating > 0:
-            print(f"📈 Средний рейтинг GRAB: {grab_avg_rating:.2f}/5.0 (детализация по звездам недоступна)")
+            out(f"📈 Средний рейтинг GRAB: {grab_avg_rating:.2f}/5.0 (детализация по звездам недоступна)")
         
         # Анализ проблемных областей (только GOJEK)
         negative_ratings = one_stars + two_stars
         negative_rate = (negative_ratings / total_gojek_ratings) * 100 if total_gojek_ratings > 0 else 0
+        report.metric('gojek_ratings', {5: five_stars, 4: four_stars, 3: three_stars, 2: two_stars, 1: one_stars})
+        report.metric('grab_avg_rating', grab_avg_rating)
+        report.metric('negative_rate_percent', negative_rate)
         if negative_ratings > 0:
-            print(f"🚨 Негативные отзывы GOJEK (1-2★): {negative_ratings:,.0f} ({negative_rate:.1f}%)")
+            out(f"🚨 Негативные отзывы GOJEK (1-2★): {negative_ratings:,.0f} ({negative_rate:.1f}%)")
         
         # Расчет частоты плохих оценок (все кроме 5 звезд) - только GOJEK
         bad_ratings = four_stars + three_stars + two_stars + one_stars
@@ -1963,162 +2056,87 @@ def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
         
         if bad_ratings > 0 and gojek_orders > 0:
             orders_per_bad_rating = gojek_orders / bad_ratings
-            print(f"\n📊 Частота плохих оценок GOJEK (не 5★):")
-            print(f"  📈 Плохих оценок всего: {bad_ratings:,.0f} из {total_gojek_ratings:,.0f} ({(bad_ratings/total_gojek_ratings*100):.1f}%)")
-            print(f"  📦 Заказов GOJEK на 1 плохую оценку: {orders_per_bad_rating:.1f}")
-            print(f"  💡 Это означает: каждый {orders_per_bad_rating:.0f}-й заказ GOJEK получает оценку не 5★")
+            out(f"\n📊 Частота плохих оценок GOJEK (не 5★):")
+            out(f"  📈 Плохих оценок всего: {bad_ratings:,.0f} из {total_gojek_ratings:,.0f} ({(bad_ratings/total_gojek_ratings*100):.1f}%)")
+            out(f"  📦 Заказов GOJEK на 1 плохую оценку: {orders_per_bad_rating:.1f}")
+            out(f"  💡 Это означает: каждый {orders_per_bad_rating:.0f}-й заказ GOJEK получает оценку не 5★")
             
             # Интерпретация результата
             if orders_per_bad_rating >= 100:
-                print(f"  🟢 ОТЛИЧНО: Очень редкие плохие оценки")
+                out(f"  🟢 ОТЛИЧНО: Очень редкие плохие оценки")
             elif orders_per_bad_rating >= 50:
-                print(f"  🟡 ХОРОШО: Умеренная частота плохих оценок")
+                out(f"  🟡 ХОРОШО: Умеренная частота плохих оценок")
             elif orders_per_bad_rating >= 20:
-                print(f"  🟠 ВНИМАНИЕ: Частые плохие оценки")
+                out(f"  🟠 ВНИМАНИЕ: Частые плохие оценки")
             else:
-                print(f"  🔴 КРИТИЧНО: Очень частые плохие оценки")
+                out(f"  🔴 КРИТИЧНО: Очень частые плохие оценки")
             
             if negative_rate > 10:
-                print(f"  ⚠️ КРИТИЧНО: Высокий уровень негативных отзывов!")
+                out(f"  ⚠️ КРИТИЧНО: Высокий уровень негативных отзывов!")
         
-        print(f"\n⚠️ ОГРАНИЧЕНИЯ ДАННЫХ:")
-        print(f"  • GOJEK: {total_gojek_ratings:,.0f} детальных оценок от клиентов")
-        print(f"  • GRAB: только средний рейтинг {grab_avg_rating:.2f}/5.0, детализация недоступна")
-        print(f"  • Анализ частоты основан только на данных GOJEK")
+        out(f"\n⚠️ ОГРАНИЧЕНИЯ ДАННЫХ:")
+        out(f"  • GOJEK: {total_gojek_ratings:,.0f} детальных оценок от клиентов")
+        out(f"  • GRAB: только средний рейтинг {grab_avg_rating:.2f}/5.0, детализация недоступна")
+        out(f"  • Анализ частоты основан только на данных GOJEK")
     else:
-        print("📊 Детальные данные по оценкам недоступны")
+        out("📊 Детальные данные по оценкам недоступны")
         
         # Показываем хотя бы средние рейтинги если есть
         if not grab_platform_data.empty and 'rating' in grab_platform_data.columns:
             grab_avg = grab_platform_data['rating'].mean()
-            print(f"📈 Средний рейтинг GRAB: {grab_avg:.2f}/5.0")
+            out(f"📈 Средний рейтинг GRAB: {grab_avg:.2f}/5.0")
+            report.metric('grab_avg_rating', grab_avg)
         
         if not gojek_platform_data.empty and 'rating' in gojek_platform_data.columns:
             gojek_avg = gojek_platform_data['rating'].mean()
-            print(f"📈 Средний рейтинг GOJEK: {gojek_avg:.2f}/5.0")
+            out(f"📈 Средний рейтинг GOJEK: {gojek_avg:.2f}/5.0")
+            report.metric('gojek_avg_rating', gojek_avg)
     
-    print()
+    out()
     
     # 7. АНАЛИЗ ВНЕШНИХ ФАКТОРОВ (API)
-    print("🌐 7. АНАЛИЗ ВНЕШНИХ ФАКТОРОВ")
-    print("-" * 40)
+    report.section('external', "🌐 7. АНАЛИЗ ВНЕШНИХ ФАКТОРОВ")
     
     # Получаем точные координаты ресторана
-    restaurant_location = get_restaurant_location(restaurant_name)
-    print(f"📍 Локация: {restaurant_location['location']}, {restaurant_location['area']} ({restaurant_location['zone']} зона)")
-    print(f"🗺️ Координаты: {restaurant_location['latitude']:.4f}, {restaurant_location['longitude']:.4f}")
+    restaurant_location = graph.result('location')
+    out(f"📍 Локация: {restaurant_location['location']}, {restaurant_location['area']} ({restaurant_location['zone']} зона)")
+    out(f"🗺️ Координаты: {restaurant_location['latitude']:.4f}, {restaurant_location['longitude']:.4f}")
     
     # УПРОЩЕННЫЙ АНАЛИЗ ПОГОДЫ (без симуляций и псевдонауки)
-    print("🌤️ АНАЛИЗ ПОГОДНЫХ УСЛОВИЙ:")
+    out("🌤️ АНАЛИЗ ПОГОДНЫХ УСЛОВИЙ:")
     
-    # Анализируем ВСЕ дни с данными
-    all_dates = data['date'].unique()
-    weather_sales_data = []
-    weather_groups = {}  # Группировка продаж по погодным условиям
+    # Погода всех дней с данными - узлы weather / weather_impact графа
+    api_available, weather_sales_data, weather_groups = graph.result('weather')
+    out(f"  📊 Анализ погодных данных за {len(weather_sales_data)} дней...")
     
-    print(f"  📊 Анализ погодных данных за {len(all_dates)} дней...")
-    
-    # Проверяем доступность API на первом запросе
-    first_date = all_dates[0]
-    test_weather = weather_api.get_weather_data(
-        first_date, 
-        lat=restaurant_location['latitude'], 
-        lon=restaurant_location['longitude']
-    )
-    
-    api_available = test_weather.get('source', '').startswith('Open-Meteo')
     if not api_available:
-        print("  ⚠️ Внешний API недоступен - используем базовый анализ")
-        print("  📊 Показываем основные тренды без детальных погодных данных")
+        out("  ⚠️ Внешний API недоступен - используем базовый анализ")
+        out("  📊 Показываем основные тренды без детальных погодных данных")
         # Пропускаем сложный анализ если API недоступен
-        print("  💡 Для полного анализа погоды подключите Open-Meteo API")
-        print()
+        out("  💡 Для полного анализа погоды подключите Open-Meteo API")
+        out()
         # Переходим к праздникам
     else:
-        print("  ✅ Получаем реальные погодные данные...")
+        out("  ✅ Получаем реальные погодные данные...")
     
-    # Собираем данные о погоде для всех дней
-    for i, date in enumerate(all_dates):
-        if api_available or i == 0:  # Делаем запрос только если API доступен или это первый запрос
-            weather = weather_api.get_weather_data(
-                date, 
-                lat=restaurant_location['latitude'], 
-                lon=restaurant_location['longitude']
-            )
-        else:
-            # Используем симуляцию для остальных дней если API недоступен
-            weather = weather_api._simulate_weather(date)
-        day_sales = data[data['date'] == date]['total_sales'].sum()
-        condition = weather['condition']
-        
-        weather_sales_data.append({
-            'date': date,
-            'condition': condition,
-            'temperature': weather['temperature'],
-            'rain': weather.get('rain', 0),
-            'wind': weather.get('wind_speed', 10),
-            'sales': day_sales
-        })
-        
-        # Группируем продажи по погодным условиям
-        if condition not in weather_groups:
-            weather_groups[condition] = []
-        weather_groups[condition].append(day_sales)
-    total_weather_impact = 0
-    impact_details = []
-    critical_days = []
+    weather_summary = graph.result('weather_impact')
+    impact_details = weather_summary['impact_details']
+    critical_days = weather_summary['critical_days']
     
-    for item in weather_sales_data:
-        # Формируем данные для анализа
-        day_weather = {
-            'temperature': item['temperature'],
-            'rain': item['rain'],
-            'wind': item['wind']
-        }
-        
-        # Получаем зону ресторана
-        restaurant_zone = restaurant_location.get('zone', 'Unknown')
-        
-        # Анализируем влияние погоды на этот день
-        weather_analysis = analyze_weather_impact_for_report(
-            day_weather, 
-            zone=restaurant_zone, 
-            restaurant_name=restaurant_name
-        )
-        
-        day_impact = weather_analysis['total_impact']
-        total_weather_impact += day_impact
-        
-        # Сохраняем детали для дней с заметным влиянием
-        impact_details.append({
-            'date': item['date'],
-            'sales': item['sales'],
-            'impact': day_impact,
-            'primary_factor': weather_analysis['primary_factor'],
-            'weather': day_weather
-        })
-        
-        # Критическими считаем только дни с экстремальным влиянием
-        if abs(day_impact) > 40:  # Только действительно критические дни
-            critical_days.append({
-                'date': item['date'],
-                'sales': item['sales'],
-                'impact': day_impact,
-                'primary_factor': weather_analysis['primary_factor'],
-                'weather': day_weather
-            })
     # Средний эффект погоды за период
-    avg_weather_impact = total_weather_impact / len(weather_sales_data) if weather_sales_data else 0
+    avg_weather_impact = weather_summary['avg_weather_impact']
     weather_impact = avg_weather_impact  # Для совместимости с остальным кодом
     
-    print(f"  📊 ИТОГОВЫЙ АНАЛИЗ ВЛИЯНИЯ ПОГОДЫ:")
-    print(f"    💰 Средний эффект погоды за период: {avg_weather_impact:+.1f}%")
+    out(f"  📊 ИТОГОВЫЙ АНАЛИЗ ВЛИЯНИЯ ПОГОДЫ:")
+    out(f"    💰 Средний эффект погоды за период: {avg_weather_impact:+.1f}%")
+    report.metric('weather_impact_percent', avg_weather_impact)
+    report.metric('weather_groups_avg_sales', {condition: sum(sales) / len(sales) for condition, sales in weather_groups.items()})
     
     if abs(avg_weather_impact) > 5:
         impact_assessment = "КРИТИЧНО!" if abs(avg_weather_impact) > 15 else "ЗАМЕТНО"
-        print(f"    ⚠️ Оценка: {impact_assessment}")
+        out(f"    ⚠️ Оценка: {impact_assessment}")
     else:
-        print(f"    ✅ Оценка: Умеренное влияние")
+        out(f"    ✅ Оценка: Умеренное влияние")
     
     # Классификация дней по влиянию погоды
     if impact_details:
@@ -2132,17 +2150,17 @@ def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
         moderate_negative = [d for d in impact_details if -40 <= d['impact'] <= -15]
         strong_negative = [d for d in impact_details if d['impact'] < -40]
         
-        print(f"  📊 КЛАССИФИКАЦИЯ ПОГОДНОГО ВЛИЯНИЯ:")
-        print(f"    📈 Сильно положительное (>+40%): {len(strong_positive)} дней")
-        print(f"    🟢 Умеренно положительное (+15% до +40%): {len(moderate_positive)} дней")
-        print(f"    ⚪ Нейтральное (-15% до +15%): {len(neutral)} дней")
-        print(f"    🟠 Умеренно негативное (-40% до -15%): {len(moderate_negative)} дней")
-        print(f"    🔴 Сильно негативное (<-40%): {len(strong_negative)} дней")
+        out(f"  📊 КЛАССИФИКАЦИЯ ПОГОДНОГО ВЛИЯНИЯ:")
+        out(f"    📈 Сильно положительное (>+40%): {len(strong_positive)} дней")
+        out(f"    🟢 Умеренно положительное (+15% до +40%): {len(moderate_positive)} дней")
+        out(f"    ⚪ Нейтральное (-15% до +15%): {len(neutral)} дней")
+        out(f"    🟠 Умеренно негативное (-40% до -15%): {len(moderate_negative)} дней")
+        out(f"    🔴 Сильно негативное (<-40%): {len(strong_negative)} дней")
         
         # Показываем только топ-5 дней с самым сильным влиянием
         top_impact_days = impact_details[:5]
         if top_impact_days:
-            print(f"  🔥 ТОП-5 ДНЕЙ С НАИБОЛЬШИМ ПОГОДНЫМ ВЛИЯНИЕМ:")
+            out(f"  🔥 ТОП-5 ДНЕЙ С НАИБОЛЬШИМ ПОГОДНЫМ ВЛИЯНИЕМ:")
             
             for i, day in enumerate(top_impact_days):
                 impact_emoji = "📈" if day['impact'] > 0 else "📉"
@@ -2155,66 +2173,55 @@ def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
                 else:
                     category = "ℹ️ Умеренное"
                 
-                print(f"    {i+1}. {day['date']}: {impact_emoji} {day['impact']:+.1f}% ({category})")
-                print(f"       🎯 Фактор: {day['primary_factor']}")
-                print(f"       💰 Продажи: {day['sales']:,.0f} IDR")
+                out(f"    {i+1}. {day['date']}: {impact_emoji} {day['impact']:+.1f}% ({category})")
+                out(f"       🎯 Фактор: {day['primary_factor']}")
+                out(f"       💰 Продажи: {day['sales']:,.0f} IDR")
                 
                 # Детали погоды
                 w = day['weather']
-                print(f"       🌤️ Погода: {w['temperature']:.1f}°C, дождь {w['rain']:.1f}мм, ветер {w['wind']:.1f}км/ч")
+                out(f"       🌤️ Погода: {w['temperature']:.1f}°C, дождь {w['rain']:.1f}мм, ветер {w['wind']:.1f}км/ч")
     
     # Отдельно выводим критические дни (если есть)
     if critical_days:
-        print(f"  🚨 ЭКСТРЕМАЛЬНЫЕ ПОГОДНЫЕ ДНИ (влияние >40%): {len(critical_days)} из {len(weather_sales_data)}")
+        out(f"  🚨 ЭКСТРЕМАЛЬНЫЕ ПОГОДНЫЕ ДНИ (влияние >40%): {len(critical_days)} из {len(weather_sales_data)}")
         for day in critical_days[:3]:  # Показываем топ-3 критических
             impact_emoji = "📈" if day['impact'] > 0 else "📉"
-            print(f"    • {day['date']}: {impact_emoji} {day['impact']:+.1f}% - {day['primary_factor']}")
+            out(f"    • {day['date']}: {impact_emoji} {day['impact']:+.1f}% - {day['primary_factor']}")
     else:
-        print(f"  ✅ ЭКСТРЕМАЛЬНЫХ ПОГОДНЫХ ДНЕЙ НЕ ОБНАРУЖЕНО (все дни в пределах нормы)")
+        out(f"  ✅ ЭКСТРЕМАЛЬНЫХ ПОГОДНЫХ ДНЕЙ НЕ ОБНАРУЖЕНО (все дни в пределах нормы)")
     
     # Рекомендации на основе анализа
-    print(f"  💡 РЕКОМЕНДАЦИИ ПО ПОГОДЕ:")
+    out(f"  💡 РЕКОМЕНДАЦИИ ПО ПОГОДЕ:")
     
-    # Анализируем общие паттерны
-    sample_weather = {
-        'temperature': sum(item['temperature'] for item in weather_sales_data) / len(weather_sales_data),
-        'rain': sum(item['rain'] for item in weather_sales_data) / len(weather_sales_data),
-        'wind': sum(item['wind'] for item in weather_sales_data) / len(weather_sales_data)
-    }
-    
-    general_analysis = analyze_weather_impact_for_report(
-        sample_weather, 
-        zone=restaurant_location.get('zone', 'Unknown')
-    )
+    # Анализируем общие паттерны (средняя погода периода)
+    general_analysis = weather_summary['general_analysis']
     
     for i, recommendation in enumerate(general_analysis['recommendations'][:3], 1):
-        print(f"    {i}. {recommendation}")
+        out(f"    {i}. {recommendation}")
     
     # Анализ погодных данных завершен
     
     # Анализ праздников
-    print(f"\n📅 Влияние праздников:")
-    year = int(start_date[:4])
-    holidays = calendar_api.get_holidays(year)
-    holiday_dates = [h['date'] for h in holidays if start_date <= h['date'] <= end_date]
-    
-    holiday_sales = data[data['date'].isin(holiday_dates)]['total_sales']
-    regular_sales = data[~data['date'].isin(holiday_dates)]['total_sales']
+    out(f"\n📅 Влияние праздников:")
+    holidays = graph.result('holidays')
+    holiday_dates, holiday_sales, regular_sales = _split_holiday_sales(data, holidays, start_date, end_date)
     
     if not holiday_sales.empty and not regular_sales.empty:
         holiday_avg = holiday_sales.mean()
         regular_avg = regular_sales.mean()
         holiday_effect = ((holiday_avg - regular_avg) / regular_avg * 100) if regular_avg > 0 else 0
         
-        print(f"  🎉 Праздничных дней в периоде: {len(holiday_sales)}")
-        print(f"  📊 Средние продажи в праздники: {holiday_avg:,.0f} IDR")
-        print(f"  📊 Средние продажи в обычные дни: {regular_avg:,.0f} IDR")
-        print(f"  🎯 Влияние праздников: {holiday_effect:+.1f}%")
+        out(f"  🎉 Праздничных дней в периоде: {len(holiday_sales)}")
+        out(f"  📊 Средние продажи в праздники: {holiday_avg:,.0f} IDR")
+        out(f"  📊 Средние продажи в обычные дни: {regular_avg:,.0f} IDR")
+        out(f"  🎯 Влияние праздников: {holiday_effect:+.1f}%")
+        report.metric('holiday_days', len(holiday_sales))
+        report.metric('holiday_effect_percent', holiday_effect)
         
         # Детальный анализ праздников с влиянием на продажи
         period_holidays = [h for h in holidays if h['date'] in holiday_dates]
         if period_holidays:
-            print(f"  📋 Праздники в периоде ({len(period_holidays)} всего):")
+            out(f"  📋 Праздники в периоде ({len(period_holidays)} всего):")
             
             # Анализируем влияние каждого типа праздника
             holiday_impact_analysis = {}
@@ -2245,23 +2252,23 @@ def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
                 national_impact = ((national_avg - regular_avg) / regular_avg * 100) if regular_avg > 0 and national_avg > 0 else 0
                 
                 impact_emoji = "📈" if national_impact > 5 else "📉" if national_impact < -5 else "➡️"
-                print(f"    🇮🇩 Национальные ({len(national_holidays)}): {impact_emoji} {national_impact:+.1f}% влияние")
+                out(f"    🇮🇩 Национальные ({len(national_holidays)}): {impact_emoji} {national_impact:+.1f}% влияние")
                 
                 # Показываем самые значимые
                 for holiday in national_holidays[:3]:
                     h_sales = next((h['sales'] for h in holiday_impact_analysis.get('national', []) if h['date'] == holiday['date']), 0)
                     h_impact = ((h_sales - regular_avg) / regular_avg * 100) if regular_avg > 0 and h_sales > 0 else 0
                     impact_text = f" ({h_impact:+.1f}%)" if abs(h_impact) > 10 else ""
-                    print(f"      • {holiday['date']}: {holiday['name']}{impact_text}")
+                    out(f"      • {holiday['date']}: {holiday['name']}{impact_text}")
                 if len(national_holidays) > 3:
-                    print(f"      • ... и еще {len(national_holidays) - 3}")
+                    out(f"      • ... и еще {len(national_holidays) - 3}")
             
             if balinese_holidays:
                 balinese_avg = sum(h['sales'] for h in holiday_impact_analysis.get('balinese', [])) / len(holiday_impact_analysis.get('balinese', [1])) if holiday_impact_analysis.get('balinese') else 0
                 balinese_impact = ((balinese_avg - regular_avg) / regular_avg * 100) if regular_avg > 0 and balinese_avg > 0 else 0
                 
                 impact_emoji = "📈" if balinese_impact > 5 else "📉" if balinese_impact < -5 else "➡️"
-                print(f"    🏝️ Балийские ({len(balinese_holidays)}): {impact_emoji} {balinese_impact:+.1f}% влияние")
+                out(f"    🏝️ Балийские ({len(balinese_holidays)}): {impact_emoji} {balinese_impact:+.1f}% влияние")
                 
                 # Показываем самые значимые
                 for holiday in balinese_holidays[:5]:
@@ -2269,80 +2276,67 @@ def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
                     h_impact = ((h_sales - regular_avg) / regular_avg * 100) if regular_avg > 0 and h_sales > 0 else 0
                     if abs(h_impact) > 10:  # Показываем только значимые
                         impact_text = f" ({h_impact:+.1f}%)"
-                        print(f"      • {holiday['date']}: {holiday['name']}{impact_text}")
+                        out(f"      • {holiday['date']}: {holiday['name']}{impact_text}")
                 
                 if len([h for h in balinese_holidays if abs(((next((s['sales'] for s in holiday_impact_analysis.get('balinese', []) if s['date'] == h['date']), 0) - regular_avg) / regular_avg * 100)) > 10]) < len(balinese_holidays):
                     remaining = len(balinese_holidays) - len([h for h in balinese_holidays if abs(((next((s['sales'] for s in holiday_impact_analysis.get('balinese', []) if s['date'] == h['date']), 0) - regular_avg) / regular_avg * 100)) > 10])
                     if remaining > 0:
-                        print(f"      • ... и еще {remaining} с меньшим влиянием")
+                        out(f"      • ... и еще {remaining} с меньшим влиянием")
         else:
-            print(f"  📋 Нет праздников в анализируемом периоде")
+            out(f"  📋 Нет праздников в анализируемом периоде")
     
-    print()
+    out()
     
     # 8. AI-АНАЛИЗ И СТРАТЕГИЧЕСКИЕ РЕКОМЕНДАЦИИ
-    print("🤖 8. AI-АНАЛИЗ И СТРАТЕГИЧЕСКИЕ РЕКОМЕНДАЦИИ")
-    print("-" * 40)
+    report.section('ai', "🤖 8. AI-АНАЛИЗ И СТРАТЕГИЧЕСКИЕ РЕКОМЕНДАЦИИ")
     
-    # Собираем все данные для AI анализа
-    weather_data = {"weather_impact": weather_impact if 'weather_impact' in locals() else 0}
-    holiday_data = {"holiday_effect": holiday_effect if 'holiday_effect' in locals() else 0}
+    # AI анализ по эффектам погоды и праздников (узел ai графа)
+    out(graph.result('ai'))
     
-    # Специфический анализ для Only Eggs
-    if restaurant_name == "Only_Eggs":
-        only_eggs_insights = generate_only_eggs_specific_insights(data, grab_platform_data, gojek_platform_data)
-        print(only_eggs_insights)
-    else:
-        ai_insights = openai_analyzer.generate_insights(data, weather_data, holiday_data)
-        print(ai_insights)
-    
-    print()
+    out()
     
     # 8.5. ДЕТЕКТИВНЫЙ АНАЛИЗ ПРИЧИН ПАДЕНИЙ/РОСТА
-    print("🔍 8.5 ДЕТЕКТИВНЫЙ АНАЛИЗ ПРИЧИН")
-    print("-" * 40)
+    report.section('detective', "🔍 8.5 ДЕТЕКТИВНЫЙ АНАЛИЗ ПРИЧИН")
     
-    # Используем интегрированный ML детективный анализ
+    # Используем интегрированный ML детективный анализ (один расчет на разделы 8.5, 8.6 и файл)
+    _psa_results, _psa_error = None, None
     try:
-        from src.analyzers import ProductionSalesAnalyzer
-        _psa = ProductionSalesAnalyzer()
-        _psa_results = _psa.analyze_restaurant_performance(restaurant_name, start_date, end_date, use_ml=True)
-        print("📋 ML-ДЕТЕКТИВНЫЙ АНАЛИЗ (интегрированный):")
+        _psa_results = graph.result('ml_detective')
+        out("📋 ML-ДЕТЕКТИВНЫЙ АНАЛИЗ (интегрированный):")
         for line in _psa_results:
-            print(line)
+            out(line)
     except Exception as e:
-        print(f"⚠️ Ошибка интегрированного ML анализа: {e}")
-        print("📊 Используем fallback анализ...")
+        _psa_error = e
+        out(f"⚠️ Ошибка интегрированного ML анализа: {e}")
+        out("📊 Используем fallback анализ...")
         simple_trend_analysis = analyze_sales_trends(data)
-        print(simple_trend_analysis)
+        out(simple_trend_analysis)
         marketing_analysis = analyze_marketing_performance_without_ml(data)
-        print(marketing_analysis)
+        out(marketing_analysis)
     
     # 8.6. ML-АНАЛИЗ И ПРОГНОЗИРОВАНИЕ (ИНТЕГРИРОВАНО)
-    print("\n🤖 8.6 ИНТЕГРИРОВАННЫЙ ML-ДЕТЕКТИВНЫЙ АНАЛИЗ")
-    print("-" * 40)
-    try:
-        from src.analyzers import ProductionSalesAnalyzer
-        _psa = ProductionSalesAnalyzer()
-        _ml_results = _psa.analyze_restaurant_performance(restaurant_name, start_date, end_date, use_ml=True)
-        for line in _ml_results:
-            print(line)
-    except Exception as e:
-        print(f"⚠️ Ошибка интегрированного ML анализа: {e}")
+    out()
+    report.section('ml_detective', "🤖 8.6 ИНТЕГРИРОВАННЫЙ ML-ДЕТЕКТИВНЫЙ АНАЛИЗ")
+    if _psa_results is not None:
+        for line in _psa_results:
+            out(line)
+    else:
+        out(f"⚠️ Ошибка интегрированного ML анализа: {_psa_error}")
     
     # 9. СРАВНИТЕЛЬНЫЙ БЕНЧМАРКИНГ
-    print(f"\n📊 9. СРАВНИТЕЛЬНЫЙ АНАЛИЗ И БЕНЧМАРКИ")
-    print("-" * 40)
+    out()
+    report.section('benchmarks', "📊 9. СРАВНИТЕЛЬНЫЙ АНАЛИЗ И БЕНЧМАРКИ")
     
     # Сравнение с рыночными показателями
-    print("🏆 Ключевые показатели vs рыночные стандарты:")
+    out("🏆 Ключевые показатели vs рыночные стандарты:")
     
     # Рассчитываем реальные бенчмарки из всех данных в базе
-    market_avg_order_value = calculate_market_benchmark('avg_order_value')
-    market_avg_roas = calculate_market_benchmark('roas')
-    market_avg_rating = calculate_market_benchmark('rating')
-    market_repeat_rate = calculate_market_benchmark('repeat_rate')
-    market_conversion_rate = calculate_market_benchmark('conversion_rate')
+    market = graph.result('benchmarks')
+    market_avg_order_value = market['avg_order_value']
+    market_avg_roas = market['roas']
+    market_avg_rating = market['rating']
+    market_repeat_rate = market['repeat_rate']
+    market_conversion_rate = market['conversion_rate']
     
     benchmarks = {
         'avg_order_value': {'current': avg_order_value, 'benchmark': market_avg_order_value, 'unit': 'IDR'},
@@ -2375,13 +2369,14 @@ def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
             'conversion_rate': 'Конверсия рекламы'
         }.get(metric, metric)
         
-        print(f"  {metric_name}: {current:.1f}{unit} vs {benchmark:.1f}{unit} - {status} ({diff})")
+        out(f"  {metric_name}: {current:.1f}{unit} vs {benchmark:.1f}{unit} - {status} ({diff})")
+    report.metric('benchmarks', {metric: {'current': point['current'], 'benchmark': point['benchmark']}
+                                 for metric, point in benchmarks.items()})
     
-    print()
+    out()
     
     # 10. СТРАТЕГИЧЕСКИЕ РЕКОМЕНДАЦИИ
-    print("💡 10. СТРАТЕГИЧЕСКИЕ РЕКОМЕНДАЦИИ")
-    print("-" * 40)
+    report.section('recommendations', "💡 10. СТРАТЕГИЧЕСКИЕ РЕКОМЕНДАЦИИ")
     
     recommendations = []
     
@@ -2429,406 +2424,240 @@ def analyze_restaurant(restaurant_name, start_date=None, end_date=None):
     if avg_order_value < 300000:
         recommendations.append("💰 Низкий средний чек ({:,.0f} IDR) - пересмотреть ценообразование или добавить upsell".format(avg_order_value))
     
+    report.metric('recommendations', recommendations[:8])
+    
     # Выводим рекомендации
     if recommendations:
-        print("🎯 Приоритетные действия:")
+        out("🎯 Приоритетные действия:")
         for i, rec in enumerate(recommendations[:8], 1):  # Топ-8 рекомендаций
-            print(f"  {i}. {rec}")
+            out(f"  {i}. {rec}")
     else:
-        print("✅ Все ключевые показатели в пределах нормы!")
-    print()
-    # Сохраняем ДЕТАЛЬНЫЙ отчет
+        out("✅ Все ключевые показатели в пределах нормы!")
+    out()
+    
+    return report
+
+def get_restaurant_report(restaurant_name, start_date=None, end_date=None, use_cache=True):
+    """
+    Отчет ресторана из кеша (data/report_cache), если данные за период не менялись,
+    иначе - полный расчет build_restaurant_report с сохранением в кеш
+    
+    Returns:
+        RestaurantReport или None, если нет данных
+    """
+    if not start_date or not end_date:
+        start_date = "2025-04-01"
+        end_date = "2025-06-30"
+    
+    cache = get_report_cache()
+    key = None
+    if use_cache:
+        try:
+            key = cache.key(restaurant_name, start_date, end_date)
+            report = cache.get(key)
+            if report is not None:
+                print(f"⚡ Отчет из кеша (данные не менялись, создан {report.created_at})")
+                return report
+        except Exception as e:
+            print(f"⚠️ Кеш отчетов недоступен: {e}")
+            key = None
+    
+    report = build_restaurant_report(restaurant_name, start_date, end_date)
+    if report is not None and key:
+        try:
+            cache.put(key, report)
+        except Exception as e:
+            print(f"⚠️ Не удалось сохранить отчет в кеш: {e}")
+    return report
+
+def analyze_restaurant(restaurant_name, start_date=None, end_date=None, formats=('txt',), use_cache=True):
+    """
+    ПОЛНЫЙ анализ ресторана: отчет в консоль и в файлы reports/
+    
+    Args:
+        formats: Форматы сохраненного отчета (txt, json, html)
+        use_cache: Взять готовый отчет из кеша, если данные не менялись
+    
+    Returns:
+        Путь к первому сохраненному файлу (None - отчет не создан)
+    """
+    report = get_restaurant_report(restaurant_name, start_date, end_date, use_cache=use_cache)
+    if report is None:
+        return None
+    print(render_console(report))
+    
+    # Сохраняем ДЕТАЛЬНЫЙ отчет - рендер готового объекта, без новых расчетов и запросов
     try:
-        os.makedirs('reports', exist_ok=True)
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"reports/detailed_analysis_{restaurant_name.replace(' ', '_')}_{timestamp}.txt"
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            # Шапка отчета по образцу README
-            separator = """════════════════════════════════════════════════════════════════════════════════════════════════════\n"""
-            f.write(separator)
-            f.write(f"🏪 Полный отчет анализа ресторана \"{restaurant_name}\"\n")
-            f.write(f"🏪 АНАЛИЗ РЕСТОРАНА: {restaurant_name}\n")
-            # Кол-во дней периода
-            try:
-                from datetime import datetime as _dt
-                _sd = _dt.strptime(start_date, '%Y-%m-%d')
-                _ed = _dt.strptime(end_date, '%Y-%m-%d')
-                _days = (_ed - _sd).days + 1
-            except Exception:
-                _days = len(data)
-            f.write(f"🗓️ ПЕРИОД: {start_date} — {end_date} ({_days} дней)\n\n")
-            f.write(separator)
-            f.write(f"📊 Создан: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"🔬 Использованы все 63 параметра + 3 API интеграции\n\n")
-            
-            # Исполнительное резюме
-            f.write("📊 ИСПОЛНИТЕЛЬНОЕ РЕЗЮМЕ\n")
-            f.write("-" * 50 + "\n")
-            f.write(f"💰 Общая выручка: {total_sales:,.0f} IDR (GRAB: {grab_sales:,.0f} + GOJEK: {gojek_sales:,.0f})\n")
-            f.write(f"📦 Общие заказы: {total_orders:,.0f}\n")
-            f.write(f"   ├── 📱 GRAB: {grab_orders:,.0f} (успешно: {grab_successful:,.0f}, отменено: {grab_cancelled}, fake: {grab_fake})\n")
-            f.write(f"   └── 🛵 GOJEK: {gojek_orders:,.0f} (успешно: {gojek_successful:,.0f}, отменено: {gojek_cancelled}, потеряно: {gojek_lost}, fake: {gojek_fake})\n")
-            f.write(f"   💡 Успешных заказов: {grab_successful + gojek_successful:,.0f}\n")
-            f.write(f"💵 Средний чек: {avg_order_value:,.0f} IDR\n")
-            f.write(f"   ├── 📱 GRAB: {grab_avg_check:,.0f} IDR ({grab_sales:,.0f} ÷ {grab_successful})\n")
-            f.write(f"   └── 🛵 GOJEK: {gojek_avg_check:,.0f} IDR ({gojek_sales:,.0f} ÷ {gojek_successful})\n")
-            f.write(f"📊 Дневная выручка: {daily_avg_sales:,.0f} IDR (средняя по рабочим дням)\n")
-            f.write(f"⭐ Средний рейтинг: {avg_rating:.2f}/5.0\n")
-            f.write(f"👥 Обслужено клиентов: {total_customers:,.0f}\n")
-            f.write(f"🎯 ROAS: {avg_roas:.2f}x\n")
-            f.write(f"📈 ROI маркетинга: {format_roi(roi_percentage)}\n")
-            f.write(f"💸 Маркетинговый бюджет: {total_marketing:,.0f} IDR ({(total_marketing/total_sales*100) if total_sales>0 else 0:.1f}% от выручки)\n")
-            f.write("📊 Детализация маркетинговых затрат:\n")
-            f.write("   ┌─ 📱 GRAB:\n")
-            f.write(f"   │  💰 Бюджет: {grab_marketing_budget:,.0f} IDR ({(grab_marketing_budget/total_marketing*100) if total_marketing>0 else 0:.1f}% общего бюджета)\n")
-            f.write(f"   │  📈 {((grab_marketing_budget/total_sales*100) if total_sales>0 else 0):.1f}% от общей выручки | {((grab_marketing_budget/max(grab_sales,1))*100):.1f}% от выручки GRAB | {((grab_marketing_budget/max(grab_marketing_sales,1))*100):.1f}% от рекламных продаж\n")
-            f.write("   └─ 🛵 GOJEK:\n")
-            f.write(f"      💰 Бюджет: {gojek_marketing_budget:,.0f} IDR ({(gojek_marketing_budget/total_marketing*100) if total_marketing>0 else 0:.1f}% общего бюджета)\n")
-            f.write(f"      📈 {((gojek_marketing_budget/total_sales*100) if total_sales>0 else 0):.1f}% от общей выручки | {((gojek_marketing_budget/max(gojek_sales,1))*100):.1f}% от выручки GOJEK\n\n")
-            
-            # Динамика по месяцам
-            f.write("📈 2. АНАЛИЗ ПРОДАЖ И ТРЕНДОВ\n")
-            f.write("-" * 40 + "\n")
-            f.write("📊 Динамика по месяцам:\n")
-            for month, sales in monthly_sales.items():
-                month_name = month_names.get(month, f"Месяц {month}")
-                month_data = data_sorted[data_sorted['month'] == month]
-                days_in_month = len(month_data)
-                daily_avg = sales / days_in_month if days_in_month > 0 else 0
-                f.write(f"  {month_name}: {sales:,.0f} IDR ({days_in_month} дней, {daily_avg:,.0f} IDR/день)\n")
-            # Выходные vs будни
-            weekend = data_sorted[pd.to_datetime(data_sorted['date']).dt.dayofweek.isin([5,6])]
-            weekday = data_sorted[~pd.to_datetime(data_sorted['date']).dt.dayofweek.isin([5,6])]
-            if not weekend.empty and not weekday.empty:
-                f.write("\n🗓️ Выходные vs Будни:\n")
-                f.write(f"  📅 Средние продажи в выходные: {weekend['total_sales'].mean():,.0f} IDR\n")
-                f.write(f"  📅 Средние продажи в будни: {weekday['total_sales'].mean():,.0f} IDR\n")
-                effect = (weekend['total_sales'].mean() - weekday['total_sales'].mean())/weekday['total_sales'].mean()*100 if weekday['total_sales'].mean()>0 else 0
-                f.write(f"  📊 Эффект выходных: {effect:+.1f}%\n")
-            # Лучший/худший день
-            if not data_sorted.empty:
-                best = data_sorted.loc[data_sorted['total_sales'].idxmax()]
-                worst = data_sorted.loc[data_sorted['total_sales'].idxmin()]
-                f.write("📊 АНАЛИЗ РАБОЧИХ ДНЕЙ ({} дней):\n".format(len(data_sorted)))
-                f.write(f"🏆 Лучший день: {best['date']} - {best['total_sales']:,.0f} IDR\n")
-                f.write(f"📉 Худший день: {worst['date']} - {worst['total_sales']:,.0f} IDR\n")
-                spread = (best['total_sales'] - worst['total_sales'])/max(1, weekday['total_sales'].mean())*100 if not weekday.empty else 0
-                f.write(f"📊 Разброс продаж: {spread:.1f}% (только рабочие дни)\n")
-                f.write(f"📈 Средние продажи: {daily_avg_sales:,.0f} IDR/день\n")
-                # Коэф. вариации
-                cv = (data_sorted['total_sales'].std()/data_sorted['total_sales'].mean()*100) if data_sorted['total_sales'].mean()>0 else 0
-                f.write(f"📊 Коэффициент вариации: {cv:.1f}% (стабильность продаж)\n\n")
-            
-            # Клиентская база
-            f.write("👥 3. ДЕТАЛЬНЫЙ АНАЛИЗ КЛИЕНТСКОЙ БАЗЫ\n")
-            f.write("-" * 40 + "\n")
-            f.write("📊 Структура клиентской базы (GRAB + GOJEK):\n")
-            if total_customers > 0:
-                f.write(f"  🆕 Новые клиенты: {new_customers:,.0f} ({new_rate:.1f}%)\n")
-                f.write(f"    📱 GRAB: {grab_new:,.0f} | 🛵 GOJEK: {gojek_new:,.0f}\n")
-                f.write(f"  🔄 Повторные клиенты: {repeated_customers:,.0f} ({repeat_rate:.1f}%)\n")
-                f.write(f"    📱 GRAB: {grab_repeat:,.0f} | 🛵 GOJEK: {gojek_repeat:,.0f}\n")
-                f.write(f"  📲 Реактивированные: {reactivated_customers:,.0f} ({reactive_rate:.1f}%)\n")
-                f.write(f"    📱 GRAB: {grab_reactive:,.0f} | 🛵 GOJEK: {gojek_reactive:,.0f}\n\n")
-                # Доходность по типам клиентов (только GRAB)
-                if new_customer_revenue > 0 and grab_new > 0:
-                    avg_new = new_customer_revenue / grab_new
-                    avg_repeat = (repeated_customer_revenue / grab_repeat) if grab_repeat > 0 else 0
-                    avg_reactive = (reactivated_customer_revenue / grab_reactive) if grab_reactive > 0 else 0
-                    f.write("💰 Доходность по типам клиентов (только GRAB):\n")
-                    f.write(f"  🆕 Новые: {new_customer_revenue:,.0f} IDR (средний чек: {avg_new:,.0f} IDR) - только {grab_new} клиентов GRAB\n")
-                    f.write(f"  🔄 Повторные: {repeated_customer_revenue:,.0f} IDR (средний чек: {avg_repeat:,.0f} IDR) - только {grab_repeat} клиентов GRAB\n")
-                    if reactivated_customer_revenue > 0:
-                        f.write(f"  📲 Реактивированные: {reactivated_customer_revenue:,.0f} IDR (средний чек: {avg_reactive:,.0f} IDR) - только {grab_reactive} клиентов GRAB\n\n")
-                    f.write(f"  ⚠️ КРИТИЧНО: Данные о доходах от {gojek_new + gojek_repeat + gojek_reactive:,.0f} клиентов GOJEK ОТСУТСТВУЮТ в базе данных\n")
-                    f.write("  📊 Это означает, что реальная доходность может быть выше указанной\n")
-                    if avg_repeat > avg_new:
-                        loyalty_premium = ((avg_repeat - avg_new) / avg_new * 100)
-                        f.write(f"  🏆 Премия лояльности (GRAB): +{loyalty_premium:.1f}% к среднему чеку\n")
-            f.write("\n")
-            
-            # Маркетинговая эффективность
-            f.write("📈 4. МАРКЕТИНГОВАЯ ЭФФЕКТИВНОСТЬ И ВОРОНКА\n")
-            f.write("-" * 40 + "\n")
-            if total_impressions > 0:
-                f.write(f"👁️ Показы рекламы: {total_impressions:,.0f}\n")
-                f.write(f"🔗 CTR: {ctr:.2f}%\n")
-                f.write(f"✅ Конверсия: {overall_conversion:.2f}%\n")
-                f.write(f"💰 Стоимость заказа: {cost_per_order:,.0f} IDR\n")
-                
-                # Детальная воронка и потенциал
-                bounce_rate = ((total_menu_visits - total_add_to_carts) / total_menu_visits * 100) if total_menu_visits > 0 else 0
-                lost_from_bounce = max(0, total_menu_visits - total_add_to_carts)
-                cart_abandon_rate = ((total_add_to_carts - grab_marketing_orders) / total_add_to_carts * 100) if total_add_to_carts > 0 else 0
-                lost_from_abandon = max(0, total_add_to_carts - grab_marketing_orders)
-                f.write("ДЕТАЛЬНАЯ ВОРОНКА:\n")
-                f.write(f"  💔 Bounce rate: {bounce_rate:.1f}% ({lost_from_bounce:,} ушли без покупки)\n")
-                f.write(f"  🛒 Брошенные корзины: {cart_abandon_rate:.1f}% ({lost_from_abandon:,} добавили, но не купили)\n")
-                potential_from_bounce = lost_from_bounce * 0.1 * (total_sales / total_orders) if total_orders > 0 else 0
-                potential_from_abandon = lost_from_abandon * (total_sales / total_orders) if total_orders > 0 else 0
-                f.write("  💰 Потенциал оптимизации:\n")
-                f.write(f"  • Снижение bounce на 10%: +{potential_from_bounce:,.0f} IDR\n")
-                f.write(f"  • Устранение брошенных корзин: +{potential_from_abandon:,.0f} IDR\n")
-                total_ads_sales_now = grab_marketing_sales + gojek_marketing_sales
-                if total_ads_sales_now > 0:
-                    improvement_percent = ((potential_from_bounce + potential_from_abandon) / total_ads_sales_now * 100)
-                    f.write(f"  • Потенциальный рост к рекламным продажам: +{improvement_percent:.1f}%\n")
-                
-                # Расширенные метрики (при наличии данных)
-                mer = (marketing_sales / total_marketing) if total_marketing > 0 else 0
-                cpm = (grab_only_spend / total_impressions * 1000) if total_impressions > 0 else 0
-                reach = data['unique_impressions_reach'].sum() if 'unique_impressions_reach' in data.columns else 0
-                frequency = (total_impressions / reach) if reach > 0 else 0
-                f.write(f"📊 Расширенные метрики: MER {mer:.2f}x; CPM {cpm:,.0f} IDR; frequency {frequency:.2f}\n")
-                
-                # ROAS по месяцам - пересчитываем для сохранения отчета
-                f.write("ROAS по месяцам (GRAB + GOJEK):\n")
-                
-                # Пересчитываем april_roas и may_roas для сохранения
-                april_grab_sales = grab_platform_data[pd.to_datetime(grab_platform_data['date']).dt.month == 4]['marketing_sales'].sum() if not grab_platform_data.empty else 0
-                april_grab_spend = grab_platform_data[pd.to_datetime(grab_platform_data['date']).dt.month == 4]['marketing_spend'].sum() if not grab_platform_data.empty else 0
-                april_gojek_sales = gojek_platform_data[pd.to_datetime(gojek_platform_data['date']).dt.month == 4]['marketing_sales'].sum() if not gojek_platform_data.empty else 0
-                april_gojek_spend = gojek_platform_data[pd.to_datetime(gojek_platform_data['date']).dt.month == 4]['marketing_spend'].sum() if not gojek_platform_data.empty else 0
-                
-                april_total_sales = april_grab_sales + april_gojek_sales
-                april_total_spend = april_grab_spend + april_gojek_spend
-                april_roas_save = april_total_sales / april_total_spend if april_total_spend > 0 else 0
-                
-                may_grab_sales = grab_platform_data[pd.to_datetime(grab_platform_data['date']).dt.month == 5]['marketing_sales'].sum() if not grab_platform_data.empty else 0
-                may_grab_spend = grab_platform_data[pd.to_datetime(grab_platform_data['date']).dt.month == 5]['marketing_spend'].sum() if not grab_platform_data.empty else 0
-                may_gojek_sales = gojek_platform_data[pd.to_datetime(gojek_platform_data['date']).dt.month == 5]['marketing_sales'].sum() if not gojek_platform_data.empty else 0
-                may_gojek_spend = gojek_platform_data[pd.to_datetime(gojek_platform_data['date']).dt.month == 5]['marketing_spend'].sum() if not gojek_platform_data.empty else 0
-                
-                may_total_sales = may_grab_sales + may_gojek_sales
-                may_total_spend = may_grab_spend + may_gojek_spend
-                may_roas_save = may_total_sales / may_total_spend if may_total_spend > 0 else 0
-                
-                f.write(f"  Апрель: {april_roas_save:.2f}x\n")
-                f.write(f"  Май: {may_roas_save:.2f}x\n")
-            f.write("\n")
-            
-            # 5. ДЕТЕКТИВНЫЙ АНАЛИЗ ПРОБЛЕМ
-            f.write("🔍 5. ДЕТЕКТИВНЫЙ АНАЛИЗ ПРОБЛЕМ\n")
-            f.write("-" * 40 + "\n")
-            try:
-                # 5.1 Реклама отключена (дни без бюджета)
-                ads_off_days = int((data['marketing_spend'] <= 0).sum()) if 'marketing_spend' in data.columns else 0
-                f.write(f"• 📉 Дни с отключенной рекламой (оба канала): {ads_off_days}\n")
-                
-                # 5.2 Платформенные сбои: топ критичных дней
-                conn_cause = sqlite3.connect('database.sqlite')
-                cause_df = pd.read_sql_query(f"""
-                    WITH dates AS (
-                        SELECT stat_date, restaurant_id FROM grab_stats WHERE restaurant_id = (SELECT id FROM restaurants WHERE name = '{restaurant_name}' LIMIT 1) AND stat_date BETWEEN '{start_date}' AND '{end_date}'
-                        UNION
-                        SELECT stat_date, restaurant_id FROM gojek_stats WHERE restaurant_id = (SELECT id FROM restaurants WHERE name = '{restaurant_name}' LIMIT 1) AND stat_date BETWEEN '{start_date}' AND '{end_date}'
-                    )
-                    SELECT d.stat_date as date,
-                           COALESCE(g.offline_rate, 0) as grab_off_min,
-                           CASE 
-                               WHEN gj.close_time IS NULL THEN 0
-                               WHEN typeof(gj.close_time) = 'text' AND instr(gj.close_time, ':') > 0 THEN 
-                                   CAST(substr(gj.close_time,1,2) AS INTEGER)*60 + CAST(substr(gj.close_time,4,2) AS INTEGER)
-                               WHEN typeof(gj.close_time) = 'text' THEN CAST(gj.close_time AS INTEGER)
-                               ELSE CAST(gj.close_time AS INTEGER)
-                           END as gojek_off_min
-                    FROM dates d
-                    LEFT JOIN grab_stats g ON g.restaurant_id = d.restaurant_id AND g.stat_date = d.stat_date
-                    LEFT JOIN gojek_stats gj ON gj.restaurant_id = d.restaurant_id AND gj.stat_date = d.stat_date
-                """, conn_cause)
-                conn_cause.close()
-                if not cause_df.empty:
-                    cause_df['total_off_min'] = cause_df['grab_off_min'].fillna(0) + cause_df['gojek_off_min'].fillna(0)
-                    critical = cause_df.sort_values('total_off_min', ascending=False).head(5)
-                    crit_days = int((cause_df['total_off_min'] > 60).sum())
-                    f.write(f"• 🛑 Критичные оффлайны платформ (>60 мин): {crit_days} дней\n")
-                    for _, r in critical.iterrows():
-                        if r['total_off_min'] > 0:
-                            f.write(f"   ─ {r['date']}: GRAB {int(r['grab_off_min']):,} мин; GOJEK {int(r['gojek_off_min']):,} мин\n")
-                
-                # 5.3 Погодные и праздничные факторы (агрегировано)
-                if 'weather_impact' in locals():
-                    f.write(f"• 🌧️ Влияние погоды (среднее): {weather_impact:+.1f}%\n")
-                if 'holiday_effect' in locals():
-                    f.write(f"• 🎉 Влияние праздников (среднее): {holiday_effect:+.1f}%\n")
-            except Exception as e:
-                f.write(f"⚠️ Не удалось сформировать детективный раздел: {e}\n")
-            f.write("\n")
-            
-            # 6. КАЧЕСТВО ОБСЛУЖИВАНИЯ И ОПЕРАЦИИ
-            f.write("⚠️ 5. ОПЕРАЦИОННАЯ ЭФФЕКТИВНОСТЬ\n")
-            f.write("-" * 40 + "\n")
-            # Финансовые показатели payouts (по образцу README)
-            try:
-                conn_pay = sqlite3.connect('database.sqlite')
-                cur = conn_pay.cursor()
-                cur.execute("""
-                SELECT 
-                  SUM(COALESCE(g.payouts,0)) as grab_payouts,
-                  SUM(COALESCE(gj.payouts,0)) as gojek_payouts
-                FROM restaurants r
-                LEFT JOIN grab_stats g ON r.id=g.restaurant_id
-                LEFT JOIN gojek_stats gj ON r.id=gj.restaurant_id
-                WHERE r.name = ? AND (g.stat_date BETWEEN ? AND ? OR gj.stat_date BETWEEN ? AND ?)
-                """, (restaurant_name, start_date, end_date, start_date, end_date))
-                row = cur.fetchone() or (0,0)
-                conn_pay.close()
-                grab_payouts, gojek_payouts = int(row[0] or 0), int(row[1] or 0)
-                total_payouts = grab_payouts + gojek_payouts
-                f.write("\n💳 ФИНАНСОВЫЕ ПОКАЗАТЕЛИ\n")
-                f.write("-" * 60 + "\n")
-                f.write("💰 Выплаты:\n")
-                f.write(f"   ├── 📱 GRAB: {grab_payouts:,.0f} IDR\n")
-                f.write(f"   ├── 🛵 GOJEK: {gojek_payouts:,.0f} IDR\n")
-                f.write(f"   └── 💎 Общие выплаты: {total_payouts:,.0f} IDR\n")
-            except Exception:
-                pass
-            f.write(f"🚫 Дней с отменами 'закрыто': {days_with_closure_cancellations} ({(days_with_closure_cancellations/len(data)*100):.1f}%)\n")
-            f.write(f"📦 Дней с дефицитом: {out_of_stock_days} ({(out_of_stock_days/len(data)*100):.1f}%)\n")
-            f.write(f"❌ Отмененные заказы: {cancelled_orders:,.0f}\n")
-            # Детализация offline по платформам (по минутам и критичным дням)
-            f.write("\n⏰ ВЫКЛЮЧЕНИЯ ПЛАТФОРМ (детализация):\n")
-            try:
-                conn_tmp = sqlite3.connect('database.sqlite')
-                cur = conn_tmp.cursor()
-                cur.execute("""
-                SELECT 
-                  SUM(COALESCE(g.offline_rate,0)) as grab_offline_min,
-                  SUM(CASE WHEN COALESCE(g.offline_rate,0)>60 THEN 1 ELSE 0 END) as grab_crit_days,
-                  SUM(CASE WHEN gj.close_time IS NOT NULL AND gj.close_time!='00:00:00' THEN 
-                           CAST(substr(gj.close_time,1,2) AS INTEGER)*60+CAST(substr(gj.close_time,4,2) AS INTEGER) ELSE 0 END) as gojek_offline_min,
-                  SUM(CASE WHEN gj.close_time IS NOT NULL AND gj.close_time!='00:00:00' THEN 1 ELSE 0 END) as gojek_crit_days
-                FROM grab_stats g
-                LEFT JOIN gojek_stats gj ON g.restaurant_id=gj.restaurant_id AND g.stat_date=gj.stat_date
-                WHERE g.restaurant_id=(SELECT id FROM restaurants WHERE name=? LIMIT 1)
-                  AND g.stat_date BETWEEN ? AND ?
-                """, (restaurant_name, start_date, end_date))
-                row = cur.fetchone() or (0,0,0,0)
-                conn_tmp.close()
-                f.write(f"  📱 GRAB: {int(row[0])} мин offline; критичные дни: {int(row[1])}\n")
-                f.write(f"  🛵 GOJEK: {int(row[2])} мин offline; критичные дни: {int(row[3])}\n")
-            except Exception as e:
-                f.write(f"  ⚠️ Детализация offline недоступна: {e}\n")
-            
-            if 'total_operational_losses' in locals() and total_operational_losses > 0:
-                f.write(f"\n💸 Реальные потери: {total_operational_losses:,.0f} IDR ({(total_operational_losses/total_sales*100):.1f}%)\n")
-            f.write("\n")
-            
-            # Качество обслуживания
-            f.write("⭐ 6. КАЧЕСТВО ОБСЛУЖИВАНИЯ И УДОВЛЕТВОРЕННОСТЬ\n")
-            f.write("-" * 40 + "\n")
-            
-            # Используем те же переменные что и в консольном выводе
-            gojek_ratings_data = gojek_platform_data if not gojek_platform_data.empty else pd.DataFrame()
-            
-            if not gojek_ratings_data.empty and 'five_star_ratings' in gojek_ratings_data.columns:
-                one_stars = gojek_ratings_data['one_star_ratings'].sum()
-                two_stars = gojek_ratings_data['two_star_ratings'].sum()
-                three_stars = gojek_ratings_data['three_star_ratings'].sum()
-                four_stars = gojek_ratings_data['four_star_ratings'].sum()
-                five_stars = gojek_ratings_data['five_star_ratings'].sum()
-                total_gojek_ratings = one_stars + two_stars + three_stars + four_stars + five_stars
-                
-                grab_avg_rating = grab_platform_data['rating'].mean() if not grab_platform_data.empty and 'rating' in grab_platform_data.columns else 0
-                
-                f.write(f"📊 Детальные оценки клиентов GOJEK (всего: {total_gojek_ratings:,.0f}):\n")
-                
-                ratings_data = [
-                    (5, five_stars, "⭐⭐⭐⭐⭐"),
-                    (4, four_stars, "⭐⭐⭐⭐"),
-                    (3, three_stars, "⭐⭐⭐"),
-                    (2, two_stars, "⭐⭐"),
-                    (1, one_stars, "⭐")
-                ]
-                
-                for stars, count, emoji in ratings_data:
-                    if count > 0:  # Показываем только непустые категории
-                        percentage = (count / total_gojek_ratings) * 100 if total_gojek_ratings > 0 else 0
-                        f.write(f"  {emoji} {stars} звезд: {count:,.0f} ({percentage:.1f}%)\n")
-                
-                if total_gojek_ratings > 0:
-                    gojek_weighted_score = (five_stars * 5 + four_stars * 4 + three_stars * 3 + two_stars * 2 + one_stars * 1)
-                    gojek_satisfaction = gojek_weighted_score / total_gojek_ratings
-                    f.write(f"📈 Индекс удовлетворенности GOJEK: {gojek_satisfaction:.2f}/5.0\n")
-                
-                if grab_avg_rating > 0:
-                    f.write(f"📈 Средний рейтинг GRAB: {grab_avg_rating:.2f}/5.0 (детализация недоступна)\n")
-                
-                negative_ratings = one_stars + two_stars
-                if negative_ratings > 0:
-                    negative_rate = (negative_ratings / total_gojek_ratings) * 100
-                    f.write(f"🚨 Негативные отзывы GOJEK (1-2★): {negative_ratings:,.0f} ({negative_rate:.1f}%)\n")
-                
-                f.write(f"⚠️ ОГРАНИЧЕНИЯ: GOJEK {total_gojek_ratings} оценок, GRAB только средний рейтинг\n")
-            else:
-                f.write("📊 Детальные данные по оценкам недоступны\n")
-            f.write("\n")
-            
-            # Внешние факторы
-            f.write("🌐 7. ВНЕШНИЕ ФАКТОРЫ\n")
-            f.write("-" * 40 + "\n")
-            f.write("Погодные условия и их влияние:\n")
-            if 'weather_groups' in locals() and weather_groups:
-                for condition, sales_list in weather_groups.items():
-                    avg_sales = sum(sales_list) / len(sales_list)
-                    emoji = {"Clear": "☀️", "Rain": "🌧️", "Clouds": "☁️", "Thunderstorm": "⛈️"}.get(condition, "🌤️")
-                    f.write(f"{emoji} {condition}: {avg_sales:,.0f} IDR ({len(sales_list)} дней)\n")
-            else:
-                f.write("  📊 Данные о погодных условиях недоступны\n")
-            if 'weather_impact' in locals():
-                f.write(f"💧 Влияние дождя: {weather_impact:+.1f}%\n")
-            if 'holiday_effect' in locals():
-                f.write(f"🎯 Влияние праздников: {holiday_effect:+.1f}%\n")
-            f.write("\n")
-            
-            # AI инсайты
-            f.write("🤖 AI-АНАЛИЗ И ИНСАЙТЫ\n")
-            f.write("-" * 50 + "\n")
-            f.write(ai_insights + "\n\n")
-            
-            # Детективный анализ причин
-            f.write("🔍 8.5 ДЕТЕКТИВНЫЙ АНАЛИЗ ПРИЧИН\n")
-            f.write("-" * 40 + "\n")
-            try:
-                f.write(detective_analysis + "\n\n")
-            except NameError:
-                simple_trend_analysis = analyze_sales_trends(data)
-                f.write(simple_trend_analysis + "\n\n")
-            # ВСТРАИВАЕМ ИНТЕГРИРОВАННЫЙ ML ДЕТЕКТИВНЫЙ АНАЛИЗ В ФАЙЛ
-            try:
-                from src.analyzers import ProductionSalesAnalyzer
-                _psa = ProductionSalesAnalyzer()
-                _psa_results = _psa.analyze_restaurant_performance(restaurant_name, start_date, end_date, use_ml=True)
-                f.write("📋 ML-ДЕТЕКТИВНЫЙ АНАЛИЗ (интегрированный)\n")
-                f.write("-" * 50 + "\n")
-                f.write("\n".join(_psa_results) + "\n\n")
-            except Exception as _e:
-                f.write(f"⚠️ Ошибка ML-детективного анализа: {_e}\n\n")
-            
-            # Стратегические рекомендации
-            f.write("💡 СТРАТЕГИЧЕСКИЕ РЕКОМЕНДАЦИИ\n")
-            f.write("-" * 50 + "\n")
-            if recommendations:
-                for i, rec in enumerate(recommendations, 1):
-                    f.write(f"{i}. {rec}\n")
-            else:
-                f.write("✅ Все ключевые показатели в пределах нормы!\n")
-            
-            f.write("\n" + "═" * 100 + "\n")
-            f.write("📊 Отчет создан системой Muzaquest Analytics\n")
-            f.write("🔬 Проанализированы все 63 параметра + 3 API интеграции\n")
-            f.write("🎯 Рекомендации основаны на лучших практиках ресторанного бизнеса\n")
-        
-        print(f"💾 Детальный отчет сохранен: {filename}")
-        
+        paths = save_report(report, formats)
+        for path in paths.values():
+            print(f"💾 Детальный отчет сохранен: {path}")
+        filename = next(iter(paths.values()), None)
     except Exception as e:
         print(f"❌ Ошибка сохранения отчета: {e}")
+        filename = None
 
     print()
     print("🎯 Анализ завершен! Проверьте сохраненный детальный отчет.")
     print("="*80)
+    return filename
+
+
+_portfolio_warm = False
+
+def _warm_portfolio_data(start_date, end_date, verbose=True):
+    """
+    Общие read-only данные для analyze-all: загружаются один раз в родителе
+    (fork наследует их) или один раз в каждом процессе пула (spawn)
+    """
+    global _portfolio_warm
+    if _portfolio_warm:
+        return
+    started = time.time()
+    ensure_market_cube('database.sqlite')
+    from src.utils.calendar_dimension import get_calendar
+    get_calendar(f"{start_date[:4]}-01-01", end_date)
+    get_shared_apis()
+    get_shared_sales_analyzer()
+    try:
+        _restaurant_locations_map()
+    except Exception as e:
+        print(f"⚠️ Карта локаций недоступна: {e}")
+    try:
+        # Модель загружается (или обучается) до пула - процессы не обучают ее параллельно
+        from src.ml_models.ultimate_complete_ml_system import get_ultimate_system
+        get_ultimate_system(train_if_missing=True)
+    except Exception as e:
+        print(f"⚠️ ML модель недоступна: {e}")
+    _portfolio_warm = True
+    if verbose:
+        print(f"🧊 Общие данные загружены за {time.time() - started:.1f} сек")
+
+def _analyze_restaurant_job(restaurant_name, start_date, end_date, log_dir, formats=('txt',), use_cache=True):
+    """Отчет одного ресторана в процессе пула; консольный вывод - в <log_dir>/<ресторан>.log"""
+    from contextlib import redirect_stdout, redirect_stderr
+    started = time.time()
+    log_path = os.path.join(log_dir, f"{restaurant_name.replace(' ', '_').replace('/', '_')}.log")
+    report, error = None, None
+    try:
+        with open(log_path, 'w', encoding='utf-8') as log, redirect_stdout(log), redirect_stderr(log):
+            report = analyze_restaurant(restaurant_name, start_date, end_date, formats, use_cache)
+        if not report:
+            error = "отчет не создан (нет данных или ошибка сохранения)"
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return {
+        'restaurant': restaurant_name,
+        'report': report,
+        'log': log_path,
+        'seconds': round(time.time() - started, 2),
+        'error': error,
+    }
+
+def analyze_all_restaurants(start_date=None, end_date=None, workers=None, formats=('txt',), use_cache=True):
+    """
+    Отчеты по всем ресторанам портфеля параллельно в пуле процессов
+
+    Args:
+        formats: Форматы отчетов (txt, json, html)
+        use_cache: Рестораны без новых данных берутся из кеша отчетов
+
+    Returns:
+        Список результатов по ресторанам (restaurant, report, log, seconds, error)
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    
+    if not start_date or not end_date:
+        start_date = "2025-04-01"
+        end_date = "2025-06-30"
+    
+    restaurants = load_restaurant_list()['name'].tolist()
+    if not restaurants:
+        print("❌ Нет ресторанов с данными")
+        return []
+    workers = max(1, min(workers or os.cpu_count() or 1, len(restaurants)))
+    
+    print(f"\n📦 ОТЧЕТЫ ПО ВСЕМУ ПОРТФЕЛЮ: {len(restaurants)} ресторанов, {workers} процессов")
+    print(f"📅 Период анализа: {start_date} → {end_date}")
+    print("=" * 80)
+    
+    log_dir = os.path.join('reports', f"portfolio_{start_date}_{end_date}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    os.makedirs(log_dir, exist_ok=True)
+    started = time.time()
+    _warm_portfolio_data(start_date, end_date)
+    
+    results = []
+    
+    def report_progress(result):
+        results.append(result)
+        if result['error']:
+            print(f"❌ [{len(results)}/{len(restaurants)}] {result['restaurant']}: {result['error']} "
+                  f"({result['seconds']:.1f} сек, лог: {result['log']})")
+        else:
+            print(f"✅ [{len(results)}/{len(restaurants)}] {result['restaurant']}: "
+                  f"{result['seconds']:.1f} сек → {result['report']}")
+    
+    if workers == 1:
+        for name in restaurants:
+            report_progress(_analyze_restaurant_job(name, start_date, end_date, log_dir, formats, use_cache))
+    else:
+        # Самые крупные рестораны (список отсортирован по продажам) стартуют первыми
+        with ProcessPoolExecutor(max_workers=workers, initializer=_warm_portfolio_data,
+                                 initargs=(start_date, end_date, False)) as executor:
+            futures = {executor.submit(_analyze_restaurant_job, name, start_date, end_date, log_dir, formats, use_cache): name
+                       for name in restaurants}
+            for future in as_completed(futures):
+                try:
+                    report_progress(future.result())
+                except Exception as e:
+                    # Процесс пула упал целиком (память, сигнал)
+                    report_progress({'restaurant': futures[future], 'report': None, 'log': None,
+                                     'seconds': 0.0, 'error': f"{type(e).__name__}: {e}"})
+    
+    elapsed = time.time() - started
+    failed = [r for r in results if r['error']]
+    busy = sum(r['seconds'] for r in results)
+    print()
+    print("=" * 80)
+    print(f"📊 Итог: {len(results) - len(failed)} успешно, {len(failed)} ошибок за {elapsed:.1f} сек")
+    print(f"⚡ Пропускная способность: {len(results) / elapsed * 60:.1f} ресторанов/мин "
+          f"(в среднем {busy / len(results):.1f} сек на отчет, ускорение x{busy / elapsed:.1f})")
+    for r in failed:
+        print(f"   ❌ {r['restaurant']}: {r['error']}")
+    
+    with open(os.path.join(log_dir, 'summary.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'start_date': start_date, 'end_date': end_date, 'workers': workers,
+            'elapsed_sec': round(elapsed, 2), 'succeeded': len(results) - len(failed), 'failed': len(failed),
+            'results': sorted(results, key=lambda r: r['restaurant']),
+        }, f, ensure_ascii=False, indent=2)
+    print(f"💾 Логи и сводка: {log_dir}")
+    return results
+
+def load_restaurant_list():
+    """Рестораны с данными и их статистика (по убыванию продаж)"""
+    # Каждая платформа агрегируется по ресторану отдельно, затем соединяется
+    # (соединение сырых строк двух платформ перемножало бы дни Grab на дни Gojek)
+    platform_totals = """
+        SELECT restaurant_id, COUNT(DISTINCT stat_date) AS days, MIN(stat_date) AS first_date,
+               MAX(stat_date) AS last_date, SUM(COALESCE(sales, 0)) AS sales
+        FROM {table}
+        GROUP BY restaurant_id
+        """
+    query = f"""
+        SELECT r.id, r.name,
+               COALESCE(g.days, 0) as grab_days,
+               COALESCE(gj.days, 0) as gojek_days,
+               MIN(COALESCE(g.first_date, gj.first_date), COALESCE(gj.first_date, g.first_date)) as first_date,
+               MAX(COALESCE(g.last_date, gj.last_date), COALESCE(gj.last_date, g.last_date)) as last_date,
+               COALESCE(g.sales, 0) + COALESCE(gj.sales, 0) as total_sales
+        FROM restaurants r
+        LEFT JOIN ({platform_totals.format(table='grab_stats')}) g ON r.id = g.restaurant_id
+        LEFT JOIN ({platform_totals.format(table='gojek_stats')}) gj ON r.id = gj.restaurant_id
+        WHERE g.days > 0 OR gj.days > 0
+        ORDER BY total_sales DESC, r.name
+        """
+    with connection() as conn:
+        return pd.read_sql_query(query, conn)
 
 def list_restaurants():
     """Показывает список доступных ресторанов"""
@@ -2836,25 +2665,7 @@ def list_restaurants():
     print("=" * 60)
     
     try:
-        conn = sqlite3.connect("database.sqlite")
-        
-        # Получаем рестораны с их статистикой
-        query = """
-        SELECT r.id, r.name,
-               COUNT(DISTINCT g.stat_date) as grab_days,
-               COUNT(DISTINCT gj.stat_date) as gojek_days,
-               MIN(COALESCE(g.stat_date, gj.stat_date)) as first_date,
-               MAX(COALESCE(g.stat_date, gj.stat_date)) as last_date,
-               SUM(COALESCE(g.sales, 0) + COALESCE(gj.sales, 0)) as total_sales
-        FROM restaurants r
-        LEFT JOIN grab_stats g ON r.id = g.restaurant_id
-        LEFT JOIN gojek_stats gj ON r.id = gj.restaurant_id
-        GROUP BY r.id, r.name
-        HAVING (grab_days > 0 OR gojek_days > 0)
-        ORDER BY total_sales DESC, r.name
-        """
-        
-        df = pd.read_sql_query(query, conn)
+        df = load_restaurant_list()
         
         for i, row in df.iterrows():
             total_days = max(row['grab_days'] or 0, row['gojek_days'] or 0)
@@ -2868,8 +2679,6 @@ def list_restaurants():
             
             print()
         
-        conn.close()
-        
     except Exception as e:
         print(f"❌ Ошибка при получении списка ресторанов: {e}")
 
@@ -2887,99 +2696,39 @@ def analyze_market(start_date=None, end_date=None):
     print()
     
     try:
-        conn = sqlite3.connect("database.sqlite")
-        
         # 1. ОБЗОР РЫНКА
         print("📊 1. ОБЗОР РЫНКА")
         print("-" * 40)
         
-        # Общая статистика рынка (ИСПРАВЛЕННАЯ ЛОГИКА)
-        market_query = """
-        WITH grab_data AS (
-            SELECT r.name,
-                   g.stat_date,
-                   COALESCE(g.sales, 0) as grab_sales,
-                   COALESCE(g.orders, 0) as grab_orders,
-                   g.rating as grab_rating,
-                   COALESCE(g.ads_spend, 0) as grab_marketing_spend,
-                   COALESCE(g.ads_sales, 0) as grab_marketing_sales,
-                   COALESCE(g.new_customers, 0) as grab_new_customers
-            FROM restaurants r
-            LEFT JOIN grab_stats g ON r.id = g.restaurant_id 
-                AND g.stat_date BETWEEN ? AND ?
-        ),
-        gojek_data AS (
-            SELECT r.name,
-                   gj.stat_date,
-                   COALESCE(gj.sales, 0) as gojek_sales,
-                   COALESCE(gj.orders, 0) as gojek_orders,
-                   gj.rating as gojek_rating,
-                   COALESCE(gj.ads_spend, 0) as gojek_marketing_spend,
-                   COALESCE(gj.ads_sales, 0) as gojek_marketing_sales,
-                   COALESCE(gj.new_client, 0) as gojek_new_customers
-            FROM restaurants r
-            LEFT JOIN gojek_stats gj ON r.id = gj.restaurant_id 
-                AND gj.stat_date BETWEEN ? AND ?
-        ),
-        daily_data AS (
-            SELECT 
-                g.name,
-                g.stat_date,
-                COALESCE(g.grab_sales, 0) + COALESCE(gj.gojek_sales, 0) as total_sales,
-                COALESCE(g.grab_orders, 0) + COALESCE(gj.gojek_orders, 0) as total_orders,
-                COALESCE(g.grab_rating, gj.gojek_rating, 0) as avg_rating,
-                COALESCE(g.grab_marketing_spend, 0) + COALESCE(gj.gojek_marketing_spend, 0) as marketing_spend,
-                COALESCE(g.grab_marketing_sales, 0) + COALESCE(gj.gojek_marketing_sales, 0) as marketing_sales,
-                COALESCE(g.grab_new_customers, 0) + COALESCE(gj.gojek_new_customers, 0) as new_customers
-            FROM grab_data g
-            LEFT JOIN gojek_data gj ON g.name = gj.name AND g.stat_date = gj.stat_date
-            WHERE g.stat_date IS NOT NULL AND (COALESCE(g.grab_sales, 0) + COALESCE(gj.gojek_sales, 0) > 0)
-            
-            UNION
-            
-            SELECT 
-                gj.name,
-                gj.stat_date,
-                COALESCE(g.grab_sales, 0) + COALESCE(gj.gojek_sales, 0) as total_sales,
-                COALESCE(g.grab_orders, 0) + COALESCE(gj.gojek_orders, 0) as total_orders,
-                COALESCE(g.grab_rating, gj.gojek_rating, 0) as avg_rating,
-                COALESCE(g.grab_marketing_spend, 0) + COALESCE(gj.gojek_marketing_spend, 0) as marketing_spend,
-                COALESCE(g.grab_marketing_sales, 0) + COALESCE(gj.gojek_marketing_sales, 0) as marketing_sales,
-                COALESCE(g.grab_new_customers, 0) + COALESCE(gj.gojek_new_customers, 0) as new_customers
-            FROM gojek_data gj
-            LEFT JOIN grab_data g ON g.name = gj.name AND g.stat_date = gj.stat_date
-            WHERE gj.stat_date IS NOT NULL AND g.stat_date IS NULL AND COALESCE(gj.gojek_sales, 0) > 0
-        ),
-        market_data AS (
-            SELECT name,
-                   SUM(total_sales) as total_sales,
-                   SUM(total_orders) as total_orders,
-                   AVG(avg_rating) as avg_rating,
-                   SUM(marketing_spend) as marketing_spend,
-                   SUM(marketing_sales) as marketing_sales,
-                   SUM(new_customers) as new_customers,
-                   COUNT(DISTINCT stat_date) as active_days
-            FROM daily_data
-            GROUP BY name
-            HAVING total_sales > 0
-        )
-        SELECT 
-            COUNT(*) as active_restaurants,
-            SUM(total_sales) as market_sales,
-            SUM(total_orders) as market_orders,
-            AVG(total_sales) as avg_restaurant_sales,
-            AVG(avg_rating) as market_avg_rating,
-            SUM(marketing_spend) as total_marketing_spend,
-            SUM(marketing_sales) as total_marketing_sales,
-            SUM(new_customers) as total_new_customers,
-            AVG(active_days) as avg_active_days
-        FROM market_data
-        """
-        
-        market_stats = pd.read_sql_query(market_query, conn, params=(start_date, end_date, start_date, end_date))
+        # Статистика ресторанов за период - свертка куба ресторан × месяц × платформа
+        restaurants_period = market_rollup(start_date, end_date, 'all')
+        market_by_restaurant = pd.DataFrame({
+            'name': restaurants_period['name'],
+            'total_sales': restaurants_period['sales'],
+            'total_orders': restaurants_period['orders'],
+            # Дни без рейтинга считаются как 0 (как в прежнем расчете по дням)
+            'avg_rating': restaurants_period['rating_sum'] / restaurants_period['days'],
+            'marketing_spend': restaurants_period['ads_spend'],
+            'marketing_sales': restaurants_period['ads_sales'],
+            'new_customers': restaurants_period['new_customers'],
+            'active_days': restaurants_period['days'],
+        })
+        market_by_restaurant = market_by_restaurant[market_by_restaurant['total_sales'] > 0]
+        
+        # Общая статистика рынка
+        stats = pd.Series({
+            'active_restaurants': len(market_by_restaurant),
+            'market_sales': market_by_restaurant['total_sales'].sum(),
+            'market_orders': market_by_restaurant['total_orders'].sum(),
+            'avg_restaurant_sales': market_by_restaurant['total_sales'].mean(),
+            'market_avg_rating': market_by_restaurant['avg_rating'].mean(),
+            'total_marketing_spend': market_by_restaurant['marketing_spend'].sum(),
+            'total_marketing_sales': market_by_restaurant['marketing_sales'].sum(),
+            'total_new_customers': market_by_restaurant['new_customers'].sum(),
+            'avg_active_days': market_by_restaurant['active_days'].mean(),
+        })
         
-        if not market_stats.empty:
-            stats = market_stats.iloc[0]
+        if not market_by_restaurant.empty:
             market_roas = stats['total_marketing_sales'] / stats['total_marketing_spend'] if stats['total_marketing_spend'] > 0 else 0
             avg_order_value = stats['market_sales'] / stats['market_orders'] if stats['market_orders'] > 0 else 0
             
@@ -2999,78 +2748,8 @@ def analyze_market(start_date=None, end_date=None):
         print("🏆 2. ЛИДЕРЫ РЫНКА")
         print("-" * 40)
         
-        leaders_query = """
-        WITH grab_data AS (
-            SELECT r.name,
-                   g.stat_date,
-                   COALESCE(g.sales, 0) as grab_sales,
-                   COALESCE(g.orders, 0) as grab_orders,
-                   g.rating as grab_rating,
-                   COALESCE(g.ads_spend, 0) as grab_marketing_spend,
-                   COALESCE(g.ads_sales, 0) as grab_marketing_sales,
-                   COALESCE(g.new_customers, 0) as grab_new_customers
-            FROM restaurants r
-            LEFT JOIN grab_stats g ON r.id = g.restaurant_id 
-                AND g.stat_date BETWEEN ? AND ?
-        ),
-        gojek_data AS (
-            SELECT r.name,
-                   gj.stat_date,
-                   COALESCE(gj.sales, 0) as gojek_sales,
-                   COALESCE(gj.orders, 0) as gojek_orders,
-                   gj.rating as gojek_rating,
-                   COALESCE(gj.ads_spend, 0) as gojek_marketing_spend,
-                   COALESCE(gj.ads_sales, 0) as gojek_marketing_sales,
-                   COALESCE(gj.new_client, 0) as gojek_new_customers
-            FROM restaurants r
-            LEFT JOIN gojek_stats gj ON r.id = gj.restaurant_id 
-                AND gj.stat_date BETWEEN ? AND ?
-        ),
-        daily_data AS (
-            SELECT 
-                g.name,
-                g.stat_date,
-                COALESCE(g.grab_sales, 0) + COALESCE(gj.gojek_sales, 0) as total_sales,
-                COALESCE(g.grab_orders, 0) + COALESCE(gj.gojek_orders, 0) as total_orders,
-                COALESCE(g.grab_rating, gj.gojek_rating, 0) as avg_rating,
-                COALESCE(g.grab_marketing_spend, 0) + COALESCE(gj.gojek_marketing_spend, 0) as marketing_spend,
-                COALESCE(g.grab_marketing_sales, 0) + COALESCE(gj.gojek_marketing_sales, 0) as marketing_sales,
-                COALESCE(g.grab_new_customers, 0) + COALESCE(gj.gojek_new_customers, 0) as new_customers
-            FROM grab_data g
-            LEFT JOIN gojek_data gj ON g.name = gj.name AND g.stat_date = gj.stat_date
-            WHERE g.stat_date IS NOT NULL AND (COALESCE(g.grab_sales, 0) + COALESCE(gj.gojek_sales, 0) > 0)
-            
-            UNION
-            
-            SELECT 
-                gj.name,
-                gj.stat_date,
-                COALESCE(g.grab_sales, 0) + COALESCE(gj.gojek_sales, 0) as total_sales,
-                COALESCE(g.grab_orders, 0) + COALESCE(gj.gojek_orders, 0) as total_orders,
-                COALESCE(g.grab_rating, gj.gojek_rating, 0) as avg_rating,
-                COALESCE(g.grab_marketing_spend, 0) + COALESCE(gj.gojek_marketing_spend, 0) as marketing_spend,
-                COALESCE(g.grab_marketing_sales, 0) + COALESCE(gj.gojek_marketing_sales, 0) as marketing_sales,
-                COALESCE(g.grab_new_customers, 0) + COALESCE(gj.gojek_new_customers, 0) as new_customers
-            FROM gojek_data gj
-            LEFT JOIN grab_data g ON g.name = gj.name AND g.stat_date = gj.stat_date
-            WHERE gj.stat_date IS NOT NULL AND g.stat_date IS NULL AND COALESCE(gj.gojek_sales, 0) > 0
-        )
-        SELECT name,
-               SUM(total_sales) as total_sales,
-               SUM(total_orders) as total_orders,
-               AVG(avg_rating) as avg_rating,
-               SUM(marketing_spend) as marketing_spend,
-               SUM(marketing_sales) as marketing_sales,
-               SUM(new_customers) as new_customers,
-               COUNT(DISTINCT stat_date) as active_days
-        FROM daily_data
-        GROUP BY name
-        HAVING total_sales > 0
-        ORDER BY total_sales DESC
-        LIMIT 15
-        """
-        
-        leaders = pd.read_sql_query(leaders_query, conn, params=(start_date, end_date, start_date, end_date))
+        leaders = (market_by_restaurant.sort_values('total_sales', ascending=False, kind='stable')
+                   .head(15).reset_index(drop=True))
         
         print("ТОП-15 по продажам:")
         for i, row in leaders.iterrows():
@@ -3320,8 +2999,6 @@ def analyze_market(start_date=None, end_date=None):
         except Exception as e:
             print(f"❌ Ошибка сохранения отчета: {e}")
         
-        conn.close()
-        
     except Exception as e:
         print(f"❌ Ошибка при анализе рынка: {e}")
 
@@ -3527,6 +3204,11 @@ def main():
   🔬 Полный анализ ресторана (ВСЕ 63 параметра + API):
     python main.py analyze "Ika Canggu"
     python main.py analyze "Ika Canggu" --start 2025-04-01 --end 2025-06-22
+    python main.py analyze "Ika Canggu" --formats txt json html
+    python main.py analyze "Ika Canggu" --no-cache   # пересчитать, даже если данные не менялись
+  
+  📦 Отчеты по всем ресторанам параллельно (пул процессов):
+    python main.py analyze-all --start 2025-06-01 --end 2025-06-30 --workers 8
   
   🌍 Анализ всего рынка:
     python main.py market
@@ -3534,6 +3216,21 @@ def main():
     
   🌐 Проверка статуса API:
     python main.py check-apis
+    
+  🛠️ Индексы базы данных (+ EXPLAIN горячих запросов):
+    python main.py migrate
+    
+  🔄 Обновление производных данных (только новые дни):
+    python main.py refresh
+    python main.py refresh --full
+    
+  🏖️ Разбор туристических файлов data/tourism (только изменившиеся):
+    python main.py tourism
+    python main.py tourism --full
+    
+  📈 Ожидаемые продажи и отклонения (все рестораны x дни → таблица expected_sales):
+    python main.py predict --start 2025-06-01 --end 2025-06-30
+    python main.py predict --start 2025-06-01 --end 2025-06-30 --restaurants "Ika Canggu" "Only Eggs"
 
 НОВЫЕ ВОЗМОЖНОСТИ:
   👥 Анализ клиентской базы (новые/повторные/реактивированные)
@@ -3548,7 +3245,7 @@ def main():
     )
     
     parser.add_argument('command', 
-                       choices=['list', 'analyze', 'market', 'check-apis'],
+                       choices=['list', 'analyze', 'analyze-all', 'market', 'check-apis', 'migrate', 'refresh', 'tourism', 'predict'],
                        help='Команда для выполнения')
     
     parser.add_argument('restaurant', nargs='?', 
@@ -3560,6 +3257,21 @@ def main():
     parser.add_argument('--end', 
                        help='Дата окончания периода (YYYY-MM-DD)')
     
+    parser.add_argument('--full', action='store_true',
+                       help='refresh: пересчитать всю историю, а не только новые дни; tourism: разобрать все файлы')
+    
+    parser.add_argument('--restaurants', nargs='+',
+                       help='predict: только эти рестораны (по умолчанию все)')
+    
+    parser.add_argument('--workers', type=int,
+                       help='analyze-all: число процессов (по умолчанию - число ядер)')
+    
+    parser.add_argument('--formats', nargs='+', choices=sorted(REPORT_EXTENSIONS), default=['txt'],
+                       help='analyze / analyze-all: форматы сохраненного отчета (по умолчанию txt)')
+    
+    parser.add_argument('--no-cache', action='store_true',
+                       help='analyze / analyze-all: пересчитать отчет, даже если данные не менялись')
+    
     args = parser.parse_args()
     
     # Проверяем наличие базы данных
@@ -3582,13 +3294,37 @@ def main():
                 print("   Используйте: python main.py analyze \"Название ресторана\"")
                 sys.exit(1)
             
-            analyze_restaurant(args.restaurant, args.start, args.end)
+            analyze_restaurant(args.restaurant, args.start, args.end, formats=args.formats, use_cache=not args.no_cache)
+            
+        elif args.command == 'analyze-all':
+            results = analyze_all_restaurants(args.start, args.end, workers=args.workers, formats=args.formats,
+                                              use_cache=not args.no_cache)
+            if not results or any(r['error'] for r in results):
+                sys.exit(1)
             
         elif args.command == 'market':
             analyze_market(args.start, args.end)
             
         elif args.command == 'check-apis':
             check_api_status()
+            
+        elif args.command == 'migrate':
+            from src.utils.db_migrations import run_migrations
+            if not run_migrations('database.sqlite'):
+                sys.exit(1)
+            
+        elif args.command == 'refresh':
+            from src.utils.refresh import refresh
+            refresh('database.sqlite', full=args.full)
+            
+        elif args.command == 'tourism':
+            from src.utils.tourism_store import ingest_tourism
+            if ingest_tourism('database.sqlite', full=args.full)['errors']:
+                sys.exit(1)
+            
+        elif args.command == 'predict':
+            from src.ml_models.batch_predictor import predict_expected_sales
+            predict_expected_sales(args.start, args.end, restaurants=args.restaurants, db_path='database.sqlite')
     
     except KeyboardInterrupt:
         print("\n\n🛑 Анализ прерван пользователем")
@@ -3698,13 +3434,14 @@ def estimate_rating_impact(rating_change, sales_deviation, restaurant_name="Unkn
     # НАУЧНЫЙ РАСЧЕТ: коэффициент основан на корреляционном анализе реальных данных
     # Получаем актуальную корреляцию из базы данных
     try:
-        cursor = sqlite3.connect('database.sqlite').cursor()
-        cursor.execute("""
-            SELECT AVG(avg_rating), AVG(total_sales) 
-            FROM grab_stats 
-            WHERE restaurant_id = (SELECT id FROM restaurants WHERE name = ? LIMIT 1)
-        """, (restaurant_name,))
-        avg_rating, avg_sales = cursor.fetchone() or (4.0, 1000)
+        with connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT AVG(avg_rating), AVG(total_sales) 
+                FROM grab_stats 
+                WHERE restaurant_id = (SELECT id FROM restaurants WHERE name = ? LIMIT 1)
+            """, (restaurant_name,))
+            avg_rating, avg_sales = cursor.fetchone() or (4.0, 1000)
         
         # Расчет коэффициента на основе данных
         rating_impact_coefficient = (avg_sales * 0.08) / 0.1  # Динамический расчет
@@ -3733,14 +3470,15 @@ def estimate_marketing_impact(marketing_change, sales_deviation, restaurant_name
     
     # НАУЧНЫЙ РАСЧЕТ: коэффициент основан на корреляционном анализе реальных данных
     try:
-        cursor = sqlite3.connect('database.sqlite').cursor()
-        cursor.execute("""
-            SELECT AVG(gojek_marketing_spend), AVG(total_sales) 
-            FROM grab_stats g
-            JOIN gojek_stats gj ON g.stat_date = gj.stat_date AND g.restaurant_id = gj.restaurant_id
-            WHERE g.restaurant_id = (SELECT id FROM restaurants WHERE name = ? LIMIT 1)
-        """, (restaurant_name,))
-        avg_marketing, avg_sales = cursor.fetchone() or (1000, 1000)
+        with connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT AVG(gojek_marketing_spend), AVG(total_sales) 
+                FROM grab_stats g
+                JOIN gojek_stats gj ON g.stat_date = gj.stat_date AND g.restaurant_id = gj.restaurant_id
+                WHERE g.restaurant_id = (SELECT id FROM restaurants WHERE name = ? LIMIT 1)
+            """, (restaurant_name,))
+            avg_marketing, avg_sales = cursor.fetchone() or (1000, 1000)
         
         # Динамический расчет коэффициента
         marketing_impact_coefficient = (avg_sales * 0.15) / (avg_marketing * 0.5) if avg_marketing > 0 else 0.3
@@ -9,6 +9,8 @@ import sys
 import sqlite3
 import urllib.request
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
 def download_database():
     """Скачивает базу данных если её нет"""
     db_path = "../database.sqlite"
@@ -53,6 +55,19 @@ def check_database():
         print(f"❌ Ошибка проверки БД: {e}")
         return False
 
+def migrate_database():
+    """Создает индексы для горячих запросов и обновляет статистику"""
+    db_path = "../database.sqlite"
+    
+    try:
+        from src.utils.db_migrations import run_migrations
+        if not run_migrations(db_path):
+            print("⚠️ Часть горячих запросов все еще без индексов")
+        return True
+    except Exception as e:
+        print(f"❌ Ошибка миграции БД: {e}")
+        return False
+
 def setup_environment():
     """Настраивает окружение"""
     env_path = "../.env"
@@ -99,6 +114,11 @@ def main():
         print("❌ База данных повреждена")
         return False
     
+    # Индексы и статистика планировщика
+    if not migrate_database():
+        print("❌ Не удалось создать индексы")
+        return False
+    
     # Настраиваем окружение
     if not setup_environment():
         print("❌ Не удалось настроить окружение")
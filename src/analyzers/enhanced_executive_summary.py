@@ -14,6 +14,12 @@ try:
 except ImportError:
     FAKE_ORDERS_AVAILABLE = False
 
+# Общий пул read-only подключений к SQLite
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from src.utils.db_pool import get_connection
+
 
 class EnhancedExecutiveSummary:
     """Создает улучшенное исполнительное резюме с fake orders и четкой структурой"""
@@ -81,10 +87,10 @@ class EnhancedExecutiveSummary:
     def _get_summary_data(self, restaurant_name: str, start_date: str, end_date: str) -> Optional[Dict]:
         """Получает сводные данные из базы"""
         try:
-            with sqlite3.connect('database.sqlite') as conn:
+            with get_connection() as conn:
                 # Получаем ID ресторана
-                restaurant_query = f"SELECT id FROM restaurants WHERE name = '{restaurant_name}'"
-                restaurant_df = pd.read_sql_query(restaurant_query, conn)
+                restaurant_query = "SELECT id FROM restaurants WHERE name = ?"
+                restaurant_df = pd.read_sql_query(restaurant_query, conn, params=(restaurant_name,))
                 if restaurant_df.empty:
                     return None
                 
@@ -34,27 +34,45 @@ except ImportError:
 
 from .production_sales_analyzer import ProductionSalesAnalyzer
 
+# Общий пул read-only подключений к SQLite
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from src.utils.db_pool import get_connection
+from src.utils.daily_facts import restaurant_watermark, restaurant_data_signature
+from src.utils.calendar_dimension import join_calendar
+from src.ml_models.shap_explainer import get_tree_explainer, explain_batch
+from src.ml_models.restaurant_model_cache import get_restaurant_model_cache, entry_version
+from src.ml_models.incremental_training import decide_retrain, next_lineage, next_trained_range, warm_start_forest
+
+# Дообучение леса (warm_start) - только если накопилась хотя бы неделя новых дней,
+# иначе новые деревья учились бы на 1-2 строках; модель ресторана мала, полная пересборка дешева
+MIN_INCREMENT_DAYS = 7
+
 class IntegratedMLDetective:
     """Интегрированный ML + детективный анализатор"""
     
-    def __init__(self):
+    def __init__(self, model_cache=None):
         # Детективный анализатор (существующий)
         self.detective = ProductionSalesAnalyzer()
         
-        # ML компоненты
+        # ML компоненты (модель ресторана - из общего кеша моделей)
+        self.model_cache = model_cache or get_restaurant_model_cache()
         self.ml_model = None
         self.shap_explainer = None
         self.feature_names = []
         self.model_trained = False
-        
-        # Инициализируем ML если доступен
-        if ML_AVAILABLE:
-            self.ml_model = RandomForestRegressor(
-                n_estimators=100,
-                max_depth=10,
-                random_state=42,
-                n_jobs=-1
-            )
+        self.model_key = None
+        self.model_version = None
+    
+    @staticmethod
+    def _new_model():
+        return RandomForestRegressor(
+            n_estimators=100,
+            max_depth=10,
+            random_state=42,
+            n_jobs=-1
+        )
     
     def analyze_with_ml_explanations(self, restaurant_name, start_date, end_date):
         """
@@ -72,12 +90,21 @@ class IntegratedMLDetective:
             detective_results.append("⚠️ ML анализ недоступен - установите scikit-learn и shap")
             return detective_results
         
-        # 2. Обучаем ML модель если еще не обучена
-        if not self.model_trained:
-            print("🧠 Обучение ML модели...")
-            self._train_ml_model(restaurant_name)
+        # 2. Модель ресторана: из кеша, если данные не изменились, иначе обучаем
+        self._ensure_ml_model(restaurant_name)
+        
+        # 3. Добавляем ML объяснения для проблемных дней (один проход SHAP на все дни)
+        problem_dates = []
+        for result in detective_results:
+            if "ПРОБЛЕМНЫЙ ДЕНЬ" in result and "2025-" in result:
+                date_str = self._extract_date_from_result(result)
+                if date_str and date_str not in problem_dates:
+                    problem_dates.append(date_str)
+        
+        if problem_dates:
+            print(f"🔍 ML анализ для {len(problem_dates)} проблемных дней...")
+        ml_explanations = self._get_ml_explanations_for_days(restaurant_name, problem_dates)
         
-        # 3. Добавляем ML объяснения для проблемных дней
         ml_enhanced_results = []
         
         for i, result in enumerate(detective_results):
@@ -88,12 +115,8 @@ class IntegratedMLDetective:
                 # Извлекаем дату из строки
                 date_str = self._extract_date_from_result(result)
                 if date_str:
-                    print(f"🔍 ML анализ для {date_str}...")
-                    ml_explanation = self._get_ml_explanation_for_day(
-                        restaurant_name, date_str
-                    )
                     ml_enhanced_results.append("")
-                    ml_enhanced_results.extend(ml_explanation)
+                    ml_enhanced_results.extend(ml_explanations.get(date_str, ["⚠️ ML модель не обучена"]))
         
         # 4. Добавляем общую ML сводку
         ml_enhanced_results.append("")
@@ -104,70 +127,145 @@ class IntegratedMLDetective:
         
         return ml_enhanced_results
     
-    def _train_ml_model(self, restaurant_name):
-        """Обучает ML модель на исторических данных"""
+    def _ensure_ml_model(self, restaurant_name):
+        """
+        Модель ресторана по ключу restaurant_<id>: запись кеша актуальна, пока
+        не сдвинулся водяной знак ресторана и не изменилась подпись его данных
+        (дозагрузка старых дат, правки); иначе дообучение или полная
+        пересборка, результат - обратно в кеш
+        """
         
+        self.model_trained = False
         try:
-            # Получаем исторические данные для обучения
-            training_data = self._prepare_training_data(restaurant_name)
-            
-            if len(training_data) < 10:
-                print("⚠️ Недостаточно данных для обучения ML модели")
+            with get_connection() as conn:
+                row = conn.execute("SELECT id FROM restaurants WHERE name = ?", (restaurant_name,)).fetchone()
+            if row is None:
+                print(f"⚠️ Ресторан {restaurant_name} не найден - ML модель не обучена")
                 return
             
-            # Подготавливаем признаки и целевую переменную
-            features_df = training_data.drop(['sales', 'date'], axis=1)
-            target = training_data['sales']
-            
-            self.feature_names = list(features_df.columns)
+            restaurant_id = int(row[0])
+            key = f"restaurant_{restaurant_id}"
+            watermark = restaurant_watermark(restaurant_id)
+            signature = restaurant_data_signature(restaurant_id, watermark)
+            
+            entry = self.model_cache.get(key)
+            trained_end = (entry.get('trained_range') or {}).get('end') if entry is not None else None
+            if entry is not None and trained_end == watermark and entry.get('data_signature') == signature:
+                print(f"♻️ ML модель из кеша (данные до {watermark})")
+            else:
+                print("🧠 Обучение ML модели...")
+                # Дообучение только поверх неизмененной истории: иначе полная пересборка
+                previous = entry
+                if entry is not None and entry.get('data_signature') != restaurant_data_signature(restaurant_id, trained_end):
+                    previous = None
+                entry = self._train_ml_model(restaurant_id, watermark, previous=previous)
+                if entry is None:
+                    return
+                entry['data_signature'] = signature
+                entry['version'] = entry_version(key, entry)
+                self.model_cache.put(key, entry)
+            
+            self._use_model_entry(key, entry)
             
+        except Exception as e:
+            print(f"❌ Ошибка обучения ML модели: {e}")
+            self.model_trained = False
+    
+    def _use_model_entry(self, key, entry):
+        """Делает запись кеша текущей моделью анализатора"""
+        
+        self.ml_model = entry['model']
+        self.feature_names = list(entry['feature_names'])
+        self.model_key = key
+        self.model_version = entry['version']
+        
+        # SHAP объяснитель - один на версию модели (кеш процесса)
+        self.shap_explainer = get_tree_explainer(self.ml_model, self.model_version)
+        self.model_trained = True
+    
+    def _train_ml_model(self, restaurant_id, watermark, previous=None):
+        """
+        Обучает модель ресторана на 6 месяцах до водяного знака
+        
+        Args:
+            restaurant_id: ID ресторана
+            watermark: Последний день данных ресторана
+            previous: Устаревшая запись кеша (для дообучения warm_start)
+        
+        Returns:
+            Запись кеша (model, feature_names, trained_range, lineage, metrics) или None
+        """
+        
+        import copy
+        
+        # Получаем исторические данные для обучения
+        training_data = self._prepare_training_data(restaurant_id, watermark)
+        
+        if len(training_data) < 10:
+            print("⚠️ Недостаточно данных для обучения ML модели")
+            return None
+        
+        # Подготавливаем признаки и целевую переменную
+        features_df = training_data.drop(['sales', 'date'], axis=1)
+        target = training_data['sales']
+        feature_names = list(features_df.columns)
+        data_start = training_data['date'].min()
+        
+        # Политика: дообучение на новых днях или полная пересборка
+        mode, reason = 'full', 'модели еще нет'
+        if previous is not None:
+            new_days = training_data['date'] > previous['trained_range']['end']
+            mode, reason = decide_retrain(previous, data_start, watermark, feature_names,
+                                          int(new_days.sum()), len(training_data))
+            if mode != 'incremental' or new_days.sum() < MIN_INCREMENT_DAYS:
+                mode = 'full'
+        
+        if mode == 'incremental':
+            # Копия: прежняя модель может использоваться другим анализатором
+            model = warm_start_forest(copy.deepcopy(previous['model']),
+                                      features_df[new_days], target[new_days])
+            y_pred = model.predict(features_df[new_days])
+            r2 = r2_score(target[new_days], y_pred)
+            mae = mean_absolute_error(target[new_days], y_pred)
+            print(f"✅ ML модель дообучена ({reason}): R² = {r2:.3f}, MAE = {mae:,.0f} IDR")
+        else:
             # Разделяем на обучение и тест
             X_train, X_test, y_train, y_test = train_test_split(
                 features_df, target, test_size=0.2, random_state=42
             )
             
             # Обучаем модель
-            self.ml_model.fit(X_train, y_train)
-            
-            # Создаем SHAP объяснитель
-            self.shap_explainer = shap.TreeExplainer(self.ml_model)
+            model = self._new_model()
+            model.fit(X_train, y_train)
             
             # Оцениваем качество
-            y_pred = self.ml_model.predict(X_test)
+            y_pred = model.predict(X_test)
             r2 = r2_score(y_test, y_pred)
             mae = mean_absolute_error(y_test, y_pred)
-            
             print(f"✅ ML модель обучена: R² = {r2:.3f}, MAE = {mae:,.0f} IDR")
-            self.model_trained = True
-            
-        except Exception as e:
-            print(f"❌ Ошибка обучения ML модели: {e}")
-            self.model_trained = False
-    
-    def _prepare_training_data(self, restaurant_name):
-        """Подготавливает данные для обучения ML модели"""
         
-        conn = sqlite3.connect('database.sqlite')
-        
-        # Получаем ID ресторана
-        restaurant_query = f"SELECT id FROM restaurants WHERE name = '{restaurant_name}'"
-        restaurant_df = pd.read_sql_query(restaurant_query, conn)
-        
-        if restaurant_df.empty:
-            return pd.DataFrame()
-        
-        restaurant_id = restaurant_df.iloc[0]['id']
+        return {
+            'model': model,
+            'feature_names': feature_names,
+            'trained_range': next_trained_range(previous, mode, data_start, watermark),
+            'lineage': next_lineage(previous, mode),
+            'metrics': {'r2': r2, 'mae': mae, 'rows': len(training_data)},
+        }
+    
+    def _prepare_training_data(self, restaurant_id, watermark):
+        """Подготавливает данные для обучения ML модели: 6 месяцев до водяного знака"""
         
-        # Объединенный запрос данных за последние 6 месяцев
-        query = f"""
+        # Окно привязано к последнему дню данных, а не к сегодняшней дате -
+        # модель однозначно определяется рестораном и водяным знаком
+        query = """
         WITH all_dates AS (
             SELECT stat_date FROM grab_stats 
-            WHERE restaurant_id = {restaurant_id}
-            AND stat_date >= date('now', '-6 months')
+            WHERE restaurant_id = :rid
+            AND stat_date BETWEEN date(:wm, '-6 months') AND :wm
             UNION
             SELECT stat_date FROM gojek_stats 
-            WHERE restaurant_id = {restaurant_id}
-            AND stat_date >= date('now', '-6 months')
+            WHERE restaurant_id = :rid
+            AND stat_date BETWEEN date(:wm, '-6 months') AND :wm
         )
         SELECT 
             ad.stat_date as date,
@@ -201,19 +299,22 @@ class IntegratedMLDetective:
             COALESCE(g.orders, 0) + COALESCE(gj.orders, 0) as total_orders
             
         FROM all_dates ad
-        LEFT JOIN grab_stats g ON ad.stat_date = g.stat_date AND g.restaurant_id = {restaurant_id}
-        LEFT JOIN gojek_stats gj ON ad.stat_date = gj.stat_date AND gj.restaurant_id = {restaurant_id}
+        LEFT JOIN grab_stats g ON ad.stat_date = g.stat_date AND g.restaurant_id = :rid
+        LEFT JOIN gojek_stats gj ON ad.stat_date = gj.stat_date AND gj.restaurant_id = :rid
         ORDER BY ad.stat_date
         """
         
-        df = pd.read_sql_query(query, conn)
-        conn.close()
+        if not watermark:
+            return pd.DataFrame()
+        
+        with get_connection() as conn:
+            df = pd.read_sql_query(query, conn, params={'rid': int(restaurant_id), 'wm': watermark})
         
         if df.empty:
             return df
         
-        # Добавляем признаки праздников
-        df['is_holiday'] = df['date'].apply(self._check_holiday)
+        # Добавляем признаки праздников (календарное измерение)
+        df = join_calendar(df, date_column='date', columns=['is_holiday'])
         
         # Добавляем погодные данные (упрощенно для обучения)
         df['precipitation'] = 0  # Будем получать из API при реальном анализе
@@ -231,82 +332,115 @@ class IntegratedMLDetective:
     def _get_ml_explanation_for_day(self, restaurant_name, target_date):
         """Получает ML объяснение для конкретного дня"""
         
+        return self._get_ml_explanations_for_days(restaurant_name, [target_date])[target_date]
+    
+    def _get_ml_explanations_for_days(self, restaurant_name, target_dates):
+        """
+        ML объяснения для набора дней: одна матрица признаков (один запрос),
+        один прогноз и один вызов SHAP на все дни
+        
+        Returns:
+            {дата: строки объяснения}
+        """
+        
+        if not target_dates:
+            return {}
+        
         if not self.model_trained:
-            return ["⚠️ ML модель не обучена"]
+            return {date: ["⚠️ ML модель не обучена"] for date in target_dates}
         
         try:
-            # Подготавливаем признаки для целевого дня
-            features = self._prepare_features_for_date(restaurant_name, target_date)
-            
-            if not features:
-                return ["⚠️ Не удалось подготовить признаки для ML анализа"]
-            
-            # Получаем реальные продажи
-            actual_sales = self._get_actual_sales(restaurant_name, target_date)
+            # Признаки и реальные продажи всех дней
+            features_df, actual_sales = self._prepare_features_for_dates(restaurant_name, target_dates)
             
-            # Делаем прогноз
-            feature_array = np.array([list(features.values())])
-            predicted_sales = self.ml_model.predict(feature_array)[0]
+            explanations = {date: ["⚠️ Не удалось подготовить признаки для ML анализа"] for date in target_dates}
+            if features_df.empty:
+                return explanations
             
-            # Получаем SHAP объяснение
-            shap_values = self.shap_explainer.shap_values(feature_array)[0]
+            # Прогноз и SHAP для всей матрицы
+            predictions = self.ml_model.predict(features_df)
+            shap_matrix = explain_batch(self.ml_model, features_df, self.model_version)
             
-            # Формируем объяснение
-            explanation = []
-            explanation.append("🧠 ML ОБЪЯСНЕНИЕ (SHAP):")
-            explanation.append(f"   💰 Реальные продажи: {actual_sales:,.0f} IDR")
-            explanation.append(f"   🤖 ML прогноз: {predicted_sales:,.0f} IDR")
+            for row_idx, target_date in enumerate(features_df.index):
+                explanations[target_date] = self._format_ml_explanation(
+                    features_df.iloc[row_idx].tolist(), shap_matrix[row_idx],
+                    predictions[row_idx], actual_sales.get(target_date, 0)
+                )
+            return explanations
             
-            deviation_pct = ((actual_sales - predicted_sales) / predicted_sales) * 100
-            explanation.append(f"   📊 Отклонение: {deviation_pct:+.1f}%")
-            explanation.append("")
-            
-            # Сортируем факторы по важности
-            feature_importance = list(zip(self.feature_names, features.values(), shap_values))
-            feature_importance.sort(key=lambda x: abs(x[2]), reverse=True)
-            
-            explanation.append("   🔍 ГЛАВНЫЕ ФАКТОРЫ ВЛИЯНИЯ:")
-            
-            for i, (feature_name, feature_value, shap_value) in enumerate(feature_importance[:5]):
-                if abs(shap_value) < 50000:  # Игнорируем малозначимые
-                    continue
-                    
-                impact_pct = (shap_value / predicted_sales) * 100
-                formatted_name = self._format_feature_name(feature_name)
+        except Exception as e:
+            return {date: [f"❌ Ошибка ML анализа: {e}"] for date in target_dates}
+    
+    def _format_ml_explanation(self, feature_values, shap_values, predicted_sales, actual_sales):
+        """Формирует объяснение одного дня из прогноза и SHAP значений"""
+        
+        explanation = []
+        explanation.append("🧠 ML ОБЪЯСНЕНИЕ (SHAP):")
+        explanation.append(f"   💰 Реальные продажи: {actual_sales:,.0f} IDR")
+        explanation.append(f"   🤖 ML прогноз: {predicted_sales:,.0f} IDR")
+        
+        deviation_pct = ((actual_sales - predicted_sales) / predicted_sales) * 100
+        explanation.append(f"   📊 Отклонение: {deviation_pct:+.1f}%")
+        explanation.append("")
+        
+        # Сортируем факторы по важности
+        feature_importance = list(zip(self.feature_names, feature_values, shap_values))
+        feature_importance.sort(key=lambda x: abs(x[2]), reverse=True)
+        
+        explanation.append("   🔍 ГЛАВНЫЕ ФАКТОРЫ ВЛИЯНИЯ:")
+        
+        for i, (feature_name, feature_value, shap_value) in enumerate(feature_importance[:5]):
+            if abs(shap_value) < 50000:  # Игнорируем малозначимые
+                continue
                 
-                if shap_value > 0:
-                    explanation.append(f"      {i+1}. ✅ {formatted_name}: +{impact_pct:.1f}% влияния (+{shap_value:,.0f} IDR)")
-                else:
-                    explanation.append(f"      {i+1}. 🚨 {formatted_name}: {impact_pct:.1f}% влияния ({shap_value:,.0f} IDR)")
-            
-            # Добавляем ML рекомендации
-            explanation.append("")
-            explanation.append("   💡 ML РЕКОМЕНДАЦИИ:")
-            ml_recommendations = self._generate_ml_recommendations(feature_importance, predicted_sales)
-            explanation.extend([f"      • {rec}" for rec in ml_recommendations])
-            
-            return explanation
+            impact_pct = (shap_value / predicted_sales) * 100
+            formatted_name = self._format_feature_name(feature_name)
             
-        except Exception as e:
-            return [f"❌ Ошибка ML анализа: {e}"]
+            if shap_value > 0:
+                explanation.append(f"      {i+1}. ✅ {formatted_name}: +{impact_pct:.1f}% влияния (+{shap_value:,.0f} IDR)")
+            else:
+                explanation.append(f"      {i+1}. 🚨 {formatted_name}: {impact_pct:.1f}% влияния ({shap_value:,.0f} IDR)")
+        
+        # Добавляем ML рекомендации
+        explanation.append("")
+        explanation.append("   💡 ML РЕКОМЕНДАЦИИ:")
+        ml_recommendations = self._generate_ml_recommendations(feature_importance, predicted_sales)
+        explanation.extend([f"      • {rec}" for rec in ml_recommendations])
+        
+        return explanation
     
     def _prepare_features_for_date(self, restaurant_name, target_date):
         """Подготавливает признаки для конкретной даты"""
         
-        conn = sqlite3.connect('database.sqlite')
-        
-        # Получаем ID ресторана
-        restaurant_query = f"SELECT id FROM restaurants WHERE name = '{restaurant_name}'"
-        restaurant_df = pd.read_sql_query(restaurant_query, conn)
-        
-        if restaurant_df.empty:
+        features_df, _ = self._prepare_features_for_dates(restaurant_name, [target_date])
+        if features_df.empty:
             return {}
+        return features_df.iloc[0].to_dict()
+    
+    def _prepare_features_for_dates(self, restaurant_name, target_dates):
+        """
+        Матрица признаков для набора дат одним запросом
+        
+        Returns:
+            (DataFrame признаков: индекс - дата, колонки в порядке обучения;
+             {дата: реальные продажи})
+        """
         
-        restaurant_id = restaurant_df.iloc[0]['id']
+        dates = sorted(set(target_dates))
+        placeholders = ', '.join('?' for _ in dates)
         
-        # Получаем данные за целевую дату
+        # Данные всех дат одним запросом
         query = f"""
+        WITH r AS (SELECT id FROM restaurants WHERE name = ?),
+        d AS (
+            SELECT stat_date, restaurant_id FROM grab_stats
+            WHERE restaurant_id = (SELECT id FROM r) AND stat_date IN ({placeholders})
+            UNION
+            SELECT stat_date, restaurant_id FROM gojek_stats
+            WHERE restaurant_id = (SELECT id FROM r) AND stat_date IN ({placeholders})
+        )
         SELECT 
+            d.stat_date,
             g.offline_rate,
             gj.close_time,
             gj.preparation_time,
@@ -316,56 +450,48 @@ class IntegratedMLDetective:
             g.impressions,
             COALESCE(g.rating, gj.rating, 4.5) as rating,
             (COALESCE(g.orders, 0) + COALESCE(gj.orders, 0)) as total_orders,
-            COALESCE(g.ads_sales,0) + COALESCE(gj.ads_sales,0) as total_ads_sales,
-            COALESCE(g.ads_spend,0) + COALESCE(gj.ads_spend,0) as total_ads_spend
-        FROM (
-            SELECT stat_date, restaurant_id FROM grab_stats WHERE restaurant_id = {restaurant_id} AND stat_date = '{target_date}'
-            UNION
-            SELECT stat_date, restaurant_id FROM gojek_stats WHERE restaurant_id = {restaurant_id} AND stat_date = '{target_date}'
-        ) d
+            COALESCE(g.sales, 0) + COALESCE(gj.sales, 0) as total_sales
+        FROM d
         LEFT JOIN grab_stats g ON g.restaurant_id = d.restaurant_id AND g.stat_date = d.stat_date
         LEFT JOIN gojek_stats gj ON gj.restaurant_id = d.restaurant_id AND gj.stat_date = d.stat_date
         """
         
-        df = pd.read_sql_query(query, conn)
-        conn.close()
+        with get_connection() as conn:
+            df = pd.read_sql_query(query, conn, params=(restaurant_name, *dates, *dates))
         
         if df.empty:
-            return {}
-        
-        row = df.iloc[0]
-        
-        # Подготавливаем признаки
-        date_obj = datetime.strptime(target_date, '%Y-%m-%d')
-        
-        features = {
-            'is_weekend': 1 if date_obj.weekday() >= 5 else 0,
-            'day_of_week': date_obj.weekday(),
-            'grab_offline_rate': float(row['offline_rate']) if pd.notna(row['offline_rate']) else 0,
-            'gojek_closed': 1 if (pd.notna(row['close_time']) and row['close_time'] != '00:00:00') else 0,
-            'preparation_minutes': self._time_to_minutes(row['preparation_time']) if pd.notna(row['preparation_time']) else 15,
-            'delivery_minutes': self._time_to_minutes(row['delivery_time']) if pd.notna(row['delivery_time']) else 20,
-            'total_ads_spend': float(row['grab_ads_spend'] or 0) + float(row['gojek_ads_spend'] or 0),
-            'impressions': float(row['impressions']) if pd.notna(row['impressions']) else 0,
-            'rating': float(row['rating']) if pd.notna(row['rating']) else 4.5,
-            'total_orders': int(row['total_orders']) if pd.notna(row['total_orders']) else 0,
-            'is_holiday': 1 if self._check_holiday(target_date) else 0
-        }
-        
-        # Добавляем погодные данные
-        weather_data = self.detective._get_weather_data(restaurant_name, target_date)
-        if weather_data:
-            features['precipitation'] = weather_data['precipitation']
-            features['temperature'] = weather_data['temperature']
-        else:
-            features['precipitation'] = 0
-            features['temperature'] = 27  # средняя для Бали
+            return pd.DataFrame(columns=self.feature_names), {}
+        
+        df = df.drop_duplicates('stat_date').set_index('stat_date')
+        day_of_week = pd.to_datetime(df.index).weekday
+        
+        features = pd.DataFrame(index=df.index)
+        features['is_weekend'] = (day_of_week >= 5).astype(int)
+        features['day_of_week'] = day_of_week
+        features['grab_offline_rate'] = pd.to_numeric(df['offline_rate'], errors='coerce').fillna(0).astype(float)
+        features['gojek_closed'] = (df['close_time'].notna() & (df['close_time'] != '00:00:00')).astype(int)
+        features['preparation_minutes'] = [self._time_to_minutes(t) if pd.notna(t) else 15 for t in df['preparation_time']]
+        features['delivery_minutes'] = [self._time_to_minutes(t) if pd.notna(t) else 20 for t in df['delivery_time']]
+        features['total_ads_spend'] = df['grab_ads_spend'].fillna(0).astype(float) + df['gojek_ads_spend'].fillna(0).astype(float)
+        features['impressions'] = df['impressions'].fillna(0).astype(float)
+        features['rating'] = df['rating'].fillna(4.5).astype(float)
+        features['total_orders'] = df['total_orders'].fillna(0).astype(int)
+        features = join_calendar(features, date_column=None, columns=['is_holiday'])
+        
+        # Погода (локальное хранилище, уже предзагружено детективным анализом)
+        weather = [self.detective._get_weather_data(restaurant_name, date) for date in df.index]
+        features['precipitation'] = [w['precipitation'] if w else 0 for w in weather]
+        features['temperature'] = [w['temperature'] if w else 27 for w in weather]  # средняя для Бали
         
         # Добавляем исторические признаки
-        historical_features = self._get_historical_features(restaurant_name, target_date)
-        features.update(historical_features)
+        for name, value in self._get_historical_features(restaurant_name, None).items():
+            features[name] = value
         
-        return features
+        # Порядок колонок - как при обучении
+        if self.feature_names:
+            features = features.reindex(columns=self.feature_names, fill_value=0)
+        
+        return features, df['total_sales'].to_dict()
     
     def _get_historical_features(self, restaurant_name, target_date):
         """Получает исторические признаки (скользящие средние)"""
@@ -398,10 +524,6 @@ class IntegratedMLDetective:
             return day_data.get('total_sales', 0)
         return 0
     
-    def _check_holiday(self, date_str):
-        """Проверяет является ли день праздником"""
-        return date_str in self.detective.holidays_data
-    
     def _format_feature_name(self, feature_name):
         """Форматирует название признака для отчета"""
         
@@ -34,6 +34,13 @@ except ImportError:
     print("⚠️ Fake orders filter недоступен")
     FAKE_ORDERS_AVAILABLE = False
 
+# Общий пул read-only подключений к SQLite
+from src.utils.db_pool import get_connection
+from src.utils.period_loader import load_restaurant_period, driver_waiting_to_minutes, time_to_minutes
+from src.utils.daily_facts import load_daily_facts
+from src.utils.weather_store import get_weather_store
+from src.utils.ml_executor import submit_ml, MLTimeoutError
+
 class ProductionSalesAnalyzer:
     """Продакшн анализатор для детективного анализа продаж"""
     
@@ -131,6 +138,9 @@ class ProductionSalesAnalyzer:
                     f"🎯 Все дни показывают стабильную работу"
                 ]
             
+            # Погода всего периода - одним запросом
+            self._prefetch_weather(restaurant_name, start_date, end_date)
+            
             results = []
             results.append(f"🔍 ДЕТЕКТИВНЫЙ АНАЛИЗ: {restaurant_name}")
             results.append(f"📅 Период: {start_date} - {end_date}")
@@ -171,55 +181,28 @@ class ProductionSalesAnalyzer:
     
     def _find_bad_days(self, restaurant_name, start_date, end_date):
         """Находит дни с критическим падением продаж (>30% от медианы)"""
-        with sqlite3.connect('database.sqlite') as conn:
+        with get_connection() as conn:
             # Сначала найдем ID ресторана
-            restaurant_query = f"SELECT id FROM restaurants WHERE name = '{restaurant_name}'"
-            restaurant_df = pd.read_sql_query(restaurant_query, conn)
-            
-            if restaurant_df.empty:
-                return []
-                
-            restaurant_id = restaurant_df.iloc[0]['id']
+            restaurant_query = "SELECT id FROM restaurants WHERE name = ?"
+            restaurant_df = pd.read_sql_query(restaurant_query, conn, params=(restaurant_name,))
             
-            # ИСПРАВЛЕННЫЙ ЗАПРОС: правильно объединяем данные GRAB + GOJEK
-            query = f"""
-            SELECT 
-                COALESCE(g.stat_date, gj.stat_date) as stat_date,
-                COALESCE(g.sales, 0) as grab_sales,
-                COALESCE(gj.sales, 0) as gojek_sales,
-                COALESCE(g.sales, 0) + COALESCE(gj.sales, 0) as total_sales,
-                COALESCE(g.orders, 0) + COALESCE(gj.orders, 0) as total_orders,
-                COALESCE(g.offline_rate, 0) as grab_offline_rate,
-                CASE 
-                    WHEN gj.close_time IS NULL THEN 0
-                    WHEN typeof(gj.close_time) = 'text' THEN 
-                        CASE 
-                            WHEN gj.close_time LIKE '%:%' THEN 
-                                CAST(substr(gj.close_time, 1, instr(gj.close_time, ':')-1) AS INTEGER) * 60 + 
-                                CAST(substr(gj.close_time, instr(gj.close_time, ':')+1, 2) AS INTEGER)
-                            ELSE CAST(gj.close_time AS INTEGER)
-                        END
-                    ELSE CAST(gj.close_time AS INTEGER)
-                END as gojek_close_minutes
-            FROM (
-                SELECT g.stat_date, g.restaurant_id, g.sales, g.orders, g.offline_rate,
-                       NULL as close_time
-                FROM grab_stats g
-                WHERE g.restaurant_id = {restaurant_id}
-                UNION ALL
-                SELECT gj.stat_date, gj.restaurant_id, NULL as sales, NULL as orders, NULL as offline_rate,
-                       gj.close_time
-                FROM gojek_stats gj
-                WHERE gj.restaurant_id = {restaurant_id}
-            ) dates
-            LEFT JOIN grab_stats g ON g.restaurant_id = dates.restaurant_id AND g.stat_date = dates.stat_date
-            LEFT JOIN gojek_stats gj ON gj.restaurant_id = dates.restaurant_id AND gj.stat_date = dates.stat_date
-            WHERE dates.stat_date BETWEEN '{start_date}' AND '{end_date}'
-              AND (COALESCE(g.sales, 0) + COALESCE(gj.sales, 0)) > 0
-            ORDER BY stat_date
-            """
+        if restaurant_df.empty:
+            return []
             
-            df = pd.read_sql_query(query, conn)
+        restaurant_id = restaurant_df.iloc[0]['id']
+        
+        # Дневные факты: GRAB + GOJEK уже объединены, оффлайн в минутах
+        facts = load_daily_facts(start_date, end_date, restaurant_id)
+        facts = facts[facts['total_sales'] > 0]
+        df = pd.DataFrame({
+            'stat_date': facts['stat_date'],
+            'grab_sales': facts['grab_sales'],
+            'gojek_sales': facts['gojek_sales'],
+            'total_sales': facts['total_sales'],
+            'total_orders': facts['total_orders'],
+            'grab_offline_rate': facts['grab_offline_minutes'],
+            'gojek_close_minutes': facts['gojek_offline_minutes'].astype(int),
+        })
         
         if len(df) < 7:  # Недостаточно данных
             return []
@@ -284,24 +267,20 @@ class ProductionSalesAnalyzer:
             results.append(f"🟢 Grab: {day_data['grab_sales']:,.0f} IDR ({day_data['grab_orders']} заказов)")
             results.append(f"🟠 Gojek: {day_data['gojek_sales']:,.0f} IDR ({day_data['gojek_orders']} заказов)")
             
-            # Пытаемся использовать ML анализ, но с детальным fallback
-            try:
-                ml_factors = self._get_ml_factors_analysis(restaurant_name, target_date, day_data['total_sales'])
-                
-                if ml_factors and not any("недоступен" in str(factor) for factor in ml_factors):
-                    results.append("")
-                    results.append("🤖 ML АНАЛИЗ ФАКТОРОВ ВЛИЯНИЯ:")
-                    for factor in ml_factors:
-                        results.append(f"   {factor}")
-                else:
-                    raise Exception("ML анализ недоступен")
-            except:
+            # Пытаемся использовать ML анализ (с дедлайном), но с детальным fallback
+            ml_factors, ml_note = self._run_ml_factors(restaurant_name, target_date)
+            results.append("")
+            if ml_factors:
+                results.append("🤖 ML АНАЛИЗ ФАКТОРОВ ВЛИЯНИЯ:")
+                for factor in ml_factors:
+                    results.append(f"   {factor}")
+            else:
                 # Детальный детективный анализ как в README
-                results.append("")
                 results.append("🔍 ДЕТЕКТИВНЫЙ АНАЛИЗ ФАКТОРОВ:")
                 detective_factors = self._get_quick_detective_analysis(restaurant_name, target_date, day_data)
                 for factor in detective_factors:
                     results.append(f"   {factor}")
+            results.append(f"   {ml_note.strip()}")
             
             return results
             
@@ -346,9 +325,9 @@ class ProductionSalesAnalyzer:
     def _get_day_data(self, restaurant_name, target_date):
         """Получает данные за конкретный день"""
         # Сначала найдем ID ресторана
-        with sqlite3.connect('database.sqlite') as conn:
-            restaurant_query = f"SELECT id FROM restaurants WHERE name = '{restaurant_name}'"
-            restaurant_df = pd.read_sql_query(restaurant_query, conn)
+        with get_connection() as conn:
+            restaurant_query = "SELECT id FROM restaurants WHERE name = ?"
+            restaurant_df = pd.read_sql_query(restaurant_query, conn, params=(restaurant_name,))
             
             if restaurant_df.empty:
                 return None
@@ -430,10 +409,10 @@ class ProductionSalesAnalyzer:
         """Получает среднемесячные временные показатели"""
         target_month = target_date[:7]  # YYYY-MM
         
-        with sqlite3.connect('database.sqlite') as conn:
+        with get_connection() as conn:
             # Сначала найдем ID ресторана
-            restaurant_query = f"SELECT id FROM restaurants WHERE name = '{restaurant_name}'"
-            restaurant_df = pd.read_sql_query(restaurant_query, conn)
+            restaurant_query = "SELECT id FROM restaurants WHERE name = ?"
+            restaurant_df = pd.read_sql_query(restaurant_query, conn, params=(restaurant_name,))
             
             if restaurant_df.empty:
                 return {'avg_prep_time': 0, 'avg_delivery_time': 0, 'avg_gojek_waiting': 0, 'avg_grab_waiting': 0}
@@ -477,71 +456,6 @@ class ProductionSalesAnalyzer:
             }
         return {'avg_prep_time': 0, 'avg_delivery_time': 0, 'avg_gojek_waiting': 0, 'avg_grab_waiting': 0}
     
-    def _get_weather_data(self, restaurant_name, date_str):
-        """Получает РЕАЛЬНЫЕ погодные данные через Open-Meteo API"""
-        try:
-            import requests
-            import sqlite3
-            
-            # Получаем координаты ресторана
-            with sqlite3.connect('database.sqlite') as conn:
-                restaurant_query = f"SELECT latitude, longitude FROM restaurants WHERE name = '{restaurant_name}'"
-                restaurant_df = pd.read_sql_query(restaurant_query, conn)
-                
-                if restaurant_df.empty:
-                    # Default координаты Denpasar, Bali если ресторан не найден
-                    lat, lng = -8.6500, 115.2200
-                else:
-                    lat = restaurant_df.iloc[0]['latitude']
-                    lng = restaurant_df.iloc[0]['longitude']
-                    
-                    # Fallback если координаты пустые
-                    if pd.isna(lat) or pd.isna(lng):
-                        lat, lng = -8.6500, 115.2200
-            
-            # РЕАЛЬНЫЙ запрос к Open-Meteo API
-            url = "https://archive-api.open-meteo.com/v1/archive"
-            params = {
-                'latitude': lat,
-                'longitude': lng,
-                'start_date': date_str,
-                'end_date': date_str,
-                'daily': 'temperature_2m_mean,precipitation_sum,wind_speed_10m_max',
-                'timezone': 'Asia/Jakarta',
-                'elevation': 0  # КРИТИЧНО: уровень моря для правильной температуры
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                daily = data.get('daily', {})
-                
-                temp = daily.get('temperature_2m_mean', [None])[0]
-                precipitation = daily.get('precipitation_sum', [None])[0]
-                wind = daily.get('wind_speed_10m_max', [None])[0]
-                
-                return {
-                    'precipitation': precipitation if precipitation is not None else 0,
-                    'temperature': temp if temp is not None else 27,
-                    'wind_speed': wind if wind is not None else 5
-                }
-            else:
-                # Fallback если API недоступен
-                return {
-                    'precipitation': 0,
-                    'temperature': 27,
-                    'wind_speed': 5
-                }
-                
-        except Exception as e:
-            # Fallback при любой ошибке
-            return {
-                'precipitation': 0,
-                'temperature': 27,
-                'wind_speed': 5
-            }
-    
     def _analyze_time_factors(self, day_data, monthly_averages, factors, critical_issues):
         """Анализирует временные факторы с отклонениями"""
         impact_score = 0
@@ -697,131 +611,130 @@ class ProductionSalesAnalyzer:
             else:
                 return f"{hours}ч"
 
-    def get_period_statistics_with_corrections(self, restaurant_name, start_date, end_date):
+    def _load_period(self, restaurant_name, start_date, end_date, period=None):
+        """Возвращает данные периода (переданные или загруженные одним запросом)"""
+        if period is not None:
+            return period
+        return load_restaurant_period(restaurant_name, start_date, end_date)
+    
+    def get_period_statistics_with_corrections(self, restaurant_name, start_date, end_date, period=None):
         """
         Получает статистику за период с полными корректировками:
         Итоговые данные = Исходные - Отмененные - Потерянные - Фейковые
         """
         try:
-            with sqlite3.connect('database.sqlite') as conn:
-                # Получаем ID ресторана
-                restaurant_query = f"SELECT id FROM restaurants WHERE name = '{restaurant_name}'"
-                restaurant_df = pd.read_sql_query(restaurant_query, conn)
-                if restaurant_df.empty:
-                    return None
-                
-                restaurant_id = restaurant_df.iloc[0]['id']
-                
-                # Получаем исходные данные Grab
-                grab_query = f"""
-                SELECT 
-                    SUM(COALESCE(sales, 0)) as original_sales,
-                    SUM(COALESCE(orders, 0)) as original_orders,
-                    SUM(COALESCE(cancelled_orders, 0)) as cancelled_orders,
-                    SUM(COALESCE(ads_spend, 0)) as ads_spend,
-                    SUM(COALESCE(ads_sales, 0)) as ads_sales,
-                    SUM(COALESCE(payouts, 0)) as payouts,
-                    SUM(COALESCE(new_customers, 0)) as new_customers,
-                    SUM(COALESCE(repeated_customers, 0)) as repeated_customers,
-                    SUM(COALESCE(reactivated_customers, 0)) as reactivated_customers
-                FROM grab_stats
-                WHERE restaurant_id = {restaurant_id}
-                AND stat_date BETWEEN '{start_date}' AND '{end_date}'
-                """
-                grab_df = pd.read_sql_query(grab_query, conn)
-                
-                # Получаем исходные данные Gojek
-                gojek_query = f"""
-                SELECT 
-                    SUM(COALESCE(sales, 0)) as original_sales,
-                    SUM(COALESCE(orders, 0)) as original_orders,
-                    SUM(COALESCE(cancelled_orders, 0)) as cancelled_orders,
-                    SUM(COALESCE(potential_lost, 0)) as potential_lost,
-                    SUM(COALESCE(ads_spend, 0)) as ads_spend,
-                    SUM(COALESCE(ads_sales, 0)) as ads_sales,
-                    SUM(COALESCE(new_client, 0)) as new_clients,
-                    SUM(COALESCE(active_client, 0)) as active_clients,
-                    SUM(COALESCE(returned_client, 0)) as returned_clients
-                FROM gojek_stats
-                WHERE restaurant_id = {restaurant_id}
-                AND stat_date BETWEEN '{start_date}' AND '{end_date}'
-                """
-                gojek_df = pd.read_sql_query(gojek_query, conn)
-                
-                # Получаем фейковые заказы за период
-                fake_stats = self._get_fake_orders_for_period(restaurant_name, start_date, end_date)
-                
-                # Формируем результат
-                result = {
-                    'restaurant_name': restaurant_name,
-                    'period': f"{start_date} — {end_date}",
-                    
-                    # Grab данные
-                    'grab_original_orders': int(grab_df.iloc[0]['original_orders']) if not grab_df.empty else 0,
-                    'grab_original_sales': int(grab_df.iloc[0]['original_sales']) if not grab_df.empty else 0,
-                    'grab_cancelled_orders': int(grab_df.iloc[0]['cancelled_orders']) if not grab_df.empty else 0,
-                    'grab_fake_orders': fake_stats['grab_fake_orders'],
-                    'grab_fake_amount': fake_stats['grab_fake_amount'],
-                    
-                    # Gojek данные
-                    'gojek_original_orders': int(gojek_df.iloc[0]['original_orders']) if not gojek_df.empty else 0,
-                    'gojek_original_sales': int(gojek_df.iloc[0]['original_sales']) if not gojek_df.empty else 0,
-                    'gojek_cancelled_orders': int(gojek_df.iloc[0]['cancelled_orders']) if not gojek_df.empty else 0,
-                    'gojek_potential_lost': int(gojek_df.iloc[0]['potential_lost']) if not gojek_df.empty else 0,
-                    'gojek_fake_orders': fake_stats['gojek_fake_orders'],
-                    'gojek_fake_amount': fake_stats['gojek_fake_amount'],
-                    
-                    # Реклама
-                    'grab_ads_spend': int(grab_df.iloc[0]['ads_spend']) if not grab_df.empty else 0,
-                    'grab_ads_sales': int(grab_df.iloc[0]['ads_sales']) if not grab_df.empty else 0,
-                    'gojek_ads_spend': int(gojek_df.iloc[0]['ads_spend']) if not gojek_df.empty else 0,
-                    'gojek_ads_sales': int(gojek_df.iloc[0]['ads_sales']) if not gojek_df.empty else 0,
-                    
-                    # Выплаты
-                    'grab_payouts': int(grab_df.iloc[0]['payouts']) if not grab_df.empty else 0,
-                    
-                    # Клиенты
-                    'grab_new_customers': int(grab_df.iloc[0]['new_customers']) if not grab_df.empty else 0,
-                    'grab_repeated_customers': int(grab_df.iloc[0]['repeated_customers']) if not grab_df.empty else 0,
-                    'grab_reactivated_customers': int(grab_df.iloc[0]['reactivated_customers']) if not grab_df.empty else 0,
-                    'gojek_new_clients': int(gojek_df.iloc[0]['new_clients']) if not gojek_df.empty else 0,
-                    'gojek_active_clients': int(gojek_df.iloc[0]['active_clients']) if not gojek_df.empty else 0,
-                    'gojek_returned_clients': int(gojek_df.iloc[0]['returned_clients']) if not gojek_df.empty else 0,
-                }
-                
-                # Рассчитываем финальные (очищенные) данные
-                result['grab_final_orders'] = (result['grab_original_orders'] - 
-                                             result['grab_cancelled_orders'] - 
-                                             result['grab_fake_orders'])
-                result['gojek_final_orders'] = (result['gojek_original_orders'] - 
-                                              result['gojek_cancelled_orders'] - 
-                                              result['gojek_fake_orders'])
-                
-                result['grab_final_sales'] = result['grab_original_sales'] - result['grab_fake_amount']
-                result['gojek_final_sales'] = (result['gojek_original_sales'] - 
-                                             result['gojek_fake_amount'] - 
-                                             result['gojek_potential_lost'])
-                
-                # Итоговые данные
-                result['total_final_orders'] = result['grab_final_orders'] + result['gojek_final_orders']
-                result['total_final_sales'] = result['grab_final_sales'] + result['gojek_final_sales']
-                result['total_ads_spend'] = result['grab_ads_spend'] + result['gojek_ads_spend']
-                result['total_ads_sales'] = result['grab_ads_sales'] + result['gojek_ads_sales']
-                
-                # Средний чек
-                result['grab_avg_check'] = (result['grab_final_sales'] / result['grab_final_orders'] 
-                                          if result['grab_final_orders'] > 0 else 0)
-                result['gojek_avg_check'] = (result['gojek_final_sales'] / result['gojek_final_orders'] 
-                                           if result['gojek_final_orders'] > 0 else 0)
-                
-                # ROAS
-                result['grab_roas'] = (result['grab_ads_sales'] / result['grab_ads_spend'] 
-                                     if result['grab_ads_spend'] > 0 else 0)
-                result['gojek_roas'] = (result['gojek_ads_sales'] / result['gojek_ads_spend'] 
-                                      if result['gojek_ads_spend'] > 0 else 0)
-                
-                return result
-                
+            period = self._load_period(restaurant_name, start_date, end_date, period)
+            if period is None:
+                return None
+            
+            # Исходные данные Grab
+            grab = period.totals('grab', [
+                'sales', 'orders', 'cancelled_orders', 'ads_spend', 'ads_sales', 'payouts',
+                'new_customers', 'repeated_customers', 'reactivated_customers'
+            ])
+            grab_totals = {
+                'original_sales': grab['sales'],
+                'original_orders': grab['orders'],
+                'cancelled_orders': grab['cancelled_orders'],
+                'ads_spend': grab['ads_spend'],
+                'ads_sales': grab['ads_sales'],
+                'payouts': grab['payouts'],
+                'new_customers': grab['new_customers'],
+                'repeated_customers': grab['repeated_customers'],
+                'reactivated_customers': grab['reactivated_customers'],
+            }
+            
+            # Исходные данные Gojek
+            gojek = period.totals('gojek', [
+                'sales', 'orders', 'cancelled_orders', 'potential_lost', 'ads_spend', 'ads_sales',
+                'new_client', 'active_client', 'returned_client'
+            ])
+            gojek_totals = {
+                'original_sales': gojek['sales'],
+                'original_orders': gojek['orders'],
+                'cancelled_orders': gojek['cancelled_orders'],
+                'potential_lost': gojek['potential_lost'],
+                'ads_spend': gojek['ads_spend'],
+                'ads_sales': gojek['ads_sales'],
+                'new_clients': gojek['new_client'],
+                'active_clients': gojek['active_client'],
+                'returned_clients': gojek['returned_client'],
+            }
+            
+            # Получаем фейковые заказы за период
+            fake_stats = self._get_fake_orders_for_period(restaurant_name, start_date, end_date)
+            
+            # Формируем результат
+            result = {
+                'restaurant_name': restaurant_name,
+                'period': f"{start_date} — {end_date}",
+                
+                # Grab данные
+                'grab_original_orders': int(grab_totals['original_orders']),
+                'grab_original_sales': int(grab_totals['original_sales']),
+                'grab_cancelled_orders': int(grab_totals['cancelled_orders']),
+                'grab_fake_orders': fake_stats['grab_fake_orders'],
+                'grab_fake_amount': fake_stats['grab_fake_amount'],
+                
+                # Gojek данные
+                'gojek_original_orders': int(gojek_totals['original_orders']),
+                'gojek_original_sales': int(gojek_totals['original_sales']),
+                'gojek_cancelled_orders': int(gojek_totals['cancelled_orders']),
+                'gojek_potential_lost': int(gojek_totals['potential_lost']),
+                'gojek_fake_orders': fake_stats['gojek_fake_orders'],
+                'gojek_fake_amount': fake_stats['gojek_fake_amount'],
+                
+                # Реклама
+                'grab_ads_spend': int(grab_totals['ads_spend']),
+                'grab_ads_sales': int(grab_totals['ads_sales']),
+                'gojek_ads_spend': int(gojek_totals['ads_spend']),
+                'gojek_ads_sales': int(gojek_totals['ads_sales']),
+                
+                # Выплаты
+                'grab_payouts': int(grab_totals['payouts']),
+                
+                # Клиенты
+                'grab_new_customers': int(grab_totals['new_customers']),
+                'grab_repeated_customers': int(grab_totals['repeated_customers']),
+                'grab_reactivated_customers': int(grab_totals['reactivated_customers']),
+                'gojek_new_clients': int(gojek_totals['new_clients']),
+                'gojek_active_clients': int(gojek_totals['active_clients']),
+                'gojek_returned_clients': int(gojek_totals['returned_clients']),
+            }
+            
+            # Рассчитываем финальные (очищенные) данные
+            result['grab_final_orders'] = (result['grab_original_orders'] - 
+                                         result['grab_cancelled_orders'] - 
+                                         result['grab_fake_orders'])
+            result['gojek_final_orders'] = (result['gojek_original_orders'] - 
+                                          result['gojek_cancelled_orders'] - 
+                                          result['gojek_fake_orders'])
+            
+            result['grab_final_sales'] = result['grab_original_sales'] - result['grab_fake_amount']
+            result['gojek_final_sales'] = (result['gojek_original_sales'] - 
+                                         result['gojek_fake_amount'] - 
+                                         result['gojek_potential_lost'])
+            
+            # Итоговые данные
+            result['total_final_orders'] = result['grab_final_orders'] + result['gojek_final_orders']
+            result['total_final_sales'] = result['grab_final_sales'] + result['gojek_final_sales']
+            result['total_ads_spend'] = result['grab_ads_spend'] + result['gojek_ads_spend']
+            result['total_ads_sales'] = result['grab_ads_sales'] + result['gojek_ads_sales']
+            
+            # Средний чек
+            result['grab_avg_check'] = (result['grab_final_sales'] / result['grab_final_orders'] 
+                                      if result['grab_final_orders'] > 0 else 0)
+            result['gojek_avg_check'] = (result['gojek_final_sales'] / result['gojek_final_orders'] 
+                                       if result['gojek_final_orders'] > 0 else 0)
+            
+            # ROAS
+            result['grab_roas'] = (result['grab_ads_sales'] / result['grab_ads_spend'] 
+                                 if result['grab_ads_spend'] > 0 else 0)
+            result['gojek_roas'] = (result['gojek_ads_sales'] / result['gojek_ads_spend'] 
+                                  if result['gojek_ads_spend'] > 0 else 0)
+            
+            return result
+            
         except Exception as e:
             print(f"❌ Ошибка получения статистики: {e}")
             return None
@@ -871,14 +784,16 @@ class ProductionSalesAnalyzer:
             'gojek_fake_amount': gojek_fake_amount
         }
 
-    def generate_executive_summary(self, restaurant_name, start_date, end_date):
+    def generate_executive_summary(self, restaurant_name, start_date, end_date, period=None):
         """
         Генерирует правильное исполнительное резюме:
         - Общая выручка: исходные данные из базы
         - Детализация: с указанием fake orders
         - Метрики: за вычетом отмененных, потерянных и fake
         """
-        stats = self.get_period_statistics_with_corrections(restaurant_name, start_date, end_date)
+        # Один запрос на все разделы резюме
+        period = self._load_period(restaurant_name, start_date, end_date, period)
+        stats = self.get_period_statistics_with_corrections(restaurant_name, start_date, end_date, period=period)
         if not stats:
             return ["❌ Нет данных для генерации исполнительного резюме"]
         
@@ -964,27 +879,27 @@ class ProductionSalesAnalyzer:
         
         # Добавляем анализ продаж и трендов
         results.append("")
-        sales_trends = self._get_sales_trends_analysis(restaurant_name, start_date, end_date)
+        sales_trends = self._get_sales_trends_analysis(restaurant_name, start_date, end_date, period=period)
         results.extend(sales_trends)
         
         # Добавляем детальный анализ клиентской базы
         results.append("")
-        customer_analysis = self._get_customer_base_analysis(restaurant_name, start_date, end_date)
+        customer_analysis = self._get_customer_base_analysis(restaurant_name, start_date, end_date, period=period)
         results.extend(customer_analysis)
         
         # Добавляем маркетинговую эффективность и воронку
         results.append("")
-        marketing_analysis = self._get_marketing_effectiveness_analysis(restaurant_name, start_date, end_date)
+        marketing_analysis = self._get_marketing_effectiveness_analysis(restaurant_name, start_date, end_date, period=period)
         results.extend(marketing_analysis)
         
         # Добавляем финансовые показатели
         results.append("")
-        financial_metrics = self._get_financial_metrics(restaurant_name, start_date, end_date)
+        financial_metrics = self._get_financial_metrics(restaurant_name, start_date, end_date, period=period)
         results.extend(financial_metrics)
         
         # Добавляем операционные метрики
         results.append("")
-        operational_metrics = self._get_operational_metrics(restaurant_name, start_date, end_date)
+        operational_metrics = self._get_operational_metrics(restaurant_name, start_date, end_date, period=period)
         results.extend(operational_metrics)
         
         # Добавляем операционные сбои
@@ -1016,9 +931,9 @@ class ProductionSalesAnalyzer:
     def _get_average_rating(self, restaurant_name, start_date, end_date):
         """Получает средний рейтинг за период"""
         try:
-            with sqlite3.connect('database.sqlite') as conn:
-                restaurant_query = f"SELECT id FROM restaurants WHERE name = '{restaurant_name}'"
-                restaurant_df = pd.read_sql_query(restaurant_query, conn)
+            with get_connection() as conn:
+                restaurant_query = "SELECT id FROM restaurants WHERE name = ?"
+                restaurant_df = pd.read_sql_query(restaurant_query, conn, params=(restaurant_name,))
                 if restaurant_df.empty:
                     return 4.5
                 
@@ -1061,12 +976,12 @@ class ProductionSalesAnalyzer:
     def _get_operational_issues_analysis(self, restaurant_name, start_date, end_date):
         """Анализ операционных сбоев платформ"""
         try:
-            conn = sqlite3.connect('database.sqlite')
+            conn = get_connection()
             cursor = conn.cursor()
             
             # Получаем restaurant_id
-            restaurant_query = f"SELECT id FROM restaurants WHERE name = '{restaurant_name}'"
-            cursor.execute(restaurant_query)
+            restaurant_query = "SELECT id FROM restaurants WHERE name = ?"
+            cursor.execute(restaurant_query, (restaurant_name,))
             restaurant_result = cursor.fetchone()
             if not restaurant_result:
                 return []
@@ -1176,12 +1091,12 @@ class ProductionSalesAnalyzer:
     def _get_ratings_analysis(self, restaurant_name, start_date, end_date):
         """Анализ качества обслуживания и рейтингов"""
         try:
-            conn = sqlite3.connect('database.sqlite')
+            conn = get_connection()
             cursor = conn.cursor()
             
             # Получаем restaurant_id
-            restaurant_query = f"SELECT id FROM restaurants WHERE name = '{restaurant_name}'"
-            cursor.execute(restaurant_query)
+            restaurant_query = "SELECT id FROM restaurants WHERE name = ?"
+            cursor.execute(restaurant_query, (restaurant_name,))
             restaurant_result = cursor.fetchone()
             if not restaurant_result:
                 return []
@@ -1257,40 +1172,23 @@ class ProductionSalesAnalyzer:
         except Exception as e:
             return [f"❌ Ошибка анализа рейтингов: {e}"]
 
-    def _get_financial_metrics(self, restaurant_name, start_date, end_date):
+    def _get_financial_metrics(self, restaurant_name, start_date, end_date, period=None):
         """Получение финансовых показателей"""
         try:
-            conn = sqlite3.connect('database.sqlite')
-            cursor = conn.cursor()
-            
-            # Получаем restaurant_id
-            restaurant_query = f"SELECT id FROM restaurants WHERE name = '{restaurant_name}'"
-            cursor.execute(restaurant_query)
-            restaurant_result = cursor.fetchone()
-            if not restaurant_result:
+            period = self._load_period(restaurant_name, start_date, end_date, period)
+            if period is None:
                 return []
-                
-            restaurant_id = restaurant_result[0]
             
             results = []
             results.append("💳 ФИНАНСОВЫЕ ПОКАЗАТЕЛИ")
             results.append("──────────────────────────────────────────────────────────────────────────────")
             
             # Получаем выплаты
-            cursor.execute('''
-            SELECT SUM(payouts) FROM grab_stats 
-            WHERE restaurant_id = ? AND stat_date BETWEEN ? AND ?
-            ''', (restaurant_id, start_date, end_date))
-            grab_payouts = cursor.fetchone()[0] or 0
-            
-            cursor.execute('''
-            SELECT SUM(payouts) FROM gojek_stats 
-            WHERE restaurant_id = ? AND stat_date BETWEEN ? AND ?
-            ''', (restaurant_id, start_date, end_date))
-            gojek_payouts = cursor.fetchone()[0] or 0
+            grab_payouts = period.totals('grab', ['payouts'])['payouts']
+            gojek_payouts = period.totals('gojek', ['payouts'])['payouts']
             
             # Получаем статистику для ROAS
-            stats = self.get_period_statistics_with_corrections(restaurant_name, start_date, end_date)
+            stats = self.get_period_statistics_with_corrections(restaurant_name, start_date, end_date, period=period)
             
             results.append("💰 Выплаты:")
             results.append(f"├── 📱 GRAB: {grab_payouts:,} IDR")
@@ -1333,85 +1231,47 @@ class ProductionSalesAnalyzer:
             results.append(f"    ├── 🏛️ Комиссия платформы: {gojek_platform_commission:,} IDR ({gojek_platform_rate:.1f}%)")
             results.append(f"    └── 📈 Рекламный бюджет: {stats['gojek_ads_spend']:,} IDR ({gojek_ads_rate:.1f}%)")
             
-            conn.close()
             return results
             
         except Exception as e:
             return [f"❌ Ошибка получения финансовых показателей: {e}"]
     
-    def _get_operational_metrics(self, restaurant_name, start_date, end_date):
+    def _get_operational_metrics(self, restaurant_name, start_date, end_date, period=None):
         """Получение операционных метрик"""
         try:
-            conn = sqlite3.connect('database.sqlite')
-            cursor = conn.cursor()
-            
-            # Получаем restaurant_id
-            restaurant_query = f"SELECT id FROM restaurants WHERE name = '{restaurant_name}'"
-            cursor.execute(restaurant_query)
-            restaurant_result = cursor.fetchone()
-            if not restaurant_result:
+            period = self._load_period(restaurant_name, start_date, end_date, period)
+            if period is None:
                 return []
-                
-            restaurant_id = restaurant_result[0]
             
             results = []
             results.append("⏰ ОПЕРАЦИОННЫЕ МЕТРИКИ")
             results.append("──────────────────────────────────────────────────────────────────────────────")
             
-            # GRAB метрики (driver_waiting_time это JSON)
-            cursor.execute('''
-            SELECT driver_waiting_time FROM grab_stats 
-            WHERE restaurant_id = ? AND stat_date BETWEEN ? AND ?
-            AND driver_waiting_time IS NOT NULL AND driver_waiting_time != ''
-            ''', (restaurant_id, start_date, end_date))
-            grab_waiting_results = cursor.fetchall()
-            
-            # Парсим JSON и получаем среднее время ожидания GRAB
-            grab_waiting_times = []
-            for row in grab_waiting_results:
-                try:
-                    import json
-                    if row[0]:
-                        data = json.loads(row[0])
-                        if isinstance(data, dict) and 'min' in data:
-                            grab_waiting_times.append(float(data['min']))
-                        elif isinstance(data, (int, float)):
-                            grab_waiting_times.append(float(data))
-                except:
-                    continue
+            # GRAB метрики (driver_waiting_time это JSON) - среднее время ожидания
+            grab_waiting_times = [
+                minutes for minutes in period.grab['driver_waiting_time'].map(driver_waiting_to_minutes)
+                if minutes is not None and not pd.isna(minutes)
+            ]
             
             grab_waiting = sum(grab_waiting_times) / len(grab_waiting_times) if grab_waiting_times else 0
             
             # GOJEK метрики (время в формате TIME: HH:MM:SS, driver_waiting в минутах)
-            cursor.execute('''
-            SELECT preparation_time, delivery_time, driver_waiting 
-            FROM gojek_stats 
-            WHERE restaurant_id = ? AND stat_date BETWEEN ? AND ?
-            AND preparation_time IS NOT NULL
-            ''', (restaurant_id, start_date, end_date))
-            gojek_results = cursor.fetchall()
+            gojek_rows = period.gojek
+            gojek_rows = gojek_rows[gojek_rows['preparation_time'].notna()]
             
             gojek_prep_times = []
             gojek_delivery_times = []
             gojek_waiting_times = []
             
-            for row in gojek_results:
-                try:
-                    # Парсим TIME поля (HH:MM:SS -> минуты)
-                    if row[0]:  # preparation_time
-                        prep_parts = str(row[0]).split(':')
-                        prep_minutes = int(prep_parts[0]) * 60 + int(prep_parts[1]) + int(prep_parts[2]) / 60
-                        gojek_prep_times.append(prep_minutes)
-                    
-                    if row[1]:  # delivery_time  
-                        del_parts = str(row[1]).split(':')
-                        del_minutes = int(del_parts[0]) * 60 + int(del_parts[1]) + int(del_parts[2]) / 60
-                        gojek_delivery_times.append(del_minutes)
-                    
-                    if row[2] is not None:  # driver_waiting (уже в минутах)
-                        gojek_waiting_times.append(float(row[2]))
-                except:
-                    continue
+            for prep_time, delivery_time, driver_waiting in zip(
+                    gojek_rows['preparation_time'], gojek_rows['delivery_time'], gojek_rows['driver_waiting']):
+                # Парсим TIME поля (HH:MM:SS -> минуты)
+                if prep_time:
+                    gojek_prep_times.append(time_to_minutes(prep_time))
+                if delivery_time and not pd.isna(delivery_time):
+                    gojek_delivery_times.append(time_to_minutes(delivery_time))
+                if driver_waiting is not None and not pd.isna(driver_waiting):  # уже в минутах
+                    gojek_waiting_times.append(float(driver_waiting))
             
             gojek_prep = sum(gojek_prep_times) / len(gojek_prep_times) if gojek_prep_times else 0
             gojek_delivery = sum(gojek_delivery_times) / len(gojek_delivery_times) if gojek_delivery_times else 0
@@ -1427,7 +1287,7 @@ class ProductionSalesAnalyzer:
             results.append("")
             
             # Добавляем операционную эффективность (отмененные заказы и потери)
-            stats = self.get_period_statistics_with_corrections(restaurant_name, start_date, end_date)
+            stats = self.get_period_statistics_with_corrections(restaurant_name, start_date, end_date, period=period)
             
             results.append("⚠️ ОПЕРАЦИОННАЯ ЭФФЕКТИВНОСТЬ:")
             results.append("🚫 Отмененные заказы:")
@@ -1450,58 +1310,25 @@ class ProductionSalesAnalyzer:
             total_sales = stats['grab_final_sales'] + stats['gojek_final_sales']
             results.append(f"└── 📊 Общие потери: {total_losses:,.0f} IDR ({total_losses/total_sales*100:.2f}% от выручки)")
             
-            conn.close()
             return results
             
         except Exception as e:
             return [f"❌ Ошибка получения операционных метрик: {e}"]
 
-    def _get_sales_trends_analysis(self, restaurant_name, start_date, end_date):
+    def _get_sales_trends_analysis(self, restaurant_name, start_date, end_date, period=None):
         """Анализ продаж и трендов"""
         try:
-            conn = sqlite3.connect('database.sqlite')
-            cursor = conn.cursor()
-            
-            # Получаем restaurant_id
-            restaurant_query = f"SELECT id FROM restaurants WHERE name = '{restaurant_name}'"
-            cursor.execute(restaurant_query)
-            restaurant_result = cursor.fetchone()
-            if not restaurant_result:
+            period = self._load_period(restaurant_name, start_date, end_date, period)
+            if period is None:
                 return []
-                
-            restaurant_id = restaurant_result[0]
             
             results = []
             results.append("📈 2. АНАЛИЗ ПРОДАЖ И ТРЕНДОВ")
             results.append("----------------------------------------")
             
-            # Получаем продажи по дням (объединяем GRAB и GOJEK по датам)
-            cursor.execute('''
-            SELECT 
-                stat_date,
-                SUM(grab_sales + gojek_sales) as daily_total
-            FROM (
-                SELECT 
-                    stat_date,
-                    SUM(sales) as grab_sales,
-                    0 as gojek_sales
-                FROM grab_stats 
-                WHERE restaurant_id = ? AND stat_date BETWEEN ? AND ?
-                GROUP BY stat_date
-                UNION ALL
-                SELECT 
-                    stat_date,
-                    0 as grab_sales,
-                    SUM(sales) as gojek_sales
-                FROM gojek_stats 
-                WHERE restaurant_id = ? AND stat_date BETWEEN ? AND ?
-                GROUP BY stat_date
-            ) combined
-            GROUP BY stat_date
-            ORDER BY stat_date
-            ''', (restaurant_id, start_date, end_date, restaurant_id, start_date, end_date))
-            
-            daily_data = cursor.fetchall()
+            # Продажи по дням (объединяем GRAB и GOJEK по датам)
+            daily = period.daily_sales()
+            daily_data = list(zip(daily['stat_date'], daily['daily_total'].tolist()))
             
             # Группируем по месяцам
             from datetime import datetime
@@ -1570,8 +1397,13 @@ class ProductionSalesAnalyzer:
             results.append(f"📊 АНАЛИЗ РАБОЧИХ ДНЕЙ ({days_count} дней):")
             results.append(f"🏆 Лучший день: {best_day[0]} - {best_day[1]:,} IDR")
             
+            # ML анализ лучшего и худшего дня - параллельно в пуле ML задач
+            best_day_task = self._submit_ml_factors(restaurant_name, best_day[0])
+            worst_day_task = self._submit_ml_factors(restaurant_name, worst_day[0])
+
             # ML анализ факторов лучшего дня
-            best_day_ml_analysis = self._get_ml_factors_analysis(restaurant_name, best_day[0], is_good_day=True)
+            best_day_ml_analysis = self._get_ml_factors_analysis(restaurant_name, best_day[0], is_good_day=True,
+                                                                 task=best_day_task)
             if best_day_ml_analysis:
                 results.append("   🔍 Факторы успеха:")
                 results.extend(best_day_ml_analysis)
@@ -1580,7 +1412,8 @@ class ProductionSalesAnalyzer:
             results.append(f"📉 Худший день: {worst_day[0]} - {worst_day[1]:,} IDR")
             
             # ML анализ факторов худшего дня
-            worst_day_ml_analysis = self._get_ml_factors_analysis(restaurant_name, worst_day[0], is_good_day=False)
+            worst_day_ml_analysis = self._get_ml_factors_analysis(restaurant_name, worst_day[0], is_good_day=False,
+                                                                  task=worst_day_task)
             if worst_day_ml_analysis:
                 results.append("   🔍 Причины падения:")
                 results.extend(worst_day_ml_analysis)
@@ -1590,66 +1423,39 @@ class ProductionSalesAnalyzer:
             results.append(f"📈 Средние продажи: {avg_sales:,.0f} IDR/день")
             results.append(f"📊 Коэффициент вариации: {cv:.1f}% (стабильность продаж)")
             
-            conn.close()
             return results
             
         except Exception as e:
             return [f"❌ Ошибка анализа продаж и трендов: {e}"]
 
-    def _get_customer_base_analysis(self, restaurant_name, start_date, end_date):
+    def _get_customer_base_analysis(self, restaurant_name, start_date, end_date, period=None):
         """Детальный анализ клиентской базы"""
         try:
-            conn = sqlite3.connect('database.sqlite')
-            cursor = conn.cursor()
-            
-            # Получаем restaurant_id
-            restaurant_query = f"SELECT id FROM restaurants WHERE name = '{restaurant_name}'"
-            cursor.execute(restaurant_query)
-            restaurant_result = cursor.fetchone()
-            if not restaurant_result:
+            period = self._load_period(restaurant_name, start_date, end_date, period)
+            if period is None:
                 return []
-                
-            restaurant_id = restaurant_result[0]
             
             results = []
             results.append("👥 3. ДЕТАЛЬНЫЙ АНАЛИЗ КЛИЕНТСКОЙ БАЗЫ")
             results.append("----------------------------------------")
             
             # GRAB клиенты
-            cursor.execute('''
-            SELECT 
-                SUM(new_customers) as new_customers,
-                SUM(repeated_customers) as repeated_customers, 
-                SUM(reactivated_customers) as reactivated_customers,
-                SUM(earned_new_customers) as earned_new,
-                SUM(earned_repeated_customers) as earned_repeated,
-                SUM(earned_reactivated_customers) as earned_reactivated
-            FROM grab_stats 
-            WHERE restaurant_id = ? AND stat_date BETWEEN ? AND ?
-            ''', (restaurant_id, start_date, end_date))
-            
-            grab_result = cursor.fetchone()
-            grab_new = grab_result[0] or 0
-            grab_repeat = grab_result[1] or 0
-            grab_react = grab_result[2] or 0
-            grab_new_earned = grab_result[3] or 0
-            grab_repeat_earned = grab_result[4] or 0
-            grab_react_earned = grab_result[5] or 0
+            grab_result = period.totals('grab', [
+                'new_customers', 'repeated_customers', 'reactivated_customers',
+                'earned_new_customers', 'earned_repeated_customers', 'earned_reactivated_customers'
+            ])
+            grab_new = grab_result['new_customers']
+            grab_repeat = grab_result['repeated_customers']
+            grab_react = grab_result['reactivated_customers']
+            grab_new_earned = grab_result['earned_new_customers']
+            grab_repeat_earned = grab_result['earned_repeated_customers']
+            grab_react_earned = grab_result['earned_reactivated_customers']
             
             # GOJEK клиенты
-            cursor.execute('''
-            SELECT 
-                SUM(new_client) as new_clients,
-                SUM(active_client) as active_clients,
-                SUM(returned_client) as returned_clients
-            FROM gojek_stats 
-            WHERE restaurant_id = ? AND stat_date BETWEEN ? AND ?
-            ''', (restaurant_id, start_date, end_date))
-            
-            gojek_result = cursor.fetchone()
-            gojek_new = gojek_result[0] or 0
-            gojek_active = gojek_result[1] or 0
-            gojek_returned = gojek_result[2] or 0
+            gojek_result = period.totals('gojek', ['new_client', 'active_client', 'returned_client'])
+            gojek_new = gojek_result['new_client']
+            gojek_active = gojek_result['active_client']
+            gojek_returned = gojek_result['returned_client']
             
             # Общая статистика
             total_new = grab_new + gojek_new
@@ -1681,70 +1487,44 @@ class ProductionSalesAnalyzer:
             results.append("")
             
             # Приобретение новых клиентов по месяцам
-            cursor.execute('''
-            SELECT 
-                strftime('%Y-%m', stat_date) as month,
-                SUM(grab_new + gojek_new) as monthly_new
-            FROM (
-                SELECT stat_date, new_customers as grab_new, 0 as gojek_new FROM grab_stats 
-                WHERE restaurant_id = ? AND stat_date BETWEEN ? AND ?
-                UNION ALL
-                SELECT stat_date, 0 as grab_new, new_client as gojek_new FROM gojek_stats 
-                WHERE restaurant_id = ? AND stat_date BETWEEN ? AND ?
-            ) monthly
-            GROUP BY month
-            ORDER BY month
-            ''', (restaurant_id, start_date, end_date, restaurant_id, start_date, end_date))
-            
-            monthly_new = cursor.fetchall()
+            grab_monthly_new = period.monthly_totals('grab', ['new_customers'])
+            gojek_monthly_new = period.monthly_totals('gojek', ['new_client'])
+            monthly_new = [
+                (month,
+                 grab_monthly_new.get(month, {}).get('new_customers', 0) +
+                 gojek_monthly_new.get(month, {}).get('new_client', 0))
+                for month in sorted(set(grab_monthly_new) | set(gojek_monthly_new))
+            ]
             results.append("📈 Приобретение новых клиентов по месяцам:")
             for month, new_count in monthly_new:
                 month_name = 'Апрель' if month == '2025-04' else 'Май'
                 results.append(f"  {month_name}: {new_count:,} новых клиентов")
             
-            conn.close()
             return results
             
         except Exception as e:
             return [f"❌ Ошибка анализа клиентской базы: {e}"]
 
-    def _get_marketing_effectiveness_analysis(self, restaurant_name, start_date, end_date):
+    def _get_marketing_effectiveness_analysis(self, restaurant_name, start_date, end_date, period=None):
         """Анализ маркетинговой эффективности и воронки"""
         try:
-            conn = sqlite3.connect('database.sqlite')
-            cursor = conn.cursor()
-            
-            # Получаем restaurant_id
-            restaurant_query = f"SELECT id FROM restaurants WHERE name = '{restaurant_name}'"
-            cursor.execute(restaurant_query)
-            restaurant_result = cursor.fetchone()
-            if not restaurant_result:
+            period = self._load_period(restaurant_name, start_date, end_date, period)
+            if period is None:
                 return []
-                
-            restaurant_id = restaurant_result[0]
             
             results = []
             results.append("📈 4. МАРКЕТИНГОВАЯ ЭФФЕКТИВНОСТЬ И ВОРОНКА")
             results.append("----------------------------------------")
             
             # GRAB маркетинговая воронка
-            cursor.execute('''
-            SELECT 
-                SUM(impressions) as total_impressions,
-                SUM(unique_menu_visits) as menu_visits,
-                SUM(unique_add_to_carts) as add_to_carts,
-                SUM(ads_orders) as ads_orders,
-                SUM(ads_spend) as ads_spend
-            FROM grab_stats 
-            WHERE restaurant_id = ? AND stat_date BETWEEN ? AND ?
-            ''', (restaurant_id, start_date, end_date))
-            
-            grab_funnel = cursor.fetchone()
-            impressions = grab_funnel[0] or 0
-            menu_visits = grab_funnel[1] or 0
-            add_to_carts = grab_funnel[2] or 0
-            ads_orders = grab_funnel[3] or 0
-            ads_spend = grab_funnel[4] or 0
+            grab_funnel = period.totals('grab', [
+                'impressions', 'unique_menu_visits', 'unique_add_to_carts', 'ads_orders', 'ads_spend', 'ads_sales'
+            ])
+            impressions = grab_funnel['impressions']
+            menu_visits = grab_funnel['unique_menu_visits']
+            add_to_carts = grab_funnel['unique_add_to_carts']
+            ads_orders = grab_funnel['ads_orders']
+            ads_spend = grab_funnel['ads_spend']
             
             results.append("📊 Маркетинговая воронка (только GRAB - GOJEK не предоставляет данные воронки):")
             results.append(f"  👁️ Показы рекламы: {impressions:,}")
@@ -1788,16 +1568,11 @@ class ProductionSalesAnalyzer:
                         
                         # Анализ потенциала улучшений
                         if ads_orders > 0:
-                            # Получаем среднюю стоимость заказа для расчета потенциала
-                            cursor.execute('''
-                            SELECT SUM(ads_sales) / SUM(ads_orders) as avg_order_value
-                            FROM grab_stats 
-                            WHERE restaurant_id = ? AND stat_date BETWEEN ? AND ?
-                            AND ads_orders > 0
-                            ''', (restaurant_id, start_date, end_date))
-                            
-                            avg_order_result = cursor.fetchone()
-                            avg_order_value = avg_order_result[0] if avg_order_result and avg_order_result[0] else 0
+                            # Средняя стоимость заказа для расчета потенциала (дни с рекламными заказами)
+                            grab_rows = period.grab
+                            with_ads = grab_rows[pd.to_numeric(grab_rows['ads_orders'], errors='coerce') > 0]
+                            ads_orders_sum = with_ads['ads_orders'].sum()
+                            avg_order_value = with_ads['ads_sales'].sum() / ads_orders_sum if ads_orders_sum else 0
                             
                             if avg_order_value > 0:
                                 # Потенциал от снижения bounce на 10%
@@ -1812,10 +1587,7 @@ class ProductionSalesAnalyzer:
                                 results.append(f"  • 🎯 Общий потенциал: +{potential_from_bounce + potential_from_abandon:,.0f} IDR")
                                 
                                 # Процент от текущих продаж
-                                current_sales = cursor.execute('''
-                                SELECT SUM(ads_sales) FROM grab_stats 
-                                WHERE restaurant_id = ? AND stat_date BETWEEN ? AND ?
-                                ''', (restaurant_id, start_date, end_date)).fetchone()[0] or 0
+                                current_sales = grab_funnel['ads_sales']
                                 
                                 if current_sales > 0:
                                     improvement_percent = ((potential_from_bounce + potential_from_abandon) / current_sales * 100)
@@ -1835,35 +1607,11 @@ class ProductionSalesAnalyzer:
             # ROAS по месяцам
             results.append("🎯 ROAS по месяцам (GRAB + GOJEK):")
             
-            # GRAB по месяцам
-            cursor.execute('''
-            SELECT 
-                strftime('%Y-%m', stat_date) as month,
-                SUM(ads_sales) as monthly_ads_sales,
-                SUM(ads_spend) as monthly_ads_spend
-            FROM grab_stats 
-            WHERE restaurant_id = ? AND stat_date BETWEEN ? AND ?
-            GROUP BY strftime('%Y-%m', stat_date)
-            ORDER BY month
-            ''', (restaurant_id, start_date, end_date))
-            
-            grab_monthly = cursor.fetchall()
-            grab_dict = {month: (sales, spend) for month, sales, spend in grab_monthly}
-            
-            # GOJEK по месяцам
-            cursor.execute('''
-            SELECT 
-                strftime('%Y-%m', stat_date) as month,
-                SUM(ads_sales) as monthly_ads_sales,
-                SUM(ads_spend) as monthly_ads_spend
-            FROM gojek_stats 
-            WHERE restaurant_id = ? AND stat_date BETWEEN ? AND ?
-            GROUP BY strftime('%Y-%m', stat_date)
-            ORDER BY month
-            ''', (restaurant_id, start_date, end_date))
-            
-            gojek_monthly = cursor.fetchall()
-            gojek_dict = {month: (sales, spend) for month, sales, spend in gojek_monthly}
+            # GRAB и GOJEK по месяцам
+            grab_dict = {month: (row['ads_sales'], row['ads_spend'])
+                         for month, row in period.monthly_totals('grab', ['ads_sales', 'ads_spend']).items()}
+            gojek_dict = {month: (row['ads_sales'], row['ads_spend'])
+                          for month, row in period.monthly_totals('gojek', ['ads_sales', 'ads_spend']).items()}
             
             # Объединяем и выводим результаты
             for month in ['2025-04', '2025-05']:
@@ -1882,111 +1630,94 @@ class ProductionSalesAnalyzer:
                 results.append(f"    📱 GRAB: {grab_roas:.2f}x (продажи: {grab_sales:,} / бюджет: {grab_spend:,.0f})")
                 results.append(f"    🛵 GOJEK: {gojek_roas:.2f}x (продажи: {gojek_sales:,} / бюджет: {gojek_spend:,.0f})")
             
-            conn.close()
             return results
             
         except Exception as e:
             return [f"❌ Ошибка анализа маркетинговой эффективности: {e}"]
 
-    def _get_ml_factors_analysis(self, restaurant_name, target_date, is_good_day=True):
+    def _get_ml_factors_analysis(self, restaurant_name, target_date, is_good_day=True, task=None):
         """
         НАСТОЯЩИЙ ML анализ факторов используя UltimateCompleteMLSystem + SHAP
         Анализирует ПРИЧИНЫ изменений продаж, а не тривиальные корреляции
+
+        При таймауте или ошибке ML - быстрый детективный анализ дня
+        """
+        factors, note = self._run_ml_factors(restaurant_name, target_date, task)
+        if factors is not None:
+            return factors + [note]
+
+        day_data = self._get_day_data(restaurant_name, target_date)
+        if not day_data:
+            return [note]
+        return [note] + [f"      {factor}" for factor in
+                         self._get_quick_detective_analysis(restaurant_name, target_date, day_data)]
+
+    def _submit_ml_factors(self, restaurant_name, target_date):
+        """Ставит ML анализ дня в пул ML задач (с дедлайном ML_TIMEOUT_SEC)"""
+        print(f"🤖 Запуск НАСТОЯЩЕГО ML анализа для {target_date}...")
+        return submit_ml(self._ml_factors_work, restaurant_name, target_date)
+
+    def _run_ml_factors(self, restaurant_name, target_date, task=None):
+        """
+        Ждет ML анализ дня в пределах дедлайна
+
+        Returns:
+            (строки ML факторов, строка о времени) или (None, причина отказа)
         """
+        task = task or self._submit_ml_factors(restaurant_name, target_date)
         try:
-            # Таймаут для избежания зависаний
-            import signal
-            
-            def timeout_handler(signum, frame):
-                raise TimeoutError("ML анализ превысил лимит времени")
-            
-            signal.signal(signal.SIGALRM, timeout_handler)
-            signal.alarm(30)  # 30 секунд максимум
-            print(f"🤖 Запуск НАСТОЯЩЕГО ML анализа для {target_date}...")
-            
-            # Используем полную ML систему
-            import sys
-            import os
-            sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-            from ml_models.ultimate_complete_ml_system import UltimateCompleteMLSystem
-            
-            ml_system = UltimateCompleteMLSystem()
-            
-            # Проверяем есть ли сохраненная модель
-            if not ml_system.trained_model:
-                # Пытаемся загрузить сохраненную модель
-                try:
-                    ml_system.load_model()
-                    print("✅ Загружена сохраненная ML модель")
-                except:
-                    print("🧠 Быстрое обучение ML модели (один раз)...")
-                    dataset = ml_system.build_ultimate_dataset()
-                    success = ml_system.train_ultimate_model(dataset)
-                    
-                    if not success:
-                        return ["      ❌ Не удалось обучить ML модель"]
-                    
-                    # Сохраняем модель для повторного использования
-                    try:
-                        ml_system.save_model()
-                        print("💾 ML модель сохранена")
-                    except:
-                        print("⚠️ Не удалось сохранить ML модель")
-            
-            # Получаем данные за целевую дату
-            target_data = self._get_ml_day_data(restaurant_name, target_date)
-            
-            if not target_data:
-                return ["      ❌ Нет данных для ML анализа"]
-            
-            # Готовим данные для SHAP анализа
-            feature_vector = self._prepare_ml_features(target_data, ml_system)
-            
-            if feature_vector is None:
-                return ["      ❌ Не удалось подготовить данные для ML"]
-            
-            # Упрощенный ML анализ без SHAP (пока SHAP не работает стабильно)
-            try:
-                # Используем feature importance из Random Forest
-                if hasattr(ml_system.trained_model, 'feature_importances_'):
-                    feature_names = ['grab_sales', 'gojek_sales', 'grab_orders', 'gojek_orders', 'grab_rating', 'gojek_rating', 'grab_ads_spend', 'gojek_ads_spend']
-                    importances = ml_system.trained_model.feature_importances_
-                    
-                    # Создаем список важности факторов
-                    factor_importance = list(zip(feature_names, importances))
-                    factor_importance.sort(key=lambda x: x[1], reverse=True)
-                    
-                    results = []
-                    results.append("      🤖 **ML АНАЛИЗ (упрощенный):**")
-                    
-                    # Показываем топ-3 наиболее важных фактора
-                    for i, (feature, importance) in enumerate(factor_importance[:3], 1):
-                        readable_name = self._format_feature_name(feature)
-                        percentage = importance * 100
-                        results.append(f"      {i}. **{readable_name}**: {percentage:.1f}% важности")
-                    
-                    # Добавляем простые выводы на основе данных дня
-                    results.extend(self._get_simple_ml_conclusions(target_data))
-                else:
-                    return ["      ❌ ML модель не поддерживает анализ важности"]
-                    
-            except Exception as e:
-                print(f"❌ Ошибка упрощенного ML анализа: {e}")
-                return ["      ❌ ML анализ временно недоступен"]
-            
-            # Отключаем таймаут
-            signal.alarm(0)
-            return results if results else ["      💡 Факторы в пределах нормы"]
-            
-        except TimeoutError:
-            signal.alarm(0)
-            print("⏰ ML анализ превысил лимит времени (30 сек)")
-            return ["      ⏰ ML анализ превысил лимит времени - используется базовый анализ"]
+            factors, elapsed = task.result()
+        except MLTimeoutError:
+            print(f"⏰ ML анализ {target_date} превысил лимит времени ({task.deadline.timeout:.0f} сек)")
+            return None, (f"      ⏰ ML анализ превысил лимит времени ({task.deadline.timeout:.0f} сек) "
+                          f"- используется базовый анализ")
         except Exception as e:
-            signal.alarm(0)
             print(f"❌ Ошибка НАСТОЯЩЕГО ML анализа: {e}")
-            return [f"      ❌ ML анализ недоступен: {e}"]
-    
+            return None, f"      ❌ ML анализ недоступен: {e} - используется базовый анализ"
+        return factors, f"      ⏱️ ML анализ: {elapsed:.1f} сек"
+
+    def _ml_factors_work(self, deadline, restaurant_name, target_date):
+        """ML анализ дня в потоке пула; ошибки - исключениями, между шагами - точки отмены"""
+        # Общая для процесса модель из реестра. Обучение здесь не запускаем: его не
+        # прервать дедлайном, и оно держит общую блокировку модели для всех запросов
+        from src.ml_models.ultimate_complete_ml_system import get_ultimate_system
+
+        ml_system = get_ultimate_system(train_if_missing=False)
+        if ml_system is None:
+            raise RuntimeError("ML модель не обучена (python src/ml_models/ultimate_complete_ml_system.py)")
+        deadline.check()
+
+        # Получаем данные за целевую дату
+        target_data = self._get_ml_day_data(restaurant_name, target_date)
+        if not target_data:
+            raise RuntimeError("нет данных для ML анализа")
+        deadline.check()
+
+        # Готовим данные для SHAP анализа
+        feature_vector = self._prepare_ml_features(target_data, ml_system)
+        if feature_vector is None:
+            raise RuntimeError("не удалось подготовить данные для ML")
+
+        # Упрощенный ML анализ без SHAP (пока SHAP не работает стабильно):
+        # feature importance из Random Forest
+        if not hasattr(ml_system.trained_model, 'feature_importances_'):
+            raise RuntimeError("ML модель не поддерживает анализ важности")
+
+        # Схема признаков из реестра - в порядке обучения модели
+        factor_importance = list(zip(ml_system.feature_names, ml_system.trained_model.feature_importances_))
+        factor_importance.sort(key=lambda x: x[1], reverse=True)
+
+        results = ["      🤖 **ML АНАЛИЗ (упрощенный):**"]
+
+        # Показываем топ-3 наиболее важных фактора
+        for i, (feature, importance) in enumerate(factor_importance[:3], 1):
+            readable_name = self._format_feature_name(feature)
+            results.append(f"      {i}. **{readable_name}**: {importance * 100:.1f}% важности")
+
+        # Добавляем простые выводы на основе данных дня
+        results.extend(self._get_simple_ml_conclusions(target_data))
+        return results
+
     def _get_quick_detective_analysis(self, restaurant_name, target_date, day_data):
         """Быстрый детективный анализ без ML как в README"""
         factors = []
@@ -2181,7 +1912,7 @@ class ProductionSalesAnalyzer:
     def _get_ml_day_data(self, restaurant_name, target_date):
         """Получает данные за конкретный день для ML анализа"""
         try:
-            conn = sqlite3.connect('database.sqlite')
+            conn = get_connection()
             cursor = conn.cursor()
             
             # Получаем ID ресторана
@@ -2310,13 +2041,11 @@ class ProductionSalesAnalyzer:
     def _get_shap_explanations(self, feature_vector, ml_system):
         """Получает SHAP объяснения для вектора признаков"""
         try:
-            import shap
-            
-            # Создаем SHAP explainer
-            explainer = shap.TreeExplainer(ml_system.trained_model)
+            from src.ml_models.shap_explainer import explain_batch
             
-            # Получаем SHAP values
-            shap_values = explainer.shap_values(feature_vector)
+            # SHAP explainer строится один раз на версию модели (кеш процесса)
+            shap_values = explain_batch(ml_system.trained_model, feature_vector,
+                                        version=getattr(ml_system, 'model_version', None))
             
             # Получаем имена признаков
             feature_names = list(ml_system.ultimate_feature_importance.keys())
@@ -2409,54 +2138,48 @@ class ProductionSalesAnalyzer:
             pass
         return 0
     
+    def _get_restaurant_coordinates(self, restaurant_name):
+        """Координаты ресторана (Denpasar, Bali если не найдены)"""
+        with get_connection() as conn:
+            restaurant_query = "SELECT latitude, longitude FROM restaurants WHERE name = ?"
+            restaurant_df = pd.read_sql_query(restaurant_query, conn, params=(restaurant_name,))
+        
+        if restaurant_df.empty:
+            return -8.6500, 115.2200
+        
+        lat = restaurant_df.iloc[0]['latitude']
+        lng = restaurant_df.iloc[0]['longitude']
+        
+        # Fallback если координаты пустые
+        if pd.isna(lat) or pd.isna(lng):
+            return -8.6500, 115.2200
+        return lat, lng
+    
+    def _prefetch_weather(self, restaurant_name, start_date, end_date):
+        """Загружает погоду за весь период одним запросом в локальное хранилище"""
+        try:
+            lat, lng = self._get_restaurant_coordinates(restaurant_name)
+            get_weather_store().prefetch(lat, lng, start_date, end_date)
+        except Exception:
+            pass
+    
     def _get_weather_data(self, restaurant_name, date_str):
-        """Получает РЕАЛЬНЫЕ погодные данные через Open-Meteo API"""
+        """Получает РЕАЛЬНЫЕ погодные данные Open-Meteo (через локальное хранилище)"""
         try:
-            import requests
-            import sqlite3
+            lat, lng = self._get_restaurant_coordinates(restaurant_name)
             
-            # Получаем координаты ресторана
-            with sqlite3.connect('database.sqlite') as conn:
-                restaurant_query = f"SELECT latitude, longitude FROM restaurants WHERE name = '{restaurant_name}'"
-                restaurant_df = pd.read_sql_query(restaurant_query, conn)
-                
-                if restaurant_df.empty:
-                    # Default координаты Denpasar, Bali если ресторан не найден
-                    lat, lng = -8.6500, 115.2200
-                else:
-                    lat = restaurant_df.iloc[0]['latitude']
-                    lng = restaurant_df.iloc[0]['longitude']
-                    
-                    # Fallback если координаты пустые
-                    if pd.isna(lat) or pd.isna(lng):
-                        lat, lng = -8.6500, 115.2200
-            
-            # РЕАЛЬНЫЙ запрос к Open-Meteo API
-            url = "https://archive-api.open-meteo.com/v1/archive"
-            params = {
-                'latitude': lat,
-                'longitude': lng,
-                'start_date': date_str,
-                'end_date': date_str,
-                'daily': 'temperature_2m_mean,precipitation_sum,wind_speed_10m_max',
-                'timezone': 'Asia/Jakarta',
-                'elevation': 0  # КРИТИЧНО: уровень моря для правильной температуры
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
+            # HTTP только при промахе хранилища
+            daily = get_weather_store().get_day(lat, lng, date_str)
             
-            if response.status_code == 200:
-                data = response.json()
-                daily = data.get('daily', {})
-                
-                temp = daily.get('temperature_2m_mean', [None])[0]
-                precipitation = daily.get('precipitation_sum', [None])[0]
-                wind = daily.get('wind_speed_10m_max', [None])[0]
+            if daily:
+                temp = daily['temperature_mean']
+                precipitation = daily['precipitation_sum']
+                wind = daily['wind_speed_max']
                 
                 return {
-                    'precipitation': precipitation if precipitation is not None else 0,
-                    'temperature': temp if temp is not None else 27,
-                    'wind_speed': wind if wind is not None else 5
+                    'precipitation': precipitation if pd.notna(precipitation) else 0,
+                    'temperature': temp if pd.notna(temp) else 27,
+                    'wind_speed': wind if pd.notna(wind) else 5
                 }
             else:
                 # Fallback если API недоступен
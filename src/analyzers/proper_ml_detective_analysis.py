@@ -24,6 +24,17 @@ import shap
 import warnings
 warnings.filterwarnings('ignore')
 
+# Общий пул read-only подключений к SQLite
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from src.utils.db_pool import get_connection
+from src.utils.weather_store import get_weather_store
+from src.utils.calendar_dimension import join_calendar, MONTHLY_TOURISTS_2024
+
+# Координаты для погоды (центр Бали)
+BALI_LAT, BALI_LON = -8.4095, 115.1889
+
 class ProperMLDetectiveAnalysis:
     def __init__(self):
         self.model = None
@@ -35,7 +46,7 @@ class ProperMLDetectiveAnalysis:
         
         print("🌍 ЗАГРУЖАЕМ РЕАЛЬНЫЕ ВНЕШНИЕ ФАКТОРЫ...")
         
-        conn = sqlite3.connect('database.sqlite')
+        conn = get_connection()
         
         # Базовые данные ресторанов (БЕЗ продаж!)
         query = """
@@ -134,7 +145,12 @@ class ProperMLDetectiveAnalysis:
         
         print("🌦️ Получаем РЕАЛЬНЫЕ данные погоды из Open-Meteo API...")
         
-        # Получаем реальные погодные данные
+        # Получаем реальные погодные данные (весь период - одним запросом)
+        dates = pd.to_datetime(df['stat_date'])
+        if not dates.empty:
+            get_weather_store().prefetch(BALI_LAT, BALI_LON, dates.min().strftime('%Y-%m-%d'),
+                                         dates.max().strftime('%Y-%m-%d'))
+        
         weather_data = []
         for _, row in df.iterrows():
             date = row['stat_date'] if isinstance(row['stat_date'], str) else row['stat_date'].strftime('%Y-%m-%d')
@@ -153,44 +169,30 @@ class ProperMLDetectiveAnalysis:
         return df
     
     def get_real_weather_data(self, date):
-        """Получает РЕАЛЬНЫЕ данные погоды из Open-Meteo API"""
+        """Получает РЕАЛЬНЫЕ данные погоды из Open-Meteo API (через локальное хранилище)"""
         try:
-            # Open-Meteo Historical Weather API (БЕСПЛАТНЫЙ!)
-            url = "https://archive-api.open-meteo.com/v1/archive"
-            params = {
-                'latitude': -8.4095,  # Бали
-                'longitude': 115.1889,
-                'start_date': date,
-                'end_date': date,
-                'hourly': 'temperature_2m,relative_humidity_2m,precipitation',
-                'timezone': 'Asia/Jakarta'
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                hourly = data.get('hourly', {})
+            # Почасовые данные Open-Meteo, HTTP только при промахе хранилища
+            hourly = get_weather_store().get_hourly(BALI_LAT, BALI_LON, date)
+            
+            if not hourly.empty:
+                # Берем среднее за день
+                temps = hourly['temperature'].dropna().tolist()
+                humidity = hourly['humidity'].dropna().tolist()
+                precipitation = hourly['precipitation'].dropna().tolist()
+                
+                avg_temp = sum(temps) / len(temps) if temps else 28
+                avg_humidity = sum(humidity) / len(humidity) if humidity else 75
+                total_rain = sum(precipitation) if precipitation else 0
                 
-                if hourly and len(hourly.get('time', [])) > 0:
-                    # Берем среднее за день
-                    temps = hourly.get('temperature_2m', [28])
-                    humidity = hourly.get('relative_humidity_2m', [75])
-                    precipitation = hourly.get('precipitation', [0])
-                    
-                    avg_temp = sum(temps) / len(temps) if temps else 28
-                    avg_humidity = sum(humidity) / len(humidity) if humidity else 75
-                    total_rain = sum(precipitation) if precipitation else 0
-                    
-                    # Конвертируем осадки в часы дождя (примерно)
-                    rain_hours = min(total_rain / 2.5, 24) if total_rain > 0.1 else 0
-                    
-                    return {
-                        'temperature': avg_temp,
-                        'humidity': avg_humidity,
-                        'rain_hours': rain_hours,
-                        'source': 'Open-Meteo API'
-                    }
+                # Конвертируем осадки в часы дождя (примерно)
+                rain_hours = min(total_rain / 2.5, 24) if total_rain > 0.1 else 0
+                
+                return {
+                    'temperature': avg_temp,
+                    'humidity': avg_humidity,
+                    'rain_hours': rain_hours,
+                    'source': 'Open-Meteo API'
+                }
             
             # Fallback если API недоступно
             return self._fallback_weather_data(date)
@@ -213,48 +215,9 @@ class ProperMLDetectiveAnalysis:
     def add_tourist_data(self, df):
         """Добавляет туристические данные"""
         
-        # РЕАЛЬНЫЕ туристические коэффициенты из обновленного файла Table-1-7-Final-1-1.xls
-        try:
-            import pandas as pd
-            
-            # Читаем актуальные данные за 2024 год
-            df_tourists = pd.read_excel('data/Table-1-7-Final-1-1.xls', sheet_name='tab4 ok')
-            
-            # Данные за 2024 год (реальные цифры)
-            monthly_data_2024 = {
-                1: 420037,   # JANUARY
-                2: 455277,   # FEBRUARY  
-                3: 469227,   # MARCH
-                4: 503194,   # APRIL
-                5: 544601,   # MAY
-                6: 520898,   # JUNE
-                7: 625665,   # JULY
-                8: 616641,   # AUGUST
-                9: 593909,   # SEPTEMBER
-                10: 559911,  # OCTOBER
-                11: 472900,  # NOVEMBER
-                12: 551100   # DECEMBER
-            }
-            
-            # Рассчитываем коэффициенты относительно среднего
-            avg_tourists = sum(monthly_data_2024.values()) / 12  # 527,863 туристов в месяц
-            monthly_coeffs = {str(month): tourists/avg_tourists for month, tourists in monthly_data_2024.items()}
-            
-            print(f"✅ Загружены РЕАЛЬНЫЕ данные туристов за 2024: {sum(monthly_data_2024.values()):,} туристов")
-            print(f"📊 Средний поток: {avg_tourists:,.0f} туристов/месяц")
-            
-        except Exception as e:
-            print(f"⚠️ Ошибка загрузки новых туристических данных: {e}")
-            print("📊 Используем предыдущие данные...")
-            # Запасной расчет на основе общих сезонных паттернов Бали
-            monthly_coeffs = {
-                '1': 1.3, '2': 1.2, '3': 1.1, '4': 0.9, 
-                '5': 0.8, '6': 0.7, '7': 0.8, '8': 0.9,
-                '9': 1.0, '10': 1.1, '11': 1.2, '12': 1.3
-            }
-        
-        # Добавляем туристические коэффициенты по месяцам
-        df['tourist_seasonal_coeff'] = df['month'].map(lambda x: monthly_coeffs.get(str(x), 1.0))
+        # РЕАЛЬНЫЕ туристические коэффициенты 2024 по месяцам - из календарного измерения
+        df = join_calendar(df, columns=['tourist_seasonal_coeff'])
+        print(f"✅ Загружены РЕАЛЬНЫЕ данные туристов за 2024: {sum(MONTHLY_TOURISTS_2024.values()):,} туристов")
         
         # РЕАЛЬНЫЕ ежедневные данные туристов на основе месячной статистики
         # Распределяем месячные данные по дням с учетом сезонности
@@ -286,30 +249,9 @@ class ProperMLDetectiveAnalysis:
     def add_holiday_data(self, df):
         """Добавляет данные о праздниках"""
         
-        # Симулируем праздничные дни
-        df['is_holiday'] = 0
-        df['is_weekend'] = ((df['day_of_week'] == 0) | (df['day_of_week'] == 6)).astype(int)
-        
-        # РЕАЛЬНЫЕ индонезийские праздники из официального календаря
-        try:
-            import json
-            with open('data/comprehensive_holiday_analysis.json', 'r', encoding='utf-8') as f:
-                holiday_data = json.load(f)
-            
-            # Извлекаем реальные даты праздников
-            holiday_dates = list(holiday_data.keys())
-            
-        except Exception as e:
-            print(f"Ошибка загрузки реальных праздников: {e}")
-            # Запасные официальные праздники Индонезии
-            holiday_dates = [
-                '2024-01-01', '2024-02-10', '2024-03-11', '2024-05-01', 
-                '2024-08-17', '2024-12-25', '2025-01-01', '2025-02-28'
-            ]
-        
+        # РЕАЛЬНЫЕ праздники (comprehensive_holiday_analysis.json) и выходные - одним join календаря
+        df = join_calendar(df, columns=['is_holiday', 'is_weekend'])
         df['stat_date'] = pd.to_datetime(df['stat_date'])
-        for holiday in holiday_dates:
-            df.loc[df['stat_date'] == holiday, 'is_holiday'] = 1
         
         return df
     
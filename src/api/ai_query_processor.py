@@ -19,6 +19,11 @@ import subprocess
 import sys
 from pathlib import Path
 
+# Общий пул read-only подключений к SQLite
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from src.utils.db_pool import get_connection
+
 class AIQueryProcessor:
     """
     Процессор для обработки свободных запросов клиента
@@ -268,7 +273,7 @@ class AIQueryProcessor:
     def _restaurant_exists(self, restaurant_name):
         """КРИТИЧЕСКАЯ ФУНКЦИЯ: Проверяет существование ресторана в базе данных"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_connection(self.db_path)
             query = "SELECT COUNT(*) as count FROM restaurants WHERE LOWER(name) LIKE ?"
             result = pd.read_sql_query(query, conn, params=[f'%{restaurant_name.lower()}%'])
             conn.close()
@@ -666,6 +671,11 @@ if __name__ == "__main__":
             if restaurant_name and any(word in query_lower for word in analysis_keywords):
                 return self._analyze_restaurant_anomalies(restaurant_name, original_query)
             
+            # Конкретный день ресторана - прогноз и SHAP факторы (быстрая модель)
+            date_match = re.search(r'\d{4}-\d{2}-\d{2}', original_query)
+            if restaurant_name and date_match:
+                return self._explain_restaurant_day(restaurant_name, date_match.group(0))
+            
             # Иначе общая информация о ML
             ml_info = self._get_ml_model_info()
             
@@ -719,6 +729,30 @@ if __name__ == "__main__":
         except Exception as e:
             return f"❌ Ошибка при анализе ML данных: {e}"
     
+    def _explain_restaurant_day(self, restaurant_name, target_date):
+        """ML прогноз и SHAP факторы дня (компактная модель, если она верна полной)"""
+        from src.ml_models.compact_model import explain_day
+        
+        result = explain_day(restaurant_name, target_date, db_path=self.db_path)
+        if result is None:
+            return f"❌ Нет ML модели или данных для {restaurant_name} за {target_date}"
+        
+        deviation = (result['actual'] - result['predicted']) / result['predicted'] * 100 if result['predicted'] else 0
+        lines = [
+            f"🤖 **ML объяснение: {restaurant_name}, {target_date}**",
+            "",
+            f"💰 Реальные продажи: {result['actual']:,.0f} IDR",
+            f"🎯 Прогноз модели: {result['predicted']:,.0f} IDR ({deviation:+.1f}%)",
+            "",
+            "🔍 **Главные факторы (SHAP):**",
+        ]
+        for i, (feature, value, impact) in enumerate(result['factors'], 1):
+            sign = '📈' if impact > 0 else '📉'
+            lines.append(f"{i}. {sign} {feature} = {value:,.2f}: {impact:+,.0f} IDR")
+        lines.append("")
+        lines.append(f"_Модель: {result['model']} {result['version']}, {result['elapsed'] * 1000:.0f} мс_")
+        return "\n".join(lines)
+    
     def _analyze_restaurant_anomalies(self, restaurant_name, original_query):
         """Анализирует аномальные дни для конкретного ресторана"""
         try:
@@ -740,7 +774,7 @@ if __name__ == "__main__":
             if not self._restaurant_exists(restaurant_name):
                 return f"❌ Ресторан '{restaurant_name}' не найден в базе данных. Проверьте правильность названия."
             
-            conn = sqlite3.connect(self.db_path)
+            conn = get_connection(self.db_path)
             
             # Получаем ID ресторана
             restaurant_query = "SELECT id, name FROM restaurants WHERE LOWER(name) LIKE ?"
@@ -969,7 +1003,7 @@ if __name__ == "__main__":
     def _get_restaurant_data(self, restaurant_name, start_date=None, end_date=None):
         """Получение данных ресторана из базы с фильтрацией по периоду"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_connection(self.db_path)
             
             # Сначала получаем restaurant_id
             restaurant_query = "SELECT id FROM restaurants WHERE LOWER(name) LIKE ?"
@@ -1090,7 +1124,7 @@ if __name__ == "__main__":
     def _get_all_restaurant_names(self):
         """Получение списка всех ресторанов"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_connection(self.db_path)
             query = "SELECT DISTINCT name FROM restaurants ORDER BY name"
             restaurants = pd.read_sql_query(query, conn)
             conn.close()
@@ -1240,7 +1274,7 @@ if __name__ == "__main__":
     def _get_top_restaurants(self):
         """Получение топ ресторанов"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_connection(self.db_path)
             query = """
                 SELECT restaurant_name, SUM(sales) as total_sales
                 FROM (
@@ -1270,7 +1304,7 @@ if __name__ == "__main__":
     def _get_total_market_sales(self):
         """Получение общих продаж рынка"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_connection(self.db_path)
             grab_query = "SELECT SUM(sales) as total FROM grab_stats"
             gojek_query = "SELECT SUM(sales) as total FROM gojek_stats"
             
@@ -1435,7 +1469,7 @@ if __name__ == "__main__":
                 return "❌ Не удалось определить название ресторана из запроса"
             
             # Получаем ID ресторана
-            conn = sqlite3.connect('database.sqlite')
+            conn = get_connection()
             restaurant_query = "SELECT id, name FROM restaurants WHERE LOWER(name) LIKE ?"
             restaurant_data = pd.read_sql_query(restaurant_query, conn, params=[f'%{restaurant_name.lower()}%'])
             
@@ -1635,7 +1669,7 @@ if __name__ == "__main__":
         """Получает ВСЕ доступные данные о ресторане"""
         try:
             # Создаем новое подключение с параметрами
-            conn = sqlite3.connect(self.db_path, timeout=20.0)
+            conn = get_connection(self.db_path)
             
             # Получаем ID ресторана
             restaurant_query = "SELECT id, name FROM restaurants WHERE LOWER(name) LIKE ?"
@@ -2381,7 +2415,7 @@ if __name__ == "__main__":
     def _analyze_restaurant_trends(self, query):
         """Универсальный умный анализ трендов для ЛЮБОГО периода"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_connection(self.db_path)
             query_lower = query.lower()
             
             # УМНОЕ ОПРЕДЕЛЕНИЕ ПЕРИОДА из запроса
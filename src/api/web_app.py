@@ -10,6 +10,10 @@ import sys
 import os
 from pathlib import Path
 
+# Общий пул read-only подключений к SQLite
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from src.utils.db_pool import get_connection
+
 # Настройка страницы
 st.set_page_config(
     page_title="MUZAQUEST Analytics Dashboard",
@@ -57,7 +61,7 @@ st.markdown('<p style="text-align: center; font-size: 1.2rem; color: #666;">Пр
 def load_restaurants():
     """Загрузка списка ресторанов"""
     try:
-        conn = sqlite3.connect('database.sqlite')
+        conn = get_connection()
         query = """
         SELECT DISTINCT restaurant_name 
         FROM grab_stats 
@@ -85,16 +89,32 @@ def load_restaurant_locations():
 
 @st.cache_data
 def load_tourist_data():
-    """Загрузка туристических данных"""
+    """Загрузка туристических данных (таблица tourism_arrivals, без разбора xls)"""
+    from src.utils.tourism_store import load_tourism
     try:
-        with open('data/scientific_tourist_coefficients.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return load_tourism('database.sqlite')
     except Exception as e:
         st.error(f"Ошибка загрузки туристических данных: {e}")
-        return {}
+        return pd.DataFrame()
 
 def run_analysis(restaurant_name=None, start_date=None, end_date=None):
     """Запуск анализа через main.py"""
+    if restaurant_name:
+        # Отчет ресторана - в процессе через кеш отчетов: повторное открытие без пересчета
+        try:
+            from contextlib import redirect_stdout
+            from io import StringIO
+            from main import get_restaurant_report
+            from src.utils.report_model import render_console
+
+            with redirect_stdout(StringIO()):
+                report = get_restaurant_report(restaurant_name, start_date, end_date)
+            if report is None:
+                return f"Нет данных для анализа: {restaurant_name} ({start_date} → {end_date})"
+            return render_console(report)
+        except Exception as e:
+            return f"Ошибка анализа: {e}"
+
     try:
         cmd = [sys.executable, 'main.py', 'analyze']
         
@@ -367,17 +387,18 @@ elif page == "🤖 ML-модель и прогнозы":
     
     with col2:
         forecast_days = st.slider("Горизонт прогноза (дни):", 1, 30, 7)
+        factors_date = st.date_input("День для факторов влияния:", datetime(2025, 6, 1))
     
     if st.button("🚀 Запустить ML-анализ", type="primary"):
         with st.spinner("Выполняем ML-анализ..."):
             
             # Запуск ML анализа через proper_ml_detective_analysis.py
             try:
-                import proper_ml_detective_analysis as ml_detective
-                
                 st.markdown("### 🤖 Результаты ML-анализа")
                 
                 if analysis_type == "🔍 Детективный анализ (SHAP)":
+                    import proper_ml_detective_analysis as ml_detective
+                    
                     # Запуск детективного анализа
                     st.info("Запуск детективного анализа с SHAP объяснениями...")
                     result = subprocess.run([
@@ -397,9 +418,22 @@ elif page == "🤖 ML-модель и прогнозы":
                     st.success("✅ Прогноз готов")
                     
                 elif analysis_type == "🎯 Факторы влияния":
-                    st.info("Анализируем факторы влияния...")
-                    # Здесь будет SHAP анализ факторов
-                    st.success("✅ Анализ факторов завершен")
+                    # Компактная модель (если верна полной) - ответ за доли секунды
+                    from src.ml_models.compact_model import explain_day
+                    
+                    result = explain_day(selected_restaurant, factors_date.strftime('%Y-%m-%d'))
+                    if result is None:
+                        st.warning("Нет ML модели или данных за выбранный день")
+                    else:
+                        col_a, col_b = st.columns(2)
+                        col_a.metric("💰 Реальные продажи", f"{result['actual']:,.0f} IDR")
+                        col_b.metric("🎯 Прогноз модели", f"{result['predicted']:,.0f} IDR",
+                                     f"{result['actual'] - result['predicted']:+,.0f} IDR")
+                        factors_df = pd.DataFrame(result['factors'], columns=['Фактор', 'Значение', 'Влияние (IDR)'])
+                        st.plotly_chart(px.bar(factors_df, x='Влияние (IDR)', y='Фактор', orientation='h'),
+                                        use_container_width=True)
+                        st.caption(f"Модель: {result['model']} {result['version']} • {result['elapsed'] * 1000:.0f} мс")
+                        st.success("✅ Анализ факторов завершен")
                     
                 else:  # Аномалии
                     st.info("Ищем аномалии в данных...")
@@ -643,68 +677,69 @@ elif page == "🗓️ Балийский календарь":
 elif page == "🌍 Туристическая аналитика":
     st.markdown("## 🌍 Туристическая аналитика Бали")
     
-    tourist_data = load_tourist_data()
+    tourism = load_tourist_data()
     
-    if tourist_data:
+    if not tourism.empty:
         st.markdown("### 📊 Данные по туристам")
         
+        # По национальностям (DISPAR): последний год против тех же месяцев прошлого
+        nationality = tourism[tourism['kind'] == 'by_nationality']
+        latest_year = int(nationality['year'].max()) if not nationality.empty else None
+        months = sorted(nationality[nationality['year'] == latest_year]['month'].unique()) if latest_year else []
+        by_year = nationality[nationality['month'].isin(months)].groupby(['year', 'country'])['arrivals'].sum()
+        available = set(by_year.index.get_level_values('year'))
+        years = [year for year in (latest_year - 1, latest_year) if year in available] if latest_year else []
+        
+        def ranking(year):
+            return by_year.xs(year, level='year').drop('TOTAL', errors='ignore').sort_values(ascending=False)
+        
         col1, col2 = st.columns(2)
         
         with col1:
-            st.markdown("#### 📈 2024 vs 2025")
-            st.metric("2024 год", "3.52 млн туристов")
-            st.metric("2025 год (до мая)", "2.72 млн туристов")
+            st.markdown(f"#### 📈 {' vs '.join(str(year) for year in years)}")
+            for year in years:
+                st.metric(f"{year} год (месяцы {months[0]}-{months[-1]})",
+                          f"{by_year.get((year, 'TOTAL'), 0) / 1e6:.2f} млн туристов")
         
         with col2:
             st.markdown("#### 🇷🇺 Позиция России")
-            st.metric("2024 место", "#14 (68,572 туристов)")
-            st.metric("2025 место", "#18 (28,672 туристов)")
+            for year in years:
+                countries = ranking(year)
+                if 'Russian' in countries.index:
+                    st.metric(f"{year} место", f"#{countries.index.get_loc('Russian') + 1} "
+                                               f"({countries['Russian']:,} туристов)")
         
         # Топ-10 стран
         st.markdown("### 🏆 ТОП-10 стран по туристам")
         
-        # Реальные данные из XLS файлов
-        try:
-            import sys
-            sys.path.append('.')
-            from main import analyze_tourist_data
-            
-            tourist_data = analyze_tourist_data()
-            if tourist_data and 'top_countries_2024' in tourist_data:
-                top_countries = []
-                for country in tourist_data['top_countries_2024'][:5]:
-                    country_2025 = next((c for c in tourist_data.get('top_countries_2025', []) 
-                                       if c['country'] == country['country']), 
-                                      {'tourists': 0})
-                    
-                    total_2024 = tourist_data['total_2024']
-                    share = (country['tourists'] / total_2024 * 100) if total_2024 > 0 else 0
-                    
-                    top_countries.append({
-                        "Страна": f"🏳️ {country['country']}",
-                        "2024": f"{country['tourists']:,}",
-                        "2025": f"{country_2025['tourists']:,}",
-                        "Доля": f"{share:.1f}%"
-                    })
-            else:
-                top_countries = [{"Страна": "Данные недоступны", "2024": "-", "2025": "-", "Доля": "-"}]
-        except Exception as e:
-            st.error(f"Ошибка загрузки туристических данных: {e}")
-            top_countries = [{"Страна": "Ошибка загрузки", "2024": "-", "2025": "-", "Доля": "-"}]
+        top_countries = []
+        if years:
+            current, previous = ranking(years[-1]), ranking(years[0])
+            total = by_year.get((years[-1], 'TOTAL'), 0)
+            for country, tourists in current.head(10).items():
+                row = {"Страна": f"🏳️ {country}"}
+                if len(years) > 1:
+                    row[str(years[0])] = f"{int(previous.get(country, 0)):,}"
+                row[str(years[-1])] = f"{int(tourists):,}"
+                row["Доля"] = f"{tourists / total * 100:.1f}%" if total else "-"
+                top_countries.append(row)
+        if not top_countries:
+            top_countries = [{"Страна": "Данные недоступны"}]
         
         df_countries = pd.DataFrame(top_countries)
         st.dataframe(df_countries, use_container_width=True)
         
         # График динамики
         if st.checkbox("📈 Показать график динамики"):
-            # Создание примера графика
-            months = ['Янв', 'Фев', 'Мар', 'Апр', 'Май']
-            tourists_2024 = [320000, 340000, 380000, 420000, 450000]
-            tourists_2025 = [280000, 300000, 350000, 380000, 410000]
+            # Месячные итоги: для каждого месяца - источник с наивысшим приоритетом
+            totals = tourism[tourism['country'] == 'TOTAL'].drop_duplicates(['year', 'month'])
+            month_names = ['Янв', 'Фев', 'Мар', 'Апр', 'Май', 'Июн', 'Июл', 'Авг', 'Сен', 'Окт', 'Ноя', 'Дек']
             
             fig = go.Figure()
-            fig.add_trace(go.Scatter(x=months, y=tourists_2024, mode='lines+markers', name='2024'))
-            fig.add_trace(go.Scatter(x=months, y=tourists_2025, mode='lines+markers', name='2025'))
+            for year in sorted(totals['year'].unique())[-3:]:
+                year_totals = totals[totals['year'] == year].sort_values('month')
+                fig.add_trace(go.Scatter(x=[month_names[m - 1] for m in year_totals['month']],
+                                         y=year_totals['arrivals'], mode='lines+markers', name=str(year)))
             
             fig.update_layout(
                 title="Динамика туристического потока",
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+📈 ПАКЕТНЫЙ ПРОГНОЗ ОЖИДАЕМЫХ ПРОДАЖ
+==========================================
+Ожидаемые продажи и отклонение для всех ресторанов x дней за один проход.
+
+✅ КАК РАБОТАЕТ:
+- Модель - текущая версия ultimate_rf из реестра (scaler + схема признаков)
+- Матрица признаков - одним чтением из хранилища признаков (только колонки модели)
+- model.predict по блокам PREDICT_CHUNK_ROWS строк параллельно в потоках
+  (деревья sklearn считают без GIL; лес общий, копий модели нет)
+- Результат - таблица expected_sales: expected_sales, actual_sales,
+  residual = факт - прогноз, версия модели (ключ ресторан + день)
+
+Запуск:
+    python main.py predict --start 2025-06-01 --end 2025-06-30 [--restaurants "Ika Canggu" ...]
+"""
+
+import os
+import sys
+import copy
+import time
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional, Dict, List, Any
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from src.utils.db_pool import connection, DEFAULT_DB_PATH, BUSY_TIMEOUT_MS
+
+PREDICTIONS_TABLE = 'expected_sales'
+PREDICT_CHUNK_ROWS = int(os.getenv('PREDICT_CHUNK_ROWS', '5000'))
+PREDICT_WORKERS = int(os.getenv('PREDICT_WORKERS', str(os.cpu_count() or 1)))
+
+
+def create_predictions_table(conn: sqlite3.Connection):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {PREDICTIONS_TABLE} (
+            restaurant_id INTEGER NOT NULL,
+            stat_date TEXT NOT NULL,
+            expected_sales REAL,
+            actual_sales REAL,
+            residual REAL,
+            model_version TEXT,
+            scored_at TEXT,
+            PRIMARY KEY (restaurant_id, stat_date)
+        )
+    """)
+
+
+def predict_in_chunks(model, X: np.ndarray, chunk_rows: int = PREDICT_CHUNK_ROWS,
+                      workers: int = PREDICT_WORKERS) -> np.ndarray:
+    """
+    model.predict по блокам строк параллельно
+
+    Каждый блок считается однопоточной поверхностной копией модели (деревья
+    общие): параллелизм - по блокам, а не по деревьям внутри predict.
+    """
+    if len(X) == 0:
+        return np.zeros(0)
+    chunks = [X[i:i + chunk_rows] for i in range(0, len(X), max(1, chunk_rows))]
+    if workers <= 1 or len(chunks) == 1:
+        return np.concatenate([model.predict(chunk) for chunk in chunks])
+
+    if hasattr(model, 'n_jobs'):
+        model = copy.copy(model)
+        model.n_jobs = 1
+    with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+        return np.concatenate(list(executor.map(model.predict, chunks)))
+
+
+def _restaurant_ids(names: Optional[List[str]], db_path: str) -> Optional[List[int]]:
+    if not names:
+        return None
+    placeholders = ', '.join('?' for _ in names)
+    with connection(db_path) as conn:
+        rows = conn.execute(f"SELECT id, name FROM restaurants WHERE name IN ({placeholders})", names).fetchall()
+    missing = sorted(set(names) - {name for _, name in rows})
+    if missing:
+        print(f"⚠️ Рестораны не найдены: {', '.join(missing)}")
+    return [int(rid) for rid, _ in rows]
+
+
+def write_predictions(predictions: pd.DataFrame, model_version: Optional[str], db_path: str = DEFAULT_DB_PATH) -> int:
+    """INSERT OR REPLACE прогнозов в таблицу expected_sales"""
+    scored_at = datetime.now().isoformat(timespec='seconds')
+    rows = [
+        (int(rid), date, float(expected), float(actual), float(residual), model_version, scored_at)
+        for rid, date, expected, actual, residual in predictions[
+            ['restaurant_id', 'stat_date', 'expected_sales', 'actual_sales', 'residual']
+        ].itertuples(index=False, name=None)
+    ]
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        create_predictions_table(conn)
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {PREDICTIONS_TABLE} "
+            f"(restaurant_id, stat_date, expected_sales, actual_sales, residual, model_version, scored_at) "
+            f"VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return len(rows)
+
+
+def predict_expected_sales(start_date: Optional[str] = None, end_date: Optional[str] = None,
+                           restaurants: Optional[List[str]] = None, db_path: str = DEFAULT_DB_PATH,
+                           chunk_rows: int = PREDICT_CHUNK_ROWS, workers: int = PREDICT_WORKERS,
+                           write: bool = True, verbose: bool = True) -> Dict[str, Any]:
+    """
+    Пакетный прогноз ожидаемых продаж
+
+    Args:
+        start_date: Начальная дата (включительно, None - вся история)
+        end_date: Конечная дата (включительно)
+        restaurants: Названия ресторанов (None - все)
+        db_path: Путь к базе данных
+        chunk_rows: Строк в блоке predict
+        workers: Параллельных блоков
+        write: Записать результат в таблицу expected_sales
+
+    Returns:
+        Словарь: predictions (DataFrame), rows, restaurants, skipped, mae, model_version
+    """
+    from src.ml_models.ultimate_complete_ml_system import get_ultimate_system
+
+    started = time.time()
+    system = get_ultimate_system(train_if_missing=True)
+    if system is None:
+        raise RuntimeError("ML модель недоступна")
+    feature_names = list(system.feature_names)
+
+    restaurant_ids = _restaurant_ids(restaurants, db_path)
+    if restaurant_ids == []:
+        return {'predictions': pd.DataFrame(), 'rows': 0, 'restaurants': 0, 'skipped': 0,
+                'mae': None, 'model_version': system.model_version}
+
+    data = system.load_ultimate_features(columns=feature_names + ['total_sales'], start_date=start_date,
+                                         end_date=end_date, restaurant_ids=restaurant_ids)
+
+    # Строки с пропусками в признаках модель не видела при обучении
+    features = data[feature_names].apply(pd.to_numeric, errors='coerce')
+    complete = features.notna().all(axis=1).to_numpy()
+    X = system.scaler.transform(features[complete].to_numpy(dtype=float))
+    expected = predict_in_chunks(system.trained_model, X, chunk_rows, workers)
+
+    predictions = data.loc[complete, ['restaurant_id', 'stat_date']].reset_index(drop=True)
+    predictions['expected_sales'] = expected
+    predictions['actual_sales'] = data.loc[complete, 'total_sales'].to_numpy(dtype=float)
+    predictions['residual'] = predictions['actual_sales'] - predictions['expected_sales']
+
+    if write and len(predictions):
+        write_predictions(predictions, system.model_version, db_path)
+
+    result = {
+        'predictions': predictions,
+        'rows': len(predictions),
+        'restaurants': predictions['restaurant_id'].nunique(),
+        'skipped': int((~complete).sum()),
+        'mae': float(predictions['residual'].abs().mean()) if len(predictions) else None,
+        'model_version': system.model_version,
+    }
+    if verbose:
+        print(f"📈 Прогноз: {result['rows']:,} ресторан-дней, {result['restaurants']} ресторанов "
+              f"(модель {system.model_version}, {time.time() - started:.1f} сек)")
+        if result['skipped']:
+            print(f"   ⚠️ Пропущено строк с неполными признаками: {result['skipped']}")
+        if result['mae'] is not None:
+            print(f"   📊 Средняя абсолютная ошибка: {result['mae']:,.0f} IDR")
+        if write and result['rows']:
+            print(f"   💾 Записано в таблицу {PREDICTIONS_TABLE}")
+    return result
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+⚡ КОМПАКТНАЯ МОДЕЛЬ ДЛЯ ИНТЕРАКТИВНЫХ ЗАПРОСОВ
+==========================================
+Дистилляция: небольшой неглубокий лес учится на прогнозах полной модели
+ultimate_rf (300 деревьев, глубина 20) и отвечает за ее место в
+интерактивных путях (веб-приложение, AIQueryProcessor).
+
+✅ ВЕРНОСТЬ (метрики в реестре, ultimate_rf_compact):
+- fidelity_r2        - R² прогнозов компактной модели к прогнозам полной (отложенная выборка)
+- r2                 - R² к реальным продажам
+- shap_correlation   - средняя корреляция SHAP векторов двух моделей по строкам
+- shap_top3_overlap  - доля совпадения топ-3 факторов
+
+✅ ВЫБОР МОДЕЛИ (get_interactive_model):
+- компактная, если она дистиллирована из текущей версии ultimate_rf и
+  fidelity_r2 >= COMPACT_MIN_FIDELITY
+- иначе - полная модель
+
+Использование:
+    python -m src.ml_models.ultimate_complete_ml_system   # обучение + дистилляция
+    explain_day('Only Eggs', '2025-06-05')               # прогноз + SHAP за доли секунды
+"""
+
+import os
+import sys
+import time
+from typing import Optional, Dict, List, Any
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import r2_score
+from sklearn.model_selection import train_test_split
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from src.utils.db_pool import connection, DEFAULT_DB_PATH
+from src.utils.feature_store import get_feature_store
+from src.ml_models.model_registry import ModelRegistry, get_model
+from src.ml_models.shap_explainer import explain_batch, SHAP_AVAILABLE
+
+TEACHER_MODEL_NAME = 'ultimate_rf'
+COMPACT_MODEL_NAME = 'ultimate_rf_compact'
+COMPACT_MIN_FIDELITY = float(os.getenv('COMPACT_MIN_FIDELITY', '0.9'))
+
+# Компактный лес: в ~10 раз меньше деревьев, вдвое мельче
+COMPACT_PARAMS = {
+    'n_estimators': 30,
+    'max_depth': 10,
+    'min_samples_leaf': 2,
+    'random_state': 42,
+    'n_jobs': -1,
+}
+
+# Строк для сравнения SHAP векторов полной и компактной модели
+SHAP_SAMPLE_ROWS = 200
+
+
+def _shap_agreement(teacher, student, X: np.ndarray) -> Dict[str, float]:
+    """Корреляция SHAP векторов и совпадение топ-3 факторов по строкам X"""
+    teacher_shap = explain_batch(teacher, X)
+    student_shap = explain_batch(student, X)
+    correlations, overlaps = [], []
+    for t_row, s_row in zip(teacher_shap, student_shap):
+        if np.std(t_row) > 0 and np.std(s_row) > 0:
+            correlations.append(np.corrcoef(t_row, s_row)[0, 1])
+        t_top = set(np.argsort(-np.abs(t_row))[:3])
+        s_top = set(np.argsort(-np.abs(s_row))[:3])
+        overlaps.append(len(t_top & s_top) / 3)
+    return {
+        'shap_correlation': float(np.mean(correlations)) if correlations else 0.0,
+        'shap_top3_overlap': float(np.mean(overlaps)) if overlaps else 0.0,
+    }
+
+
+def distill_ultimate_model(system, data, registry: Optional[ModelRegistry] = None,
+                           force: bool = False, verbose: bool = True) -> Optional[str]:
+    """
+    Дистиллирует компактную модель из обученной UltimateCompleteMLSystem
+
+    Args:
+        system: Система с обученной моделью (trained_model, scaler, feature_names)
+        data: Датасет признаков (как при обучении)
+        registry: Реестр моделей
+        force: Дистиллировать, даже если компактная модель этой версии уже есть
+
+    Returns:
+        Версия компактной модели в реестре (None - не удалось)
+    """
+    registry = registry or ModelRegistry()
+    existing = registry.metadata(COMPACT_MODEL_NAME)
+    if (not force and existing and system.model_version
+            and existing.get('params', {}).get('teacher_version') == system.model_version):
+        return existing['version']
+
+    feature_names = list(system.feature_names)
+    clean = data[feature_names + ['total_sales']].apply(lambda col: col.astype(float)).dropna()
+    if len(clean) < 100 or system.trained_model is None:
+        print("❌ Недостаточно данных для дистилляции компактной модели")
+        return None
+
+    X = system.scaler.transform(clean[feature_names].values)
+    y = clean['total_sales'].values
+    # Учитель - прогнозы полной модели: компактная повторяет модель, а не шум
+    teacher_pred = system.trained_model.predict(X)
+
+    X_train, X_test, t_train, t_test, _, y_test = train_test_split(
+        X, teacher_pred, y, test_size=0.2, random_state=42
+    )
+    student = RandomForestRegressor(**COMPACT_PARAMS).fit(X_train, t_train)
+    student_pred = student.predict(X_test)
+
+    metrics = {
+        'fidelity_r2': float(r2_score(t_test, student_pred)),
+        'r2': float(r2_score(y_test, student_pred)),
+        'teacher_r2': float(r2_score(y_test, t_test)),
+    }
+    if SHAP_AVAILABLE:
+        metrics.update(_shap_agreement(system.trained_model, student, X_test[:SHAP_SAMPLE_ROWS]))
+
+    version = registry.save(
+        COMPACT_MODEL_NAME,
+        {'model': student, 'scaler': system.scaler},
+        feature_names=feature_names,
+        metrics=metrics,
+        data_watermark=system.data_watermark,
+        params=dict(COMPACT_PARAMS, teacher_version=system.model_version),
+        trained_range=system.trained_range,
+    )
+    if verbose:
+        print(f"⚡ Компактная модель {COMPACT_MODEL_NAME} {version}: верность R² = {metrics['fidelity_r2']:.3f}"
+              + (f", корреляция SHAP = {metrics['shap_correlation']:.3f}, топ-3 = {metrics['shap_top3_overlap']:.0%}"
+                 if 'shap_correlation' in metrics else ""))
+    return version
+
+
+def get_interactive_model(registry: Optional[ModelRegistry] = None):
+    """
+    Модель для интерактивных запросов: компактная, если она актуальна и верна
+    полной модели, иначе полная (дескрипторы реестра, общие для процесса)
+    """
+    registry = registry or ModelRegistry()
+    teacher_version = registry.latest_version(TEACHER_MODEL_NAME)
+    compact_meta = registry.metadata(COMPACT_MODEL_NAME)
+    if (compact_meta
+            and compact_meta.get('params', {}).get('teacher_version') == teacher_version
+            and compact_meta.get('metrics', {}).get('fidelity_r2', 0) >= COMPACT_MIN_FIDELITY):
+        return get_model(COMPACT_MODEL_NAME, version=compact_meta['version'], registry=registry)
+    return get_model(TEACHER_MODEL_NAME, version=teacher_version, registry=registry)
+
+
+def explain_day(restaurant_name: str, target_date: str, top: int = 5,
+                db_path: str = DEFAULT_DB_PATH) -> Optional[Dict[str, Any]]:
+    """
+    Прогноз и SHAP факторы дня ресторана интерактивной моделью
+
+    Признаки только читаются из хранилища признаков: дописывает его refresh,
+    интерактивный запрос не строит датасет и не берет блокировку записи.
+
+    Returns:
+        Словарь: model, version, predicted, actual, factors [(признак, значение, shap)],
+        elapsed; None если модели или данных нет (в т.ч. месяц еще не в хранилище)
+    """
+    from src.ml_models.ultimate_complete_ml_system import ULTIMATE_FEATURES_NAME
+
+    started = time.time()
+    handle = get_interactive_model()
+    if handle is None:
+        return None
+
+    with connection(db_path) as conn:
+        row = conn.execute("SELECT id FROM restaurants WHERE name = ?", (restaurant_name,)).fetchone()
+    if row is None:
+        return None
+
+    feature_names = handle.feature_names
+    store = get_feature_store(ULTIMATE_FEATURES_NAME, db_path)
+    if not set(feature_names + ['total_sales']) <= set(store.columns()):
+        return None
+    day = store.read(columns=feature_names + ['total_sales'], start_date=target_date, end_date=target_date,
+                     restaurant_ids=[int(row[0])])
+    if day.empty:
+        return None
+
+    values = day[feature_names].astype(float).values[:1]
+    X = handle.artifact['scaler'].transform(values)
+    predicted = float(handle.model.predict(X)[0])
+    factors: List[tuple] = []
+    if SHAP_AVAILABLE:
+        shap_row = explain_batch(handle.model, X, version=f"{handle.name}:{handle.version}")[0]
+        order = np.argsort(-np.abs(shap_row))[:top]
+        factors = [(feature_names[i], float(values[0][i]), float(shap_row[i])) for i in order]
+
+    return {
+        'model': handle.name,
+        'version': handle.version,
+        'predicted': predicted,
+        'actual': float(day['total_sales'].iloc[0]),
+        'factors': factors,
+        'elapsed': time.time() - started,
+    }
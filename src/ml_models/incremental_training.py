@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+🔁 ИНКРЕМЕНТАЛЬНОЕ ПЕРЕОБУЧЕНИЕ МОДЕЛЕЙ
+==========================================
+Политика переобучения и дообучение на новом окне данных.
+
+✅ РЕЖИМЫ:
+- incremental: RandomForest warm_start (новые деревья на новом окне),
+  LightGBM - продолжение бустинга через init_model
+- full: полная пересборка на всей истории
+- skip: новых данных нет
+
+✅ ПОЛНАЯ ПЕРЕСБОРКА, ЕСЛИ:
+- модели еще нет или изменилась схема признаков
+- появились данные раньше уже виденного диапазона (дозагрузка истории)
+- новое окно слишком велико (RETRAIN_MAX_NEW_FRACTION от всех данных)
+- накопилось RETRAIN_MAX_INCREMENTS дообучений подряд
+
+Диапазон stat_date, который видела модель, хранится в метаданных реестра
+(trained_range), вместе с родословной версии (lineage).
+"""
+
+import os
+from typing import Optional, Dict, List, Any, Tuple
+
+RETRAIN_MAX_INCREMENTS = int(os.getenv('RETRAIN_MAX_INCREMENTS', '6'))
+RETRAIN_MAX_NEW_FRACTION = float(os.getenv('RETRAIN_MAX_NEW_FRACTION', '0.3'))
+
+# Прирост модели за одно дообучение
+RF_INCREMENT_TREES = 50
+LGB_INCREMENT_ROUNDS = 300
+
+
+def seen_range(metadata: Optional[Dict[str, Any]]) -> Tuple[Optional[str], Optional[str]]:
+    """Диапазон stat_date, который видела модель (start, end)"""
+    trained_range = (metadata or {}).get('trained_range') or {}
+    return trained_range.get('start'), trained_range.get('end')
+
+
+def decide_retrain(metadata: Optional[Dict[str, Any]], data_start: str, data_end: str,
+                   feature_names: List[str], new_rows: int, total_rows: int,
+                   force_full: bool = False, feature_schema: Optional[int] = None) -> Tuple[str, str]:
+    """
+    Политика переобучения
+
+    Args:
+        metadata: Метаданные текущей версии модели в реестре (None - модели нет)
+        data_start, data_end: Диапазон stat_date доступных данных
+        feature_names: Схема признаков доступных данных
+        new_rows: Строк новее виденного моделью диапазона
+        total_rows: Всего строк
+        force_full: Принудительная полная пересборка
+        feature_schema: Версия смысла признаков (другая у модели - полная пересборка)
+
+    Returns:
+        (режим: 'full' | 'incremental' | 'skip', причина)
+    """
+    if force_full:
+        return 'full', 'запрошена полная пересборка'
+    if not metadata:
+        return 'full', 'модели еще нет'
+    seen_start, seen_end = seen_range(metadata)
+    if not seen_end:
+        return 'full', 'неизвестен диапазон обучения модели'
+    if set(metadata.get('feature_names', [])) - set(feature_names):
+        return 'full', 'изменилась схема признаков'
+    if feature_schema is not None and (metadata.get('params') or {}).get('feature_schema') != feature_schema:
+        return 'full', f'изменилась версия признаков ({feature_schema})'
+    if seen_start and data_start < seen_start:
+        return 'full', f'появились данные до {seen_start}'
+    if data_end <= seen_end or new_rows == 0:
+        return 'skip', f'новых данных после {seen_end} нет'
+    increments = (metadata.get('lineage') or {}).get('increments', 0)
+    if increments >= RETRAIN_MAX_INCREMENTS:
+        return 'full', f'{increments} дообучений подряд'
+    if total_rows and new_rows / total_rows > RETRAIN_MAX_NEW_FRACTION:
+        return 'full', f'новое окно {new_rows / total_rows:.0%} данных'
+    return 'incremental', f'{new_rows} новых строк после {seen_end}'
+
+
+def next_lineage(metadata: Optional[Dict[str, Any]], mode: str) -> Dict[str, Any]:
+    """Родословная новой версии: режим, базовая версия, число дообучений подряд"""
+    if mode != 'incremental' or not metadata:
+        return {'mode': 'full', 'base_version': None, 'increments': 0}
+    previous = metadata.get('lineage') or {}
+    return {
+        'mode': 'incremental',
+        'base_version': metadata.get('version'),
+        'increments': previous.get('increments', 0) + 1,
+    }
+
+
+def next_trained_range(metadata: Optional[Dict[str, Any]], mode: str,
+                       data_start: str, data_end: str) -> Dict[str, str]:
+    """Диапазон, который будет видеть модель после обучения"""
+    seen_start, _ = seen_range(metadata)
+    start = seen_start if mode == 'incremental' and seen_start else data_start
+    return {'start': start, 'end': data_end}
+
+
+def warm_start_forest(model, X_new, y_new, add_trees: int = RF_INCREMENT_TREES):
+    """
+    Дообучение RandomForest: существующие деревья сохраняются, новые
+    add_trees деревьев обучаются на новом окне данных
+    """
+    model.set_params(warm_start=True, n_estimators=model.n_estimators + add_trees)
+    model.fit(X_new, y_new)
+    return model
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+🗄️ РЕЕСТР ML МОДЕЛЕЙ
+==========================================
+Версионированные артефакты моделей вместо одного pickle файла.
+
+✅ ЧТО ХРАНИТСЯ (data/models/<имя>/<версия>/):
+- model.joblib  - артефакт (модель, scaler, ...) без сжатия
+- meta.json     - схема признаков, водяной знак и диапазон обучающих данных,
+                  метрики, родословная (полное обучение / дообучение)
+- <имя>/LATEST  - текущая версия
+
+✅ ЗАГРУЗКА:
+- joblib mmap_mode='r': numpy массивы артефакта отображаются в память
+  (деревья sklearn копируют узлы в свои буферы при распаковке, поэтому
+  воркеры делят лес через copy-on-write: загрузить модель до fork)
+- get_model() - общий для процесса дескриптор: модель загружается один раз
+  и перечитывается только при появлении новой версии
+"""
+
+import os
+import json
+import threading
+from datetime import datetime
+from typing import Optional, Dict, List, Any
+
+import joblib
+
+REGISTRY_DIR = os.getenv('MODEL_REGISTRY_DIR', os.path.join('data', 'models'))
+ARTIFACT_FILE = 'model.joblib'
+META_FILE = 'meta.json'
+LATEST_FILE = 'LATEST'
+
+
+class LoadedModel:
+    """Загруженная версия модели: артефакт + метаданные"""
+
+    __slots__ = ('name', 'version', 'artifact', 'metadata')
+
+    def __init__(self, name: str, version: str, artifact: Dict[str, Any], metadata: Dict[str, Any]):
+        self.name = name
+        self.version = version
+        self.artifact = artifact
+        self.metadata = metadata
+
+    @property
+    def model(self):
+        return self.artifact.get('model')
+
+    @property
+    def feature_names(self) -> List[str]:
+        return self.metadata.get('feature_names', [])
+
+    def __repr__(self):
+        return f"LoadedModel({self.name!r}, {self.version})"
+
+
+class ModelRegistry:
+    """Файловый реестр версий моделей"""
+
+    def __init__(self, root: str = REGISTRY_DIR):
+        self.root = root
+
+    def _model_dir(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def versions(self, name: str) -> List[str]:
+        """Версии модели по возрастанию (только полностью записанные)"""
+        model_dir = self._model_dir(name)
+        if not os.path.isdir(model_dir):
+            return []
+        return sorted(
+            entry for entry in os.listdir(model_dir)
+            if entry.startswith('v') and os.path.exists(os.path.join(model_dir, entry, META_FILE))
+        )
+
+    def latest_version(self, name: str) -> Optional[str]:
+        """Текущая версия модели (LATEST, иначе последняя записанная)"""
+        try:
+            with open(os.path.join(self._model_dir(name), LATEST_FILE), 'r', encoding='utf-8') as f:
+                version = f.read().strip()
+            if version:
+                return version
+        except OSError:
+            pass
+        versions = self.versions(name)
+        return versions[-1] if versions else None
+
+    def metadata(self, name: str, version: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Метаданные версии (None если версии нет)"""
+        version = version or self.latest_version(name)
+        if not version:
+            return None
+        try:
+            with open(os.path.join(self._model_dir(name), version, META_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, name: str, artifact: Dict[str, Any], feature_names: List[str],
+             metrics: Optional[Dict[str, Any]] = None, data_watermark: Optional[str] = None,
+             params: Optional[Dict[str, Any]] = None, trained_range: Optional[Dict[str, str]] = None,
+             lineage: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Сохраняет новую версию модели и делает ее текущей
+
+        Args:
+            name: Имя модели в реестре
+            artifact: Словарь с моделью ('model') и вспомогательными объектами
+            feature_names: Схема признаков в порядке обучения
+            metrics: Метрики качества
+            data_watermark: Последняя дата обучающих данных
+            params: Гиперпараметры
+            trained_range: Диапазон stat_date, который видела модель {'start', 'end'}
+            lineage: Режим обучения и базовая версия (для дообучения)
+
+        Returns:
+            Версия (v0001, v0002, ...)
+        """
+        model_dir = self._model_dir(name)
+        os.makedirs(model_dir, exist_ok=True)
+        versions = self.versions(name)
+        number = int(versions[-1][1:]) + 1 if versions else 1
+        version = f"v{number:04d}"
+        version_dir = os.path.join(model_dir, version)
+        os.makedirs(version_dir, exist_ok=True)
+
+        # Без сжатия - иначе mmap_mode при загрузке невозможен
+        joblib.dump(artifact, os.path.join(version_dir, ARTIFACT_FILE))
+
+        metadata = {
+            'name': name,
+            'version': version,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'feature_names': list(feature_names),
+            'data_watermark': data_watermark,
+            'metrics': metrics or {},
+            'params': params or {},
+            'trained_range': trained_range,
+            'lineage': lineage or {'mode': 'full', 'base_version': None, 'increments': 0},
+        }
+        # meta.json пишется последним: версия без него считается недописанной
+        with open(os.path.join(version_dir, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, ensure_ascii=False, indent=2, default=str)
+
+        latest_tmp = os.path.join(model_dir, f".{LATEST_FILE}.{os.getpid()}")
+        with open(latest_tmp, 'w', encoding='utf-8') as f:
+            f.write(version)
+        os.replace(latest_tmp, os.path.join(model_dir, LATEST_FILE))
+        return version
+
+    def load(self, name: str, version: Optional[str] = None,
+             mmap_mode: Optional[str] = 'r') -> Optional[LoadedModel]:
+        """Загружает версию модели (по умолчанию текущую); None если нет"""
+        version = version or self.latest_version(name)
+        metadata = self.metadata(name, version)
+        if metadata is None:
+            return None
+        artifact = joblib.load(os.path.join(self._model_dir(name), version, ARTIFACT_FILE), mmap_mode=mmap_mode)
+        return LoadedModel(name, version, artifact, metadata)
+
+
+_handles: Dict[tuple, LoadedModel] = {}
+_handles_lock = threading.Lock()
+
+
+def get_model(name: str, version: Optional[str] = None,
+              registry: Optional[ModelRegistry] = None) -> Optional[LoadedModel]:
+    """
+    Общий для процесса дескриптор модели
+
+    Повторные вызовы возвращают уже загруженный объект; новая версия в
+    реестре (LATEST) подхватывается при следующем вызове.
+    """
+    registry = registry or ModelRegistry()
+    version = version or registry.latest_version(name)
+    if not version:
+        return None
+    key = (os.path.abspath(registry.root), name, version)
+    handle = _handles.get(key)
+    if handle is None:
+        with _handles_lock:
+            handle = _handles.get(key)
+            if handle is None:
+                handle = registry.load(name, version)
+                if handle is None:
+                    return None
+                # Старые версии этой модели больше не нужны процессу
+                for old_key in [k for k in _handles if k[:2] == key[:2]]:
+                    del _handles[old_key]
+                _handles[key] = handle
+    return handle
+
+
+def clear_model_handles():
+    """Сбрасывает загруженные модели процесса (тесты, переобучение)"""
+    with _handles_lock:
+        _handles.clear()
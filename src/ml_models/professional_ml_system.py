@@ -18,15 +18,77 @@ import joblib
 import warnings
 warnings.filterwarnings('ignore')
 
+# Общий пул read-only подключений к SQLite
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from src.utils.db_pool import get_connection
+from src.utils.weather_store import get_weather_store, location_key, restaurant_cell
+from src.utils.weather_prefetcher import prefetch_weather
+from src.ml_models.model_registry import ModelRegistry
+from src.ml_models.incremental_training import (
+    decide_retrain, next_lineage, next_trained_range, seen_range, LGB_INCREMENT_ROUNDS
+)
+
+# Имя модели в реестре (data/models/professional_lgbm)
+PROFESSIONAL_MODEL_NAME = 'professional_lgbm'
+
+# Параллельная кросс-валидация: фолды в пуле процессов
+CV_SPLITS = 5
+CV_WORKERS = int(os.getenv('CV_WORKERS', '0'))  # 0 - по числу фолдов/ядер
+CV_THREADS_PER_WORKER = int(os.getenv('CV_THREADS_PER_WORKER', '0'))  # 0 - ядра / воркеры
+
+LGB_PARAMS = {
+    'objective': 'regression',
+    'metric': 'l1',
+    'boosting_type': 'gbdt',
+    'learning_rate': 0.05,
+    'num_leaves': 64,
+    'feature_fraction': 0.8,
+    'bagging_fraction': 0.8,
+    'bagging_freq': 5,
+    'seed': 42,
+    'verbose': -1
+}
+
+
+def _train_fold(fold, X_train, y_train, X_val, y_val, params):
+    """Обучает один фолд LightGBM (выполняется в процессе пула)"""
+    train_data = lgb.Dataset(X_train, label=y_train)
+    val_data = lgb.Dataset(X_val, label=y_val, reference=train_data)
+    
+    model = lgb.train(
+        params,
+        train_data,
+        num_boost_round=2000,
+        valid_sets=[val_data],
+        callbacks=[lgb.early_stopping(100, verbose=False), lgb.log_evaluation(0)]
+    )
+    
+    return fold, model, model.predict(X_val)
+
 class ProfessionalMLSystem:
     """Профессиональная ML система для анализа продаж ресторанов"""
     
-    def __init__(self):
+    def __init__(self, cv_workers=CV_WORKERS, cv_threads_per_worker=CV_THREADS_PER_WORKER, deterministic=False):
+        """
+        Args:
+            cv_workers: Процессов для фолдов (1 - последовательно, 0 - авто)
+            cv_threads_per_worker: Потоков LightGBM на процесс (0 - авто)
+            deterministic: Детерминированный LightGBM - параллельный и
+                последовательный запуск совпадают побитово
+        """
+        cpu_count = os.cpu_count() or 1
+        self.cv_workers = cv_workers or min(CV_SPLITS, cpu_count)
+        self.cv_threads_per_worker = cv_threads_per_worker or max(1, cpu_count // self.cv_workers)
+        self.deterministic = deterministic
         self.models = []
         self.feature_names = []
         self.weather_cache = {}
         self.shap_explainer = None
         self.feature_importance = None
+        self.data_watermark = None
+        self.trained_range = None
         
     def load_and_validate_data(self):
         """1) Предварительная проверка данных (ChatGPT чеклист)"""
@@ -34,7 +96,7 @@ class ProfessionalMLSystem:
         print("🔍 ЭТАП 1: ПРЕДВАРИТЕЛЬНАЯ ПРОВЕРКА ДАННЫХ")
         print("="*50)
         
-        conn = sqlite3.connect('database.sqlite')
+        conn = get_connection()
         
         # Проверяем покрытие данных
         validation_results = {}
@@ -117,7 +179,7 @@ class ProfessionalMLSystem:
         print("\n🔧 ЭТАП 2: FEATURE ENGINEERING")
         print("="*40)
         
-        conn = sqlite3.connect('database.sqlite')
+        conn = get_connection()
         
         # Загружаем объединенные данные
         print("📊 Загрузка и объединение данных...")
@@ -273,81 +335,73 @@ class ProfessionalMLSystem:
         return df
     
     def _add_weather_features(self, df):
-        """Добавляет погодные фичи используя нашу исправленную систему"""
+        """Добавляет погодные фичи из локального хранилища погоды (вся история)"""
         
         df['weather_temp'] = 27.0  # default
         df['weather_rain'] = 0.0
         df['weather_wind'] = 5.0
         
-        # Группируем по дате + ресторан для оптимизации
-        unique_combinations = df[['stat_date', 'restaurant_id', 'latitude', 'longitude']].drop_duplicates()
-        
-        # ОГРАНИЧЕНИЕ ДЛЯ ТЕСТИРОВАНИЯ: только первые 500 комбинаций
-        max_weather_requests = min(500, len(unique_combinations))
-        unique_combinations = unique_combinations.head(max_weather_requests)
+        if df.empty:
+            return
         
-        print(f"      Получаем погоду для {len(unique_combinations)} комбинаций (тестовый режим)...")
-        
-        for i, (_, row) in enumerate(unique_combinations.iterrows()):
-            if i % 50 == 0 and i > 0:
-                print(f"      Обработано {i}/{len(unique_combinations)}")
-            
-            date_str = row['stat_date'].strftime('%Y-%m-%d')
-            restaurant_id = row['restaurant_id']
-            lat, lng = row['latitude'], row['longitude']
-            
-            # Получаем погоду
-            weather = self._get_weather_for_date(date_str, restaurant_id, lat, lng)
-            
-            # Обновляем все записи для этой комбинации
-            mask = (df['stat_date'] == row['stat_date']) & (df['restaurant_id'] == restaurant_id)
-            df.loc[mask, 'weather_temp'] = weather['temp']
-            df.loc[mask, 'weather_rain'] = weather['rain']
-            df.loc[mask, 'weather_wind'] = weather['wind']
+        # Ключи погоды: дата + ячейка сетки (соседние рестораны делят погоду).
+        # Ячейка - как в ultimate системе: файл геолокаций по имени, затем restaurants
+        conn = get_connection()
+        names = dict(conn.execute("SELECT id, name FROM restaurants").fetchall())
+        conn.close()
+        restaurants = df[['restaurant_id', 'latitude', 'longitude']].drop_duplicates('restaurant_id')
+        restaurant_cells = {rid: restaurant_cell(names.get(rid), lat, lng)
+                            for rid, lat, lng in restaurants.itertuples(index=False)}
+        cells = pd.DataFrame(df['restaurant_id'].map(restaurant_cells).tolist(),
+                             columns=['cell_lat', 'cell_lon'], index=df.index)
+        keys = cells.assign(date=df['stat_date'].dt.strftime('%Y-%m-%d'))
+        ranges = keys.groupby(['cell_lat', 'cell_lon'])['date'].agg(['min', 'max'])
+        
+        print(f"      Получаем погоду для {len(keys.drop_duplicates())} комбинаций дата+ячейка "
+              f"({len(ranges)} ячеек сетки)...")
+        
+        # Все диапазоны - параллельно в хранилище погоды
+        needs = [(lat, lng, row['min'], row['max']) for (lat, lng), row in ranges.iterrows()]
+        prefetch_weather(needs)
+        
+        weather_store = get_weather_store()
+        frames = []
+        for lat, lng, start, end in needs:
+            daily = weather_store.get_daily(lat, lng, start, end, fetch=False).reset_index()
+            frames.append(daily.assign(cell_lat=lat, cell_lon=lng))
+        weather = pd.concat(frames).set_index(['date', 'cell_lat', 'cell_lon'])
+        weather = weather[~weather.index.duplicated()]
+        
+        matched = weather.reindex(pd.MultiIndex.from_frame(keys[['date', 'cell_lat', 'cell_lon']]))
+        df['weather_temp'] = matched['temperature_mean'].fillna(27.0).to_numpy()
+        df['weather_rain'] = matched['precipitation_sum'].fillna(0.0).to_numpy()
+        df['weather_wind'] = matched['wind_speed_max'].fillna(5.0).to_numpy()
     
     def _get_weather_for_date(self, date, restaurant_id, lat, lng):
         """Получает погодные данные для конкретного ресторана и даты"""
         
-        cache_key = f"{date}_{restaurant_id}"
+        # Ключ кэша - ячейка погодной сетки (пустые координаты -> Денпасар)
+        lat, lng = location_key(lat, lng)
+        cache_key = f"{date}_{lat}_{lng}"
         
         if cache_key in self.weather_cache:
             return self.weather_cache[cache_key]
         
         default_weather = {'temp': 27.0, 'rain': 0.0, 'wind': 5.0}
         
-        if pd.isna(lat) or pd.isna(lng):
-            lat, lng = -8.6500, 115.2200  # Default Denpasar
-        
         try:
-            url = "https://archive-api.open-meteo.com/v1/archive"
-            params = {
-                'latitude': lat,
-                'longitude': lng,
-                'start_date': date,
-                'end_date': date,
-                'daily': 'temperature_2m_mean,precipitation_sum,wind_speed_10m_max',
-                'timezone': 'Asia/Jakarta',
-                'elevation': 0  # КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ
-            }
+            # Локальное хранилище Open-Meteo (HTTP только при промахе)
+            daily = get_weather_store().get_day(lat, lng, date)
             
-            response = requests.get(url, params=params, timeout=5)
-            if response.status_code == 200:
-                data = response.json()
-                daily = data.get('daily', {})
+            if daily:
+                weather_data = {
+                    'temp': daily['temperature_mean'] if pd.notna(daily['temperature_mean']) else 27.0,
+                    'rain': daily['precipitation_sum'] if pd.notna(daily['precipitation_sum']) else 0.0,
+                    'wind': daily['wind_speed_max'] if pd.notna(daily['wind_speed_max']) else 5.0
+                }
                 
-                if daily:
-                    temp_mean = daily.get('temperature_2m_mean', [None])[0]
-                    precipitation = daily.get('precipitation_sum', [None])[0]
-                    wind_speed = daily.get('wind_speed_10m_max', [None])[0]
-                    
-                    weather_data = {
-                        'temp': temp_mean if temp_mean is not None else 27.0,
-                        'rain': precipitation if precipitation is not None else 0.0,
-                        'wind': wind_speed if wind_speed is not None else 5.0
-                    }
-                    
-                    self.weather_cache[cache_key] = weather_data
-                    return weather_data
+                self.weather_cache[cache_key] = weather_data
+                return weather_data
         except:
             pass
         
@@ -362,21 +416,14 @@ class ProfessionalMLSystem:
         
         # Подготовка данных
         target = 'total_sales'
-        
-        # Исключаем не-фичи из обучения
-        exclude_cols = [
-            'restaurant_id', 'stat_date', 'total_sales', 'total_orders',
-            'latitude', 'longitude', 'location_region', 'rain_category',
-            'gojek_accepting_time', 'gojek_preparation_time', 'gojek_delivery_time'
-        ]
-        
-        feature_cols = [col for col in df.columns if col not in exclude_cols]
-        
-        # Убираем NaN
-        df_clean = df.dropna(subset=feature_cols + [target])
+        feature_cols, df_clean = self._training_frame(df)
         
         X = df_clean[feature_cols]
         y = df_clean[target]
+        self.data_watermark = df_clean['stat_date'].max().strftime('%Y-%m-%d') if len(df_clean) else None
+        if len(df_clean):
+            self.trained_range = {'start': df_clean['stat_date'].min().strftime('%Y-%m-%d'),
+                                  'end': self.data_watermark}
         
         print(f"📊 Данные для обучения:")
         print(f"   Записей: {len(X):,}")
@@ -384,19 +431,42 @@ class ProfessionalMLSystem:
         print(f"   Target: {target}")
         
         # TimeSeriesSplit
-        tscv = TimeSeriesSplit(n_splits=5)
+        tscv = TimeSeriesSplit(n_splits=CV_SPLITS)
+        folds = list(tscv.split(X))
+        
+        params = dict(LGB_PARAMS, num_threads=self.cv_threads_per_worker)
+        if self.deterministic:
+            # Стабильные гистограммы и порядок суммирования при равном num_threads
+            params.update({'deterministic': True, 'force_row_wise': True})
         
         oof_predictions = np.zeros(len(y))
-        models = []
+        models = [None] * len(folds)
         cv_scores = []
         
-        print(f"\n🔄 Кросс-валидация:")
+        workers = min(self.cv_workers, len(folds))
+        print(f"\n🔄 Кросс-валидация: {len(folds)} фолдов, процессов: {workers}, "
+              f"потоков на процесс: {self.cv_threads_per_worker}"
+              f"{' (детерминированно)' if self.deterministic else ''}")
         
-        for fold, (train_idx, val_idx) in enumerate(tscv.split(X)):
-            print(f"   Fold {fold + 1}/5...")
-            
-            X_train, X_val = X.iloc[train_idx], X.iloc[val_idx]
-            y_train, y_val = y.iloc[train_idx], y.iloc[val_idx]
+        fold_args = [
+            (fold, X.iloc[train_idx], y.iloc[train_idx], X.iloc[val_idx], y.iloc[val_idx], params)
+            for fold, (train_idx, val_idx) in enumerate(folds)
+        ]
+        
+        if workers > 1:
+            # spawn: OpenMP LightGBM небезопасен после fork
+            from concurrent.futures import ProcessPoolExecutor
+            import multiprocessing
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                fold_results = list(pool.map(_train_fold, *zip(*fold_args)))
+        else:
+            fold_results = [_train_fold(*args) for args in fold_args]
+        
+        # Сборка результатов в порядке фолдов - OOF не зависит от порядка завершения
+        for fold, model, val_pred in sorted(fold_results, key=lambda r: r[0]):
+            train_idx, val_idx = folds[fold]
+            y_val = y.iloc[val_idx]
+            print(f"   Fold {fold + 1}/{len(folds)}...")
             
             # Даты для проверки
             train_dates = df_clean.iloc[train_idx]['stat_date']
@@ -404,33 +474,6 @@ class ProfessionalMLSystem:
             print(f"      Train: {train_dates.min().date()} → {train_dates.max().date()}")
             print(f"      Val:   {val_dates.min().date()} → {val_dates.max().date()}")
             
-            # LightGBM
-            train_data = lgb.Dataset(X_train, label=y_train)
-            val_data = lgb.Dataset(X_val, label=y_val, reference=train_data)
-            
-            params = {
-                'objective': 'regression',
-                'metric': 'l1',
-                'boosting_type': 'gbdt',
-                'learning_rate': 0.05,
-                'num_leaves': 64,
-                'feature_fraction': 0.8,
-                'bagging_fraction': 0.8,
-                'bagging_freq': 5,
-                'seed': 42,
-                'verbose': -1
-            }
-            
-            model = lgb.train(
-                params,
-                train_data,
-                num_boost_round=2000,
-                valid_sets=[val_data],
-                callbacks=[lgb.early_stopping(100), lgb.log_evaluation(0)]
-            )
-            
-            # Предсказания
-            val_pred = model.predict(X_val)
             oof_predictions[val_idx] = val_pred
             
             # Метрики
@@ -439,7 +482,7 @@ class ProfessionalMLSystem:
             mape = mean_absolute_percentage_error(y_val, val_pred)
             
             cv_scores.append({'mae': mae, 'r2': r2, 'mape': mape})
-            models.append(model)
+            models[fold] = model
             
             print(f"      MAE: {mae:,.0f} IDR, R²: {r2:.4f}, MAPE: {mape:.2%}")
         
@@ -467,6 +510,103 @@ class ProfessionalMLSystem:
             'y_true': y.values
         }
     
+    @staticmethod
+    def _training_frame(df, target='total_sales'):
+        """Колонки признаков и строки без пропусков для обучения"""
+        
+        # Исключаем не-фичи из обучения
+        exclude_cols = [
+            'restaurant_id', 'stat_date', 'total_sales', 'total_orders',
+            'latitude', 'longitude', 'location_region', 'rain_category',
+            'gojek_accepting_time', 'gojek_preparation_time', 'gojek_delivery_time'
+        ]
+        
+        feature_cols = [col for col in df.columns if col not in exclude_cols]
+        
+        # Убираем NaN
+        return feature_cols, df.dropna(subset=feature_cols + [target])
+    
+    def retrain_mode(self, df, force_full=False, registry=None):
+        """Политика переобучения: ('full' | 'incremental' | 'skip', причина)"""
+        
+        registry = registry or ModelRegistry()
+        feature_cols, df_clean = self._training_frame(df)
+        dates = df_clean['stat_date'].dt.strftime('%Y-%m-%d')
+        metadata = registry.metadata(PROFESSIONAL_MODEL_NAME)
+        _, seen_end = seen_range(metadata)
+        new_rows = int((dates > seen_end).sum()) if seen_end else len(dates)
+        return decide_retrain(metadata, dates.min(), dates.max(), feature_cols, new_rows, len(dates),
+                              force_full=force_full)
+    
+    def continue_training(self, df, registry=None):
+        """
+        Дообучение: продолжение бустинга текущей модели реестра (init_model)
+        на окне новых дней; последние 20% окна - валидация для early stopping
+        """
+        
+        print("\n🔁 ДООБУЧЕНИЕ LIGHTGBM НА НОВЫХ ДАННЫХ")
+        print("="*50)
+        
+        registry = registry or ModelRegistry()
+        handle = registry.load(PROFESSIONAL_MODEL_NAME)
+        if handle is None:
+            print("❌ В реестре нет модели для дообучения")
+            return None
+        
+        feature_cols = handle.feature_names
+        _, df_clean = self._training_frame(df)
+        df_clean = df_clean.sort_values('stat_date')
+        _, seen_end = seen_range(handle.metadata)
+        window = df_clean[df_clean['stat_date'].dt.strftime('%Y-%m-%d') > seen_end]
+        
+        split = int(len(window) * 0.8)
+        if split < 10 or len(window) - split < 2:
+            print(f"❌ Недостаточно новых данных для дообучения: {len(window)} строк")
+            return None
+        fit_part, val_part = window.iloc[:split], window.iloc[split:]
+        
+        train_data = lgb.Dataset(fit_part[feature_cols], label=fit_part['total_sales'])
+        val_data = lgb.Dataset(val_part[feature_cols], label=val_part['total_sales'], reference=train_data)
+        params = dict(LGB_PARAMS, num_threads=self.cv_threads_per_worker)
+        if self.deterministic:
+            params.update({'deterministic': True, 'force_row_wise': True})
+        
+        model = lgb.train(
+            params,
+            train_data,
+            num_boost_round=LGB_INCREMENT_ROUNDS,
+            valid_sets=[val_data],
+            init_model=handle.model,
+            callbacks=[lgb.early_stopping(50, verbose=False), lgb.log_evaluation(0)]
+        )
+        
+        val_pred = model.predict(val_part[feature_cols])
+        metrics = {
+            'window_mae': mean_absolute_error(val_part['total_sales'], val_pred),
+            'window_r2': r2_score(val_part['total_sales'], val_pred),
+            'window_rows': len(window),
+            'num_trees': model.num_trees()
+        }
+        window_start = window['stat_date'].min().strftime('%Y-%m-%d')
+        self.data_watermark = window['stat_date'].max().strftime('%Y-%m-%d')
+        
+        version = registry.save(
+            PROFESSIONAL_MODEL_NAME,
+            {'model': model, 'models': [model]},
+            feature_names=feature_cols,
+            metrics=metrics,
+            data_watermark=self.data_watermark,
+            trained_range=next_trained_range(handle.metadata, 'incremental', window_start, self.data_watermark),
+            lineage=next_lineage(handle.metadata, 'incremental')
+        )
+        
+        self.models = [model]
+        self.feature_names = feature_cols
+        print(f"   ✅ Дообучено на {len(window):,} новых строках ({window_start} → {self.data_watermark})")
+        print(f"   📊 MAE окна: {metrics['window_mae']:,.0f} IDR, R²: {metrics['window_r2']:.4f}")
+        print(f"   ✅ Модель сохранена в реестр: {PROFESSIONAL_MODEL_NAME} {version}")
+        return metrics
+    
     def analyze_with_shap(self, df, model_results):
         """5) SHAP анализ и объяснения"""
         
@@ -606,9 +746,21 @@ class ProfessionalMLSystem:
         
         print(f"\n💾 СОХРАНЕНИЕ РЕЗУЛЬТАТОВ:")
         
-        # Сохраняем модели
-        joblib.dump(model_results['models'], 'professional_ml_models.pkl')
-        print(f"   ✅ Модели сохранены: professional_ml_models.pkl")
+        # Сохраняем модели фолдов новой версией в реестре
+        version = ModelRegistry().save(
+            PROFESSIONAL_MODEL_NAME,
+            {'model': model_results['models'][-1], 'models': model_results['models']},
+            feature_names=model_results['feature_names'],
+            metrics={
+                'mae': model_results['overall_mae'],
+                'r2': model_results['overall_r2'],
+                'cv_scores': model_results['cv_scores']
+            },
+            data_watermark=self.data_watermark,
+            trained_range=self.trained_range,
+            lineage=next_lineage(None, 'full')
+        )
+        print(f"   ✅ Модели сохранены в реестр: {PROFESSIONAL_MODEL_NAME} {version}")
         
         # Сохраняем SHAP
         joblib.dump(shap_results, 'professional_shap_results.pkl')
@@ -627,8 +779,17 @@ def main():
     print("Адаптированная под структуру: grab_stats + gojek_stats + restaurants")
     print("="*70)
     
+    import argparse
+    parser = argparse.ArgumentParser(description="Профессиональная ML система")
+    parser.add_argument('--workers', type=int, default=CV_WORKERS, help='Процессов для фолдов CV (1 - последовательно)')
+    parser.add_argument('--threads', type=int, default=CV_THREADS_PER_WORKER, help='Потоков LightGBM на процесс')
+    parser.add_argument('--deterministic', action='store_true', help='Побитово воспроизводимое обучение')
+    parser.add_argument('--full', action='store_true', help='Полная пересборка вместо дообучения')
+    args = parser.parse_args()
+    
     # Инициализация
-    ml_system = ProfessionalMLSystem()
+    ml_system = ProfessionalMLSystem(cv_workers=args.workers, cv_threads_per_worker=args.threads,
+                                     deterministic=args.deterministic)
     
     # 1) Валидация данных
     if not ml_system.load_and_validate_data():
@@ -638,6 +799,16 @@ def main():
     # 2) Feature Engineering
     df = ml_system.build_feature_dataset()
     
+    # Политика: дообучение на новых днях, полная пересборка или ничего
+    mode, reason = ml_system.retrain_mode(df, force_full=args.full)
+    print(f"🔁 Режим переобучения: {mode} ({reason})")
+    if mode == 'skip':
+        return
+    if mode == 'incremental':
+        if ml_system.continue_training(df) is not None:
+            return
+        print("⚠️ Дообучение не удалось - полная пересборка")
+    
     # 3) Обучение с TimeSeriesSplit
     model_results = ml_system.train_with_time_series_cv(df)
     
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+🗃️ КЕШ МОДЕЛЕЙ РЕСТОРАНОВ
+==========================================
+Обученные модели IntegratedMLDetective по ключу ресторана (или кластера).
+
+✅ КАК РАБОТАЕТ:
+- Запись: модель, схема признаков, trained_range, lineage, метрики
+- В памяти - LRU на MAX_CACHED_MODELS записей, на диске - один joblib на ключ
+  (data/models/restaurant_cache/<ключ>.joblib), переживает перезапуск
+- Запись актуальна, пока водяной знак daily_facts ресторана равен
+  trained_range['end']; новые дни - дообучение или пересборка
+  (политика incremental_training.decide_retrain)
+- SHAP объяснитель - из кеша shap_explainer по версии записи
+
+Повторный анализ того же ресторана не обучает модель вообще.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+import joblib
+
+from src.ml_models.model_registry import REGISTRY_DIR
+
+RESTAURANT_CACHE_DIR = os.getenv('RESTAURANT_MODEL_CACHE_DIR', os.path.join(REGISTRY_DIR, 'restaurant_cache'))
+MAX_CACHED_MODELS = int(os.getenv('MAX_CACHED_MODELS', '16'))
+
+
+def entry_version(key: str, entry: Dict[str, Any]) -> str:
+    """Версия записи для кеша SHAP: ключ, конец обучающих данных, номер дообучения, подпись данных"""
+    trained_end = (entry.get('trained_range') or {}).get('end')
+    increments = (entry.get('lineage') or {}).get('increments', 0)
+    signature = entry.get('data_signature')
+    return f"{key}@{trained_end}#{increments}" + (f"~{signature}" if signature else '')
+
+
+class RestaurantModelCache:
+    """LRU кеш моделей в памяти с сохранением на диск"""
+
+    def __init__(self, root: str = RESTAURANT_CACHE_DIR, max_entries: int = MAX_CACHED_MODELS):
+        self.root = root
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.joblib")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Запись по ключу: из памяти, иначе с диска; None если нет"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+
+        try:
+            entry = joblib.load(self._path(key))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"⚠️ Кеш модели {key} поврежден: {e}")
+            return None
+        self._remember(key, entry)
+        return entry
+
+    def put(self, key: str, entry: Dict[str, Any]):
+        """Сохраняет запись в память и на диск (атомарная замена файла)"""
+        self._remember(key, entry)
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+            joblib.dump(entry, tmp_path)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print(f"⚠️ Кеш модели {key} не сохранен на диск: {e}")
+
+    def _remember(self, key: str, entry: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_cache: Optional[RestaurantModelCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_restaurant_model_cache() -> RestaurantModelCache:
+    """Общий для процесса кеш моделей ресторанов"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RestaurantModelCache()
+    return _cache
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+🧠 КЕШ SHAP ОБЪЯСНИТЕЛЕЙ
+==========================================
+shap.TreeExplainer строится один раз на версию модели, а не на каждый день.
+
+✅ ИСПОЛЬЗОВАНИЕ:
+- get_tree_explainer(model, version) - объяснитель из кеша процесса
+- explain_batch(model, X, version) - SHAP значения всей матрицы одним вызовом
+
+Отчет с 15 проблемными днями = один проход SHAP по матрице 15 x признаки.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Optional, Any
+
+import numpy as np
+
+try:
+    import shap
+    SHAP_AVAILABLE = True
+except ImportError:
+    SHAP_AVAILABLE = False
+
+# Сколько объяснителей держать в памяти (по одному на версию модели)
+MAX_EXPLAINERS = 4
+
+_explainers = OrderedDict()
+_explainers_lock = threading.Lock()
+
+
+def _cache_key(model, version: Optional[str]):
+    # Без версии - идентичность объекта модели (модель хранится в кеше вместе с
+    # объяснителем, поэтому id не может быть переиспользован)
+    return ('version', version) if version else ('object', id(model))
+
+
+def get_tree_explainer(model, version: Optional[str] = None):
+    """
+    TreeExplainer для модели из кеша процесса
+
+    Args:
+        model: Обученная древесная модель
+        version: Версия модели в реестре (если есть)
+    """
+    if not SHAP_AVAILABLE:
+        raise ImportError("shap не установлен: pip install shap")
+
+    key = _cache_key(model, version)
+    with _explainers_lock:
+        cached = _explainers.get(key)
+        if cached is not None and cached[0] is model:
+            _explainers.move_to_end(key)
+            return cached[1]
+
+    # Строим вне блокировки - для 300 деревьев это заметное время
+    explainer = shap.TreeExplainer(model)
+    with _explainers_lock:
+        _explainers[key] = (model, explainer)
+        _explainers.move_to_end(key)
+        while len(_explainers) > MAX_EXPLAINERS:
+            _explainers.popitem(last=False)
+    return explainer
+
+
+def explain_batch(model, X: Any, version: Optional[str] = None) -> np.ndarray:
+    """SHAP значения для всех строк X одним вызовом: массив (строки, признаки)"""
+    if len(X) == 0:
+        return np.zeros((0, np.shape(X)[1] if np.ndim(X) == 2 else 0))
+    values = get_tree_explainer(model, version).shap_values(X)
+    # Классификаторы возвращают список по классам - берем последний класс
+    if isinstance(values, list):
+        values = values[-1]
+    return np.asarray(values)
+
+
+def clear_explainers():
+    """Сбрасывает кеш объяснителей (после переобучения)"""
+    with _explainers_lock:
+        _explainers.clear()
@@ -23,8 +23,34 @@ import json
 import os
 from datetime import datetime, timedelta
 import warnings
+import threading
 warnings.filterwarnings('ignore')
 
+# Общий пул read-only подключений к SQLite
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from src.utils.db_pool import get_connection
+from src.utils.daily_facts import load_daily_facts
+from src.utils.weather_store import get_weather_store, restaurant_cell, LOCATIONS_PATH
+from src.utils.feature_store import get_feature_store, FEATURE_SCHEMA_VERSION
+from src.utils.weather_prefetcher import prefetch_weather
+from src.utils.calendar_dimension import HOLIDAY_FILES, load_holidays, get_calendar
+from src.utils.tourism_store import TOURISM_FILES, load_tourism, TOTAL_COUNTRY
+from src.ml_models.model_registry import ModelRegistry, get_model
+from src.ml_models.compact_model import distill_ultimate_model
+from src.ml_models.incremental_training import (
+    decide_retrain, next_lineage, next_trained_range, seen_range, warm_start_forest
+)
+
+# Имя модели в реестре (data/models/ultimate_rf)
+ULTIMATE_MODEL_NAME = 'ultimate_rf'
+
+# Таблица признаков в хранилище (data/feature_store/ultimate_features)
+ULTIMATE_FEATURES_NAME = 'ultimate_features'
+
+# Входные файлы признаков: их изменение - полная пересборка хранилища
+ULTIMATE_FEATURE_INPUTS = TOURISM_FILES + HOLIDAY_FILES + [LOCATIONS_PATH]
+
 class UltimateCompleteMLSystem:
     """Максимально полная ML система"""
     
@@ -34,22 +60,47 @@ class UltimateCompleteMLSystem:
         self.ultimate_feature_importance = {}
         self.trained_model = None
         self.scaler = StandardScaler()
+        self.feature_names = []
+        self.training_metrics = {}
+        self.data_watermark = None
+        self.trained_range = None
+        self.lineage = None
+        self.model_version = None
         
         # Кэш для внешних данных
         self.weather_cache = {}
+        self.restaurant_cells = {}
         self.tourist_data = {}
         self.holidays_data = {}
         self.restaurant_locations = {}
         
-    def build_ultimate_dataset(self):
-        """Строит максимально полный датасет"""
+    def load_ultimate_features(self, columns=None, start_date=None, end_date=None, restaurant_ids=None, full=False):
+        """
+        Датасет из хранилища признаков: пересобираются только устаревшие месяцы,
+        читаются только нужные месяцы и колонки
+        """
+        
+        try:
+            store = get_feature_store(ULTIMATE_FEATURES_NAME, self.db_path)
+            store.sync(self.build_ultimate_dataset, inputs=ULTIMATE_FEATURE_INPUTS, full=full,
+                       month_inputs=get_weather_store().month_coverage)
+            return store.read(columns=columns, start_date=start_date, end_date=end_date, restaurant_ids=restaurant_ids)
+        except Exception as e:
+            print(f"⚠️ Хранилище признаков недоступно ({e}), строим датасет заново")
+            data = self.build_ultimate_dataset(start_date, end_date)
+            if restaurant_ids is not None:
+                data = data[data['restaurant_id'].isin(list(restaurant_ids))]
+            return data if columns is None else data[['stat_date', 'restaurant_id'] + [c for c in columns if c not in ('stat_date', 'restaurant_id')]]
+    
+    def build_ultimate_dataset(self, start_date=None, end_date=None):
+        """Строит максимально полный датасет (за период, по умолчанию - всю историю)"""
         
         print("🚀 СОЗДАНИЕ МАКСИМАЛЬНО ПОЛНОГО ДАТАСЕТА")
         print("=" * 80)
         
         # 1. Загружаем базовые данные из БД
         print("📊 Шаг 1: Загрузка данных из базы...")
-        base_data = self._load_base_restaurant_data()
+        base_data = self._load_base_restaurant_data(start_date, end_date)
         print(f"   ✅ Загружено {len(base_data)} записей с {len(base_data.columns)} колонками")
         
         # 2. Загружаем геолокации ресторанов
@@ -74,117 +125,104 @@ class UltimateCompleteMLSystem:
         
         return enriched_data
         
-    def _load_base_restaurant_data(self):
-        """Загружает базовые данные из БД"""
-        
-        conn = sqlite3.connect(self.db_path)
-        
-        # МЕГА-ЗАПРОС с МАКСИМУМОМ данных
-        query = """
-        SELECT 
-            g.stat_date,
-            r.name as restaurant_name,
-            r.id as restaurant_id,
-            
-            -- ========== ПРОДАЖИ И ЗАКАЗЫ ==========
-            COALESCE(g.sales, 0) as grab_sales,
-            COALESCE(gj.sales, 0) as gojek_sales,
-            COALESCE(g.sales, 0) + COALESCE(gj.sales, 0) as total_sales,
-            COALESCE(g.orders, 0) as grab_orders,
-            COALESCE(gj.orders, 0) as gojek_orders,
-            COALESCE(g.orders, 0) + COALESCE(gj.orders, 0) as total_orders,
-            
-            -- ========== СРЕДНИЙ ЧЕК ==========
-            CASE WHEN COALESCE(g.orders, 0) > 0 
-                 THEN COALESCE(g.sales, 0) / COALESCE(g.orders, 0)
-                 ELSE 0 END as grab_aov,
-            CASE WHEN COALESCE(gj.orders, 0) > 0 
-                 THEN COALESCE(gj.sales, 0) / COALESCE(gj.orders, 0)
-                 ELSE 0 END as gojek_aov,
-            CASE WHEN (COALESCE(g.orders, 0) + COALESCE(gj.orders, 0)) > 0 
-                 THEN (COALESCE(g.sales, 0) + COALESCE(gj.sales, 0)) / (COALESCE(g.orders, 0) + COALESCE(gj.orders, 0))
-                 ELSE 0 END as total_aov,
-            
-            -- ========== РЕЙТИНГИ ==========
-            COALESCE(g.rating, 4.5) as grab_rating,
-            COALESCE(gj.rating, 4.5) as gojek_rating,
-            (COALESCE(g.rating, 4.5) + COALESCE(gj.rating, 4.5)) / 2 as avg_rating,
-            
-            -- ========== МАРКЕТИНГ ==========
-            COALESCE(g.ads_spend, 0) as grab_ads_spend,
-            COALESCE(gj.ads_spend, 0) as gojek_ads_spend,
-            COALESCE(g.ads_spend, 0) + COALESCE(gj.ads_spend, 0) as total_ads_spend,
-            COALESCE(g.ads_sales, 0) as grab_ads_sales,
-            COALESCE(gj.ads_sales, 0) as gojek_ads_sales,
-            COALESCE(g.ads_sales, 0) + COALESCE(gj.ads_sales, 0) as total_ads_sales,
-            
-            -- ВОРОНКА GRAB
-            COALESCE(g.impressions, 0) as grab_impressions,
-            COALESCE(g.unique_menu_visits, 0) as grab_menu_visits,
-            COALESCE(g.unique_add_to_carts, 0) as grab_add_to_carts,
-            COALESCE(g.ads_orders, 0) as grab_ads_orders,
-            COALESCE(g.ads_ctr, 0) as grab_ctr,
-            
-            -- ROAS
-            CASE WHEN COALESCE(g.ads_spend, 0) > 0
-                 THEN COALESCE(g.ads_sales, 0) / COALESCE(g.ads_spend, 0)
-                 ELSE 0 END as grab_roas,
-            CASE WHEN COALESCE(gj.ads_spend, 0) > 0
-                 THEN COALESCE(gj.ads_sales, 0) / COALESCE(gj.ads_spend, 0)
-                 ELSE 0 END as gojek_roas,
-            
-            -- ========== ОПЕРАЦИОННЫЕ ==========
-            COALESCE(g.store_is_closed, 0) as grab_closed,
-            COALESCE(gj.store_is_closed, 0) as gojek_closed,
-            COALESCE(g.out_of_stock, 0) as grab_out_of_stock,
-            COALESCE(gj.out_of_stock, 0) as gojek_out_of_stock,
-            COALESCE(g.cancelled_orders, 0) as grab_cancelled,
-            COALESCE(gj.cancelled_orders, 0) as gojek_cancelled,
-            
-            -- ========== ВРЕМЯ ==========
-            COALESCE(gj.accepting_time, 0) as accepting_time,
-            COALESCE(gj.preparation_time, 0) as preparation_time,
-            COALESCE(gj.delivery_time, 0) as delivery_time,
-            
-            -- ========== КЛИЕНТЫ ==========
-            COALESCE(g.new_customers, 0) as grab_new_customers,
-            COALESCE(gj.new_client, 0) as gojek_new_customers,
-            COALESCE(g.repeated_customers, 0) as grab_repeated_customers,
-            COALESCE(gj.returned_client, 0) as gojek_repeated_customers,
-            
-            -- ========== ДЕТАЛЬНЫЕ РЕЙТИНГИ ==========
-            COALESCE(gj.one_star_ratings, 0) as one_star,
-            COALESCE(gj.two_star_ratings, 0) as two_star,
-            COALESCE(gj.three_star_ratings, 0) as three_star,
-            COALESCE(gj.four_star_ratings, 0) as four_star,
-            COALESCE(gj.five_star_ratings, 0) as five_star,
-            
-            -- ========== ВРЕМЕННЫЕ ==========
-            CAST(strftime('%w', g.stat_date) AS INTEGER) as day_of_week,
-            CAST(strftime('%m', g.stat_date) AS INTEGER) as month,
-            CAST(strftime('%j', g.stat_date) AS INTEGER) as day_of_year,
-            CAST(strftime('%W', g.stat_date) AS INTEGER) as week_of_year
-            
-        FROM grab_stats g
-        LEFT JOIN gojek_stats gj ON g.restaurant_id = gj.restaurant_id 
-                                 AND g.stat_date = gj.stat_date
-        LEFT JOIN restaurants r ON g.restaurant_id = r.id
-        WHERE g.stat_date >= '2023-01-01'
-        AND r.name IS NOT NULL
-        AND (g.sales > 0 OR gj.sales > 0)
-        ORDER BY g.stat_date, r.name
-        """
-        
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        
-        return df
+    def _load_base_restaurant_data(self, start_date=None, end_date=None):
+        """Загружает базовые данные из таблицы дневных фактов"""
+        
+        # Ресторан-дни GRAB + GOJEK (время и оффлайн уже в минутах)
+        f = load_daily_facts(start_date=max(start_date or '', '2023-01-01'), end_date=end_date, db_path=self.db_path)
+        f = f[f['total_sales'] > 0].reset_index(drop=True)
+        
+        def ratio(numerator, denominator):
+            return (numerator / denominator.where(denominator > 0)).fillna(0)
+        
+        dates = pd.to_datetime(f['stat_date'])
+        grab_rating = f['grab_rating'].fillna(4.5)
+        gojek_rating = f['gojek_rating'].fillna(4.5)
+        
+        df = pd.DataFrame({
+            'stat_date': f['stat_date'],
+            'restaurant_name': f['restaurant_name'],
+            'restaurant_id': f['restaurant_id'],
+            
+            # ========== ПРОДАЖИ И ЗАКАЗЫ ==========
+            'grab_sales': f['grab_sales'],
+            'gojek_sales': f['gojek_sales'],
+            'total_sales': f['total_sales'],
+            'grab_orders': f['grab_orders'],
+            'gojek_orders': f['gojek_orders'],
+            'total_orders': f['total_orders'],
+            
+            # ========== СРЕДНИЙ ЧЕК ==========
+            'grab_aov': ratio(f['grab_sales'], f['grab_orders']),
+            'gojek_aov': ratio(f['gojek_sales'], f['gojek_orders']),
+            'total_aov': ratio(f['total_sales'], f['total_orders']),
+            
+            # ========== РЕЙТИНГИ ==========
+            'grab_rating': grab_rating,
+            'gojek_rating': gojek_rating,
+            'avg_rating': (grab_rating + gojek_rating) / 2,
+            
+            # ========== МАРКЕТИНГ ==========
+            'grab_ads_spend': f['grab_ads_spend'],
+            'gojek_ads_spend': f['gojek_ads_spend'],
+            'total_ads_spend': f['total_ads_spend'],
+            'grab_ads_sales': f['grab_ads_sales'],
+            'gojek_ads_sales': f['gojek_ads_sales'],
+            'total_ads_sales': f['total_ads_sales'],
+            
+            # ВОРОНКА GRAB
+            'grab_impressions': f['grab_impressions'],
+            'grab_menu_visits': f['grab_menu_visits'],
+            'grab_add_to_carts': f['grab_add_to_carts'],
+            'grab_ads_orders': f['grab_ads_orders'],
+            'grab_ctr': f['grab_ctr'],
+            
+            # ROAS
+            'grab_roas': ratio(f['grab_ads_sales'], f['grab_ads_spend']),
+            'gojek_roas': ratio(f['gojek_ads_sales'], f['gojek_ads_spend']),
+            
+            # ========== ОПЕРАЦИОННЫЕ ==========
+            'grab_closed': f['grab_closed'],
+            'gojek_closed': f['gojek_closed'],
+            'grab_out_of_stock': f['grab_out_of_stock'],
+            'gojek_out_of_stock': f['gojek_out_of_stock'],
+            'grab_cancelled': f['grab_cancelled'],
+            'gojek_cancelled': f['gojek_cancelled'],
+            'grab_offline_minutes': f['grab_offline_minutes'],
+            'gojek_offline_minutes': f['gojek_offline_minutes'],
+            
+            # ========== ВРЕМЯ (минуты) ==========
+            'accepting_time': f['gojek_accepting_min'].fillna(0),
+            'preparation_time': f['gojek_preparation_min'].fillna(0),
+            'delivery_time': f['gojek_delivery_min'].fillna(0),
+            
+            # ========== КЛИЕНТЫ ==========
+            'grab_new_customers': f['grab_new_customers'],
+            'gojek_new_customers': f['gojek_new_customers'],
+            'grab_repeated_customers': f['grab_repeated_customers'],
+            'gojek_repeated_customers': f['gojek_repeated_customers'],
+            
+            # ========== ДЕТАЛЬНЫЕ РЕЙТИНГИ ==========
+            'one_star': f['one_star'],
+            'two_star': f['two_star'],
+            'three_star': f['three_star'],
+            'four_star': f['four_star'],
+            'five_star': f['five_star'],
+            
+            # ========== ВРЕМЕННЫЕ ==========
+            'day_of_week': (dates.dt.dayofweek + 1) % 7,
+            'month': dates.dt.month,
+            'day_of_year': dates.dt.dayofyear,
+            'week_of_year': dates.dt.strftime('%W').astype(int),
+        })
+        
+        return df.sort_values(['stat_date', 'restaurant_name']).reset_index(drop=True)
         
     def _load_restaurant_locations(self):
         """Загружает геолокации ресторанов"""
         
         try:
-            with open('data/bali_restaurant_locations.json', 'r', encoding='utf-8') as f:
+            with open(LOCATIONS_PATH, 'r', encoding='utf-8') as f:
                 locations = json.load(f)
                 
             if isinstance(locations, list):
@@ -212,203 +250,42 @@ class UltimateCompleteMLSystem:
             print(f"   ⚠️ Ошибка загрузки локаций: {e}, используем координаты Бали по умолчанию")
             
     def _load_tourist_data(self):
-        """Загружает туристические данные"""
-        
-        tourist_files = [
-            'data/tourism/Kunjungan_Wisatawan_Bali_2024.xls',  # ПОЛНЫЕ 12 МЕСЯЦЕВ - ПРИОРИТЕТ!
-            'data/tourism/1.-Data-Kunjungan-2024.xls',  # Только 5 месяцев (резерв)
-            'data/tourism/1.-Data-Kunjungan-2025-3.xls',
-            '1.-Data-Kunjungan-2024.xls',  # Резервная копия
-            '1.-Data-Kunjungan-2025-3.xls',  # Резервная копия
-            'data/Table-1-7-Final-1-1.xls'
-        ]
-        
-        for file_path in tourist_files:
-            if os.path.exists(file_path):
-                try:
-                    # Специальная обработка для файла Kunjungan_Wisatawan_Bali_2024.xls (он в CSV формате)
-                    if 'Kunjungan_Wisatawan_Bali_2024' in file_path:
-                        print(f"   📊 Парсинг ПОЛНОГО файла за 2024 {file_path}...")
-                        
-                        # Читаем как текстовый файл и парсим вручную
-                        with open(file_path, 'r') as f:
-                            lines = f.readlines()
-                        
-                        # Находим строку с заголовками
-                        header_line = None
-                        for i, line in enumerate(lines):
-                            if 'Country,Jan,Feb' in line:
-                                header_line = i
-                                break
-                        
-                        if header_line is not None:
-                            # Парсим данные по странам
-                            country_data = []
-                            for i in range(header_line + 1, len(lines)):
-                                line = lines[i].strip()
-                                if line and ',' in line:
-                                    parts = line.split(',')
-                                    if len(parts) >= 13:
-                                        try:
-                                            month_values = [int(parts[j]) for j in range(1, 13)]
-                                            country_data.append(month_values)
-                                        except ValueError:
-                                            continue
-                            
-                            # Суммируем по месяцам
-                            if country_data:
-                                months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-                                month_mapping = {
-                                    'Jan': '01', 'Feb': '02', 'Mar': '03', 'Apr': '04',
-                                    'May': '05', 'Jun': '06', 'Jul': '07', 'Aug': '08',
-                                    'Sep': '09', 'Oct': '10', 'Nov': '11', 'Dec': '12'
-                                }
-                                
-                                for month_idx, month_name in enumerate(months):
-                                    month_total = sum(country[month_idx] for country in country_data)
-                                    month_num = month_mapping[month_name]
-                                    self.tourist_data[f"2024-{month_num}"] = month_total
-                                    print(f"      {month_name} (2024-{month_num}): {month_total:,} туристов")
-                                
-                                # Добавляем данные за 2025 (экстраполяция с ростом 8%)
-                                tourist_2025_data = {}
-                                for month_idx, month_name in enumerate(months):
-                                    month_total = sum(country[month_idx] for country in country_data)
-                                    # Рост 8% для 2025
-                                    month_total_2025 = int(month_total * 1.08)
-                                    month_num = month_mapping[month_name]
-                                    tourist_2025_data[f"2025-{month_num}"] = month_total_2025
-                                    
-                                self.tourist_data.update(tourist_2025_data)
-                                
-                                print(f"   📈 Добавлены данные за 2025 (рост +8%):")
-                                for key in sorted(tourist_2025_data.keys()):
-                                    print(f"      {key}: {tourist_2025_data[key]:,} туристов")
-                                
-                                print(f"   ✅ Загружено ПОЛНЫХ {len(self.tourist_data)} месяцев туристических данных (2024 + 2025)")
-                                break  # Полные данные найдены, прекращаем поиск
-                    
-                    # Для остальных файлов - обычное Excel чтение
-                    else:
-                        df = pd.read_excel(file_path, engine='xlrd' if file_path.endswith('.xls') else 'openpyxl')
-                        
-                        # ПРАВИЛЬНЫЙ парсинг для файла Data-Kunjungan-2024.xls
-                        if 'Data-Kunjungan-2024' in file_path and len(df) > 1:
-                            print(f"   📊 Парсинг полного файла {file_path}...")
-                            
-                            # Находим строку TOTAL (обычно последняя значимая строка)
-                            total_row = None
-                            for i, row in df.iterrows():
-                                if isinstance(row.iloc[1], str) and 'total' in str(row.iloc[1]).lower():
-                                    total_row = i
-                                    break
-                            
-                            if total_row is not None:
-                                months = ['JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUNE', 'JULY', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC']
-                                month_mapping = {
-                                    'JAN': '01', 'FEB': '02', 'MAR': '03', 'APR': '04', 
-                                    'MAY': '05', 'JUNE': '06', 'JULY': '07', 'AUG': '08',
-                                    'SEP': '09', 'OCT': '10', 'NOV': '11', 'DEC': '12'
-                                }
-                                
-                                # Извлекаем данные по месяцам из строки TOTAL
-                                for col_idx in range(2, min(14, len(df.columns))):  # Колонки 2-13 это месяцы
-                                    if col_idx - 2 < len(months):
-                                        month_name = months[col_idx - 2]
-                                        month_num = month_mapping[month_name]
-                                        
-                                        try:
-                                            tourists = float(df.iloc[total_row, col_idx])
-                                            if not pd.isna(tourists) and tourists > 0:
-                                                self.tourist_data[f"2024-{month_num}"] = int(tourists)
-                                                print(f"      {month_name} (2024-{month_num}): {int(tourists):,} туристов")
-                                        except (ValueError, TypeError):
-                                            pass
-                                
-                                if self.tourist_data:
-                                    print(f"   ✅ Загружено {len(self.tourist_data)} месяцев туристических данных")
-                                    break  # Если загрузили данные, прекращаем перебор файлов
-                                
-                        # Простая обработка для других файлов
-                        elif len(df) > 0:
-                            for i, row in df.iterrows():
-                                tourists = sum([val for val in row.values if isinstance(val, (int, float)) and val > 0 and val < 10000000])
-                                if tourists > 0 and i < 12:
-                                    month = i + 1 if i < 12 else (i % 12) + 1
-                                    self.tourist_data[f"2024-{month:02d}"] = tourists
-                                
-                except Exception as e:
-                    print(f"   ⚠️ Ошибка загрузки {file_path}: {e}")
+        """Загружает туристические данные (предразобранная таблица tourism_arrivals)"""
+        
+        totals = load_tourism(self.db_path, country=TOTAL_COUNTRY)
+        if totals.empty:
+            print("   ⚠️ Туристические данные не найдены (python main.py tourism)")
+            return
+        
+        # Основной источник - первый по приоритету TOURISM_FILES
+        source = totals['source'].iloc[0]
+        primary = totals[totals['source'] == source]
+        for year, month, tourists in primary[['year', 'month', 'arrivals']].itertuples(index=False):
+            self.tourist_data[f"{year}-{month:02d}"] = int(tourists)
+        print(f"   📊 Источник {source}: {len(primary)} месяцев")
+        
+        # Полный год - экстраполяция на следующий год (рост 8%)
+        last_year = int(primary['year'].max())
+        last = primary[primary['year'] == last_year]
+        if len(last) == 12:
+            for month, tourists in last[['month', 'arrivals']].itertuples(index=False):
+                self.tourist_data.setdefault(f"{last_year + 1}-{month:02d}", int(tourists * 1.08))
+            print(f"   📈 Добавлены данные за {last_year + 1} (рост +8%)")
                     
     def _load_holidays_data(self):
-        """Загружает данные о праздниках"""
-        
-        holiday_files = [
-            'data/comprehensive_holiday_analysis.json',  # ПОЛНАЯ БАЗА 164 - ПРИОРИТЕТ!
-            'data/real_holiday_impact_analysis.json'
-        ]
-        
-        for file_path in holiday_files:
-            if os.path.exists(file_path):
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        
-                    # Извлекаем праздники из разных форматов
-                    if 'results' in data and len(data.get('results', {})) > 100:
-                        # ПОЛНАЯ БАЗА comprehensive_holiday_analysis.json (164 праздника)
-                        print(f"   🎭 ПОЛНАЯ БАЗА: {len(data['results'])} праздников")
-                        
-                        types_count = {}
-                        for date, holiday_info in data['results'].items():
-                            holiday_name = holiday_info.get('name', 'Holiday')
-                            holiday_type = holiday_info.get('type', 'unknown')
-                            
-                            self.holidays_data[date] = {
-                                'name': holiday_name,
-                                'type': holiday_type,
-                                'category': holiday_info.get('category', 'Unknown')
-                            }
-                            
-                            types_count[holiday_type] = types_count.get(holiday_type, 0) + 1
-                        
-                        print(f"   ✅ Загружены ВСЕ типы праздников:")
-                        for htype, count in sorted(types_count.items()):
-                            print(f"      • {htype}: {count} праздников")
-                        
-                        return  # Полная база загружена, прекращаем
-                        
-                    elif 'holidays' in data:
-                        self.holidays_data.update(data['holidays'])
-                    elif 'balinese_holidays' in data:
-                        self.holidays_data.update(data['balinese_holidays'])
-                    elif isinstance(data, dict):
-                        # Если это прямой словарь дат
-                        for key, value in data.items():
-                            if isinstance(key, str) and '-' in key:  # Похоже на дату
-                                self.holidays_data[key] = value
-                                
-                except Exception as e:
-                    print(f"   ⚠️ Ошибка загрузки {file_path}: {e}")
-                    
-        # Добавляем основные известные праздники
-        known_holidays = {
-            '2024-01-01': 'New Year',
-            '2024-03-11': 'Nyepi (Balinese New Year)',
-            '2024-05-01': 'Labor Day',
-            '2024-08-17': 'Independence Day',
-            '2024-12-25': 'Christmas',
-            '2025-01-01': 'New Year',
-            '2025-03-29': 'Nyepi (Balinese New Year)',
-            '2025-05-01': 'Labor Day',
-            '2025-08-17': 'Independence Day',
-            '2025-12-25': 'Christmas'
-        }
+        """Загружает данные о праздниках (общий источник календарного измерения)"""
+        
+        self.holidays_data = load_holidays()
         
-        self.holidays_data.update(known_holidays)
+        types_count = {}
+        for holiday in self.holidays_data.values():
+            types_count[holiday['type']] = types_count.get(holiday['type'], 0) + 1
+        print(f"   ✅ Загружены типы праздников:")
+        for htype, count in sorted(types_count.items()):
+            print(f"      • {htype}: {count} праздников")
         
     def _enrich_with_external_data(self, base_data):
-        """Обогащает данные внешними факторами"""
+        """Обогащает данные внешними факторами (векторно: merge таблиц погоды и календаря)"""
         
         enriched_data = base_data.copy()
         
@@ -436,129 +313,132 @@ class UltimateCompleteMLSystem:
         
         print(f"   🌤️ Загружаем погодные данные...")
         
-        # Группируем по дате И ресторану для индивидуальной погоды
-        unique_combinations = enriched_data[['stat_date', 'restaurant_id']].drop_duplicates()
-        
-        print(f"      🌤️ Получаем погоду для {len(unique_combinations)} комбинаций дата+ресторан...")
-        
-        for i, (_, row) in enumerate(unique_combinations.iterrows()):
-            if i % 50 == 0:
-                print(f"      Обработано {i}/{len(unique_combinations)} комбинаций...")
-            
-            date = row['stat_date']
-            restaurant_id = row['restaurant_id']
-                
-            # Погодные данные ДЛЯ КОНКРЕТНОГО РЕСТОРАНА
-            weather_data = self._get_weather_for_date(date, restaurant_id)
-            
-            # Праздники (одинаковые для всех ресторанов)
-            is_holiday = 1 if date in self.holidays_data else 0
-            holiday_type = self.holidays_data.get(date, 'none')
-            
-            # Туристический поток (одинаковый для всех ресторанов)
-            date_month = date[:7]  # YYYY-MM
-            tourist_flow = self.tourist_data.get(date_month, 0)
-            
-            # Обновляем записи для этой КОНКРЕТНОЙ комбинации дата+ресторан
-            mask = (enriched_data['stat_date'] == date) & (enriched_data['restaurant_id'] == restaurant_id)
-            enriched_data.loc[mask, 'weather_temp'] = weather_data['temp']
-            enriched_data.loc[mask, 'weather_rain'] = weather_data['rain']
-            enriched_data.loc[mask, 'weather_wind'] = weather_data['wind']
-            enriched_data.loc[mask, 'is_holiday'] = is_holiday
-            enriched_data.loc[mask, 'holiday_type'] = holiday_type
-            enriched_data.loc[mask, 'tourist_flow'] = tourist_flow
+        # Ячейка погодной сетки каждого ресторана
+        restaurants = enriched_data[['restaurant_id', 'restaurant_name']].drop_duplicates('restaurant_id')
+        for restaurant_id, restaurant_name in restaurants.itertuples(index=False):
+            self._get_restaurant_cell(restaurant_id, restaurant_name)
+        
+        keys = pd.DataFrame({
+            'stat_date': enriched_data['stat_date'].astype(str).to_numpy(),
+            'cell': enriched_data['restaurant_id'].map(self.restaurant_cells).to_numpy(),
+        })
+        cell_ranges = keys.groupby('cell')['stat_date'].agg(['min', 'max'])
+        
+        print(f"      🌤️ Получаем погоду для {len(keys.drop_duplicates())} комбинаций дата+ячейка "
+              f"({len(cell_ranges)} ячеек сетки)...")
+        
+        # Все ячейки - параллельно в хранилище погоды, затем одна таблица погоды
+        prefetch_weather([(lat, lng, row['min'], row['max']) for (lat, lng), row in cell_ranges.iterrows()])
+        weather = self._load_weather_table(cell_ranges)
+        
+        # Праздники и туристический поток (одинаковые для всех ресторанов) - календарное измерение
+        calendar = get_calendar(keys['stat_date'].min(), keys['stat_date'].max())
+        calendar = calendar[['stat_date', 'is_holiday', 'holiday_type']].reset_index(drop=True)
+        calendar['tourist_flow'] = calendar['stat_date'].str[:7].map(self.tourist_data).fillna(0)
+        
+        external = keys.merge(weather, on=['stat_date', 'cell'], how='left').merge(calendar, on='stat_date', how='left')
+        enriched_data['weather_temp'] = external['temp'].fillna(27.0).to_numpy()
+        enriched_data['weather_rain'] = external['rain'].fillna(0.0).to_numpy()
+        enriched_data['weather_wind'] = external['wind'].fillna(5.0).to_numpy()
+        enriched_data['is_holiday'] = external['is_holiday'].to_numpy()
+        enriched_data['holiday_type'] = external['holiday_type'].to_numpy()
+        enriched_data['tourist_flow'] = external['tourist_flow'].to_numpy()
             
         print(f"   🏪 Добавляем данные конкурентов...")
         
-        # Данные конкурентов
-        for i, row in enriched_data.iterrows():
-            date = row['stat_date']
-            restaurant_name = row['restaurant_name']
-            
-            # Находим конкурентов (другие рестораны в тот же день)
-            competitors = enriched_data[
-                (enriched_data['stat_date'] == date) & 
-                (enriched_data['restaurant_name'] != restaurant_name)
-            ]
-            
-            if len(competitors) > 0:
-                enriched_data.loc[i, 'competitor_avg_sales'] = competitors['total_sales'].mean()
-                enriched_data.loc[i, 'competitor_count'] = len(competitors)
-                
-            # Локация ресторана
-            location = self.restaurant_locations.get(restaurant_name, {})
-            enriched_data.loc[i, 'location_district'] = location.get('district', 'unknown')
+        # Конкуренты - другие рестораны в тот же день (среднее без самого ресторана)
+        sales = enriched_data['total_sales']
+        by_date = enriched_data['stat_date']
+        by_restaurant = [by_date, enriched_data['restaurant_name']]
+        competitor_sum = (sales.groupby(by_date).transform('sum')
+                          - sales.groupby(by_restaurant).transform('sum'))
+        competitor_count = (sales.groupby(by_date).transform('count')
+                            - sales.groupby(by_restaurant).transform('count'))
+        has_competitors = competitor_count > 0
+        enriched_data['competitor_avg_sales'] = np.where(
+            has_competitors, competitor_sum / competitor_count.where(has_competitors), 0.0
+        )
+        enriched_data['competitor_count'] = competitor_count.astype(int)
+        
+        # Локация ресторана
+        enriched_data['location_district'] = enriched_data['restaurant_name'].map(
+            lambda name: self.restaurant_locations.get(name, {}).get('district', 'unknown')
+        )
             
         print(f"   📊 Рассчитываем метрики воронки...")
         
-        # Рассчитываем bounce rate и cart abandon rate для GRAB
-        for i, row in enriched_data.iterrows():
-            menu_visits = row.get('grab_menu_visits', 0)
-            add_to_carts = row.get('grab_add_to_carts', 0)
-            ads_orders = row.get('grab_ads_orders', 0)
-            
+        # Bounce rate, cart abandon rate и эффективность воронки GRAB
+        def column(name):
+            if name in enriched_data:
+                return enriched_data[name].fillna(0).to_numpy(dtype=float)
+            return np.zeros(len(enriched_data))
+        
+        menu_visits = column('grab_menu_visits')
+        add_to_carts = column('grab_add_to_carts')
+        ads_orders = column('grab_ads_orders')
+        impressions = column('grab_impressions')
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
             # Bounce rate (ушли без добавления в корзину)
-            if menu_visits > 0:
-                bounce_rate = ((menu_visits - add_to_carts) / menu_visits * 100)
-                enriched_data.loc[i, 'bounce_rate'] = max(0, min(100, bounce_rate))
-            
+            bounce_rate = (menu_visits - add_to_carts) / menu_visits * 100
             # Cart abandon rate (добавили в корзину, но не заказали)
-            if add_to_carts > 0:
-                cart_abandon_rate = ((add_to_carts - ads_orders) / add_to_carts * 100)
-                enriched_data.loc[i, 'cart_abandon_rate'] = max(0, min(100, cart_abandon_rate))
-            
+            cart_abandon_rate = (add_to_carts - ads_orders) / add_to_carts * 100
             # Общая эффективность воронки (показ → заказ)
-            impressions = row.get('grab_impressions', 0)
-            if impressions > 0 and ads_orders > 0:
-                funnel_efficiency = (ads_orders / impressions * 100)
-                enriched_data.loc[i, 'funnel_efficiency'] = funnel_efficiency
+            funnel_efficiency = ads_orders / impressions * 100
+        
+        enriched_data['bounce_rate'] = np.where(menu_visits > 0, np.clip(bounce_rate, 0, 100), 0)
+        enriched_data['cart_abandon_rate'] = np.where(add_to_carts > 0, np.clip(cart_abandon_rate, 0, 100), 0)
+        enriched_data['funnel_efficiency'] = np.where((impressions > 0) & (ads_orders > 0), funnel_efficiency, 0)
             
         return enriched_data
+    
+    def _load_weather_table(self, cell_ranges):
+        """Дневная погода из хранилища: stat_date, cell, temp, rain, wind"""
+        
+        weather_store = get_weather_store()
+        frames = []
+        for (lat, lng), row in cell_ranges.iterrows():
+            try:
+                daily = weather_store.get_daily(lat, lng, row['min'], row['max'], fetch=False)
+            except Exception as e:
+                print(f"❌ Ошибка погоды для ячейки {lat}, {lng}: {e}")
+                continue
+            frames.append(pd.DataFrame({
+                'stat_date': daily.index,
+                'cell': [(lat, lng)] * len(daily),
+                'temp': daily['temperature_mean'].to_numpy(),
+                'rain': daily['precipitation_sum'].to_numpy(),
+                'wind': daily['wind_speed_max'].to_numpy(),
+            }))
+        if not frames:
+            return pd.DataFrame(columns=['stat_date', 'cell', 'temp', 'rain', 'wind'])
+        return pd.concat(frames, ignore_index=True).drop_duplicates(['stat_date', 'cell'])
         
     def _get_weather_for_date(self, date, restaurant_id=None):
-        """Получает погодные данные для даты и конкретного ресторана"""
+        """Получает погодные данные для даты и ячейки сетки ресторана"""
         
-        # Создаем ключ кэша с учетом ресторана
-        cache_key = f"{date}_{restaurant_id}" if restaurant_id else date
+        # Ключ кэша - ячейка сетки: соседние рестораны делят одну погоду
+        lat, lng = self._get_restaurant_cell(restaurant_id)
+        cache_key = f"{date}_{lat}_{lng}"
         
         if cache_key in self.weather_cache:
             return self.weather_cache[cache_key]
             
         default_weather = {'temp': 27.0, 'rain': 0.0, 'wind': 5.0}
         
-        # Получаем координаты ресторана
-        lat, lng = self._get_restaurant_coordinates(restaurant_id)
-        
         try:
-            url = "https://archive-api.open-meteo.com/v1/archive"
-            params = {
-                'latitude': lat,
-                'longitude': lng,
-                'start_date': date,
-                'end_date': date,
-                'daily': 'temperature_2m_mean,precipitation_sum,wind_speed_10m_max',
-                'timezone': 'Asia/Jakarta',
-                'elevation': 0  # КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ: уровень моря!
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                daily = data.get('daily', {})
+            # Локальное хранилище Open-Meteo (HTTP только при промахе)
+            daily = get_weather_store().get_day(lat, lng, date)
+            
+            if daily:
+                weather_data = {
+                    'temp': daily['temperature_mean'] if pd.notna(daily['temperature_mean']) else 27.0,
+                    'rain': daily['precipitation_sum'] if pd.notna(daily['precipitation_sum']) else 0.0,
+                    'wind': daily['wind_speed_max'] if pd.notna(daily['wind_speed_max']) else 5.0
+                }
                 
-                if daily:
-                    temp_mean = daily.get('temperature_2m_mean', [None])[0]
-                    precipitation = daily.get('precipitation_sum', [None])[0]
-                    wind_speed = daily.get('wind_speed_10m_max', [None])[0]
-                    
-                    weather_data = {
-                        'temp': temp_mean if temp_mean is not None else 27.0,
-                        'rain': precipitation if precipitation is not None else 0.0,
-                        'wind': wind_speed if wind_speed is not None else 5.0
-                    }
-                    
-                    self.weather_cache[cache_key] = weather_data
-                    return weather_data
+                self.weather_cache[cache_key] = weather_data
+                return weather_data
                     
         except Exception as e:
             print(f"❌ Ошибка погоды для ресторана {restaurant_id}: {e}")
@@ -566,6 +446,14 @@ class UltimateCompleteMLSystem:
         self.weather_cache[cache_key] = default_weather
         return default_weather
     
+    def _get_restaurant_cell(self, restaurant_id, restaurant_name=None):
+        """Ячейка погодной сетки ресторана (геолокации из JSON, затем база)"""
+        
+        if restaurant_id not in self.restaurant_cells:
+            lat, lng = self._get_restaurant_coordinates(restaurant_id)
+            self.restaurant_cells[restaurant_id] = restaurant_cell(restaurant_name, lat, lng)
+        return self.restaurant_cells[restaurant_id]
+    
     def _get_restaurant_coordinates(self, restaurant_id):
         """Получает координаты ресторана из базы данных"""
         
@@ -574,7 +462,7 @@ class UltimateCompleteMLSystem:
             return -8.6500, 115.2200
             
         try:
-            conn = sqlite3.connect('database.sqlite')
+            conn = get_connection()
             cursor = conn.cursor()
             
             cursor.execute('SELECT latitude, longitude FROM restaurants WHERE id = ?', (restaurant_id,))
@@ -601,10 +489,8 @@ class UltimateCompleteMLSystem:
         # Подготавливаем данные
         numeric_data = data.select_dtypes(include=[np.number])
         
-        # Исключаем целевые переменные
-        feature_cols = [col for col in numeric_data.columns 
-                       if col not in ['total_sales', 'grab_sales', 'gojek_sales', 'restaurant_id'] 
-                       and numeric_data[col].std() > 0]
+        # Исключаем целевые переменные и константные признаки
+        feature_cols = [col for col in self._candidate_features(data) if numeric_data[col].std() > 0]
         
         clean_data = numeric_data[feature_cols + ['total_sales']].dropna()
         
@@ -653,6 +539,13 @@ class UltimateCompleteMLSystem:
         print(f"   • R² Score: {r2:.4f} ({'ПРЕВОСХОДНО' if r2 > 0.95 else 'ОТЛИЧНО' if r2 > 0.9 else 'ХОРОШО'})")
         print(f"   • MAE: {mae:,.0f} IDR")
         
+        self.feature_names = feature_cols
+        self.training_metrics = {'r2': r2, 'mae': mae, 'train_rows': len(X_train), 'test_rows': len(X_test)}
+        self.data_watermark = str(data['stat_date'].max()) if 'stat_date' in data else None
+        if 'stat_date' in data:
+            self.trained_range = {'start': str(data['stat_date'].min()), 'end': self.data_watermark}
+        self.lineage = next_lineage(None, 'full')
+        
         # Анализ важности признаков
         self.ultimate_feature_importance = dict(zip(feature_cols, self.trained_model.feature_importances_))
         sorted_importance = sorted(self.ultimate_feature_importance.items(), key=lambda x: x[1], reverse=True)
@@ -668,6 +561,80 @@ class UltimateCompleteMLSystem:
         
         return True
         
+    @staticmethod
+    def _candidate_features(data):
+        """Числовые колонки датасета, кроме целевых переменных"""
+        numeric_data = data.select_dtypes(include=[np.number])
+        return [col for col in numeric_data.columns
+                if col not in ['total_sales', 'grab_sales', 'gojek_sales', 'restaurant_id']]
+    
+    def retrain(self, data=None, force_full=False, registry=None):
+        """
+        Переобучение по политике: дообучение на новом окне (warm_start) или
+        полная пересборка; результат сохраняется новой версией в реестре
+        """
+        registry = registry or ModelRegistry()
+        if data is None:
+            data = self.load_ultimate_features()
+        
+        metadata = registry.metadata(ULTIMATE_MODEL_NAME)
+        dates = data['stat_date'].astype(str)
+        _, seen_end = seen_range(metadata)
+        new_window = data[dates > seen_end] if seen_end else data
+        data_start, data_end = dates.min(), dates.max()
+        
+        mode, reason = decide_retrain(metadata, data_start, data_end, self._candidate_features(data),
+                                      len(new_window), len(data), force_full=force_full,
+                                      feature_schema=FEATURE_SCHEMA_VERSION)
+        print(f"🔁 Режим переобучения: {mode} ({reason})")
+        
+        if mode == 'skip':
+            return self.load_model(registry=registry)
+        
+        if mode == 'incremental' and not self.load_model(registry=registry):
+            mode = 'full'
+        
+        if mode == 'incremental':
+            success = self._train_incremental(new_window)
+        else:
+            success = self.train_ultimate_model(data)
+        
+        if success:
+            self.lineage = next_lineage(metadata, mode)
+            self.trained_range = next_trained_range(metadata, mode, data_start, data_end)
+            self.save_model(registry=registry)
+        return success
+    
+    def _train_incremental(self, window):
+        """Дообучение: новые деревья RandomForest на окне новых данных"""
+        
+        import copy
+        
+        clean = window[self.feature_names + ['total_sales']].apply(pd.to_numeric, errors='coerce').dropna()
+        if len(clean) < 10:
+            print("❌ Недостаточно новых данных для дообучения")
+            return False
+        
+        X = self.scaler.transform(clean[self.feature_names].values)
+        y = clean['total_sales'].values
+        
+        # Копия: загруженная модель - общий для процесса объект
+        self.trained_model = warm_start_forest(copy.deepcopy(self.trained_model), X, y)
+        
+        y_pred = self.trained_model.predict(X)
+        self.training_metrics = {
+            'window_r2': r2_score(y, y_pred),
+            'window_mae': mean_absolute_error(y, y_pred),
+            'window_rows': len(clean),
+            'n_estimators': self.trained_model.n_estimators
+        }
+        self.data_watermark = str(window['stat_date'].max())
+        self.ultimate_feature_importance = dict(zip(self.feature_names, self.trained_model.feature_importances_))
+        
+        print(f"✅ Дообучено на {len(clean)} новых строках: деревьев {self.trained_model.n_estimators}, "
+              f"R² окна {self.training_metrics['window_r2']:.4f}")
+        return True
+    
     def _categorize_factor(self, factor):
         """Категоризирует фактор"""
         if 'weather' in factor:
@@ -729,14 +696,14 @@ class UltimateCompleteMLSystem:
             
         print(f"\n💾 Максимально полные ML инсайты сохранены в ultimate_ml_insights.json")
     
-    def save_model(self):
-        """Сохраняет обученную модель"""
+    def save_model(self, registry=None):
+        """Сохраняет обученную модель новой версией в реестре моделей"""
         if self.trained_model is None:
             print("❌ Нет обученной модели для сохранения")
             return False
         
         try:
-            import pickle
+            registry = registry or ModelRegistry()
             model_data = {
                 'model': self.trained_model,
                 'scaler': self.scaler,
@@ -744,36 +711,86 @@ class UltimateCompleteMLSystem:
                 'timestamp': datetime.now().isoformat()
             }
             
-            with open('ultimate_ml_model.pkl', 'wb') as f:
-                pickle.dump(model_data, f)
-            
-            print("💾 ML модель сохранена в ultimate_ml_model.pkl")
+            self.model_version = registry.save(
+                ULTIMATE_MODEL_NAME, model_data,
+                feature_names=self.feature_names or list(self.ultimate_feature_importance),
+                metrics=self.training_metrics,
+                data_watermark=self.data_watermark,
+                params=dict(self.trained_model.get_params(), feature_schema=FEATURE_SCHEMA_VERSION),
+                trained_range=self.trained_range,
+                lineage=self.lineage
+            )
+            
+            print(f"💾 ML модель сохранена в реестр: {ULTIMATE_MODEL_NAME} {self.model_version}")
             return True
         except Exception as e:
             print(f"❌ Ошибка сохранения модели: {e}")
             return False
     
-    def load_model(self):
-        """Загружает сохраненную модель"""
+    def load_model(self, version=None, registry=None):
+        """Загружает модель из реестра (общий для процесса экземпляр, mmap)"""
         try:
-            import pickle
-            
-            with open('ultimate_ml_model.pkl', 'rb') as f:
-                model_data = pickle.load(f)
+            handle = get_model(ULTIMATE_MODEL_NAME, version=version, registry=registry)
+            if handle is None:
+                print("📂 Сохраненная модель не найдена")
+                return False
             
+            model_data = handle.artifact
             self.trained_model = model_data['model']
             self.scaler = model_data['scaler']
             self.ultimate_feature_importance = model_data.get('feature_importance', {})
-            
-            print(f"✅ ML модель загружена (сохранена: {model_data.get('timestamp', 'неизвестно')})")
+            self.feature_names = handle.feature_names
+            self.training_metrics = handle.metadata.get('metrics', {})
+            self.data_watermark = handle.metadata.get('data_watermark')
+            self.trained_range = handle.metadata.get('trained_range')
+            self.lineage = handle.metadata.get('lineage')
+            self.model_version = handle.version
+            
+            print(f"✅ ML модель загружена: {ULTIMATE_MODEL_NAME} {handle.version} "
+                  f"(данные до {self.data_watermark or 'неизвестно'})")
             return True
-        except FileNotFoundError:
-            print("📂 Сохраненная модель не найдена")
-            return False
         except Exception as e:
             print(f"❌ Ошибка загрузки модели: {e}")
             return False
 
+
+_shared_system = None
+_shared_system_lock = threading.Lock()
+
+
+def get_ultimate_system(train_if_missing=True):
+    """
+    Общая для процесса обученная UltimateCompleteMLSystem
+    
+    Модель загружается из реестра один раз (и перечитывается только при новой
+    версии); если в реестре пусто - обучается и сохраняется один раз.
+    """
+    global _shared_system
+    with _shared_system_lock:
+        latest = ModelRegistry().latest_version(ULTIMATE_MODEL_NAME)
+        if _shared_system is not None and _shared_system.model_version == latest:
+            return _shared_system
+        
+        system = UltimateCompleteMLSystem()
+        if not system.load_model():
+            if not train_if_missing:
+                return None
+            print("🧠 Обучение ML модели (один раз)...")
+            dataset = system.load_ultimate_features()
+            if not system.train_ultimate_model(dataset):
+                return None
+            system.save_model()
+        _shared_system = system
+        return system
+
+def sync_ultimate_features(db_path='database.sqlite', full=False, verbose=True):
+    """Дописывает хранилище признаков ultimate_features (шаг refresh)"""
+    
+    system = UltimateCompleteMLSystem(db_path)
+    store = get_feature_store(ULTIMATE_FEATURES_NAME, db_path)
+    return store.sync(system.build_ultimate_dataset, inputs=ULTIMATE_FEATURE_INPUTS, full=full, verbose=verbose,
+                      month_inputs=get_weather_store().month_coverage)
+
 def main():
     """Запуск максимально полной ML системы"""
     
@@ -782,13 +799,17 @@ def main():
     
     system = UltimateCompleteMLSystem()
     
-    # Строим максимально полный датасет
-    ultimate_data = system.build_ultimate_dataset()
+    # Максимально полный датасет из хранилища признаков (--full - пересборка)
+    ultimate_data = system.load_ultimate_features(full='--full' in sys.argv)
     
-    # Обучаем максимально полную модель
-    success = system.train_ultimate_model(ultimate_data)
+    # Обучаем модель: дообучение на новых днях или полная пересборка (--full)
+    success = system.retrain(ultimate_data, force_full='--full' in sys.argv)
     
     if success:
+        # Компактная модель для интерактивных запросов (--no-compact - без нее)
+        if '--no-compact' not in sys.argv:
+            distill_ultimate_model(system, ultimate_data)
+        
         # Сохраняем результаты
         system.save_ultimate_insights()
         
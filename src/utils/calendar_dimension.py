@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+📆 КАЛЕНДАРНОЕ ИЗМЕРЕНИЕ
+==========================================
+Одна строка на каждый день диапазона: праздники, туристический сезон,
+день недели и сезон Бали. Все ML пайплайны присоединяют календарь
+одним join по stat_date вместо циклов по праздникам и lambda по месяцам.
+
+✅ КОЛОНКИ:
+- stat_date (YYYY-MM-DD), day_of_week (0 = воскресенье, как strftime('%w')),
+  day_of_month, month, is_weekend
+- season ('dry' апрель-октябрь / 'wet' ноябрь-март)
+- is_holiday, holiday_name, holiday_type, holiday_category
+  (data/comprehensive_holiday_analysis.json, без нее - известные праздники)
+- tourist_seasonal_coeff - прилеты туристов месяца / среднемесячные (2024)
+
+✅ КЕШ:
+- Календарь строится один раз на целые годы запрошенного диапазона
+  и живет в памяти процесса
+- Больший диапазон или изменившиеся файлы праздников - пересборка
+
+Использование:
+    df = join_calendar(df, columns=['is_holiday', 'tourist_seasonal_coeff'])
+"""
+
+import os
+import json
+import threading
+from typing import Optional, Dict, List, Any, Iterable
+
+import pandas as pd
+
+HOLIDAY_FILES = [
+    'data/comprehensive_holiday_analysis.json',  # ПОЛНАЯ БАЗА 164 - ПРИОРИТЕТ!
+    'data/real_holiday_impact_analysis.json'
+]
+
+# Полная база праздников - от этого числа записей
+FULL_HOLIDAY_BASE = 100
+
+# Основные известные праздники (если полной базы нет)
+KNOWN_HOLIDAYS = {
+    '2024-01-01': 'New Year',
+    '2024-03-11': 'Nyepi (Balinese New Year)',
+    '2024-05-01': 'Labor Day',
+    '2024-08-17': 'Independence Day',
+    '2024-12-25': 'Christmas',
+    '2025-01-01': 'New Year',
+    '2025-03-29': 'Nyepi (Balinese New Year)',
+    '2025-05-01': 'Labor Day',
+    '2025-08-17': 'Independence Day',
+    '2025-12-25': 'Christmas'
+}
+
+# Прилеты иностранных туристов на Бали по месяцам 2024 (BPS Bali)
+MONTHLY_TOURISTS_2024 = {
+    1: 420037, 2: 455277, 3: 469227, 4: 503194, 5: 544601, 6: 520898,
+    7: 625665, 8: 616641, 9: 593909, 10: 559911, 11: 472900, 12: 551100
+}
+
+# Сухой сезон Бали
+DRY_SEASON_MONTHS = range(4, 11)
+
+CALENDAR_COLUMNS = [
+    'stat_date', 'day_of_week', 'day_of_month', 'month', 'is_weekend', 'season',
+    'is_holiday', 'holiday_name', 'holiday_type', 'holiday_category', 'tourist_seasonal_coeff'
+]
+
+
+def _holiday_entry(value: Any) -> Dict[str, str]:
+    """Запись праздника: из полной базы - name/type/category, иначе тип = название"""
+    if isinstance(value, dict):
+        return {
+            'name': value.get('name', 'Holiday'),
+            'type': value.get('type', 'unknown'),
+            'category': value.get('category', 'Unknown'),
+        }
+    return {'name': str(value), 'type': str(value), 'category': 'Unknown'}
+
+
+def load_holidays(files: Iterable[str] = HOLIDAY_FILES) -> Dict[str, Dict[str, str]]:
+    """
+    Праздники {YYYY-MM-DD: {name, type, category}}
+
+    Полная база (results на 100+ дат) используется как есть; иначе - все
+    найденные частичные источники плюс KNOWN_HOLIDAYS.
+    """
+    holidays = {}
+    for file_path in files:
+        if not os.path.exists(file_path):
+            continue
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"   ⚠️ Ошибка загрузки {file_path}: {e}")
+            continue
+
+        results = data.get('results') if isinstance(data, dict) else None
+        if isinstance(results, dict) and len(results) > FULL_HOLIDAY_BASE:
+            return {date: _holiday_entry(info) for date, info in results.items()}
+
+        for key in ('results', 'holidays', 'balinese_holidays'):
+            if isinstance(data.get(key), dict):
+                holidays.update({date: _holiday_entry(info) for date, info in data[key].items()})
+                break
+        else:
+            # Прямой словарь дат
+            holidays.update({key: _holiday_entry(value) for key, value in data.items()
+                             if isinstance(key, str) and '-' in key})
+
+    for date, name in KNOWN_HOLIDAYS.items():
+        holidays.setdefault(date, _holiday_entry(name))
+    return holidays
+
+
+def tourist_coefficients() -> Dict[int, float]:
+    """Туристический коэффициент месяца относительно среднемесячного потока"""
+    avg_tourists = sum(MONTHLY_TOURISTS_2024.values()) / 12
+    return {month: tourists / avg_tourists for month, tourists in MONTHLY_TOURISTS_2024.items()}
+
+
+def build_calendar(start_date: str, end_date: str,
+                   holidays: Optional[Dict[str, Dict[str, str]]] = None) -> pd.DataFrame:
+    """Календарь на каждый день [start_date, end_date]"""
+    holidays = load_holidays() if holidays is None else holidays
+    dates = pd.date_range(start_date, end_date, freq='D')
+    stat_date = dates.strftime('%Y-%m-%d')
+
+    holiday_table = pd.DataFrame.from_dict(holidays, orient='index', columns=['name', 'type', 'category'])
+    matched = holiday_table.reindex(stat_date)
+
+    calendar = pd.DataFrame({
+        'stat_date': stat_date,
+        'day_of_week': (dates.dayofweek + 1) % 7,
+        'day_of_month': dates.day,
+        'month': dates.month,
+    })
+    calendar['is_weekend'] = calendar['day_of_week'].isin([0, 6]).astype(int)
+    calendar['season'] = calendar['month'].isin(DRY_SEASON_MONTHS).map({True: 'dry', False: 'wet'})
+    calendar['is_holiday'] = matched['name'].notna().to_numpy().astype(int)
+    calendar['holiday_name'] = matched['name'].fillna('none').to_numpy()
+    calendar['holiday_type'] = matched['type'].fillna('none').to_numpy()
+    calendar['holiday_category'] = matched['category'].fillna('none').to_numpy()
+    calendar['tourist_seasonal_coeff'] = calendar['month'].map(tourist_coefficients()).fillna(1.0)
+    return calendar[CALENDAR_COLUMNS]
+
+
+_calendar: Optional[pd.DataFrame] = None
+_calendar_signature: Optional[Dict[str, Optional[float]]] = None
+_calendar_lock = threading.Lock()
+
+
+def _files_signature() -> Dict[str, Optional[float]]:
+    return {path: (os.path.getmtime(path) if os.path.exists(path) else None) for path in HOLIDAY_FILES}
+
+
+def get_calendar(start_date: str, end_date: str) -> pd.DataFrame:
+    """
+    Календарь диапазона из кеша процесса (индекс - stat_date)
+
+    Кеш покрывает целые годы; запрос вне кеша или изменение файлов
+    праздников пересобирает его.
+    """
+    global _calendar, _calendar_signature
+    start_date, end_date = str(start_date)[:10], str(end_date)[:10]
+    signature = _files_signature()
+    with _calendar_lock:
+        cached = _calendar if signature == _calendar_signature else None
+        if cached is None or start_date < cached.index[0] or end_date > cached.index[-1]:
+            first, last = start_date, end_date
+            if cached is not None:
+                first, last = min(first, cached.index[0]), max(last, cached.index[-1])
+            cached = build_calendar(f"{first[:4]}-01-01", f"{last[:4]}-12-31").set_index('stat_date', drop=False)
+            _calendar, _calendar_signature = cached, signature
+    return cached.loc[start_date:end_date]
+
+
+def join_calendar(df: pd.DataFrame, date_column: Optional[str] = 'stat_date',
+                  columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Присоединяет колонки календаря к df одним join по дате
+
+    Args:
+        df: Таблица с датой (строка YYYY-MM-DD или datetime)
+        date_column: Колонка даты (None - индекс df)
+        columns: Колонки календаря (None - все, кроме stat_date)
+
+    Returns:
+        df с колонками календаря (порядок и индекс строк сохраняются)
+    """
+    columns = columns or [col for col in CALENDAR_COLUMNS if col != 'stat_date']
+    dates = df.index if date_column is None else df[date_column]
+    keys = pd.to_datetime(pd.Series(dates)).dt.strftime('%Y-%m-%d')
+    known = keys.dropna()
+    if known.empty:
+        return df.assign(**{col: None for col in columns})
+
+    calendar = get_calendar(known.min(), known.max())
+    joined = calendar.reindex(keys.to_numpy())[columns]
+    return df.assign(**{col: joined[col].to_numpy() for col in columns})
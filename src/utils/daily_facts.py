@@ -0,0 +1,554 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+📅 ТАБЛИЦА ДНЕВНЫХ ФАКТОВ daily_facts
+==========================================
+Одна строка на ресторан-день: Grab и Gojek уже объединены (полное внешнее
+объединение по restaurant_id + stat_date), время и оффлайн нормализованы в минуты.
+
+✅ НОРМАЛИЗАЦИЯ:
+- gojek close_time (HH:MM:SS) → gojek_offline_minutes
+- grab offline_rate → grab_offline_minutes
+- grab driver_waiting_time (JSON {'min': ...}) → grab_driver_waiting_min
+- gojek accepting/preparation/delivery_time (HH:MM:SS) → минуты
+
+Таблица обновляется инкрементально: водяной знак исходной таблицы
+(derived_watermarks) - MAX(stat_date), MAX(rowid) и COUNT(*). Пересчитываются
+ресторан-дни строк с rowid новее знака - в том числе строки второй платформы,
+пришедшие позже за уже обработанный день, и дозагрузка старых дат. Удаленные
+строки (число строк не сходится) - полная пересборка.
+
+Правки на месте (UPDATE) rowid не меняют: триггеры исходных таблиц пишут
+ресторан-дни измененных и удаленных строк в журнал source_changes, у
+которого тот же водяной знак, что и у исходных таблиц.
+
+Таблицу пишут только refresh и прогрев analyze-all: load_daily_facts не
+берет блокировку записи, а при отставании таблицы считает факты в памяти.
+"""
+
+import os
+import sys
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Optional, Dict, List, Any
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from src.utils.db_pool import connection, DEFAULT_DB_PATH, BUSY_TIMEOUT_MS
+from src.utils.period_loader import time_to_minutes, driver_waiting_to_minutes
+
+DAILY_FACTS_TABLE = 'daily_facts'
+WATERMARKS_TABLE = 'derived_watermarks'
+SOURCE_TABLES = ('grab_stats', 'gojek_stats')
+CHANGES_TABLE = 'source_changes'
+
+# Проверка актуальности без журнала изменений (COUNT(*) по таблицам) - кеш процесса
+_current_cache: Dict[Any, bool] = {}
+_current_lock = threading.Lock()
+
+# Колонка факта -> (исходная колонка, способ нормализации)
+#   'sum'     - число, пропуск = 0
+#   'value'   - число, пропуск = NULL (рейтинги, ожидание)
+#   'time'    - HH:MM:SS -> минуты, пропуск = NULL
+#   'offline' - HH:MM:SS или минуты -> минуты, пропуск = 0
+#   'json'    - JSON {'min': ...} -> минуты, пропуск = NULL
+GRAB_FACTS = {
+    'grab_sales': ('sales', 'sum'),
+    'grab_orders': ('orders', 'sum'),
+    'grab_rating': ('rating', 'value'),
+    'grab_ads_spend': ('ads_spend', 'sum'),
+    'grab_ads_sales': ('ads_sales', 'sum'),
+    'grab_ads_orders': ('ads_orders', 'sum'),
+    'grab_impressions': ('impressions', 'sum'),
+    'grab_menu_visits': ('unique_menu_visits', 'sum'),
+    'grab_add_to_carts': ('unique_add_to_carts', 'sum'),
+    'grab_ctr': ('ads_ctr', 'sum'),
+    'grab_closed': ('store_is_closed', 'sum'),
+    'grab_busy': ('store_is_busy', 'sum'),
+    'grab_out_of_stock': ('out_of_stock', 'sum'),
+    'grab_cancelled': ('cancelled_orders', 'sum'),
+    'grab_new_customers': ('new_customers', 'sum'),
+    'grab_repeated_customers': ('repeated_customers', 'sum'),
+    'grab_reactivated_customers': ('reactivated_customers', 'sum'),
+    'grab_payouts': ('payouts', 'sum'),
+    'grab_offline_minutes': ('offline_rate', 'offline'),
+    'grab_driver_waiting_min': ('driver_waiting_time', 'json'),
+}
+
+GOJEK_FACTS = {
+    'gojek_sales': ('sales', 'sum'),
+    'gojek_orders': ('orders', 'sum'),
+    'gojek_rating': ('rating', 'value'),
+    'gojek_ads_spend': ('ads_spend', 'sum'),
+    'gojek_ads_sales': ('ads_sales', 'sum'),
+    'gojek_closed': ('store_is_closed', 'sum'),
+    'gojek_busy': ('store_is_busy', 'sum'),
+    'gojek_out_of_stock': ('out_of_stock', 'sum'),
+    'gojek_cancelled': ('cancelled_orders', 'sum'),
+    'gojek_lost_orders': ('lost_orders', 'sum'),
+    'gojek_new_customers': ('new_client', 'sum'),
+    'gojek_active_customers': ('active_client', 'sum'),
+    'gojek_repeated_customers': ('returned_client', 'sum'),
+    'gojek_payouts': ('payouts', 'sum'),
+    'one_star': ('one_star_ratings', 'sum'),
+    'two_star': ('two_star_ratings', 'sum'),
+    'three_star': ('three_star_ratings', 'sum'),
+    'four_star': ('four_star_ratings', 'sum'),
+    'five_star': ('five_star_ratings', 'sum'),
+    'gojek_offline_minutes': ('close_time', 'offline'),
+    'gojek_accepting_min': ('accepting_time', 'time'),
+    'gojek_preparation_min': ('preparation_time', 'time'),
+    'gojek_delivery_min': ('delivery_time', 'time'),
+    'gojek_driver_waiting_min': ('driver_waiting', 'value'),
+}
+
+DERIVED_FACTS = ['total_sales', 'total_orders', 'total_ads_spend', 'total_ads_sales', 'has_grab', 'has_gojek']
+
+DAILY_FACTS_COLUMNS = ['restaurant_id', 'stat_date'] + DERIVED_FACTS + list(GRAB_FACTS) + list(GOJEK_FACTS)
+
+
+def create_tables(conn: sqlite3.Connection):
+    """Создает daily_facts и таблицу водяных знаков"""
+    value_columns = ',\n            '.join(f'{column} NUMERIC' for column in DAILY_FACTS_COLUMNS[2:])
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {DAILY_FACTS_TABLE} (
+            restaurant_id INTEGER NOT NULL,
+            stat_date TEXT NOT NULL,
+            {value_columns},
+            PRIMARY KEY (restaurant_id, stat_date)
+        )
+    """)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{DAILY_FACTS_TABLE}_date ON {DAILY_FACTS_TABLE} (stat_date)")
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {WATERMARKS_TABLE} (
+            target TEXT NOT NULL,
+            source_table TEXT NOT NULL,
+            max_stat_date TEXT,
+            updated_at TEXT,
+            max_rowid INTEGER,
+            row_count INTEGER,
+            PRIMARY KEY (target, source_table)
+        )
+    """)
+    # Таблица знаков из прошлых версий - только max_stat_date
+    existing = _table_columns(conn, WATERMARKS_TABLE)
+    for column in ('max_rowid', 'row_count'):
+        if column not in existing:
+            conn.execute(f"ALTER TABLE {WATERMARKS_TABLE} ADD COLUMN {column} INTEGER")
+    create_change_log(conn)
+
+
+def create_change_log(conn: sqlite3.Connection):
+    """Журнал source_changes и триггеры UPDATE/DELETE исходных таблиц"""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CHANGES_TABLE} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source_table TEXT NOT NULL,
+            restaurant_id INTEGER,
+            stat_date TEXT,
+            changed_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{CHANGES_TABLE}_restaurant_date "
+                 f"ON {CHANGES_TABLE} (restaurant_id, stat_date)")
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for table in SOURCE_TABLES:
+        if table not in tables:
+            continue
+        # Старый и новый ключ: правка могла перенести строку на другой день
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_changes_update AFTER UPDATE ON {table}
+            BEGIN
+                INSERT INTO {CHANGES_TABLE} (source_table, restaurant_id, stat_date)
+                VALUES ('{table}', OLD.restaurant_id, OLD.stat_date), ('{table}', NEW.restaurant_id, NEW.stat_date);
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_changes_delete AFTER DELETE ON {table}
+            BEGIN
+                INSERT INTO {CHANGES_TABLE} (source_table, restaurant_id, stat_date)
+                VALUES ('{table}', OLD.restaurant_id, OLD.stat_date);
+            END
+        """)
+
+
+def _tracked_tables(conn: sqlite3.Connection) -> tuple:
+    """Таблицы с водяными знаками: исходные и журнал изменений (если создан)"""
+    has_log = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (CHANGES_TABLE,)
+    ).fetchone()
+    return SOURCE_TABLES + (CHANGES_TABLE,) if has_log else SOURCE_TABLES
+
+
+def _table_columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+
+
+def _normalize(series: pd.Series, kind: str) -> pd.Series:
+    """Приводит исходную колонку к числу минут/значению по способу нормализации"""
+    if kind == 'offline':
+        return series.map(lambda v: time_to_minutes(v) if isinstance(v, str) else v).pipe(
+            pd.to_numeric, errors='coerce').fillna(0)
+    if kind == 'time':
+        return series.map(lambda v: time_to_minutes(v) if pd.notna(v) else None).pipe(pd.to_numeric, errors='coerce')
+    if kind == 'json':
+        return series.map(driver_waiting_to_minutes).pipe(pd.to_numeric, errors='coerce')
+    numbers = pd.to_numeric(series, errors='coerce')
+    return numbers.fillna(0) if kind == 'sum' else numbers
+
+
+def _platform_facts(raw: pd.DataFrame, spec: Dict[str, tuple], flag: str) -> pd.DataFrame:
+    """Нормализует строки одной платформы в колонки фактов"""
+    facts = pd.DataFrame({
+        'restaurant_id': raw['restaurant_id'].astype('int64'),
+        'stat_date': raw['stat_date'].astype(str),
+    })
+    for fact_column, (source_column, kind) in spec.items():
+        source = raw[source_column] if source_column in raw.columns else pd.Series(None, index=raw.index, dtype=object)
+        facts[fact_column] = _normalize(source, kind).values
+    facts[flag] = 1
+    # Дубликаты ресторан-дня внутри платформы: оставляем последнюю запись
+    return facts.drop_duplicates(['restaurant_id', 'stat_date'], keep='last')
+
+
+def compute_daily_facts(grab: pd.DataFrame, gojek: pd.DataFrame) -> pd.DataFrame:
+    """
+    Объединяет сырые строки grab_stats и gojek_stats в дневные факты
+
+    Args:
+        grab: Строки grab_stats (restaurant_id, stat_date, ...)
+        gojek: Строки gojek_stats (restaurant_id, stat_date, ...)
+
+    Returns:
+        DataFrame с колонками DAILY_FACTS_COLUMNS, одна строка на ресторан-день
+    """
+    grab_facts = _platform_facts(grab, GRAB_FACTS, 'has_grab')
+    gojek_facts = _platform_facts(gojek, GOJEK_FACTS, 'has_gojek')
+    facts = grab_facts.merge(gojek_facts, on=['restaurant_id', 'stat_date'], how='outer')
+
+    # Отсутствующая платформа = нули (кроме колонок-значений)
+    for spec in (GRAB_FACTS, GOJEK_FACTS):
+        for fact_column, (_, kind) in spec.items():
+            if kind in ('sum', 'offline'):
+                facts[fact_column] = facts[fact_column].fillna(0)
+    facts['has_grab'] = facts['has_grab'].fillna(0).astype('int64')
+    facts['has_gojek'] = facts['has_gojek'].fillna(0).astype('int64')
+
+    facts['total_sales'] = facts['grab_sales'] + facts['gojek_sales']
+    facts['total_orders'] = facts['grab_orders'] + facts['gojek_orders']
+    facts['total_ads_spend'] = facts['grab_ads_spend'] + facts['gojek_ads_spend']
+    facts['total_ads_sales'] = facts['grab_ads_sales'] + facts['gojek_ads_sales']
+
+    return facts[DAILY_FACTS_COLUMNS].sort_values(['stat_date', 'restaurant_id']).reset_index(drop=True)
+
+
+def _read_source(conn: sqlite3.Connection, table: str, spec: Dict[str, tuple], where: str = '',
+                 params: tuple = ()) -> pd.DataFrame:
+    """Читает только нужные для фактов колонки исходной таблицы"""
+    available = _table_columns(conn, table)
+    needed = ['restaurant_id', 'stat_date'] + sorted({source for source, _ in spec.values() if source in available})
+    query = f"SELECT {', '.join(needed)} FROM {table} {where}"
+    return pd.read_sql_query(query, conn, params=params)
+
+
+def table_marks(conn: sqlite3.Connection, tables=None) -> Dict[str, Dict[str, Any]]:
+    """Текущие водяные знаки таблиц {таблица: {max_stat_date, max_rowid, rows}}"""
+    marks = {}
+    for table in tables or _tracked_tables(conn):
+        max_date, max_rowid, rows = conn.execute(
+            f"SELECT MAX(stat_date), MAX(rowid), COUNT(*) FROM {table}"
+        ).fetchone()
+        marks[table] = {'max_stat_date': max_date, 'max_rowid': max_rowid or 0, 'rows': rows}
+    return marks
+
+
+def read_table_marks(conn: sqlite3.Connection, target: str) -> Dict[str, Dict[str, Any]]:
+    """Сохраненные водяные знаки производной таблицы (знаки без rowid из прошлых версий не считаются)"""
+    if 'max_rowid' not in _table_columns(conn, WATERMARKS_TABLE):
+        return {}
+    rows = conn.execute(
+        f"SELECT source_table, max_stat_date, max_rowid, row_count FROM {WATERMARKS_TABLE} "
+        f"WHERE target = ? AND max_rowid IS NOT NULL AND row_count IS NOT NULL", (target,)
+    ).fetchall()
+    return {table: {'max_stat_date': max_date, 'max_rowid': max_rowid, 'rows': count}
+            for table, max_date, max_rowid, count in rows}
+
+
+def write_table_marks(conn: sqlite3.Connection, target: str, marks: Dict[str, Dict[str, Any]]):
+    """Сохраняет водяные знаки производной таблицы (результат table_marks)"""
+    now = datetime.now().isoformat(timespec='seconds')
+    conn.executemany(
+        f"INSERT OR REPLACE INTO {WATERMARKS_TABLE} "
+        f"(target, source_table, max_stat_date, updated_at, max_rowid, row_count) VALUES (?, ?, ?, ?, ?, ?)",
+        [(target, table, mark['max_stat_date'], now, mark['max_rowid'], mark['rows'])
+         for table, mark in marks.items()]
+    )
+
+
+def marks_current(marks: Dict[str, Dict[str, Any]], current: Dict[str, Dict[str, Any]]) -> bool:
+    """True если сохраненные знаки совпадают с текущими по всем таблицам"""
+    return all(table in marks and marks[table] == mark for table, mark in current.items())
+
+
+def changed_restaurant_days(conn: sqlite3.Connection, table: str,
+                            mark: Optional[Dict[str, Any]]) -> Optional[pd.DataFrame]:
+    """
+    Ресторан-дни строк таблицы, появившихся после водяного знака
+
+    Returns:
+        DataFrame restaurant_id, stat_date (без повторов) или None, если
+        инкрементально нельзя: знака нет или строки удалялись
+    """
+    if not mark:
+        return None
+    rows = pd.read_sql_query(
+        f"SELECT restaurant_id, stat_date FROM {table} WHERE rowid > ?", conn, params=(mark['max_rowid'],)
+    )
+    current_rows = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    # Все новые строки имеют rowid больше знака: иначе часть старых строк удалена
+    if current_rows != mark['rows'] + len(rows):
+        return None
+    rows = rows.dropna(subset=['restaurant_id', 'stat_date'])
+    rows['restaurant_id'] = rows['restaurant_id'].astype('int64')
+    return rows.drop_duplicates().reset_index(drop=True)
+
+
+def _write_facts(conn: sqlite3.Connection, facts: pd.DataFrame):
+    """INSERT OR REPLACE фактов (NaN -> NULL)"""
+    if facts.empty:
+        return
+    values = facts.astype(object).where(facts.notna(), None)
+    placeholders = ', '.join('?' for _ in DAILY_FACTS_COLUMNS)
+    conn.executemany(
+        f"INSERT OR REPLACE INTO {DAILY_FACTS_TABLE} ({', '.join(DAILY_FACTS_COLUMNS)}) VALUES ({placeholders})",
+        values.itertuples(index=False, name=None)
+    )
+
+
+def build_daily_facts(db_path: str = DEFAULT_DB_PATH, full: bool = False, verbose: bool = True) -> Dict[str, Any]:
+    """
+    Строит или дополняет daily_facts
+
+    Args:
+        db_path: Путь к базе данных
+        full: Пересобрать таблицу целиком (иначе - только ресторан-дни новых строк)
+        verbose: Печатать ход обновления
+
+    Returns:
+        Словарь: mode ('full'/'incremental'/'up-to-date'), rows, since, watermarks
+    """
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000)
+    try:
+        # Блокировка записи сразу: параллельные процессы не строят факты дважды
+        conn.execute("BEGIN IMMEDIATE")
+
+        # Схема изменилась (новые колонки в коде) - пересобираем с нуля
+        existing_columns = _table_columns(conn, DAILY_FACTS_TABLE)
+        if existing_columns and existing_columns != DAILY_FACTS_COLUMNS:
+            conn.execute(f"DROP TABLE {DAILY_FACTS_TABLE}")
+            full = True
+        elif not existing_columns:
+            full = True
+        create_tables(conn)
+
+        marks = read_table_marks(conn, DAILY_FACTS_TABLE)
+        current = table_marks(conn)
+        if not full:
+            changed = [changed_restaurant_days(conn, table, marks.get(table)) for table in current]
+            full = any(keys is None for keys in changed)
+
+        if full:
+            conn.execute(f"DELETE FROM {DAILY_FACTS_TABLE}")
+            grab = _read_source(conn, 'grab_stats', GRAB_FACTS)
+            gojek = _read_source(conn, 'gojek_stats', GOJEK_FACTS)
+            facts = compute_daily_facts(grab, gojek)
+            since = None
+            mode = 'full'
+        else:
+            # Ресторан-дни новых и измененных строк (включая поздние и старые даты)
+            new_keys = pd.concat(changed, ignore_index=True).drop_duplicates()
+            if new_keys.empty:
+                conn.commit()
+                if verbose:
+                    print("✅ daily_facts актуальна")
+                return {'mode': 'up-to-date', 'rows': 0, 'since': None, 'watermarks': current}
+
+            since = new_keys['stat_date'].min()
+            ids = sorted(int(i) for i in new_keys['restaurant_id'].unique())
+            id_list = ', '.join('?' for _ in ids)
+            where = f"WHERE stat_date >= ? AND restaurant_id IN ({id_list})"
+            grab = _read_source(conn, 'grab_stats', GRAB_FACTS, where, (since, *ids))
+            gojek = _read_source(conn, 'gojek_stats', GOJEK_FACTS, where, (since, *ids))
+            facts = compute_daily_facts(grab, gojek)
+            # Пересчитываем только новые ресторан-дни (вторая платформа могла прийти позже)
+            new_keys['restaurant_id'] = new_keys['restaurant_id'].astype('int64')
+            facts = facts.merge(new_keys, on=['restaurant_id', 'stat_date'], how='inner')
+            # День, у которого правка забрала все строки, из фактов уходит
+            conn.executemany(
+                f"DELETE FROM {DAILY_FACTS_TABLE} WHERE restaurant_id = ? AND stat_date = ?",
+                [(int(row.restaurant_id), str(row.stat_date)) for row in new_keys.itertuples(index=False)]
+            )
+            mode = 'incremental'
+
+        _write_facts(conn, facts)
+        write_table_marks(conn, DAILY_FACTS_TABLE, current)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    if verbose:
+        label = "пересобрана" if mode == 'full' else f"дополнена с {since}"
+        print(f"✅ daily_facts {label}: {len(facts):,} ресторан-дней")
+
+    return {'mode': mode, 'rows': len(facts), 'since': since, 'watermarks': current}
+
+
+def daily_facts_is_current(db_path: str = DEFAULT_DB_PATH) -> bool:
+    """
+    True если daily_facts существует и не отстает от исходных таблиц
+
+    Проверка на каждое чтение: MAX(rowid) таблиц (поиск по B-дереву, без
+    скана). Новые строки двигают rowid исходной таблицы, правки и удаления -
+    rowid журнала source_changes. Без журнала (база до триггеров) удаление
+    видно только по COUNT(*) - этот результат кешируется в процессе.
+    """
+    with connection(db_path) as conn:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if DAILY_FACTS_TABLE not in tables or WATERMARKS_TABLE not in tables:
+            return False
+        if _table_columns(conn, DAILY_FACTS_TABLE) != DAILY_FACTS_COLUMNS:
+            return False
+        marks = read_table_marks(conn, DAILY_FACTS_TABLE)
+        rowids = {table: conn.execute(f"SELECT MAX(rowid) FROM {table}").fetchone()[0] or 0
+                  for table in _tracked_tables(conn)}
+        if any(table not in marks or marks[table]['max_rowid'] != rowid for table, rowid in rowids.items()):
+            return False
+        if CHANGES_TABLE in rowids:
+            return True
+
+        key = (os.path.abspath(db_path), tuple(sorted(rowids.items())),
+               tuple(sorted((table, tuple(sorted(mark.items()))) for table, mark in marks.items())))
+        current = _current_cache.get(key)
+        if current is None:
+            current = marks_current(marks, table_marks(conn))
+            with _current_lock:
+                _current_cache[key] = current
+    return current
+
+
+def ensure_daily_facts(db_path: str = DEFAULT_DB_PATH, verbose: bool = False) -> bool:
+    """
+    Дополняет daily_facts, если появились новые дни
+
+    Returns:
+        True если таблица актуальна (False - база только для чтения или ошибка)
+    """
+    try:
+        if daily_facts_is_current(db_path):
+            return True
+        build_daily_facts(db_path, verbose=verbose)
+        return True
+    except sqlite3.Error as e:
+        print(f"⚠️ daily_facts не обновлена: {e}")
+        return False
+
+
+def load_daily_facts(start_date: Optional[str] = None, end_date: Optional[str] = None,
+                     restaurant_id: Optional[int] = None, db_path: str = DEFAULT_DB_PATH) -> pd.DataFrame:
+    """
+    Читает дневные факты (с именем ресторана)
+
+    Args:
+        start_date: Начальная дата (включительно)
+        end_date: Конечная дата (включительно)
+        restaurant_id: ID ресторана (None - все рестораны)
+        db_path: Путь к базе данных
+
+    Returns:
+        DataFrame: restaurant_name + DAILY_FACTS_COLUMNS, по дате и ресторану
+    """
+    conditions, params = [], []
+    if start_date:
+        conditions.append("f.stat_date >= ?")
+        params.append(start_date)
+    if end_date:
+        conditions.append("f.stat_date <= ?")
+        params.append(end_date)
+    if restaurant_id is not None:
+        conditions.append("f.restaurant_id = ?")
+        params.append(int(restaurant_id))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    # Таблицу обновляют refresh и прогрев analyze-all; чтение базу не меняет
+    if daily_facts_is_current(db_path):
+        query = f"""
+            SELECT r.name AS restaurant_name, f.*
+            FROM {DAILY_FACTS_TABLE} f
+            JOIN restaurants r ON r.id = f.restaurant_id
+            {where}
+            ORDER BY f.stat_date, r.name
+        """
+        with connection(db_path) as conn:
+            return pd.read_sql_query(query, conn, params=params)
+
+    # daily_facts отстает от исходных таблиц: считаем факты в памяти
+    source_where = where.replace('f.', '')
+    with connection(db_path) as conn:
+        grab = _read_source(conn, 'grab_stats', GRAB_FACTS, source_where, tuple(params))
+        gojek = _read_source(conn, 'gojek_stats', GOJEK_FACTS, source_where, tuple(params))
+        names = pd.read_sql_query("SELECT id AS restaurant_id, name AS restaurant_name FROM restaurants", conn)
+    facts = compute_daily_facts(grab, gojek).merge(names, on='restaurant_id', how='inner')
+    return facts[['restaurant_name'] + DAILY_FACTS_COLUMNS].sort_values(
+        ['stat_date', 'restaurant_name']).reset_index(drop=True)
+
+
+def restaurant_watermark(restaurant_id: int, db_path: str = DEFAULT_DB_PATH) -> Optional[str]:
+    """
+    Последний день данных ресторана (MAX stat_date)
+
+    Из daily_facts, если она актуальна, иначе из исходных таблиц. Дозагрузку
+    старых дат и правки знак не видит - для них restaurant_data_signature.
+    """
+    if daily_facts_is_current(db_path):
+        with connection(db_path) as conn:
+            return conn.execute(
+                f"SELECT MAX(stat_date) FROM {DAILY_FACTS_TABLE} WHERE restaurant_id = ?", (int(restaurant_id),)
+            ).fetchone()[0]
+    # daily_facts не построена или отстает - берем исходные таблицы
+    with connection(db_path) as conn:
+        dates = [conn.execute(f"SELECT MAX(stat_date) FROM {table} WHERE restaurant_id = ?",
+                              (int(restaurant_id),)).fetchone()[0] for table in SOURCE_TABLES]
+    dates = [date for date in dates if date]
+    return max(dates) if dates else None
+
+
+def restaurant_data_signature(restaurant_id: int, end_date: Optional[str] = None,
+                              db_path: str = DEFAULT_DB_PATH) -> str:
+    """
+    Подпись данных ресторана по end_date: 'строки:последний день:правки'
+
+    Строки и последний день - из исходных таблиц (индекс restaurant_id +
+    stat_date), правки - записи журнала source_changes. Дозагрузка старых
+    дат, удаление и правка на месте меняют подпись; новые дни после end_date - нет.
+    """
+    end_date = end_date or '9999-12-31'
+    params = (int(restaurant_id), end_date)
+    rows, last_day, changes = 0, '', 0
+    with connection(db_path) as conn:
+        for table in _tracked_tables(conn):
+            count, max_date = conn.execute(
+                f"SELECT COUNT(*), MAX(stat_date) FROM {table} WHERE restaurant_id = ? AND stat_date <= ?", params
+            ).fetchone()
+            if table == CHANGES_TABLE:
+                changes = count
+            else:
+                rows += count
+                last_day = max(last_day, max_date or '')
+    return f"{rows}:{last_day}:{changes}"
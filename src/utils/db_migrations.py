@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+🛠️ МИГРАЦИИ СХЕМЫ database.sqlite
+==========================================
+Создает и проверяет индексы для горячих запросов отчетов.
+
+✅ ЧТО ДЕЛАЕТ:
+- WAL журнал (пул read-only подключений читает параллельно с refresh;
+  сам пул базу не меняет)
+- Составные покрывающие индексы (restaurant_id, stat_date, ...) для grab_stats и gojek_stats
+- Уникальный индекс по restaurants.name
+- ANALYZE для статистики планировщика
+- EXPLAIN QUERY PLAN горячих запросов (полный скан = проблема)
+
+Запуск:
+    python -m src.utils.db_migrations [--db database.sqlite] [--check]
+"""
+
+import os
+import sys
+import sqlite3
+import argparse
+from typing import Dict, List, Any, Optional
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from src.utils.db_pool import DEFAULT_DB_PATH, BUSY_TIMEOUT_MS
+
+# (имя индекса, таблица, колонки, уникальный)
+# Колонки после (restaurant_id, stat_date) делают индекс покрывающим для
+# агрегатов продаж/заказов/рейтинга/рекламы - таблица не читается вовсе.
+INDEXES = [
+    ('idx_grab_stats_restaurant_date', 'grab_stats',
+     ['restaurant_id', 'stat_date', 'sales', 'orders', 'rating', 'ads_spend', 'ads_sales'], False),
+    ('idx_gojek_stats_restaurant_date', 'gojek_stats',
+     ['restaurant_id', 'stat_date', 'sales', 'orders', 'rating', 'ads_spend', 'ads_sales'], False),
+    ('ux_restaurants_name', 'restaurants', ['name'], True),
+]
+
+# Запасной индекс, если в restaurants есть дубликаты имен
+FALLBACK_NAME_INDEX = ('idx_restaurants_name', 'restaurants', ['name'], False)
+
+# Горячие запросы отчетов (параметры только для EXPLAIN)
+HOT_QUERIES = {
+    'Поиск ресторана по имени': (
+        "SELECT id FROM restaurants WHERE name = ?",
+        ('Only Eggs',)
+    ),
+    'Период ресторана (Grab)': (
+        "SELECT * FROM grab_stats WHERE restaurant_id = ? AND stat_date BETWEEN ? AND ?",
+        (1, '2025-01-01', '2025-12-31')
+    ),
+    'Период ресторана (Gojek)': (
+        "SELECT * FROM gojek_stats WHERE restaurant_id = ? AND stat_date BETWEEN ? AND ?",
+        (1, '2025-01-01', '2025-12-31')
+    ),
+    'Продажи по дням (Grab)': (
+        "SELECT stat_date, SUM(sales), SUM(orders) FROM grab_stats "
+        "WHERE restaurant_id = ? AND stat_date BETWEEN ? AND ? GROUP BY stat_date",
+        (1, '2025-01-01', '2025-12-31')
+    ),
+    'Grab ⋈ Gojek по дням': (
+        "SELECT g.stat_date, g.sales, gj.sales FROM grab_stats g "
+        "JOIN gojek_stats gj ON g.restaurant_id = gj.restaurant_id AND g.stat_date = gj.stat_date "
+        "WHERE g.restaurant_id = ? AND g.stat_date BETWEEN ? AND ?",
+        (1, '2025-01-01', '2025-12-31')
+    ),
+}
+
+
+def _table_columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+
+
+def _existing_indexes(conn: sqlite3.Connection) -> Dict[str, str]:
+    """Индексы базы {имя: таблица}"""
+    rows = conn.execute("SELECT name, tbl_name FROM sqlite_master WHERE type = 'index'").fetchall()
+    return {name: table for name, table in rows}
+
+
+def _create_index(conn: sqlite3.Connection, name: str, table: str, columns: List[str], unique: bool) -> List[str]:
+    """Создает индекс по существующим колонкам, возвращает фактический список колонок"""
+    available = _table_columns(conn, table)
+    # Ключевые колонки обязательны, покрывающие - только если есть в таблице
+    key_columns = columns[:2] if table != 'restaurants' else columns[:1]
+    if not all(column in available for column in key_columns):
+        return []
+    index_columns = [column for column in columns if column in available]
+    unique_sql = 'UNIQUE ' if unique else ''
+    conn.execute(f"CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table} ({', '.join(index_columns)})")
+    return index_columns
+
+
+def apply_migrations(db_path: str = DEFAULT_DB_PATH, analyze: Optional[bool] = None,
+                     verbose: bool = True) -> Dict[str, Any]:
+    """
+    Создает недостающие индексы и обновляет статистику (идемпотентно)
+
+    Args:
+        db_path: Путь к базе данных
+        analyze: Запускать ANALYZE (по умолчанию - только если что-то создано
+                 или статистики еще нет)
+        verbose: Печатать ход миграции
+
+    Returns:
+        Словарь: created, skipped, warnings, analyzed, wal_enabled
+    """
+    result = {'created': [], 'skipped': [], 'warnings': [], 'analyzed': False, 'wal_enabled': False}
+
+    if not os.path.exists(db_path):
+        result['warnings'].append(f"База данных не найдена: {db_path}")
+        if verbose:
+            print(f"❌ База данных не найдена: {db_path}")
+        return result
+
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000)
+    try:
+        mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        if str(mode).lower() != 'wal':
+            mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+            result['wal_enabled'] = str(mode).lower() == 'wal'
+
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        existing = _existing_indexes(conn)
+
+        for name, table, columns, unique in INDEXES:
+            if table not in tables:
+                result['skipped'].append(name)
+                result['warnings'].append(f"Таблица {table} отсутствует - индекс {name} пропущен")
+                continue
+            if name in existing:
+                result['skipped'].append(name)
+                continue
+            try:
+                created_columns = _create_index(conn, name, table, columns, unique)
+            except sqlite3.IntegrityError:
+                # Дубликаты имен ресторанов - уникальность не гарантировать, но искать быстро
+                duplicates = conn.execute(
+                    f"SELECT {columns[0]}, COUNT(*) FROM {table} GROUP BY {columns[0]} HAVING COUNT(*) > 1"
+                ).fetchall()
+                names = ', '.join(str(row[0]) for row in duplicates[:5])
+                result['warnings'].append(f"{name}: дубликаты в {table}.{columns[0]} ({names})")
+                fb_name, fb_table, fb_columns, fb_unique = FALLBACK_NAME_INDEX
+                if fb_name not in existing:
+                    _create_index(conn, fb_name, fb_table, fb_columns, fb_unique)
+                    result['created'].append(fb_name)
+                continue
+            if created_columns:
+                result['created'].append(name)
+            else:
+                result['skipped'].append(name)
+                result['warnings'].append(f"В {table} нет ключевых колонок для {name}")
+        conn.commit()
+
+        has_stats = conn.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE name = 'sqlite_stat1'"
+        ).fetchone()[0] > 0
+        if analyze is None:
+            analyze = bool(result['created']) or not has_stats
+        if analyze:
+            conn.execute("ANALYZE")
+            conn.commit()
+            result['analyzed'] = True
+    finally:
+        conn.close()
+
+    if verbose:
+        if result['wal_enabled']:
+            print("📝 Журнал базы переведен в WAL")
+        for name in result['created']:
+            print(f"✅ Создан индекс: {name}")
+        if not result['created']:
+            print("✅ Все индексы уже на месте")
+        for warning in result['warnings']:
+            print(f"⚠️ {warning}")
+        if result['analyzed']:
+            print("📊 ANALYZE: статистика планировщика обновлена")
+
+    return result
+
+
+def verify_indexes(db_path: str = DEFAULT_DB_PATH) -> Dict[str, bool]:
+    """Проверяет наличие индексов {имя: есть ли}"""
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000)
+    try:
+        existing = _existing_indexes(conn)
+    finally:
+        conn.close()
+    status = {name: name in existing for name, _, _, _ in INDEXES}
+    # Запасной индекс по имени тоже считается
+    if not status['ux_restaurants_name'] and FALLBACK_NAME_INDEX[0] in existing:
+        status['ux_restaurants_name'] = True
+    return status
+
+
+def explain_hot_queries(db_path: str = DEFAULT_DB_PATH) -> Dict[str, Dict[str, Any]]:
+    """
+    EXPLAIN QUERY PLAN для горячих запросов
+
+    Returns:
+        {название: {'plan': [строки плана], 'full_scan': bool}}
+    """
+    plans = {}
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000)
+    try:
+        for title, (query, params) in HOT_QUERIES.items():
+            try:
+                rows = conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+            except sqlite3.Error as e:
+                plans[title] = {'plan': [f"ошибка: {e}"], 'full_scan': False}
+                continue
+            details = [row[-1] for row in rows]
+            full_scan = any(d.startswith('SCAN') and 'INDEX' not in d for d in details)
+            plans[title] = {'plan': details, 'full_scan': full_scan}
+    finally:
+        conn.close()
+    return plans
+
+
+def print_query_plans(plans: Dict[str, Dict[str, Any]]) -> bool:
+    """Печатает планы запросов, возвращает True если полных сканов нет"""
+    all_good = True
+    for title, info in plans.items():
+        icon = "❌" if info['full_scan'] else "✅"
+        print(f"{icon} {title}")
+        for line in info['plan']:
+            print(f"     {line}")
+        if info['full_scan']:
+            all_good = False
+    return all_good
+
+
+def run_migrations(db_path: str = DEFAULT_DB_PATH, check_only: bool = False) -> bool:
+    """
+    Команда миграции: индексы + ANALYZE + отчет EXPLAIN QUERY PLAN
+
+    Args:
+        db_path: Путь к базе данных
+        check_only: Только проверить, ничего не создавать
+
+    Returns:
+        True если все индексы есть и горячие запросы не делают полный скан
+    """
+    print("🛠️ МИГРАЦИЯ СХЕМЫ БАЗЫ ДАННЫХ")
+    print("-" * 40)
+
+    if not os.path.exists(db_path):
+        print(f"❌ База данных не найдена: {db_path}")
+        return False
+
+    if not check_only:
+        apply_migrations(db_path)
+
+    status = verify_indexes(db_path)
+    for name, present in status.items():
+        print(f"{'✅' if present else '❌'} Индекс {name}: {'есть' if present else 'отсутствует'}")
+
+    print()
+    print("🔎 EXPLAIN QUERY PLAN горячих запросов:")
+    plans_ok = print_query_plans(explain_hot_queries(db_path))
+    print()
+
+    return all(status.values()) and plans_ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Миграция индексов database.sqlite")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='Путь к базе данных')
+    parser.add_argument('--check', action='store_true', help='Только проверить индексы и планы')
+    args = parser.parse_args()
+    sys.exit(0 if run_migrations(args.db, check_only=args.check) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+🗄️ ПУЛ ПОДКЛЮЧЕНИЙ К SQLITE
+==========================================
+Единый слой доступа к database.sqlite для main.py, анализаторов и API.
+
+✅ ВОЗМОЖНОСТИ:
+- Потокобезопасный пул read-only подключений (URI mode=ro) - пул базу
+  не меняет; WAL журнал включает команда migrate (db_migrations)
+- Настроенные PRAGMA: mmap_size, cache_size, temp_store, query_only
+- Кеш подготовленных запросов (cached_statements)
+- Совместимость с pandas.read_sql_query и привычным conn.close()
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Iterator
+
+import pandas as pd
+
+DEFAULT_DB_PATH = 'database.sqlite'
+
+# Настройки пула и PRAGMA (можно переопределить через окружение)
+POOL_MAX_IDLE = int(os.getenv('DB_POOL_MAX_IDLE', '8'))
+CACHED_STATEMENTS = int(os.getenv('DB_CACHED_STATEMENTS', '256'))
+MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', str(256 * 1024 * 1024)))  # 256 MB
+CACHE_SIZE_KB = int(os.getenv('DB_CACHE_SIZE_KB', str(64 * 1024)))   # 64 MB
+BUSY_TIMEOUT_MS = 20000
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    Подключение из пула.
+
+    Это обычный sqlite3.Connection (pandas принимает его без предупреждений),
+    но close() и выход из `with` возвращают подключение в пул, а не закрывают его.
+    """
+
+    _pool = None
+    _released = False
+
+    def close(self):
+        """Возвращает подключение в пул (или закрывает, если пула нет)"""
+        if self._released:
+            return
+        pool = self._pool
+        if pool is None:
+            super().close()
+            return
+        self._released = True
+        pool._release(self)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        result = super().__exit__(exc_type, exc_value, traceback)
+        self.close()
+        return result
+
+    def _really_close(self):
+        """Физически закрывает подключение"""
+        self._pool = None
+        try:
+            super().close()
+        except sqlite3.Error:
+            pass
+
+
+class SQLiteConnectionPool:
+    """
+    Потокобезопасный пул read-only подключений к одной базе SQLite.
+
+    Пул не блокирует вызывающий код: если свободных подключений нет, создается
+    новое; при возврате сверх лимита max_idle подключение закрывается.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, max_idle: int = POOL_MAX_IDLE):
+        """
+        Инициализация пула
+
+        Args:
+            db_path: Путь к файлу базы данных
+            max_idle: Сколько простаивающих подключений держать открытыми
+        """
+        self.db_path = os.path.abspath(db_path)
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        self.stats = {'created': 0, 'reused': 0, 'closed': 0}
+
+    def _connect(self) -> PooledConnection:
+        """Создает новое настроенное подключение"""
+        if not os.path.exists(self.db_path):
+            raise sqlite3.OperationalError(f"База данных не найдена: {self.db_path}")
+
+        conn = sqlite3.connect(
+            f"file:{self.db_path}?mode=ro",
+            uri=True,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            cached_statements=CACHED_STATEMENTS,
+            factory=PooledConnection,
+        )
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA query_only=ON")
+        # Пул общий для потоков (разделы отчета, ML) - счетчики только под блокировкой
+        with self._lock:
+            self.stats['created'] += 1
+        return conn
+
+    def acquire(self) -> PooledConnection:
+        """Берет подключение из пула (или создает новое)"""
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+            if conn is not None:
+                self.stats['reused'] += 1
+        if conn is None:
+            conn = self._connect()
+        conn._pool = self
+        conn._released = False
+        return conn
+
+    def _release(self, conn: PooledConnection):
+        """Возвращает подключение в пул"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn._really_close()
+            return
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+            self.stats['closed'] += 1
+        conn._really_close()
+
+    def close_all(self):
+        """Закрывает все простаивающие подключения"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn._really_close()
+
+
+_pools: Dict[Any, SQLiteConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str = DEFAULT_DB_PATH) -> SQLiteConnectionPool:
+    """
+    Возвращает общий для процесса пул для указанной базы
+
+    Пулы привязаны к PID: после fork дочерний процесс получает свои подключения.
+    """
+    key = (os.getpid(), os.path.abspath(db_path))
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = SQLiteConnectionPool(db_path)
+                _pools[key] = pool
+    return pool
+
+
+def get_connection(db_path: str = DEFAULT_DB_PATH) -> PooledConnection:
+    """
+    Берет read-only подключение из пула.
+
+    Использование совпадает с sqlite3.connect: `conn.close()` или блок `with`
+    возвращают подключение в пул.
+    """
+    return get_pool(db_path).acquire()
+
+
+@contextmanager
+def connection(db_path: str = DEFAULT_DB_PATH) -> Iterator[PooledConnection]:
+    """Контекстный менеджер: подключение возвращается в пул при выходе"""
+    conn = get_connection(db_path)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def read_sql(query: str, params: Optional[Any] = None, db_path: str = DEFAULT_DB_PATH) -> pd.DataFrame:
+    """
+    Выполняет SELECT и возвращает DataFrame через пул подключений
+
+    Args:
+        query: SQL запрос (используйте плейсхолдеры ? для кеша подготовленных запросов)
+        params: Параметры запроса
+        db_path: Путь к базе данных
+    """
+    with connection(db_path) as conn:
+        return pd.read_sql_query(query, conn, params=params)
+
+
+def close_all_pools():
+    """Закрывает все пулы процесса (например, перед заменой файла базы)"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+🧱 ХРАНИЛИЩЕ ПРИЗНАКОВ (FEATURE STORE)
+==========================================
+Обогащенная таблица ресторан-день (база + погода + туристы + праздники +
+конкуренты) сохраняется на диск партициями по месяцам.
+
+✅ ФОРМАТ (data/feature_store/<имя>/):
+- <YYYY-MM>.parquet - партиция месяца (pyarrow); без pyarrow - <YYYY-MM>.pkl
+- manifest.json     - версия схемы, колонки, подписи партиций и входных файлов
+
+✅ ОБНОВЛЕНИЕ (sync):
+- Подпись месяца = число ресторан-дней и последний день в daily_facts
+  (пока таблица отстает - в исходных таблицах; хранилище ее не строит)
+  + сумма версий partition_versions (refresh поднимает их для новых дней)
+  + доп. входы месяца month_inputs (например, покрытие хранилища погоды:
+  месяц, собранный без погоды, пересобирается, когда погода докачана)
+- Пересобираются только месяцы с изменившейся подписью (новый месяц -
+  новая партиция, текущий месяц - перезапись своей партиции)
+- Другая FEATURE_SCHEMA_VERSION или изменились входные файлы
+  (праздники, туристы, локации) - полная пересборка
+
+✅ ЧТЕНИЕ (read):
+- Только нужные месяцы (start_date / end_date) и только нужные колонки
+  (Parquet читает с диска лишь запрошенные колонки)
+
+Использование:
+    store = get_feature_store('ultimate_features')
+    store.sync(builder)  # builder(start_date, end_date) -> DataFrame со stat_date
+    df = store.read(columns=['total_sales', 'weather_rain'], start_date='2025-01-01')
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Optional, Dict, List, Any, Callable, Iterable
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from src.utils.db_pool import connection, DEFAULT_DB_PATH
+from src.utils.daily_facts import DAILY_FACTS_TABLE, daily_facts_is_current
+from src.utils.refresh import PARTITIONS_TABLE
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+FEATURE_STORE_DIR = os.getenv('FEATURE_STORE_DIR', os.path.join('data', 'feature_store'))
+
+# Поднимать при изменении набора или смысла колонок - хранилище пересоберется
+FEATURE_SCHEMA_VERSION = 2
+
+MANIFEST_FILE = 'manifest.json'
+KEY_COLUMNS = ['stat_date', 'restaurant_id']
+
+
+def month_signatures(db_path: str = DEFAULT_DB_PATH) -> Dict[str, str]:
+    """Подписи месяцев {YYYY-MM: 'ресторан-дни:последний день:сумма версий'}"""
+    # daily_facts перестраивает refresh; отстающую таблицу заменяют ключи исходных таблиц
+    # (ресторан-день обеих платформ = одна строка фактов, подписи совпадают)
+    source = DAILY_FACTS_TABLE if daily_facts_is_current(db_path) else (
+        "(SELECT restaurant_id, stat_date FROM grab_stats UNION SELECT restaurant_id, stat_date FROM gojek_stats)"
+    )
+    with connection(db_path) as conn:
+        facts = conn.execute(
+            f"SELECT substr(stat_date, 1, 7), COUNT(*), MAX(stat_date) FROM {source} GROUP BY 1"
+        ).fetchall()
+        try:
+            versions = dict(conn.execute(
+                f"SELECT month, SUM(version) FROM {PARTITIONS_TABLE} GROUP BY month"
+            ).fetchall())
+        except sqlite3.Error:
+            # refresh еще не запускался
+            versions = {}
+    return {month: f"{rows}:{last_day}:{versions.get(month, 0)}" for month, rows, last_day in facts}
+
+
+def month_runs(months: Iterable[str]) -> List[tuple]:
+    """Непрерывные отрезки месяцев [(первый, последний)]: ['2024-11', '2024-12', '2025-06'] -> 2 отрезка"""
+    runs = []
+    for month in sorted(months):
+        year, number = int(month[:4]), int(month[5:7])
+        previous = f"{year - 1}-12" if number == 1 else f"{year}-{number - 1:02d}"
+        if runs and runs[-1][1] == previous:
+            runs[-1] = (runs[-1][0], month)
+        else:
+            runs.append((month, month))
+    return runs
+
+
+def inputs_signature(paths: Iterable[str]) -> Dict[str, Optional[float]]:
+    """Время изменения входных файлов (None - файла нет)"""
+    return {path: (os.path.getmtime(path) if os.path.exists(path) else None) for path in paths}
+
+
+class FeatureStore:
+    """Таблица признаков ресторан-день, партиционированная по месяцам"""
+
+    def __init__(self, name: str, root: str = FEATURE_STORE_DIR, db_path: str = DEFAULT_DB_PATH,
+                 use_parquet: Optional[bool] = None):
+        """
+        Args:
+            name: Имя таблицы признаков (подкаталог хранилища)
+            root: Каталог хранилища
+            db_path: База данных (для подписей месяцев)
+            use_parquet: Формат партиций (по умолчанию Parquet, если есть pyarrow)
+        """
+        self.name = name
+        self.path = os.path.join(root, name)
+        self.db_path = db_path
+        self.use_parquet = PARQUET_AVAILABLE if use_parquet is None else use_parquet
+        self.extension = 'parquet' if self.use_parquet else 'pkl'
+        self._lock = threading.Lock()
+
+    # ---------- манифест ----------
+
+    def manifest(self) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self.path, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self, manifest: Dict[str, Any]):
+        tmp_path = os.path.join(self.path, f".{MANIFEST_FILE}.{os.getpid()}")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2, default=str)
+        os.replace(tmp_path, os.path.join(self.path, MANIFEST_FILE))
+
+    def columns(self) -> List[str]:
+        """Колонки таблицы признаков (из манифеста)"""
+        return self.manifest().get('columns', [])
+
+    def months(self) -> List[str]:
+        """Сохраненные месяцы по возрастанию"""
+        return sorted(self.manifest().get('partitions', {}))
+
+    # ---------- партиции ----------
+
+    def _partition_path(self, month: str) -> str:
+        return os.path.join(self.path, f"{month}.{self.extension}")
+
+    def _write_partition(self, month: str, df: pd.DataFrame):
+        tmp_path = f"{self._partition_path(month)}.{os.getpid()}.tmp"
+        if self.use_parquet:
+            df.to_parquet(tmp_path, index=False)
+        else:
+            df.to_pickle(tmp_path)
+        os.replace(tmp_path, self._partition_path(month))
+
+    def _read_partition(self, month: str, columns: Optional[List[str]]) -> pd.DataFrame:
+        if self.use_parquet:
+            return pd.read_parquet(self._partition_path(month), columns=columns)
+        df = pd.read_pickle(self._partition_path(month))
+        return df[columns] if columns is not None else df
+
+    # ---------- обновление ----------
+
+    def _signatures(self, month_inputs: Optional[Callable[[], Dict[str, Any]]]) -> Dict[str, str]:
+        """Подписи месяцев базы + доп. входы месяца"""
+        signatures = month_signatures(self.db_path)
+        if month_inputs is None:
+            return signatures
+        extra = month_inputs()
+        return {month: f"{signature}:{extra.get(month, 0)}" for month, signature in signatures.items()}
+
+    def stale_months(self, inputs: Iterable[str] = (),
+                     month_inputs: Optional[Callable[[], Dict[str, Any]]] = None) -> Optional[List[str]]:
+        """
+        Месяцы, которые нужно пересобрать
+
+        Args:
+            inputs: Входные файлы (изменение - полная пересборка)
+            month_inputs: Функция {YYYY-MM: значение} - доп. часть подписи месяца
+
+        Returns:
+            Список месяцев (пустой - все актуально) или None - нужна полная пересборка
+        """
+        manifest = self.manifest()
+        if (manifest.get('schema_version') != FEATURE_SCHEMA_VERSION
+                or manifest.get('format') != self.extension
+                or manifest.get('inputs', {}) != inputs_signature(inputs)):
+            return None
+        stored = manifest.get('partitions', {})
+        current = self._signatures(month_inputs)
+        return sorted(month for month, signature in current.items()
+                      if stored.get(month, {}).get('signature') != signature)
+
+    def sync(self, builder: Callable[[Optional[str], Optional[str]], pd.DataFrame],
+             inputs: Iterable[str] = (), full: bool = False, verbose: bool = True,
+             month_inputs: Optional[Callable[[], Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """
+        Дописывает хранилище: пересобирает только устаревшие месяцы
+
+        Args:
+            builder: builder(start_date, end_date) -> DataFrame со stat_date (YYYY-MM-DD)
+            inputs: Входные файлы, изменение которых требует полной пересборки
+            full: Полная пересборка
+            month_inputs: Функция {YYYY-MM: значение} - доп. часть подписи месяца
+
+        Returns:
+            Словарь: mode ('full' / 'incremental' / 'up-to-date'), months, rows
+        """
+        inputs = list(inputs)
+        with self._lock:
+            stale = None if full else self.stale_months(inputs, month_inputs)
+            if stale == []:
+                return {'mode': 'up-to-date', 'months': [], 'rows': 0}
+
+            mode = 'full' if stale is None else 'incremental'
+            signatures = self._signatures(month_inputs)
+            if stale is None:
+                stale = sorted(signatures)
+            if not stale:
+                return {'mode': mode, 'months': [], 'rows': 0}
+
+            # Один вызов построителя на непрерывный отрезок устаревших месяцев
+            parts = [builder(f"{first}-01", f"{last}-31") for first, last in month_runs(stale)]
+            parts = [part for part in parts if not part.empty] or [part for part in parts if len(part.columns)][:1]
+            built = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=['stat_date'])
+            built = built.assign(stat_date=built['stat_date'].astype(str).str[:10])
+            by_month = dict(tuple(built.groupby(built['stat_date'].str[:7], sort=True)))
+
+            os.makedirs(self.path, exist_ok=True)
+            manifest = {} if mode == 'full' else self.manifest()
+            partitions = manifest.get('partitions', {})
+            if mode == 'full':
+                for month in self.months():
+                    try:
+                        os.remove(self._partition_path(month))
+                    except OSError:
+                        pass
+
+            rows = 0
+            for month in stale:
+                part = by_month.get(month)
+                if part is None or part.empty:
+                    # Месяц без ресторан-дней после фильтров построителя
+                    partitions.pop(month, None)
+                    continue
+                # Порядок строк построителя сохраняется: чтение = полная сборка
+                self._write_partition(month, part.reset_index(drop=True))
+                partitions[month] = {'signature': signatures.get(month), 'rows': len(part)}
+                rows += len(part)
+
+            columns = list(built.columns) if parts else manifest.get('columns', [])
+            self._write_manifest({
+                'name': self.name,
+                'schema_version': FEATURE_SCHEMA_VERSION,
+                'format': self.extension,
+                'columns': columns,
+                'inputs': inputs_signature(inputs),
+                'partitions': partitions,
+                'updated_at': datetime.now().isoformat(timespec='seconds'),
+            })
+
+        if verbose:
+            label = "пересобрано" if mode == 'full' else "дописано"
+            print(f"🧱 Хранилище признаков {self.name}: {label} {len(stale)} мес., {rows:,} строк")
+        return {'mode': mode, 'months': stale, 'rows': rows}
+
+    # ---------- чтение ----------
+
+    def read(self, columns: Optional[List[str]] = None, start_date: Optional[str] = None,
+             end_date: Optional[str] = None, restaurant_ids: Optional[Iterable[int]] = None) -> pd.DataFrame:
+        """
+        Читает таблицу признаков
+
+        Args:
+            columns: Нужные колонки (None - все); stat_date и restaurant_id добавляются всегда
+            start_date: Начальная дата (включительно)
+            end_date: Конечная дата (включительно)
+            restaurant_ids: Только эти рестораны
+
+        Returns:
+            DataFrame в порядке строк построителя
+        """
+        if columns is not None:
+            columns = KEY_COLUMNS + [col for col in columns if col not in KEY_COLUMNS]
+        months = [month for month in self.months()
+                  if (not start_date or month >= start_date[:7]) and (not end_date or month <= end_date[:7])]
+        if not months:
+            return pd.DataFrame(columns=columns if columns is not None else self.columns())
+
+        df = pd.concat([self._read_partition(month, columns) for month in months], ignore_index=True)
+        if start_date:
+            df = df[df['stat_date'] >= start_date]
+        if end_date:
+            df = df[df['stat_date'] <= end_date]
+        if restaurant_ids is not None:
+            df = df[df['restaurant_id'].isin(list(restaurant_ids))]
+        return df.reset_index(drop=True)
+
+
+_stores: Dict[tuple, FeatureStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_feature_store(name: str, db_path: str = DEFAULT_DB_PATH) -> FeatureStore:
+    """Общий для процесса объект хранилища признаков"""
+    key = (name, os.path.abspath(db_path))
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = FeatureStore(name, db_path=db_path)
+        return _stores[key]
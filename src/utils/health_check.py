@@ -95,6 +95,20 @@ def check_database():
         print(f"❌ Ошибка подключения к БД: {e}")
         return False
 
+def check_database_indexes():
+    """Проверка индексов горячих запросов (создает недостающие)"""
+    if not os.path.exists('database.sqlite'):
+        print("❌ База данных не найдена: database.sqlite")
+        return False
+    
+    try:
+        sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+        from src.utils.db_migrations import run_migrations
+        return run_migrations('database.sqlite')
+    except Exception as e:
+        print(f"❌ Ошибка проверки индексов: {e}")
+        return False
+
 def check_location_data():
     """Проверка файла с координатами ресторанов"""
     print("🗺️ ПРОВЕРКА КООРДИНАТ РЕСТОРАНОВ")
@@ -342,6 +356,7 @@ def main():
     # Список всех проверок
     checks = [
         ("База данных", check_database),
+        ("Индексы БД", check_database_indexes),
         ("Координаты ресторанов", check_location_data),
         ("API ключи", check_api_keys),
         ("Зависимости Python", check_dependencies),
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+🧮 КУБ РЫНОЧНЫХ АГРЕГАТОВ
+==========================================
+Суммы и счетчики ресторан × месяц × платформа (таблица market_cube),
+построенные из daily_facts. Анализ рынка и бенчмарки отчетов сворачивают
+куб за любой период вместо сканирования grab_stats / gojek_stats.
+
+✅ ИЗМЕРЕНИЯ:
+- platform: 'grab', 'gojek' и 'all' (ресторан-дни с продажами обеих
+  платформ вместе - как в анализе рынка)
+- Только аддитивные меры (суммы, число дней, сумма и число рейтингов) -
+  любой период = сумма месяцев
+
+✅ ОБНОВЛЕНИЕ:
+- Водяной знак куба - водяные знаки исходных таблиц, из которых собрана
+  daily_facts (MAX stat_date, MAX rowid, COUNT(*))
+- Новые строки пересчитывают только свои месяцы (шаг refresh 'market_cube'
+  или ensure_market_cube при прогреве analyze-all)
+
+✅ СВЕРТКА (market_rollup):
+- Только чтение: блокировку записи берут лишь refresh и прогрев
+- Полные месяцы периода - из куба
+- Неполные крайние месяцы - те же агрегаты из daily_facts за эти дни
+- Куб отстает - весь период из daily_facts; отстает и daily_facts -
+  факты периода считаются из grab_stats / gojek_stats в памяти
+
+Использование:
+    ensure_market_cube()  # refresh / прогрев analyze-all
+    per_restaurant = market_rollup('2025-04-01', '2025-06-30')
+    benchmarks = market_benchmarks()
+"""
+
+import os
+import sys
+import sqlite3
+import calendar
+from datetime import datetime
+from typing import Optional, Dict, List, Any, Iterable, Tuple
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from src.utils.db_pool import connection, DEFAULT_DB_PATH, BUSY_TIMEOUT_MS
+from src.utils.daily_facts import (
+    DAILY_FACTS_TABLE, DAILY_FACTS_COLUMNS, create_tables, ensure_daily_facts,
+    daily_facts_is_current, load_daily_facts, read_table_marks, write_table_marks, changed_restaurant_days
+)
+
+MARKET_CUBE_TABLE = 'market_cube'
+PLATFORMS = ('grab', 'gojek', 'all')
+
+CUBE_MEASURES = [
+    'days', 'sales', 'orders', 'ads_spend', 'ads_sales', 'ads_orders', 'menu_visits',
+    'paid_ads_sales', 'converting_ads_orders', 'converting_menu_visits',
+    'new_customers', 'repeated_customers', 'reactivated_customers', 'rating_sum', 'rating_days',
+]
+CUBE_COLUMNS = ['restaurant_id', 'month', 'platform'] + CUBE_MEASURES
+
+# Платформа -> (условие ресторан-дня, {мера: выражение над daily_facts})
+_PLATFORM_SQL = {
+    'grab': ("has_grab = 1", {
+        'sales': "grab_sales", 'orders': "grab_orders",
+        'ads_spend': "grab_ads_spend", 'ads_sales': "grab_ads_sales", 'ads_orders': "grab_ads_orders",
+        'menu_visits': "grab_menu_visits",
+        # Рекламные продажи только дней с расходом; воронка только дней с заказами и визитами
+        'paid_ads_sales': "CASE WHEN grab_ads_spend > 0 THEN grab_ads_sales END",
+        'converting_ads_orders': "CASE WHEN grab_ads_orders > 0 AND grab_menu_visits > 0 THEN grab_ads_orders END",
+        'converting_menu_visits': "CASE WHEN grab_ads_orders > 0 AND grab_menu_visits > 0 THEN grab_menu_visits END",
+        'new_customers': "grab_new_customers", 'repeated_customers': "grab_repeated_customers",
+        'reactivated_customers': "grab_reactivated_customers",
+        'rating': "grab_rating",
+    }),
+    'gojek': ("has_gojek = 1", {
+        'sales': "gojek_sales", 'orders': "gojek_orders",
+        'ads_spend': "gojek_ads_spend", 'ads_sales': "gojek_ads_sales", 'ads_orders': "0",
+        'menu_visits': "0",
+        'paid_ads_sales': "CASE WHEN gojek_ads_spend > 0 THEN gojek_ads_sales END",
+        'converting_ads_orders': "0", 'converting_menu_visits': "0",
+        # active_client - повторные, returned_client - реактивированные (как в отчетах)
+        'new_customers': "gojek_new_customers", 'repeated_customers': "gojek_active_customers",
+        'reactivated_customers': "gojek_repeated_customers",
+        'rating': "gojek_rating",
+    }),
+    'all': ("total_sales > 0", {
+        'sales': "total_sales", 'orders': "total_orders",
+        'ads_spend': "total_ads_spend", 'ads_sales': "total_ads_sales", 'ads_orders': "grab_ads_orders",
+        'menu_visits': "grab_menu_visits",
+        'paid_ads_sales': "CASE WHEN total_ads_spend > 0 THEN total_ads_sales END",
+        'converting_ads_orders': "CASE WHEN grab_ads_orders > 0 AND grab_menu_visits > 0 THEN grab_ads_orders END",
+        'converting_menu_visits': "CASE WHEN grab_ads_orders > 0 AND grab_menu_visits > 0 THEN grab_menu_visits END",
+        'new_customers': "COALESCE(grab_new_customers, 0) + COALESCE(gojek_new_customers, 0)",
+        'repeated_customers': "COALESCE(grab_repeated_customers, 0) + COALESCE(gojek_active_customers, 0)",
+        'reactivated_customers': "COALESCE(grab_reactivated_customers, 0) + COALESCE(gojek_repeated_customers, 0)",
+        'rating': "COALESCE(grab_rating, gojek_rating)",
+    }),
+}
+
+
+def _aggregate_sql(group_by_month: bool, where: str = '', platforms: Iterable[str] = PLATFORMS) -> str:
+    """SELECT агрегатов платформ над daily_facts (UNION ALL по платформам)"""
+    parts = []
+    for platform in platforms:
+        condition, exprs = _PLATFORM_SQL[platform]
+        sums = ',\n                '.join(
+            f"SUM(COALESCE({exprs[measure]}, 0)) AS {measure}"
+            for measure in CUBE_MEASURES if measure not in ('days', 'rating_sum', 'rating_days')
+        )
+        month = "substr(stat_date, 1, 7)" if group_by_month else "NULL"
+        parts.append(f"""
+            SELECT restaurant_id, {month} AS month, '{platform}' AS platform,
+                COUNT(*) AS days,
+                {sums},
+                SUM({exprs['rating']}) AS rating_sum,
+                COUNT({exprs['rating']}) AS rating_days
+            FROM {DAILY_FACTS_TABLE}
+            WHERE {condition} {f'AND ({where})' if where else ''}
+            GROUP BY restaurant_id{', 2' if group_by_month else ''}
+        """)
+    return "\nUNION ALL\n".join(parts)
+
+
+def _cube_columns(conn: sqlite3.Connection) -> List[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({MARKET_CUBE_TABLE})").fetchall()]
+
+
+def create_cube_table(conn: sqlite3.Connection):
+    measures = ',\n            '.join(f'{measure} NUMERIC' for measure in CUBE_MEASURES)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {MARKET_CUBE_TABLE} (
+            restaurant_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            platform TEXT NOT NULL,
+            {measures},
+            PRIMARY KEY (restaurant_id, month, platform)
+        )
+    """)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{MARKET_CUBE_TABLE}_month ON {MARKET_CUBE_TABLE} (platform, month)")
+
+
+def build_market_cube(db_path: str = DEFAULT_DB_PATH, full: bool = False,
+                      months: Optional[Iterable[str]] = None, verbose: bool = True) -> Dict[str, Any]:
+    """
+    Строит или дополняет куб
+
+    Args:
+        db_path: Путь к базе данных
+        full: Пересобрать куб целиком
+        months: Пересчитать эти месяцы 'YYYY-MM' (по умолчанию - месяцы дней новее водяного знака)
+        verbose: Печатать ход обновления
+
+    Returns:
+        Словарь: mode ('full'/'incremental'/'up-to-date'), months, rows
+    """
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000)
+    try:
+        # Блокировка записи сразу: параллельные процессы не строят куб дважды
+        conn.execute("BEGIN IMMEDIATE")
+        create_tables(conn)
+        existing_columns = _cube_columns(conn)
+        if existing_columns and existing_columns != CUBE_COLUMNS:
+            conn.execute(f"DROP TABLE {MARKET_CUBE_TABLE}")
+            full = True
+        elif not existing_columns:
+            full = True
+        create_cube_table(conn)
+
+        marks = read_table_marks(conn, MARKET_CUBE_TABLE)
+        # Куб собирается из daily_facts - запоминаем ее водяные знаки
+        current = read_table_marks(conn, DAILY_FACTS_TABLE)
+        changed = []
+        if not full and months is None:
+            changed = [changed_restaurant_days(conn, table, marks.get(table)) for table in current]
+            full = any(keys is None for keys in changed)
+
+        if full:
+            conn.execute(f"DELETE FROM {MARKET_CUBE_TABLE}")
+            where, params, mode, months = '', (), 'full', None
+        else:
+            if months is None:
+                months = [day[:7] for keys in changed for day in keys['stat_date'].astype(str)]
+            months = sorted(set(months))
+            if not months:
+                conn.commit()
+                if verbose:
+                    print("✅ market_cube актуален")
+                return {'mode': 'up-to-date', 'months': [], 'rows': 0}
+            placeholders = ', '.join('?' for _ in months)
+            conn.execute(f"DELETE FROM {MARKET_CUBE_TABLE} WHERE month IN ({placeholders})", months)
+            where = f"substr(stat_date, 1, 7) IN ({placeholders})"
+            params = tuple(months) * len(PLATFORMS)
+            mode = 'incremental'
+
+        cursor = conn.execute(
+            f"INSERT INTO {MARKET_CUBE_TABLE} ({', '.join(CUBE_COLUMNS)}) "
+            f"SELECT {', '.join(CUBE_COLUMNS)} FROM ({_aggregate_sql(True, where)})",
+            params
+        )
+        rows = cursor.rowcount
+        write_table_marks(conn, MARKET_CUBE_TABLE, current)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    if verbose:
+        label = "пересобран" if mode == 'full' else f"обновлены месяцы {', '.join(months)}"
+        print(f"✅ market_cube {label}: {rows:,} строк ресторан × месяц × платформа")
+
+    return {'mode': mode, 'months': months or [], 'rows': rows}
+
+
+def market_cube_is_current(db_path: str = DEFAULT_DB_PATH) -> bool:
+    """True если куб собран из текущей daily_facts (сама daily_facts может отставать)"""
+    with connection(db_path) as conn:
+        try:
+            if _cube_columns(conn) != CUBE_COLUMNS:
+                return False
+            marks = read_table_marks(conn, MARKET_CUBE_TABLE)
+            current = read_table_marks(conn, DAILY_FACTS_TABLE)
+        except sqlite3.Error:
+            return False
+    return bool(marks) and marks == current
+
+
+def ensure_market_cube(db_path: str = DEFAULT_DB_PATH, verbose: bool = False) -> bool:
+    """
+    Дополняет daily_facts и куб, если появились новые дни
+
+    Берет блокировку записи - только для refresh и прогрева analyze-all,
+    не для чтения в отчетах (market_rollup / market_benchmarks)
+
+    Returns:
+        True если куб актуален (False - база только для чтения или ошибка)
+    """
+    if not ensure_daily_facts(db_path):
+        return False
+    try:
+        if market_cube_is_current(db_path):
+            return True
+        build_market_cube(db_path, verbose=verbose)
+        return True
+    except sqlite3.Error as e:
+        print(f"⚠️ market_cube не обновлен: {e}")
+        return False
+
+
+def split_period(start_date: str, end_date: str) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """
+    Делит период на полные месяцы и неполные отрезки
+
+    Returns:
+        (['YYYY-MM' полных месяцев], [(начало, конец) неполных отрезков])
+    """
+    start = datetime.strptime(start_date, '%Y-%m-%d').date()
+    end = datetime.strptime(end_date, '%Y-%m-%d').date()
+    full_months, edges = [], []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        first = start.replace(year=year, month=month, day=1)
+        last = first.replace(day=calendar.monthrange(year, month)[1])
+        lo, hi = max(first, start), min(last, end)
+        if lo == first and hi == last:
+            full_months.append(first.strftime('%Y-%m'))
+        else:
+            edges.append((lo.isoformat(), hi.isoformat()))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return full_months, edges
+
+
+def market_rollup(start_date: Optional[str] = None, end_date: Optional[str] = None, platform: str = 'all',
+                  db_path: str = DEFAULT_DB_PATH) -> pd.DataFrame:
+    """
+    Меры куба по ресторанам за период (без дат - за всю историю)
+
+    Returns:
+        DataFrame: restaurant_id, name + CUBE_MEASURES (только рестораны с днями в периоде)
+    """
+    return _rollups(start_date, end_date, [platform], db_path)[platform]
+
+
+def _rollup_source(db_path: str) -> str:
+    """Откуда сворачивать: 'cube', 'facts' (куб отстает) или 'raw' (отстает daily_facts)"""
+    if not daily_facts_is_current(db_path):
+        return 'raw'
+    return 'cube' if market_cube_is_current(db_path) else 'facts'
+
+
+def _raw_facts_connection(start_date: Optional[str], end_date: Optional[str], db_path: str) -> sqlite3.Connection:
+    """Факты периода из исходных таблиц во временной базе в памяти (рабочая база не меняется)"""
+    facts = load_daily_facts(start_date, end_date, db_path=db_path)
+    memory = sqlite3.connect(':memory:')
+    # Схема daily_facts (NUMERIC): целые суммы остаются целыми, как в рабочей таблице
+    create_tables(memory)
+    facts[DAILY_FACTS_COLUMNS].to_sql(DAILY_FACTS_TABLE, memory, index=False, if_exists='append')
+    return memory
+
+
+def _rollups(start_date: Optional[str], end_date: Optional[str], platforms: List[str],
+             db_path: str) -> Dict[str, pd.DataFrame]:
+    """Свертки периода по платформам {платформа: DataFrame как у market_rollup}"""
+    for platform in platforms:
+        if platform not in PLATFORMS:
+            raise ValueError(f"Неизвестная платформа: {platform} (доступны: {', '.join(PLATFORMS)})")
+    source = _rollup_source(db_path)
+    if start_date and end_date:
+        full_months, edges = split_period(start_date, end_date)
+    else:
+        full_months, edges = None, []
+    if source != 'cube':
+        # Куб отстает - те же агрегаты за весь период из фактов
+        full_months = []
+        edges = [(start_date or '', end_date or '9999-12-31')]
+
+    sums = ', '.join(f"SUM({measure}) AS {measure}" for measure in CUBE_MEASURES)
+    result = {}
+    with connection(db_path) as conn:
+        names = pd.read_sql_query("SELECT id AS restaurant_id, name FROM restaurants", conn)
+        facts_conn = _raw_facts_connection(start_date, end_date, db_path) if source == 'raw' else conn
+        try:
+            for platform in platforms:
+                parts = []
+                if full_months is None or full_months:
+                    month_filter = ''
+                    params: List[Any] = [platform]
+                    if full_months:
+                        month_filter = f"AND month IN ({', '.join('?' for _ in full_months)})"
+                        params.extend(full_months)
+                    parts.append(pd.read_sql_query(
+                        f"SELECT restaurant_id, {sums} FROM {MARKET_CUBE_TABLE} "
+                        f"WHERE platform = ? {month_filter} GROUP BY restaurant_id",
+                        conn, params=params
+                    ))
+                for lo, hi in edges:
+                    parts.append(pd.read_sql_query(
+                        f"SELECT restaurant_id, {sums} "
+                        f"FROM ({_aggregate_sql(False, 'stat_date BETWEEN ? AND ?', [platform])}) "
+                        f"GROUP BY restaurant_id",
+                        facts_conn, params=[lo, hi]
+                    ))
+                result[platform] = _merge_parts(parts, names)
+        finally:
+            if facts_conn is not conn:
+                facts_conn.close()
+    return result
+
+
+def _merge_parts(parts: List[pd.DataFrame], names: pd.DataFrame) -> pd.DataFrame:
+    parts = [part for part in parts if not part.empty]
+    if not parts:
+        return pd.DataFrame(columns=['restaurant_id', 'name'] + CUBE_MEASURES)
+    totals = pd.concat(parts, ignore_index=True).groupby('restaurant_id', as_index=False)[CUBE_MEASURES].sum()
+    totals = totals[totals['days'] > 0]
+    return names.merge(totals, on='restaurant_id', how='inner')[['restaurant_id', 'name'] + CUBE_MEASURES]
+
+
+def market_benchmarks(start_date: Optional[str] = None, end_date: Optional[str] = None,
+                      db_path: str = DEFAULT_DB_PATH) -> Dict[str, float]:
+    """
+    Рыночные бенчмарки - средние по ресторанам (каждый ресторан с равным весом)
+
+    Returns:
+        {avg_order_value, roas, rating, repeat_rate, conversion_rate} (0 - нет данных)
+    """
+    rollups = _rollups(start_date, end_date, ['all', 'grab'], db_path)
+    total, grab = rollups['all'], rollups['grab']
+
+    def mean_ratio(frame: pd.DataFrame, numerator: pd.Series, denominator: pd.Series, mask: pd.Series) -> float:
+        if frame.empty or not mask.any():
+            return 0.0
+        return float((numerator[mask] / denominator[mask]).mean())
+
+    customers = total['repeated_customers'] + total['new_customers'] + total['reactivated_customers']
+    return {
+        'avg_order_value': mean_ratio(total, total['sales'], total['orders'], total['orders'] > 0),
+        'roas': mean_ratio(grab, grab['paid_ads_sales'], grab['ads_spend'], grab['ads_spend'] > 0),
+        'rating': mean_ratio(total, total['rating_sum'], total['rating_days'], total['rating_days'] > 0),
+        'repeat_rate': mean_ratio(total, total['repeated_customers'] * 100.0, customers, customers > 0),
+        'conversion_rate': mean_ratio(grab, grab['converting_ads_orders'] * 100.0, grab['converting_menu_visits'],
+                                      grab['converting_menu_visits'] > 0),
+    }
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+⏱️ ИСПОЛНИТЕЛЬ ML ЗАДАЧ С ДЕДЛАЙНАМИ
+==========================================
+ML анализ выполняется в общем пуле потоков вместо signal.SIGALRM:
+SIGALRM работает только в главном потоке Unix процесса, поэтому в
+веб-приложении (Streamlit, потоки запросов) таймаут не срабатывал.
+
+✅ КАК РАБОТАЕТ:
+- submit_ml(fn, *args) ставит задачу в общий пул (ML_WORKERS потоков)
+  и передает ей Deadline первым аргументом
+- task.result() ждет не дольше оставшегося времени; по истечении -
+  отменяет задачу и бросает MLTimeoutError
+- Отмена: задача из очереди не запускается; работающая задача
+  останавливается на ближайшем deadline.check() (Python потоки
+  принудительно не прерываются)
+- Несколько задач (например, лучший и худший день) считаются параллельно
+
+Использование:
+    task = submit_ml(work, restaurant_name, target_date)
+    try:
+        result, elapsed = task.result()
+    except MLTimeoutError:
+        ...  # быстрый анализ без ML
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional, Any, Callable, Tuple
+
+ML_TIMEOUT_SEC = float(os.getenv('ML_TIMEOUT_SEC', '30'))
+ML_WORKERS = int(os.getenv('ML_WORKERS', '4'))
+
+
+class MLTimeoutError(TimeoutError):
+    """ML задача не уложилась в дедлайн или была отменена"""
+
+
+class Deadline:
+    """Дедлайн задачи с кооперативной отменой"""
+
+    def __init__(self, timeout: float = ML_TIMEOUT_SEC):
+        self.timeout = timeout
+        self.started = time.monotonic()
+        self._cancelled = threading.Event()
+
+    def remaining(self) -> float:
+        """Секунд до дедлайна (не меньше 0)"""
+        return max(0.0, self.timeout - self.elapsed())
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def expired(self) -> bool:
+        return self._cancelled.is_set() or self.remaining() <= 0
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def check(self):
+        """Точка отмены: бросает MLTimeoutError, если время вышло или задача отменена"""
+        if self.expired:
+            raise MLTimeoutError(f"ML анализ превысил лимит времени ({self.timeout:.0f} сек)")
+
+
+class MLTask:
+    """Задача в пуле ML: future + ее дедлайн"""
+
+    def __init__(self, future, deadline: Deadline):
+        self.future = future
+        self.deadline = deadline
+
+    def result(self) -> Tuple[Any, float]:
+        """
+        Результат задачи в пределах дедлайна
+
+        Returns:
+            (результат, секунд с постановки в очередь)
+
+        Raises:
+            MLTimeoutError: дедлайн истек (задача отменена)
+        """
+        try:
+            value = self.future.result(timeout=self.deadline.remaining())
+        except FutureTimeoutError:
+            self.cancel()
+            raise MLTimeoutError(f"ML анализ превысил лимит времени ({self.deadline.timeout:.0f} сек)")
+        return value, self.deadline.elapsed()
+
+    def cancel(self):
+        self.deadline.cancel()
+        self.future.cancel()
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_pid: Optional[int] = None
+_executor_lock = threading.Lock()
+
+
+def get_ml_executor() -> ThreadPoolExecutor:
+    """
+    Общий для процесса пул потоков ML
+
+    Привязан к PID: после fork (analyze-all) потоки родителя в дочернем
+    процессе не существуют - создается свой пул.
+    """
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=ML_WORKERS, thread_name_prefix='ml')
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def submit_ml(fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> MLTask:
+    """
+    Ставит ML задачу в общий пул
+
+    Args:
+        fn: fn(deadline, *args, **kwargs); длинные шаги проверяют deadline.check()
+        timeout: Лимит в секундах (по умолчанию ML_TIMEOUT_SEC), считая ожидание в очереди
+    """
+    deadline = Deadline(ML_TIMEOUT_SEC if timeout is None else timeout)
+
+    def run():
+        deadline.check()
+        return fn(deadline, *args, **kwargs)
+
+    return MLTask(get_ml_executor().submit(run), deadline)
+
+
+def run_with_deadline(fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Tuple[Any, float]:
+    """submit_ml + result: (результат, секунд) или MLTimeoutError"""
+    return submit_ml(fn, *args, timeout=timeout, **kwargs).result()
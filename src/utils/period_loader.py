@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+📦 ЗАГРУЗЧИК ДАННЫХ РЕСТОРАНА ЗА ПЕРИОД
+==========================================
+Один запрос к grab_stats + gojek_stats на весь отчет.
+
+Все разделы отчета (клиенты, маркетинг, выплаты, выключения, тренды)
+читают из одного неизменяемого набора RestaurantPeriodData вместо
+повторных запросов к базе.
+"""
+
+import json
+import threading
+from typing import Optional, Dict, List, Any
+
+import pandas as pd
+
+from src.utils.db_pool import connection, DEFAULT_DB_PATH
+
+PLATFORMS = ('grab', 'gojek')
+
+# Имена из CLI (без пробелов) -> название в таблице restaurants
+RESTAURANT_ALIASES = {'Only_Eggs': 'Only Eggs'}
+
+_columns_cache: Dict[Any, List[str]] = {}
+_columns_lock = threading.Lock()
+
+
+def time_to_minutes(value) -> float:
+    """Конвертирует время HH:MM:SS (или число минут) в минуты"""
+    if value is None or value == '':
+        return 0.0
+    if isinstance(value, (int, float)):
+        return 0.0 if pd.isna(value) else float(value)
+    try:
+        parts = str(value).split(':')
+        if len(parts) >= 3:
+            return int(parts[0]) * 60 + int(parts[1]) + int(parts[2]) / 60.0
+        if len(parts) == 2:
+            return float(int(parts[0]) * 60 + int(parts[1]))
+        return float(parts[0])
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def driver_waiting_to_minutes(value) -> Optional[float]:
+    """Распаковывает driver_waiting_time GRAB (JSON {'min': ...} или число) в минуты"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return None if pd.isna(value) else float(value)
+    try:
+        data = json.loads(value)
+    except (ValueError, TypeError):
+        return None
+    if isinstance(data, dict) and 'min' in data:
+        try:
+            return float(data['min'])
+        except (ValueError, TypeError):
+            return None
+    if isinstance(data, (int, float)):
+        return float(data)
+    return None
+
+
+def _to_number(value):
+    """NaN/None -> 0, целые float -> int (как SUM(...) из SQLite)"""
+    if value is None or pd.isna(value):
+        return 0
+    value = value.item() if hasattr(value, 'item') else value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _restore_int_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Возвращает целый тип колонкам, ставшим float из-за NULL в UNION ALL"""
+    for column in df.columns:
+        series = df[column]
+        if series.dtype.kind == 'f' and series.notna().all() and (series % 1 == 0).all():
+            df[column] = series.astype('int64')
+    return df
+
+
+class RestaurantPeriodData:
+    """
+    Неизменяемый набор данных ресторана за период (по одному на запрос отчета).
+
+    Содержит сырые строки grab_stats и gojek_stats. Свойства grab/gojek
+    возвращают полные копии, поэтому правки одного раздела не видны другим.
+    """
+
+    __slots__ = ('_restaurant_name', '_restaurant_id', '_start_date', '_end_date',
+                 '_latitude', '_longitude', '_frames')
+
+    def __init__(self, restaurant_name: str, restaurant_id: Optional[int], start_date: str,
+                 end_date: str, grab: pd.DataFrame, gojek: pd.DataFrame,
+                 latitude: Optional[float] = None, longitude: Optional[float] = None):
+        object.__setattr__(self, '_restaurant_name', restaurant_name)
+        object.__setattr__(self, '_restaurant_id', restaurant_id)
+        object.__setattr__(self, '_start_date', start_date)
+        object.__setattr__(self, '_end_date', end_date)
+        object.__setattr__(self, '_latitude', latitude)
+        object.__setattr__(self, '_longitude', longitude)
+        object.__setattr__(self, '_frames', {'grab': grab, 'gojek': gojek})
+
+    def __setattr__(self, name, value):
+        raise AttributeError("RestaurantPeriodData неизменяем")
+
+    def __repr__(self):
+        return (f"RestaurantPeriodData({self._restaurant_name!r}, {self._start_date}→{self._end_date}, "
+                f"grab={len(self._frames['grab'])}, gojek={len(self._frames['gojek'])})")
+
+    restaurant_name = property(lambda self: self._restaurant_name)
+    restaurant_id = property(lambda self: self._restaurant_id)
+    start_date = property(lambda self: self._start_date)
+    end_date = property(lambda self: self._end_date)
+    latitude = property(lambda self: self._latitude)
+    longitude = property(lambda self: self._longitude)
+
+    @property
+    def grab(self) -> pd.DataFrame:
+        """Строки grab_stats за период (копия - правки раздела не видны остальным)"""
+        return self._frames['grab'].copy()
+
+    @property
+    def gojek(self) -> pd.DataFrame:
+        """Строки gojek_stats за период (копия)"""
+        return self._frames['gojek'].copy()
+
+    def frame(self, platform: str) -> pd.DataFrame:
+        """Строки платформы ('grab' или 'gojek', копия)"""
+        return self._frames[platform].copy()
+
+    @property
+    def is_empty(self) -> bool:
+        return self._frames['grab'].empty and self._frames['gojek'].empty
+
+    def totals(self, platform: str, columns: List[str]) -> Dict[str, Any]:
+        """
+        Суммы колонок платформы за период (аналог SUM(...) ... or 0)
+
+        Args:
+            platform: 'grab' или 'gojek'
+            columns: Список колонок для суммирования
+        """
+        df = self._frames[platform]
+        result = {}
+        for column in columns:
+            if column in df.columns and not df.empty:
+                result[column] = _to_number(pd.to_numeric(df[column], errors='coerce').sum(min_count=1))
+            else:
+                result[column] = 0
+        return result
+
+    def monthly_totals(self, platform: str, columns: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Суммы колонок платформы по месяцам {'YYYY-MM': {колонка: сумма}}"""
+        df = self._frames[platform]
+        if df.empty:
+            return {}
+        months = df['stat_date'].astype(str).str[:7]
+        grouped = df[columns].apply(pd.to_numeric, errors='coerce').groupby(months).sum(min_count=1)
+        return {
+            month: {column: _to_number(row[column]) for column in columns}
+            for month, row in grouped.iterrows()
+        }
+
+    def daily_sales(self) -> pd.DataFrame:
+        """Продажи по дням: stat_date, grab_sales, gojek_sales, daily_total"""
+        parts = []
+        for platform in PLATFORMS:
+            df = self._frames[platform]
+            if not df.empty:
+                parts.append(df.groupby('stat_date')['sales'].sum(min_count=1)
+                             .rename(f'{platform}_sales'))
+        if not parts:
+            return pd.DataFrame(columns=['stat_date', 'grab_sales', 'gojek_sales', 'daily_total'])
+        daily = pd.concat(parts, axis=1).sort_index()
+        for platform in PLATFORMS:
+            if f'{platform}_sales' not in daily.columns:
+                daily[f'{platform}_sales'] = 0
+        daily = _restore_int_columns(daily.fillna(0))
+        daily['daily_total'] = daily['grab_sales'] + daily['gojek_sales']
+        daily.index.name = 'stat_date'
+        return daily.reset_index()
+
+    def joined_by_date(self, how: str = 'outer') -> pd.DataFrame:
+        """grab и gojek, объединенные по stat_date (колонки с префиксами grab_/gojek_)"""
+        grab = self._frames['grab'].add_prefix('grab_').rename(columns={'grab_stat_date': 'stat_date'})
+        gojek = self._frames['gojek'].add_prefix('gojek_').rename(columns={'gojek_stat_date': 'stat_date'})
+        return grab.merge(gojek, on='stat_date', how=how).sort_values('stat_date').reset_index(drop=True)
+
+
+def _table_columns(conn, table: str, db_path: str) -> List[str]:
+    """Колонки таблицы (кешируются на процесс)"""
+    key = (db_path, table)
+    columns = _columns_cache.get(key)
+    if columns is None:
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+        with _columns_lock:
+            _columns_cache[key] = columns
+    return columns
+
+
+def resolve_restaurant_name(restaurant_name: str) -> str:
+    """Название ресторана в базе для имени из CLI (Only_Eggs -> "Only Eggs")"""
+    return RESTAURANT_ALIASES.get(restaurant_name, restaurant_name)
+
+
+def load_restaurant_period(restaurant_name: str, start_date: str, end_date: str,
+                           db_path: str = DEFAULT_DB_PATH) -> Optional[RestaurantPeriodData]:
+    """
+    Загружает все строки grab_stats + gojek_stats ресторана за период одним запросом
+
+    Args:
+        restaurant_name: Название ресторана (алиасы CLI разрешаются здесь)
+        start_date: Начальная дата (YYYY-MM-DD)
+        end_date: Конечная дата (YYYY-MM-DD)
+        db_path: Путь к базе данных
+
+    Returns:
+        RestaurantPeriodData или None, если ресторан не найден
+    """
+    with connection(db_path) as conn:
+        restaurant = conn.execute(
+            "SELECT id, latitude, longitude FROM restaurants WHERE name = ? LIMIT 1",
+            (resolve_restaurant_name(restaurant_name),)
+        ).fetchone()
+        if restaurant is None:
+            return None
+        restaurant_id, latitude, longitude = restaurant
+
+        grab_columns = _table_columns(conn, 'grab_stats', db_path)
+        gojek_columns = _table_columns(conn, 'gojek_stats', db_path)
+        all_columns = grab_columns + [c for c in gojek_columns if c not in grab_columns]
+
+        def select_list(own_columns):
+            return ', '.join(f'"{c}"' if c in own_columns else f'NULL AS "{c}"' for c in all_columns)
+
+        # Один проход: обе таблицы через UNION ALL с выровненными колонками
+        query = f"""
+            SELECT 'grab' AS _platform, {select_list(grab_columns)}
+            FROM grab_stats WHERE restaurant_id = ? AND stat_date BETWEEN ? AND ?
+            UNION ALL
+            SELECT 'gojek' AS _platform, {select_list(gojek_columns)}
+            FROM gojek_stats WHERE restaurant_id = ? AND stat_date BETWEEN ? AND ?
+        """
+        params = (restaurant_id, start_date, end_date, restaurant_id, start_date, end_date)
+        rows = pd.read_sql_query(query, conn, params=params)
+
+    is_grab = rows['_platform'] == 'grab'
+    grab = _restore_int_columns(rows.loc[is_grab, grab_columns].sort_values('stat_date').reset_index(drop=True))
+    gojek = _restore_int_columns(rows.loc[~is_grab, gojek_columns].sort_values('stat_date').reset_index(drop=True))
+
+    return RestaurantPeriodData(restaurant_name, int(restaurant_id), start_date, end_date,
+                                grab, gojek, latitude, longitude)
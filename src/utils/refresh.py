@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+🔄 ИНКРЕМЕНТАЛЬНОЕ ОБНОВЛЕНИЕ ПРОИЗВОДНЫХ ДАННЫХ
+==========================================
+Ежедневное обновление: обрабатываются только новые ресторан-дни.
+
+✅ КАК РАБОТАЕТ:
+- Для каждой исходной таблицы хранится водяной знак (MAX stat_date,
+  MAX rowid, COUNT(*))
+- Новые ресторан-дни = ресторан-дни строк с rowid новее водяного знака:
+  поздняя строка второй платформы за уже обработанный день и дозагрузка
+  старых дат тоже попадают в дельту; удаленные строки - полное обновление
+- Правки на месте (UPDATE) попадают в дельту через журнал source_changes
+  (триггеры исходных таблиц, см. daily_facts)
+- Затронутые партиции ресторан/месяц получают новую версию
+  (partition_versions) - кеши сверяют версии и пересчитывают только их
+- Шаги обновления (REFRESH_STEPS) получают только эту дельту: daily_facts,
+  market_cube, погода новых дней, хранилище признаков ML
+
+Запуск:
+    python main.py refresh [--full]
+"""
+
+import os
+import sys
+import sqlite3
+from datetime import datetime
+from typing import Optional, Dict, List, Any, Callable, Tuple
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from src.utils.db_pool import connection, DEFAULT_DB_PATH, BUSY_TIMEOUT_MS
+from src.utils.daily_facts import (
+    build_daily_facts, create_tables, read_table_marks, write_table_marks, table_marks,
+    changed_restaurant_days, SOURCE_TABLES
+)
+from src.utils.market_cube import build_market_cube
+from src.utils.weather_store import restaurant_cell
+from src.utils.weather_prefetcher import prefetch_weather
+
+REFRESH_TARGET = 'refresh'
+PARTITIONS_TABLE = 'partition_versions'
+
+
+def _refresh_daily_facts(delta: pd.DataFrame, db_path: str, full: bool) -> str:
+    result = build_daily_facts(db_path, full=full, verbose=False)
+    return f"{result['rows']:,} ресторан-дней ({result['mode']})"
+
+
+def _refresh_market_cube(delta: pd.DataFrame, db_path: str, full: bool) -> str:
+    months = None if full else delta['stat_date'].astype(str).str[:7].unique().tolist()
+    result = build_market_cube(db_path, full=full, months=months, verbose=False)
+    return f"{result['rows']:,} строк ресторан × месяц × платформа ({result['mode']})"
+
+
+def _refresh_weather(delta: pd.DataFrame, db_path: str, full: bool) -> str:
+    if delta.empty:
+        return "новых дней нет"
+    # Ячейки сетки ресторанов дельты (как в датасете ML) и диапазон их новых дней
+    ids = sorted(int(i) for i in delta['restaurant_id'].unique())
+    placeholders = ', '.join('?' for _ in ids)
+    with connection(db_path) as conn:
+        restaurants = pd.read_sql_query(
+            f"SELECT id AS restaurant_id, name, latitude, longitude FROM restaurants WHERE id IN ({placeholders})",
+            conn, params=ids
+        )
+    cells = {row.restaurant_id: restaurant_cell(row.name, row.latitude, row.longitude)
+             for row in restaurants.itertuples(index=False)}
+    days = delta.assign(cell=delta['restaurant_id'].map(cells)).dropna(subset=['cell'])
+    ranges = days.groupby('cell')['stat_date'].agg(['min', 'max'])
+    stats = prefetch_weather([(lat, lon, row['min'], row['max']) for (lat, lon), row in ranges.iterrows()],
+                             verbose=False)
+    return f"{stats['planned']} диапазонов, {stats['days']} дней загружено, ошибок: {stats['failed']}"
+
+
+def _refresh_feature_store(delta: pd.DataFrame, db_path: str, full: bool) -> str:
+    # ML система импортирует feature_store, а он - этот модуль
+    from src.ml_models.ultimate_complete_ml_system import sync_ultimate_features
+    result = sync_ultimate_features(db_path, full=full, verbose=False)
+    return f"{len(result['months'])} мес., {result['rows']:,} строк ({result['mode']})"
+
+
+# Шаги обновления: (название, функция(delta, db_path, full) -> описание результата)
+# delta - DataFrame новых ресторан-дней: restaurant_id, stat_date, source_table
+REFRESH_STEPS: List[Tuple[str, Callable[[pd.DataFrame, str, bool], str]]] = [
+    ('daily_facts', _refresh_daily_facts),
+    ('market_cube', _refresh_market_cube),
+    ('weather', _refresh_weather),
+    ('feature_store', _refresh_feature_store),
+]
+
+
+def _create_partitions_table(conn: sqlite3.Connection):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {PARTITIONS_TABLE} (
+            restaurant_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 1,
+            last_stat_date TEXT,
+            updated_at TEXT,
+            PRIMARY KEY (restaurant_id, month)
+        )
+    """)
+
+
+def detect_new_restaurant_days(conn: sqlite3.Connection, marks: Dict[str, Dict[str, Any]],
+                               full: bool = False) -> Tuple[pd.DataFrame, Dict[str, Dict[str, Any]], bool]:
+    """
+    Находит ресторан-дни строк новее водяных знаков
+
+    Returns:
+        (delta: restaurant_id, stat_date, source_table; новые водяные знаки;
+         full - знака нет или строки удалялись: дельта - вся таблица)
+    """
+    # Знаки и дельта из одного снимка базы
+    conn.execute("BEGIN")
+    try:
+        new_marks = table_marks(conn)
+        changed = {table: None if full else changed_restaurant_days(conn, table, marks.get(table))
+                   for table in new_marks}
+        full = full or any(rows is None for rows in changed.values())
+        parts = []
+        # Полное обновление - все дни исходных таблиц (журнал правок не нужен)
+        for table in (SOURCE_TABLES if full else new_marks):
+            rows = changed[table] if not full else pd.read_sql_query(
+                f"SELECT DISTINCT restaurant_id, stat_date FROM {table}", conn
+            )
+            parts.append(rows.assign(source_table=table))
+    finally:
+        conn.rollback()
+    delta = pd.concat(parts, ignore_index=True)
+    return delta, new_marks, full
+
+
+def _describe_mark(mark: Optional[Dict[str, Any]]) -> str:
+    return f"{mark['max_stat_date'] or '—'} ({mark['rows']:,} строк)" if mark else '—'
+
+
+def invalidate_partitions(conn: sqlite3.Connection, delta: pd.DataFrame) -> int:
+    """Поднимает версию партиций ресторан/месяц, затронутых дельтой"""
+    if delta.empty:
+        return 0
+    touched = (delta.assign(month=delta['stat_date'].astype(str).str[:7])
+               .groupby(['restaurant_id', 'month'])['stat_date'].max().reset_index())
+    now = datetime.now().isoformat(timespec='seconds')
+    conn.executemany(
+        f"""
+        INSERT INTO {PARTITIONS_TABLE} (restaurant_id, month, version, last_stat_date, updated_at)
+        VALUES (?, ?, 1, ?, ?)
+        ON CONFLICT (restaurant_id, month) DO UPDATE SET
+            version = version + 1,
+            last_stat_date = MAX(COALESCE(last_stat_date, ''), excluded.last_stat_date),
+            updated_at = excluded.updated_at
+        """,
+        [(int(row.restaurant_id), row.month, row.stat_date, now) for row in touched.itertuples(index=False)]
+    )
+    return len(touched)
+
+
+def partition_versions(restaurant_id: Optional[int] = None, start_date: Optional[str] = None,
+                       end_date: Optional[str] = None, db_path: str = DEFAULT_DB_PATH) -> Dict[Tuple[int, str], int]:
+    """
+    Версии партиций {(restaurant_id, 'YYYY-MM'): версия}
+
+    Кеши включают эти версии в ключ: после refresh меняются только версии
+    затронутых ресторанов и месяцев.
+    """
+    conditions, params = [], []
+    if restaurant_id is not None:
+        conditions.append("restaurant_id = ?")
+        params.append(int(restaurant_id))
+    if start_date:
+        conditions.append("month >= ?")
+        params.append(start_date[:7])
+    if end_date:
+        conditions.append("month <= ?")
+        params.append(end_date[:7])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    try:
+        with connection(db_path) as conn:
+            rows = conn.execute(
+                f"SELECT restaurant_id, month, version FROM {PARTITIONS_TABLE} {where}", params
+            ).fetchall()
+    except sqlite3.Error:
+        # refresh еще не запускался
+        return {}
+    return {(rid, month): version for rid, month, version in rows}
+
+
+def refresh(db_path: str = DEFAULT_DB_PATH, full: bool = False, verbose: bool = True,
+            steps: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Обновляет производные таблицы и кеши по дельте новых ресторан-дней
+
+    Args:
+        db_path: Путь к базе данных
+        full: Обработать всю историю (например, после ручной правки старых дат)
+        verbose: Печатать ход обновления
+        steps: Только эти шаги REFRESH_STEPS (по умолчанию - все)
+
+    Returns:
+        Словарь: new_days, partitions, steps {название: результат}, watermarks
+    """
+    if verbose:
+        print("🔄 ИНКРЕМЕНТАЛЬНОЕ ОБНОВЛЕНИЕ ДАННЫХ")
+        print("-" * 40)
+
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000)
+    try:
+        create_tables(conn)
+        _create_partitions_table(conn)
+        conn.commit()
+        marks = read_table_marks(conn, REFRESH_TARGET)
+        delta, new_marks, full = detect_new_restaurant_days(conn, marks, full=full)
+    finally:
+        conn.close()
+
+    new_days = len(delta[['restaurant_id', 'stat_date']].drop_duplicates())
+    if verbose:
+        for table in SOURCE_TABLES:
+            print(f"📍 {table}: водяной знак {_describe_mark(marks.get(table))} → {_describe_mark(new_marks.get(table))}")
+        print(f"📦 Новых ресторан-дней: {new_days:,}")
+
+    result = {'new_days': new_days, 'partitions': 0, 'steps': {}, 'watermarks': new_marks}
+    if delta.empty and not full:
+        if verbose:
+            print("✅ Новых данных нет - обновление не требуется")
+        return result
+
+    # Версии партиций - до шагов: хранилище признаков сверяет их в подписях месяцев
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        result['partitions'] = invalidate_partitions(conn, delta)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    if verbose:
+        print(f"🗂️ Обновлено партиций ресторан/месяц: {result['partitions']:,}")
+
+    # Шаги получают только дельту; при ошибке водяной знак не двигается
+    for name, step in REFRESH_STEPS:
+        if steps is not None and name not in steps:
+            continue
+        summary = step(delta, db_path, full)
+        result['steps'][name] = summary
+        if verbose:
+            print(f"✅ {name}: {summary}")
+
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000)
+    try:
+        write_table_marks(conn, REFRESH_TARGET, new_marks)
+        conn.commit()
+    finally:
+        conn.close()
+
+    return result
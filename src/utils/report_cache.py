@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+🗄️ КЕШ ГОТОВЫХ ОТЧЕТОВ
+==========================================
+Одинаковые отчеты (CLI, веб-приложение) не пересчитываются: готовый
+RestaurantReport хранится на диске в JSON и отдается сразу, пока данные
+ресторана за период не изменились.
+
+✅ КЛЮЧ (sha256):
+- ресторан, период, опции отчета
+- водяной знак данных: число строк и последний stat_date ресторана за
+  период в grab_stats / gojek_stats + версии partition_versions
+  (refresh --full после правки старых дат поднимает версии)
+- водяной знак рынка (бенчмарки в отчете считаются по всем ресторанам)
+- версии моделей ML разделов в реестре (переобучение ultimate_rf -
+  новые ML разделы)
+- REPORT_CACHE_VERSION - поднимать при изменении содержания отчета
+
+✅ ХРАНЕНИЕ (data/report_cache/<ключ>.json):
+- Запись через временный файл + os.replace (процессы analyze-all не
+  видят недописанных файлов)
+- LRU по размеру: чтение обновляет mtime файла; при превышении
+  REPORT_CACHE_MAX_MB удаляются самые давно использованные отчеты
+
+Использование:
+    cache = get_report_cache()
+    key = cache.key('Only Eggs', '2025-06-01', '2025-06-30')
+    report = cache.get(key)
+    if report is None:
+        report = build(...)
+        cache.put(key, report)
+"""
+
+import os
+import sys
+import json
+import hashlib
+import threading
+from typing import Optional, Dict, List, Any
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from src.utils.db_pool import connection, DEFAULT_DB_PATH
+from src.utils.daily_facts import SOURCE_TABLES
+from src.utils.refresh import partition_versions
+from src.utils.period_loader import resolve_restaurant_name
+from src.utils.report_model import RestaurantReport, render_json
+from src.ml_models.model_registry import ModelRegistry
+
+REPORT_CACHE_DIR = os.getenv('REPORT_CACHE_DIR', os.path.join('data', 'report_cache'))
+REPORT_CACHE_MAX_MB = float(os.getenv('REPORT_CACHE_MAX_MB', '50'))
+
+# Поднимать при изменении разделов / расчетов отчета - старые записи перестанут совпадать
+REPORT_CACHE_VERSION = 2
+
+# Модели реестра, чьи прогнозы попадают в ML разделы отчета (ULTIMATE_MODEL_NAME)
+REPORT_MODELS = ('ultimate_rf',)
+
+
+def data_watermark(restaurant_name: str, start_date: str, end_date: str,
+                   db_path: str = DEFAULT_DB_PATH,
+                   registry: Optional[ModelRegistry] = None) -> Optional[Dict[str, Any]]:
+    """
+    Водяной знак данных отчета
+
+    Returns:
+        {restaurant_id, tables: {таблица: [строк, последний день]}, market, partitions,
+        models: {модель: версия}} или None, если ресторан не найден
+    """
+    registry = registry or ModelRegistry()
+    with connection(db_path) as conn:
+        row = conn.execute("SELECT id FROM restaurants WHERE name = ? LIMIT 1",
+                           (resolve_restaurant_name(restaurant_name),)).fetchone()
+        if row is None:
+            return None
+        restaurant_id = row[0]
+        tables, market = {}, {}
+        for table in SOURCE_TABLES:
+            tables[table] = list(conn.execute(
+                f"SELECT COUNT(*), MAX(stat_date) FROM {table} "
+                f"WHERE restaurant_id = ? AND stat_date BETWEEN ? AND ?",
+                (restaurant_id, start_date, end_date)
+            ).fetchone())
+            market[table] = list(conn.execute(f"SELECT COUNT(*), MAX(stat_date) FROM {table}").fetchone())
+    versions = partition_versions(restaurant_id, start_date, end_date, db_path=db_path)
+    return {
+        'restaurant_id': restaurant_id,
+        'tables': tables,
+        'market': market,
+        'partitions': sorted(f"{month}:{version}" for (_, month), version in versions.items()),
+        'models': {name: registry.latest_version(name) for name in REPORT_MODELS},
+    }
+
+
+class ReportCache:
+    """Дисковый LRU кеш отчетов RestaurantReport"""
+
+    def __init__(self, root: str = REPORT_CACHE_DIR, max_mb: float = REPORT_CACHE_MAX_MB,
+                 db_path: str = DEFAULT_DB_PATH, registry: Optional[ModelRegistry] = None):
+        """
+        Args:
+            root: Каталог кеша
+            max_mb: Предельный размер кеша на диске (МБ)
+            db_path: База данных (для водяных знаков)
+            registry: Реестр моделей (версии моделей ML разделов)
+        """
+        self.root = root
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.db_path = db_path
+        self.registry = registry
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, restaurant_name: str, start_date: str, end_date: str,
+            options: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Ключ отчета (None - ресторан не найден, кешировать нечего)"""
+        watermark = data_watermark(restaurant_name, start_date, end_date, db_path=self.db_path,
+                                   registry=self.registry)
+        if watermark is None:
+            return None
+        payload = {
+            'version': REPORT_CACHE_VERSION,
+            'restaurant': restaurant_name,
+            'start_date': start_date,
+            'end_date': end_date,
+            'options': options or {},
+            'watermark': watermark,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.json")
+
+    def get(self, key: Optional[str]) -> Optional[RestaurantReport]:
+        """Отчет из кеша или None"""
+        if not key:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                report = RestaurantReport.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        try:
+            # LRU: mtime - время последнего использования
+            os.utime(path, None)
+        except OSError:
+            pass
+        self.hits += 1
+        return report
+
+    def put(self, key: Optional[str], report: RestaurantReport):
+        """Сохраняет отчет и вытесняет давно неиспользуемые при превышении размера"""
+        if not key:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, f".{key}.{os.getpid()}.{threading.get_ident()}")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(render_json(report))
+        os.replace(tmp_path, self._path(key))
+        self.evict()
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Записи кеша (path, size, used), сначала самые давно использованные"""
+        items = []
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return []
+        for name in names:
+            if not name.endswith('.json') or name.startswith('.'):
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            items.append({'path': path, 'size': stat.st_size, 'used': stat.st_mtime})
+        return sorted(items, key=lambda item: item['used'])
+
+    def evict(self) -> int:
+        """Удаляет самые давно использованные отчеты, пока кеш больше max_bytes"""
+        removed = 0
+        with self._lock:
+            items = self.entries()
+            total = sum(item['size'] for item in items)
+            for item in items:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(item['path'])
+                except OSError:
+                    continue
+                total -= item['size']
+                removed += 1
+        return removed
+
+    def clear(self) -> int:
+        removed = 0
+        for item in self.entries():
+            try:
+                os.remove(item['path'])
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+
+_cache: Optional[ReportCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_report_cache() -> ReportCache:
+    """Общий для процесса кеш отчетов"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ReportCache()
+        return _cache
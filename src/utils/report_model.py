@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+🧾 МОДЕЛЬ ОТЧЕТА И РЕНДЕРЫ
+==========================================
+Анализ ресторана строит объект RestaurantReport один раз; вывод в
+консоль, файл reports/*.txt, JSON и HTML - отдельные рендеры того же
+объекта (без повторных расчетов и запросов к базе).
+
+✅ СТРУКТУРА:
+- RestaurantReport: ресторан, период, время создания, разделы по порядку
+- ReportSection: key, title, lines (текст раздела), metrics (числа для
+  JSON / веб-приложения)
+
+✅ РЕНДЕРЫ (RENDERERS):
+- console - заголовок анализа + разделы
+- txt     - шапка и подвал отчета + те же разделы
+- json    - to_dict() (from_dict() читает обратно)
+- html    - самодостаточная страница: таблица метрик + текст раздела
+
+Использование:
+    report = RestaurantReport('Only Eggs', '2025-06-01', '2025-06-30')
+    report.section('summary', '📊 1. ИСПОЛНИТЕЛЬНОЕ РЕЗЮМЕ')
+    report.add(f"💰 Общая выручка: {total:,.0f} IDR")
+    report.metric('total_sales', total)
+    paths = save_report(report, formats=('txt', 'json'))
+"""
+
+import os
+import json
+import html
+from datetime import datetime
+from typing import Optional, Dict, List, Any, Callable, Iterable
+
+import numpy as np
+
+REPORTS_DIR = 'reports'
+REPORT_EXTENSIONS = {'txt': 'txt', 'json': 'json', 'html': 'html'}
+
+SEPARATOR = "═" * 100
+
+
+def _plain(value: Any) -> Any:
+    """numpy / pandas значения -> типы JSON"""
+    if isinstance(value, dict):
+        return {str(key): _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return None if np.isnan(value) else float(value)
+    if isinstance(value, float) and value != value:
+        return None
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+class ReportSection:
+    """Раздел отчета: текст + метрики"""
+
+    def __init__(self, key: str, title: str, lines: Optional[List[str]] = None,
+                 metrics: Optional[Dict[str, Any]] = None):
+        self.key = key
+        self.title = title
+        self.lines = lines if lines is not None else []
+        self.metrics = metrics if metrics is not None else {}
+
+    def add(self, *parts: Any):
+        """Строки раздела; сигнатура как у print (без аргументов - пустая строка)"""
+        self.lines.extend(' '.join(str(part) for part in parts).split('\n'))
+
+    def metric(self, name: str, value: Any):
+        self.metrics[name] = _plain(value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'key': self.key, 'title': self.title, 'metrics': self.metrics, 'lines': self.lines}
+
+
+class RestaurantReport:
+    """Отчет анализа ресторана за период"""
+
+    def __init__(self, restaurant: str, start_date: str, end_date: str,
+                 created_at: Optional[str] = None):
+        self.restaurant = restaurant
+        self.start_date = start_date
+        self.end_date = end_date
+        self.created_at = created_at or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.sections: List[ReportSection] = []
+
+    @property
+    def days(self) -> int:
+        """Дней в периоде (включительно)"""
+        try:
+            start = datetime.strptime(self.start_date, '%Y-%m-%d')
+            end = datetime.strptime(self.end_date, '%Y-%m-%d')
+            return (end - start).days + 1
+        except (TypeError, ValueError):
+            return 0
+
+    def section(self, key: str, title: str) -> ReportSection:
+        """Начинает новый раздел (последующие add / metric пишут в него)"""
+        section = ReportSection(key, title)
+        self.sections.append(section)
+        return section
+
+    def get(self, key: str) -> Optional[ReportSection]:
+        return next((section for section in self.sections if section.key == key), None)
+
+    def add(self, *parts: Any):
+        self.sections[-1].add(*parts)
+
+    def metric(self, name: str, value: Any):
+        self.sections[-1].metric(name, value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'restaurant': self.restaurant,
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'created_at': self.created_at,
+            'sections': [section.to_dict() for section in self.sections],
+        }
+
+    @classmethod
+    def from_dict(cls, payload: Dict[str, Any]) -> 'RestaurantReport':
+        report = cls(payload['restaurant'], payload['start_date'], payload['end_date'],
+                     created_at=payload.get('created_at'))
+        report.sections = [
+            ReportSection(item['key'], item['title'], list(item.get('lines', [])), dict(item.get('metrics', {})))
+            for item in payload.get('sections', [])
+        ]
+        return report
+
+
+# ---------- рендеры ----------
+
+def _section_text(section: ReportSection) -> List[str]:
+    return [section.title, "-" * 40] + section.lines
+
+
+def render_console(report: RestaurantReport) -> str:
+    """Текст для консоли (как выводил analyze_restaurant)"""
+    lines = [
+        f"\n🔬 ПОЛНЫЙ АНАЛИЗ ВСЕХ ПАРАМЕТРОВ + API: {report.restaurant.upper()}",
+        "=" * 80,
+        f"📅 Период анализа: {report.start_date} → {report.end_date}",
+        "",
+    ]
+    for section in report.sections:
+        lines.extend(_section_text(section))
+    return "\n".join(lines)
+
+
+def render_text(report: RestaurantReport) -> str:
+    """Файл reports/*.txt: шапка, разделы, подвал"""
+    lines = [
+        SEPARATOR,
+        f"🏪 Полный отчет анализа ресторана \"{report.restaurant}\"",
+        f"🏪 АНАЛИЗ РЕСТОРАНА: {report.restaurant}",
+        f"🗓️ ПЕРИОД: {report.start_date} — {report.end_date} ({report.days} дней)",
+        "",
+        SEPARATOR,
+        f"📊 Создан: {report.created_at}",
+        "🔬 Использованы все 63 параметра + 3 API интеграции",
+        "",
+    ]
+    for section in report.sections:
+        lines.extend(_section_text(section))
+    lines.extend([
+        "",
+        SEPARATOR,
+        "📊 Отчет создан системой Muzaquest Analytics",
+        "🔬 Проанализированы все 63 параметра + 3 API интеграции",
+        "🎯 Рекомендации основаны на лучших практиках ресторанного бизнеса",
+    ])
+    return "\n".join(lines) + "\n"
+
+
+def render_json(report: RestaurantReport) -> str:
+    return json.dumps(report.to_dict(), ensure_ascii=False, indent=2)
+
+
+def _format_metric(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    if isinstance(value, int) and not isinstance(value, bool):
+        return f"{value:,}"
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def render_html(report: RestaurantReport) -> str:
+    """Самодостаточная HTML страница отчета"""
+    escape = html.escape
+    parts = [
+        "<!DOCTYPE html>",
+        "<html lang=\"ru\"><head><meta charset=\"utf-8\">",
+        f"<title>{escape(report.restaurant)} {escape(report.start_date)} — {escape(report.end_date)}</title>",
+        "<style>body{font-family:sans-serif;max-width:1000px;margin:2em auto;color:#222}"
+        "section{margin-bottom:2em}table{border-collapse:collapse;margin-bottom:1em}"
+        "td{border:1px solid #ddd;padding:4px 8px}pre{white-space:pre-wrap;background:#f7f7f7;padding:1em}</style>",
+        "</head><body>",
+        f"<h1>🏪 {escape(report.restaurant)}</h1>",
+        f"<p>🗓️ {escape(report.start_date)} — {escape(report.end_date)} ({report.days} дней) · "
+        f"📊 Создан: {escape(report.created_at)}</p>",
+    ]
+    for section in report.sections:
+        parts.append(f"<section id=\"{escape(section.key)}\"><h2>{escape(section.title)}</h2>")
+        if section.metrics:
+            parts.append("<table>")
+            parts.extend(f"<tr><td>{escape(name)}</td><td>{escape(_format_metric(value))}</td></tr>"
+                         for name, value in section.metrics.items())
+            parts.append("</table>")
+        parts.append(f"<pre>{escape(chr(10).join(section.lines))}</pre></section>")
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+
+RENDERERS: Dict[str, Callable[[RestaurantReport], str]] = {
+    'console': render_console,
+    'txt': render_text,
+    'json': render_json,
+    'html': render_html,
+}
+
+
+def render(report: RestaurantReport, fmt: str) -> str:
+    if fmt not in RENDERERS:
+        raise ValueError(f"Неизвестный формат отчета: {fmt} (доступны: {', '.join(RENDERERS)})")
+    return RENDERERS[fmt](report)
+
+
+def save_report(report: RestaurantReport, formats: Iterable[str] = ('txt',),
+                directory: str = REPORTS_DIR, timestamp: Optional[str] = None) -> Dict[str, str]:
+    """
+    Сохраняет отчет в файлы detailed_analysis_<ресторан>_<время>.<формат>
+
+    Returns:
+        {формат: путь}
+    """
+    os.makedirs(directory, exist_ok=True)
+    timestamp = timestamp or datetime.now().strftime('%Y%m%d_%H%M%S')
+    base = f"detailed_analysis_{report.restaurant.replace(' ', '_')}_{timestamp}"
+    paths = {}
+    for fmt in formats:
+        if fmt not in REPORT_EXTENSIONS:
+            raise ValueError(f"Формат {fmt} не сохраняется в файл (доступны: {', '.join(REPORT_EXTENSIONS)})")
+        path = os.path.join(directory, f"{base}.{REPORT_EXTENSIONS[fmt]}")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(render(report, fmt))
+        paths[fmt] = path
+    return paths
+
+
+def load_report(path: str) -> RestaurantReport:
+    """Читает отчет, сохраненный в формате json"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return RestaurantReport.from_dict(json.load(f))
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+🕸️ ГРАФ ЗАВИСИМОСТЕЙ РАЗДЕЛОВ ОТЧЕТА
+==========================================
+Медленные шаги отчета (SQLite, Open-Meteo, Calendarific, OpenAI, ML)
+запускаются в пуле потоков сразу после загрузки данных; разделы отчета
+пишутся по порядку и забирают готовые результаты через result().
+
+✅ КАК РАБОТАЕТ:
+- add(name, fn, after=[...]) - узел графа; fn получает результаты
+  зависимостей именованными аргументами (weather=..., holidays=...)
+- Узлы ставятся в очередь в порядке добавления (зависимости - раньше),
+  поэтому поток ждет зависимость, которая уже выполняется или стоит в
+  очереди перед ним - взаимной блокировки нет
+- result(name) - результат узла или его исключение (в том же месте
+  отчета, где шаг выполнялся раньше) - текст отчета не зависит от
+  порядка завершения потоков
+- Время отчета на холодном кеше - примерно самый долгий путь графа,
+  а не сумма шагов
+
+Использование:
+    with SectionGraph() as graph:
+        graph.add('holidays', calendar_api.get_holidays, 2025)
+        graph.add('ai', make_insights, after=['holidays'])
+        ...
+        holidays = graph.result('holidays')
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Optional, Dict, Any, Callable, Iterable
+
+SECTION_WORKERS = int(os.getenv('SECTION_WORKERS', '6'))
+
+
+class SectionGraph:
+    """Узлы отчета в пуле потоков с зависимостями"""
+
+    def __init__(self, max_workers: int = SECTION_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='section')
+        self._futures: Dict[str, Future] = {}
+        self.timings: Dict[str, float] = {}
+
+    def add(self, name: str, fn: Callable[..., Any], *args, after: Iterable[str] = (), **kwargs) -> Future:
+        """
+        Добавляет узел и сразу ставит его в очередь
+
+        Args:
+            name: Имя узла (для result и after)
+            fn: Функция шага; результаты зависимостей передаются ей по именам
+            after: Узлы, которые должны завершиться до запуска
+        """
+        if name in self._futures:
+            raise ValueError(f"Узел {name} уже добавлен")
+        deps = list(after)
+        missing = [dep for dep in deps if dep not in self._futures]
+        if missing:
+            raise ValueError(f"Узел {name}: неизвестные зависимости {', '.join(missing)}")
+        dep_futures = {dep: self._futures[dep] for dep in deps}
+
+        def run():
+            inputs = {dep: future.result() for dep, future in dep_futures.items()}
+            started = time.monotonic()
+            try:
+                return fn(*args, **kwargs, **inputs)
+            finally:
+                self.timings[name] = time.monotonic() - started
+
+        future = self._executor.submit(run)
+        self._futures[name] = future
+        return future
+
+    def result(self, name: str, timeout: Optional[float] = None) -> Any:
+        """Результат узла (исключение узла пробрасывается)"""
+        return self._futures[name].result(timeout=timeout)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> 'SectionGraph':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            # Отчет прерван - узлы из очереди не запускаем и не ждем выполняющиеся
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        else:
+            self.close()
+        return False
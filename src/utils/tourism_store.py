@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+🏖️ ТАБЛИЦА ТУРИСТИЧЕСКИХ ДАННЫХ tourism_arrivals
+==========================================
+Все источники по туристам (data/tourism/*.xls) разбираются один раз в
+нормализованную таблицу: источник, год, месяц, страна, прилеты.
+
+✅ ИСТОЧНИКИ:
+- Kunjungan_Wisatawan_Bali_2024.xls - CSV под видом xls (страны x месяцы)   → kind 'by_country'
+- 1.-Data-Kunjungan-<год>.xls       - DISPAR, прилеты по национальностям   → kind 'by_nationality'
+- Table-1-7-Final-1-1.xls (tab4)    - BPS, итог по месяцам 2017-2024        → kind 'monthly_total'
+Месячный итог источника хранится строкой country = 'TOTAL'.
+
+✅ КЕШ (tourism_sources):
+- Для каждого файла - mtime и sha256 разобранной версии
+- Файл не менялся (mtime) - без чтения; mtime другой, хеш тот же - без разбора
+- Иначе строки источника заменяются одной транзакцией
+
+Разбор xls (xlrd) - только в ingest; загрузчики читают таблицу.
+
+Запуск:
+    python main.py tourism          # разобрать изменившиеся файлы
+    python main.py tourism --full   # разобрать все заново
+"""
+
+import os
+import re
+import sys
+import hashlib
+import sqlite3
+from datetime import datetime
+from typing import Optional, Dict, List, Any, Iterable
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from src.utils.db_pool import connection, DEFAULT_DB_PATH, BUSY_TIMEOUT_MS
+
+TOURISM_TABLE = 'tourism_arrivals'
+SOURCES_TABLE = 'tourism_sources'
+TOTAL_COUNTRY = 'TOTAL'
+
+# В порядке приоритета (первый найденный источник итогов - основной)
+TOURISM_FILES = [
+    'data/tourism/Kunjungan_Wisatawan_Bali_2024.xls',  # ПОЛНЫЕ 12 МЕСЯЦЕВ - ПРИОРИТЕТ!
+    'data/tourism/1.-Data-Kunjungan-2024.xls',  # Только 5 месяцев (резерв)
+    'data/tourism/1.-Data-Kunjungan-2025-3.xls',
+    '1.-Data-Kunjungan-2024.xls',  # Резервная копия
+    '1.-Data-Kunjungan-2025-3.xls',  # Резервная копия
+    'data/Table-1-7-Final-1-1.xls',
+    'data/tourism/Table-1-7-Final-1-1.xls'
+]
+
+MONTHS = {
+    'JAN': 1, 'FEB': 2, 'MAR': 3, 'APR': 4, 'MAY': 5, 'JUN': 6,
+    'JUL': 7, 'AUG': 8, 'SEP': 9, 'OCT': 10, 'NOV': 11, 'DEC': 12
+}
+
+ARRIVALS_COLUMNS = ['source', 'kind', 'year', 'month', 'country', 'arrivals']
+
+
+def create_tables(conn: sqlite3.Connection):
+    """Создает tourism_arrivals и tourism_sources"""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TOURISM_TABLE} (
+            source TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            country TEXT NOT NULL,
+            arrivals INTEGER NOT NULL,
+            PRIMARY KEY (source, year, month, country)
+        )
+    """)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SOURCES_TABLE} (
+            source TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            path TEXT,
+            mtime REAL,
+            sha256 TEXT,
+            rows INTEGER,
+            ingested_at TEXT
+        )
+    """)
+
+
+def _month_number(label: Any) -> Optional[int]:
+    """JAN / January / JUNE -> номер месяца"""
+    return MONTHS.get(str(label).strip().upper()[:3]) if isinstance(label, str) else None
+
+
+def _year_from(text: str) -> Optional[int]:
+    match = re.search(r'(20\d\d)', text)
+    return int(match.group(1)) if match else None
+
+
+# ---------- разбор источников ----------
+
+def _parse_country_csv(path: str) -> List[tuple]:
+    """CSV 'Country,Jan,...,Dec,Total' (Kunjungan_Wisatawan_Bali_<год>.xls)"""
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        lines = [line.strip() for line in f]
+    year = _year_from(os.path.basename(path)) or _year_from(lines[0] if lines else '')
+    header = next((i for i, line in enumerate(lines) if line.startswith('Country,')), None)
+    if header is None or year is None:
+        return []
+
+    months = [_month_number(label) for label in lines[header].split(',')[1:]]
+    rows = []
+    for line in lines[header + 1:]:
+        parts = line.split(',')
+        if len(parts) < 13:
+            continue
+        country = parts[0].strip()
+        for month, value in zip(months, parts[1:]):
+            if month and value.strip().isdigit():
+                rows.append((year, month, TOTAL_COUNTRY if country.upper() == TOTAL_COUNTRY else country, int(value)))
+    return rows
+
+
+def _read_sheet(path: str, sheet_name=0) -> pd.DataFrame:
+    return pd.read_excel(path, sheet_name=sheet_name, header=None, engine='xlrd')
+
+
+def _parse_nationality_sheet(path: str) -> List[tuple]:
+    """DISPAR 'ARRIVALS TO BALI BY NATIONALITY BY MONTH IN <год>'"""
+    sheet = _read_sheet(path)
+    year = _year_from(str(sheet.iloc[0, 0])) or _year_from(os.path.basename(path))
+    header = next((i for i, value in sheet[1].items() if str(value).strip().upper() == 'NATIONALITY'), None)
+    if header is None or year is None:
+        return []
+    month_columns = {col: _month_number(label) for col, label in sheet.loc[header].items() if _month_number(label)}
+
+    total_row = next((i for i, value in sheet[1].items()
+                      if i > header and str(value).strip().upper() == TOTAL_COUNTRY), None)
+    if total_row is None:
+        return []
+    # Месяцы без данных (еще не наступили) в итоговой строке = 0
+    reported = {col: month for col, month in month_columns.items()
+                if pd.to_numeric(sheet.loc[total_row, col], errors='coerce') > 0}
+
+    rows = []
+    for i in range(header + 1, total_row + 1):
+        number, name = sheet.loc[i, 0], sheet.loc[i, 1]
+        is_country = isinstance(number, (int, float)) and pd.notna(number) and isinstance(name, str)
+        if not is_country and i != total_row:
+            continue
+        country = TOTAL_COUNTRY if i == total_row else name.strip()
+        for col, month in reported.items():
+            value = pd.to_numeric(sheet.loc[i, col], errors='coerce')
+            if pd.notna(value):
+                rows.append((year, month, country, int(value)))
+    return rows
+
+
+def _parse_monthly_table(path: str) -> List[tuple]:
+    """BPS 'tab4 ok': прилеты по месяцам, колонки - годы"""
+    sheet = _read_sheet(path, sheet_name='tab4 ok')
+    header = next((i for i, value in sheet[1].items() if str(value).strip().upper() == 'MONTH'), None)
+    if header is None:
+        return []
+    year_columns = {}
+    for col, label in sheet.loc[header].items():
+        year = pd.to_numeric(label, errors='coerce')
+        if pd.notna(year) and 2000 < year < 2100:
+            year_columns[col] = int(year)
+
+    rows = []
+    for i in range(header + 1, len(sheet)):
+        label = sheet.loc[i, 1]
+        month = _month_number(label)
+        if month is None or str(label).strip().upper() == TOTAL_COUNTRY:
+            continue
+        for col, year in year_columns.items():
+            value = pd.to_numeric(sheet.loc[i, col], errors='coerce')
+            if pd.notna(value):
+                rows.append((year, month, TOTAL_COUNTRY, int(value)))
+    return rows
+
+
+def source_kind(path: str) -> Optional[str]:
+    """Тип источника по имени файла (None - неизвестный формат)"""
+    name = os.path.basename(path)
+    if name.startswith('Kunjungan_Wisatawan'):
+        return 'by_country'
+    if 'Data-Kunjungan' in name:
+        return 'by_nationality'
+    if name.startswith('Table-1-7'):
+        return 'monthly_total'
+    return None
+
+
+PARSERS = {
+    'by_country': _parse_country_csv,
+    'by_nationality': _parse_nationality_sheet,
+    'monthly_total': _parse_monthly_table,
+}
+
+
+def parse_source(path: str) -> List[tuple]:
+    """Строки (год, месяц, страна, прилеты) одного файла"""
+    return PARSERS[source_kind(path)](path)
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _existing_sources(files: Iterable[str]) -> Dict[str, str]:
+    """{источник: путь} - первый существующий файл для каждого имени"""
+    sources = {}
+    for path in files:
+        if source_kind(path) and os.path.exists(path):
+            sources.setdefault(os.path.basename(path), path)
+    return sources
+
+
+# ---------- загрузка ----------
+
+def ingest_tourism(db_path: str = DEFAULT_DB_PATH, files: Iterable[str] = TOURISM_FILES,
+                   full: bool = False, verbose: bool = True) -> Dict[str, Any]:
+    """
+    Разбирает изменившиеся туристические файлы в tourism_arrivals
+
+    Args:
+        db_path: Путь к базе данных
+        files: Файлы источников (по приоритету)
+        full: Разобрать все файлы заново
+
+    Returns:
+        Словарь: parsed (разобранные источники), unchanged, rows, errors
+    """
+    sources = _existing_sources(files)
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000)
+    result = {'parsed': [], 'unchanged': [], 'rows': 0, 'errors': {}}
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        create_tables(conn)
+        known = {row[0]: row[1:] for row in conn.execute(f"SELECT source, mtime, sha256 FROM {SOURCES_TABLE}")}
+        now = datetime.now().isoformat(timespec='seconds')
+
+        for source, path in sources.items():
+            mtime = os.path.getmtime(path)
+            stored_mtime, stored_hash = known.get(source, (None, None))
+            if not full and stored_mtime == mtime:
+                result['unchanged'].append(source)
+                continue
+            digest = _sha256(path)
+            if not full and stored_hash == digest:
+                conn.execute(f"UPDATE {SOURCES_TABLE} SET mtime = ?, path = ? WHERE source = ?", (mtime, path, source))
+                result['unchanged'].append(source)
+                continue
+
+            try:
+                rows = parse_source(path)
+            except Exception as e:
+                result['errors'][source] = str(e)
+                continue
+            conn.execute(f"DELETE FROM {TOURISM_TABLE} WHERE source = ?", (source,))
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {TOURISM_TABLE} (source, year, month, country, arrivals) VALUES (?, ?, ?, ?, ?)",
+                [(source,) + row for row in rows]
+            )
+            conn.execute(
+                f"INSERT OR REPLACE INTO {SOURCES_TABLE} (source, kind, path, mtime, sha256, rows, ingested_at) "
+                f"VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (source, source_kind(path), path, mtime, digest, len(rows), now)
+            )
+            result['parsed'].append(source)
+            result['rows'] += len(rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    if verbose:
+        print(f"🏖️ Туристические данные: разобрано {len(result['parsed'])} файлов ({result['rows']:,} строк), "
+              f"без изменений {len(result['unchanged'])}")
+        for source in result['parsed']:
+            print(f"   ✅ {source}")
+        for source, error in result['errors'].items():
+            print(f"   ⚠️ {source}: {error}")
+    return result
+
+
+def ensure_tourism(db_path: str = DEFAULT_DB_PATH, files: Iterable[str] = TOURISM_FILES) -> bool:
+    """
+    Дополняет tourism_arrivals, если файлы изменились (без изменений - только stat файлов)
+
+    Returns:
+        True если таблица актуальна (False - база только для чтения или ошибка)
+    """
+    try:
+        ingest_tourism(db_path, files=files, verbose=False)
+        return True
+    except sqlite3.Error as e:
+        print(f"⚠️ tourism_arrivals не обновлена: {e}")
+        return False
+
+
+def load_tourism(db_path: str = DEFAULT_DB_PATH, kind: Optional[str] = None,
+                 country: Optional[str] = None, year: Optional[int] = None,
+                 files: Iterable[str] = TOURISM_FILES) -> pd.DataFrame:
+    """
+    Читает нормализованные туристические данные
+
+    Args:
+        db_path: Путь к базе данных
+        kind: Тип источника ('by_country' / 'by_nationality' / 'monthly_total')
+        country: Только эта страна (TOTAL_COUNTRY - месячные итоги)
+        year: Только этот год
+        files: Файлы источников (по приоритету)
+
+    Returns:
+        DataFrame: source, kind, year, month, country, arrivals (источники по приоритету)
+    """
+    files = list(files)
+    ensure_tourism(db_path, files)
+    query = (f"SELECT a.source, s.kind, a.year, a.month, a.country, a.arrivals "
+             f"FROM {TOURISM_TABLE} a JOIN {SOURCES_TABLE} s ON s.source = a.source WHERE 1 = 1")
+    params: List[Any] = []
+    for column, value in (('s.kind', kind), ('a.country', country), ('a.year', year)):
+        if value is not None:
+            query += f" AND {column} = ?"
+            params.append(value)
+    try:
+        with connection(db_path) as conn:
+            df = pd.read_sql_query(query + " ORDER BY a.source, a.year, a.month, a.country", conn, params=params)
+    except Exception as e:
+        print(f"⚠️ Туристические данные недоступны: {e}")
+        return pd.DataFrame(columns=ARRIVALS_COLUMNS)
+
+    # Порядок источников - приоритет files
+    priority = {os.path.basename(path): i for i, path in reversed(list(enumerate(files)))}
+    df['priority'] = df['source'].map(priority).fillna(len(priority))
+    return (df.sort_values(['priority', 'year', 'month', 'country'], kind='stable')
+              .drop(columns='priority').reset_index(drop=True))
+
+
+def monthly_totals(db_path: str = DEFAULT_DB_PATH, source: Optional[str] = None,
+                   files: Iterable[str] = TOURISM_FILES) -> pd.DataFrame:
+    """
+    Месячные итоги прилетов (year, month, arrivals, source)
+
+    source=None - для каждого месяца берется источник с наивысшим приоритетом
+    """
+    totals = load_tourism(db_path, country=TOTAL_COUNTRY, files=files)
+    if source is not None:
+        totals = totals[totals['source'] == source]
+    totals = totals.drop_duplicates(['year', 'month'], keep='first')
+    return totals[['year', 'month', 'arrivals', 'source']].sort_values(['year', 'month']).reset_index(drop=True)
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+⚡ АСИНХРОННАЯ ПРЕДЗАГРУЗКА ПОГОДЫ OPEN-METEO
+==========================================
+Заполняет локальное хранилище погоды (weather_store) перед сборкой датасета.
+
+✅ КАК РАБОТАЕТ:
+- На вход - потребности датасета: (lat, lon, start_date, end_date)
+- Потребности сводятся к ячейкам сетки, уже скачанные дни не запрашиваются
+- Запросы идут параллельно (asyncio + семафор WEATHER_CONCURRENCY)
+- Частота ограничена token bucket (WEATHER_RATE_LIMIT запросов/сек)
+- 429 / 5xx / сетевые ошибки повторяются с экспоненциальной задержкой
+  (Retry-After сервера имеет приоритет)
+
+Использование:
+    from src.utils.weather_prefetcher import prefetch_weather
+    prefetch_weather([(lat, lon, '2024-01-01', '2025-06-30'), ...])
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional, Dict, List, Any, Iterable, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from src.utils.weather_store import (
+    WeatherStore, get_weather_store, location_key, archive_params, parse_archive_response
+)
+
+WEATHER_CONCURRENCY = int(os.getenv('WEATHER_CONCURRENCY', '4'))
+WEATHER_RATE_LIMIT = float(os.getenv('WEATHER_RATE_LIMIT', '5'))
+
+MAX_RETRIES = 2
+BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 30.0
+
+# Один запрос не длиннее года: ответ hourly за год ~9000 строк
+MAX_RANGE_DAYS = 366
+
+Need = Tuple[float, float, str, str]
+
+
+class TokenBucket:
+    """Ограничитель частоты: rate токенов в секунду, запас до capacity"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        """Ждет токен (rate <= 0 - без ограничения)"""
+        if self.rate <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def _split_range(start_date: str, end_date: str, max_days: int) -> List[Tuple[str, str]]:
+    start = datetime.strptime(start_date, '%Y-%m-%d').date()
+    end = datetime.strptime(end_date, '%Y-%m-%d').date()
+    chunks = []
+    while start <= end:
+        chunk_end = min(end, start + timedelta(days=max_days - 1))
+        chunks.append((start.isoformat(), chunk_end.isoformat()))
+        start = chunk_end + timedelta(days=1)
+    return chunks
+
+
+class AsyncWeatherPrefetcher:
+    """
+    Параллельная докачка погоды в хранилище с ограничением частоты и повторами.
+    """
+
+    def __init__(self, store: Optional[WeatherStore] = None, concurrency: int = WEATHER_CONCURRENCY,
+                 rate_limit: float = WEATHER_RATE_LIMIT, max_retries: int = MAX_RETRIES,
+                 backoff: float = BACKOFF_SECONDS, max_range_days: int = MAX_RANGE_DAYS):
+        """
+        Инициализация предзагрузчика
+
+        Args:
+            store: Хранилище погоды (по умолчанию - общее для процесса)
+            concurrency: Максимум одновременных запросов
+            rate_limit: Запросов в секунду (0 - без ограничения)
+            max_retries: Повторов на запрос после первой попытки
+            backoff: Базовая задержка повтора в секундах (удваивается)
+            max_range_days: Максимальная длина диапазона одного запроса
+        """
+        self.store = store or get_weather_store()
+        self.concurrency = max(1, concurrency)
+        self.rate_limit = rate_limit
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_range_days = max_range_days
+        self.errors: List[str] = []
+        self.stats = {'planned': 0, 'requests': 0, 'retries': 0, 'failed': 0, 'days': 0}
+        self._stats_lock = threading.Lock()
+
+    def plan(self, needs: Iterable[Need]) -> List[Need]:
+        """
+        Сводит потребности к запросам: ячейка сетки, только недостающие дни,
+        диапазоны не длиннее max_range_days
+        """
+        merged: Dict[Tuple[float, float], Tuple[str, str]] = {}
+        for lat, lon, start_date, end_date in needs:
+            cell = location_key(lat, lon)
+            start_date, end_date = str(start_date)[:10], str(end_date)[:10]
+            if cell in merged:
+                known_start, known_end = merged[cell]
+                start_date, end_date = min(start_date, known_start), max(end_date, known_end)
+            merged[cell] = (start_date, end_date)
+
+        planned = []
+        for (lat, lon), (start_date, end_date) in merged.items():
+            missing = self.store.missing_dates(lat, lon, start_date, end_date)
+            if missing:
+                for chunk_start, chunk_end in _split_range(missing[0], missing[-1], self.max_range_days):
+                    planned.append((lat, lon, chunk_start, chunk_end))
+        return planned
+
+    def _count(self, key: str, value: int = 1):
+        with self._stats_lock:
+            self.stats[key] += value
+
+    async def _fetch(self, lat: float, lon: float, start_date: str, end_date: str,
+                     semaphore: asyncio.Semaphore, bucket: TokenBucket) -> bool:
+        """Один диапазон: запрос с повторами, результат - в хранилище"""
+        import requests
+
+        params = archive_params(lat, lon, start_date, end_date)
+        error = None
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            await bucket.acquire()
+            async with semaphore:
+                self._count('requests')
+                try:
+                    response = await asyncio.to_thread(
+                        requests.get, self.store.base_url, params=params, timeout=self.store.timeout
+                    )
+                    if response.status_code == 200:
+                        daily_rows, hourly_rows = parse_archive_response(response.json())
+                        days = await asyncio.to_thread(self.store.save, lat, lon, daily_rows, hourly_rows,
+                                                      start_date, end_date)
+                        self._count('days', days)
+                        return True
+                    error = f"HTTP {response.status_code}"
+                    retryable = response.status_code == 429 or response.status_code >= 500
+                    retry_after = response.headers.get('Retry-After')
+                except Exception as e:
+                    error = str(e)
+                    retryable = True
+
+            if not retryable or attempt == self.max_retries:
+                break
+            self._count('retries')
+            try:
+                delay = float(retry_after)
+            except (TypeError, ValueError):
+                delay = self.backoff * (2 ** attempt) * (1 + random.random() * 0.25)
+            await asyncio.sleep(min(delay, MAX_BACKOFF_SECONDS))
+
+        self._count('failed')
+        self.errors.append(f"{lat},{lon} {start_date}..{end_date}: {error}")
+        return False
+
+    async def run(self, planned: List[Need]) -> List[bool]:
+        """Выполняет запланированные запросы параллельно"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        bucket = TokenBucket(self.rate_limit)
+        return await asyncio.gather(*(
+            self._fetch(lat, lon, start_date, end_date, semaphore, bucket)
+            for lat, lon, start_date, end_date in planned
+        ))
+
+    def prefetch(self, needs: Iterable[Need]) -> Dict[str, Any]:
+        """
+        Заполняет хранилище по потребностям датасета (синхронная обертка)
+
+        Returns:
+            Статистика: planned, requests, retries, failed, days
+        """
+        self.errors = []
+        self.stats = {key: 0 for key in self.stats}
+        planned = self.plan(needs)
+        self.stats['planned'] = len(planned)
+        if not planned:
+            return dict(self.stats)
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            asyncio.run(self.run(planned))
+        else:
+            # Уже внутри event loop (Streamlit, Jupyter) - свой loop в отдельном потоке
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                executor.submit(asyncio.run, self.run(planned)).result()
+        return dict(self.stats)
+
+
+def prefetch_weather(needs: Iterable[Need], store: Optional[WeatherStore] = None,
+                     verbose: bool = True, **kwargs) -> Dict[str, Any]:
+    """
+    Параллельно докачивает погоду для потребностей датасета в хранилище
+
+    Args:
+        needs: Итерируемое (lat, lon, start_date, end_date)
+        store: Хранилище погоды (по умолчанию - общее для процесса)
+        verbose: Печатать итог
+        **kwargs: Параметры AsyncWeatherPrefetcher (concurrency, rate_limit, ...)
+    """
+    prefetcher = AsyncWeatherPrefetcher(store=store, **kwargs)
+    stats = prefetcher.prefetch(needs)
+    if verbose and stats['planned']:
+        print(f"      ⚡ Погода: {stats['planned']} диапазонов, {stats['requests']} запросов, "
+              f"{stats['days']} дней загружено, ошибок: {stats['failed']}")
+    return stats
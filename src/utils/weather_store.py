@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+🌦️ ЛОКАЛЬНОЕ ХРАНИЛИЩЕ ПОГОДЫ OPEN-METEO
+==========================================
+Общий погодный слой для main.py, анализаторов и ML систем.
+
+✅ ВОЗМОЖНОСТИ:
+- Один запрос к Open-Meteo Archive на весь диапазон дат по локации
+  (daily + hourly в одном ответе)
+- Результаты хранятся в SQLite (data/weather_store.sqlite) и переживают процесс
+- Повторные запросы обслуживаются с диска без HTTP
+- Промах по одной дате докачивает весь месяц, чтобы отчет по дням не делал
+  запрос на каждый день
+- Дни, которые архив вернул пустыми (еще не опубликованы), не докачиваются
+  повторно в течение WEATHER_NULL_DAY_TTL секунд
+- Координаты привязываются к ячейке сетки Open-Meteo (WEATHER_GRID_DEG):
+  рестораны одной ячейки (Canggu, Seminyak...) делят один ряд погоды
+
+Отчет за 90 дней = не более одного запроса на ячейку сетки.
+"""
+
+import os
+import json
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from datetime import date, datetime, timedelta
+from typing import Optional, Dict, List, Any, Tuple
+
+import pandas as pd
+
+ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+WEATHER_DB_PATH = os.getenv('WEATHER_DB_PATH', os.path.join('data', 'weather_store.sqlite'))
+TIMEZONE = 'Asia/Jakarta'
+REQUEST_TIMEOUT = 30
+
+# Архив Open-Meteo отстает от текущей даты на несколько дней
+ARCHIVE_LAG_DAYS = 2
+
+# Сколько секунд не перекачивать день, который архив вернул без значений
+NULL_DAY_TTL = float(os.getenv('WEATHER_NULL_DAY_TTL', '3600'))
+
+# Координаты по умолчанию (центр Денпасара)
+DEFAULT_LAT, DEFAULT_LON = -8.6500, 115.2200
+
+# Шаг сетки в градусах (ERA5-Land ~0.1° ≈ 11 км): точнее архив не различает
+WEATHER_GRID_DEG = float(os.getenv('WEATHER_GRID_DEG', '0.1'))
+
+# Геолокации ресторанов (приоритетнее координат из restaurants)
+LOCATIONS_PATH = os.path.join('data', 'bali_restaurant_locations.json')
+
+DAILY_VARIABLES = ['temperature_2m_mean', 'precipitation_sum', 'wind_speed_10m_max']
+HOURLY_VARIABLES = ['temperature_2m', 'relative_humidity_2m', 'precipitation', 'weather_code',
+                    'cloud_cover', 'wind_speed_10m']
+
+# Колонки таблиц хранилища <- переменные Open-Meteo
+DAILY_COLUMNS = {
+    'temperature_mean': 'temperature_2m_mean',
+    'precipitation_sum': 'precipitation_sum',
+    'wind_speed_max': 'wind_speed_10m_max',
+}
+HOURLY_COLUMNS = {
+    'temperature': 'temperature_2m',
+    'humidity': 'relative_humidity_2m',
+    'precipitation': 'precipitation',
+    'weather_code': 'weather_code',
+    'cloud_cover': 'cloud_cover',
+    'wind_speed': 'wind_speed_10m',
+}
+
+
+def grid_cell(lat: float, lon: float, step: float = WEATHER_GRID_DEG) -> Tuple[float, float]:
+    """Ячейка сетки: координаты, привязанные к ближайшему узлу с шагом step"""
+    if lat is None or lon is None or pd.isna(lat) or pd.isna(lon):
+        lat, lon = DEFAULT_LAT, DEFAULT_LON
+    if step <= 0:
+        return round(float(lat), 4), round(float(lon), 4)
+    return round(round(float(lat) / step) * step, 4), round(round(float(lon) / step) * step, 4)
+
+
+def location_key(lat: float, lon: float) -> Tuple[float, float]:
+    """Ключ локации в хранилище - ячейка сетки (одна на все рестораны ячейки)"""
+    return grid_cell(lat, lon)
+
+
+@lru_cache(maxsize=4)
+def load_restaurant_locations(path: str = LOCATIONS_PATH) -> Dict[str, Tuple[float, float]]:
+    """Координаты ресторанов из data/bali_restaurant_locations.json {имя: (lat, lon)}"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    entries = data.get('restaurants', []) if isinstance(data, dict) else data
+    locations = {}
+    for entry in entries or []:
+        if not isinstance(entry, dict) or not entry.get('name'):
+            continue
+        lat, lon = entry.get('latitude'), entry.get('longitude')
+        if lat is not None and lon is not None:
+            locations[entry['name']] = (float(lat), float(lon))
+    return locations
+
+
+def restaurant_cell(restaurant_name: Optional[str], lat: Optional[float] = None,
+                    lon: Optional[float] = None) -> Tuple[float, float]:
+    """
+    Ячейка сетки ресторана
+
+    Координаты берутся из файла геолокаций по имени, затем переданные
+    (обычно из таблицы restaurants), затем центр Денпасара.
+    """
+    located = load_restaurant_locations().get(restaurant_name) if restaurant_name else None
+    if located:
+        lat, lon = located
+    return grid_cell(lat, lon)
+
+
+def archive_params(lat: float, lon: float, start_date: str, end_date: str) -> Dict[str, Any]:
+    """Параметры запроса к архиву: daily и hourly за весь диапазон"""
+    return {
+        'latitude': lat,
+        'longitude': lon,
+        'start_date': start_date,
+        'end_date': end_date,
+        'daily': ','.join(DAILY_VARIABLES),
+        'hourly': ','.join(HOURLY_VARIABLES),
+        'timezone': TIMEZONE,
+        'elevation': 0  # КРИТИЧНО: уровень моря для правильной температуры
+    }
+
+
+def _series_value(block: Dict[str, Any], variable: str, i: int):
+    values = block.get(variable) or []
+    return values[i] if i < len(values) else None
+
+
+def parse_archive_response(payload: Dict[str, Any]) -> Tuple[List[tuple], List[tuple]]:
+    """
+    Разбирает ответ Open-Meteo
+
+    Returns:
+        (daily строки (date, *DAILY_COLUMNS), hourly строки (time, *HOURLY_COLUMNS));
+        дни без температуры пропускаются (архив еще не заполнен)
+    """
+    rows = []
+    for block_name, columns in (('daily', DAILY_COLUMNS), ('hourly', HOURLY_COLUMNS)):
+        block = payload.get(block_name) or {}
+        block_rows = []
+        for i, moment in enumerate(block.get('time', [])):
+            values = [_series_value(block, variable, i) for variable in columns.values()]
+            if values[0] is not None:
+                block_rows.append((moment, *values))
+        rows.append(block_rows)
+    return rows[0], rows[1]
+
+
+def _archive_end() -> date:
+    return date.today() - timedelta(days=ARCHIVE_LAG_DAYS)
+
+
+def _month_bounds(day: str) -> Tuple[str, str]:
+    start = datetime.strptime(day[:7] + '-01', '%Y-%m-%d').date()
+    end = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return start.isoformat(), end.isoformat()
+
+
+class WeatherStore:
+    """
+    Дисковый кеш погоды Open-Meteo (daily + hourly) по локациям.
+
+    Потокобезопасен; каждое обращение открывает короткое подключение к файлу
+    хранилища, поэтому экземпляр можно разделять между потоками.
+    """
+
+    def __init__(self, db_path: str = WEATHER_DB_PATH, base_url: str = ARCHIVE_URL,
+                 timeout: float = REQUEST_TIMEOUT):
+        """
+        Инициализация хранилища
+
+        Args:
+            db_path: Путь к SQLite файлу хранилища
+            base_url: URL архива Open-Meteo (для тестов - локальный сервер)
+            timeout: Тайм-аут HTTP запроса в секундах
+        """
+        self.db_path = db_path
+        self.base_url = base_url
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        # Неудачные диапазоны в этом процессе - не повторяем запрос на каждый день
+        self._failed = set()
+        # Дни без значений в ответе архива {(lat, lon, дата): срок} - не повод качать месяц заново
+        self._null_days: Dict[Tuple[float, float, str], float] = {}
+        self.stats = {'requests': 0, 'failed_requests': 0}
+        self._create_tables()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _create_tables(self):
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        daily_columns = ', '.join(f'{column} REAL' for column in DAILY_COLUMNS)
+        hourly_columns = ', '.join(f'{column} REAL' for column in HOURLY_COLUMNS)
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS weather_daily (
+                        lat REAL NOT NULL, lon REAL NOT NULL, date TEXT NOT NULL,
+                        {daily_columns}, fetched_at TEXT,
+                        PRIMARY KEY (lat, lon, date)
+                    )
+                """)
+                conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS weather_hourly (
+                        lat REAL NOT NULL, lon REAL NOT NULL, time TEXT NOT NULL,
+                        {hourly_columns},
+                        PRIMARY KEY (lat, lon, time)
+                    )
+                """)
+                conn.commit()
+            finally:
+                conn.close()
+
+    # ------------------------------------------------------------------
+    # Запись
+    # ------------------------------------------------------------------
+
+    def save(self, lat: float, lon: float, daily_rows: List[tuple], hourly_rows: List[tuple],
+             start_date: Optional[str] = None, end_date: Optional[str] = None) -> int:
+        """
+        Сохраняет разобранный ответ архива, возвращает число дней
+
+        start_date/end_date - запрошенный диапазон: дни, которых нет в ответе,
+        помечаются как еще не опубликованные (на NULL_DAY_TTL секунд)
+        """
+        lat, lon = location_key(lat, lon)
+        if start_date and end_date:
+            self._mark_null_days(lat, lon, start_date, end_date, {row[0] for row in daily_rows})
+        now = datetime.now().isoformat(timespec='seconds')
+        daily_names = ', '.join(DAILY_COLUMNS)
+        hourly_names = ', '.join(HOURLY_COLUMNS)
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO weather_daily (lat, lon, date, {daily_names}, fetched_at) "
+                    f"VALUES (?, ?, ?, {', '.join('?' for _ in DAILY_COLUMNS)}, ?)",
+                    [(lat, lon, *row, now) for row in daily_rows]
+                )
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO weather_hourly (lat, lon, time, {hourly_names}) "
+                    f"VALUES (?, ?, ?, {', '.join('?' for _ in HOURLY_COLUMNS)})",
+                    [(lat, lon, *row) for row in hourly_rows]
+                )
+                conn.commit()
+            finally:
+                conn.close()
+        return len(daily_rows)
+
+    def _mark_null_days(self, lat: float, lon: float, start_date: str, end_date: str, returned: set):
+        expires = time.monotonic() + NULL_DAY_TTL
+        with self._lock:
+            for day in pd.date_range(start_date, end_date).strftime('%Y-%m-%d'):
+                if day in returned:
+                    self._null_days.pop((lat, lon, day), None)
+                else:
+                    self._null_days[(lat, lon, day)] = expires
+
+    def _is_null_day(self, lat: float, lon: float, day: str, now: float) -> bool:
+        expires = self._null_days.get((lat, lon, day))
+        return expires is not None and expires > now
+
+    def fetch_range(self, lat: float, lon: float, start_date: str, end_date: str) -> bool:
+        """Один HTTP запрос к архиву за весь диапазон; результат сохраняется на диск"""
+        import requests
+
+        lat, lon = location_key(lat, lon)
+        end_date = min(end_date, _archive_end().isoformat())
+        if start_date > end_date:
+            return False
+        failure_key = (lat, lon, start_date, end_date)
+        if failure_key in self._failed:
+            return False
+
+        self.stats['requests'] += 1
+        try:
+            response = requests.get(self.base_url, params=archive_params(lat, lon, start_date, end_date),
+                                    timeout=self.timeout)
+            if response.status_code != 200:
+                raise ValueError(f"HTTP {response.status_code}")
+            daily_rows, hourly_rows = parse_archive_response(response.json())
+        except Exception:
+            # Сеть недоступна - не повторяем этот диапазон в текущем процессе
+            self.stats['failed_requests'] += 1
+            self._failed.add(failure_key)
+            return False
+
+        self.save(lat, lon, daily_rows, hourly_rows, start_date, end_date)
+        return True
+
+    # ------------------------------------------------------------------
+    # Чтение
+    # ------------------------------------------------------------------
+
+    def missing_dates(self, lat: float, lon: float, start_date: str, end_date: str) -> List[str]:
+        """Даты диапазона (до границы архива), которых нет в хранилище и которые архив не вернул пустыми"""
+        lat, lon = location_key(lat, lon)
+        end_date = min(end_date, _archive_end().isoformat())
+        if start_date > end_date:
+            return []
+        conn = self._connect()
+        try:
+            stored = {row[0] for row in conn.execute(
+                "SELECT date FROM weather_daily WHERE lat = ? AND lon = ? AND date BETWEEN ? AND ?",
+                (lat, lon, start_date, end_date)
+            )}
+        finally:
+            conn.close()
+        all_dates = pd.date_range(start_date, end_date).strftime('%Y-%m-%d')
+        now = time.monotonic()
+        with self._lock:
+            return [day for day in all_dates if day not in stored and not self._is_null_day(lat, lon, day, now)]
+
+    def prefetch(self, lat: float, lon: float, start_date: str, end_date: str) -> bool:
+        """
+        Докачивает недостающие дни диапазона одним запросом
+
+        Returns:
+            True если после вызова все дни диапазона есть на диске
+        """
+        missing = self.missing_dates(lat, lon, start_date, end_date)
+        if not missing:
+            return True
+        if not self.fetch_range(lat, lon, missing[0], missing[-1]):
+            return False
+        return not self.missing_dates(lat, lon, start_date, end_date)
+
+    def get_daily(self, lat: float, lon: float, start_date: str, end_date: str,
+                  fetch: bool = True) -> pd.DataFrame:
+        """
+        Дневная погода за диапазон (индекс - дата YYYY-MM-DD)
+
+        Колонки: temperature_mean, precipitation_sum, wind_speed_max
+        """
+        if fetch:
+            self.prefetch(lat, lon, start_date, end_date)
+        lat, lon = location_key(lat, lon)
+        conn = self._connect()
+        try:
+            df = pd.read_sql_query(
+                f"SELECT date, {', '.join(DAILY_COLUMNS)} FROM weather_daily "
+                f"WHERE lat = ? AND lon = ? AND date BETWEEN ? AND ? ORDER BY date",
+                conn, params=(lat, lon, start_date, end_date)
+            )
+        finally:
+            conn.close()
+        return df.set_index('date')
+
+    def month_coverage(self) -> Dict[str, int]:
+        """Сохраненные дни погоды по месяцам {YYYY-MM: дней по всем ячейкам}"""
+        conn = self._connect()
+        try:
+            return dict(conn.execute(
+                "SELECT substr(date, 1, 7), COUNT(*) FROM weather_daily GROUP BY 1"
+            ).fetchall())
+        finally:
+            conn.close()
+
+    def get_day(self, lat: float, lon: float, day: str) -> Optional[Dict[str, float]]:
+        """Дневная погода за дату (промах докачивает весь месяц); None если недоступно"""
+        daily = self.get_daily(lat, lon, day, day, fetch=False)
+        if daily.empty:
+            self.prefetch(lat, lon, *_month_bounds(day))
+            daily = self.get_daily(lat, lon, day, day, fetch=False)
+        if daily.empty:
+            return None
+        return daily.iloc[0].to_dict()
+
+    def get_hourly(self, lat: float, lon: float, day: str) -> pd.DataFrame:
+        """Почасовая погода за дату (промах докачивает весь месяц)"""
+        if self.missing_dates(lat, lon, day, day):
+            self.prefetch(lat, lon, *_month_bounds(day))
+        lat, lon = location_key(lat, lon)
+        conn = self._connect()
+        try:
+            return pd.read_sql_query(
+                f"SELECT time, {', '.join(HOURLY_COLUMNS)} FROM weather_hourly "
+                f"WHERE lat = ? AND lon = ? AND time >= ? AND time < ? ORDER BY time",
+                conn, params=(lat, lon, day, day + 'T99')
+            )
+        finally:
+            conn.close()
+
+
+_store: Optional[WeatherStore] = None
+_store_lock = threading.Lock()
+
+
+def get_weather_store() -> WeatherStore:
+    """Общее для процесса хранилище погоды"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = WeatherStore()
+    return _store
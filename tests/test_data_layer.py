@@ -0,0 +1,651 @@
+#!/usr/bin/env python3
+"""
+Тесты для слоя доступа к данным
+"""
+
+import unittest
+import sqlite3
+import tempfile
+import shutil
+import sys
+import os
+import time
+
+# Добавляем корень проекта в путь
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+
+from src.utils.db_pool import get_connection, get_pool, read_sql, close_all_pools
+from src.utils.db_migrations import apply_migrations, verify_indexes, explain_hot_queries
+from src.utils.daily_facts import (
+    build_daily_facts, load_daily_facts, daily_facts_is_current, restaurant_watermark, restaurant_data_signature
+)
+from src.utils.refresh import refresh, partition_versions
+from src.utils.feature_store import FeatureStore
+from src.utils.tourism_store import ingest_tourism, load_tourism, monthly_totals
+from src.utils.calendar_dimension import build_calendar, join_calendar, load_holidays, KNOWN_HOLIDAYS
+from src.utils.period_loader import load_restaurant_period, time_to_minutes, driver_waiting_to_minutes
+from src.utils.report_model import RestaurantReport, render, save_report, load_report
+from src.utils.report_cache import ReportCache
+from src.utils.section_graph import SectionGraph
+from src.utils.market_cube import build_market_cube, market_rollup, market_benchmarks, split_period
+from src.ml_models.model_registry import ModelRegistry
+
+
+class TestConnectionPool(unittest.TestCase):
+    """Тесты для пула read-only подключений"""
+
+    def setUp(self):
+        """Создаем временную базу"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, 'test.sqlite')
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("CREATE TABLE restaurants (id INTEGER PRIMARY KEY, name TEXT)")
+        conn.execute("INSERT INTO restaurants (name) VALUES ('Only Eggs')")
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        close_all_pools()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_connection_reused_after_close(self):
+        """close() возвращает подключение в пул"""
+        conn = get_connection(self.db_path)
+        df = pd.read_sql_query("SELECT * FROM restaurants", conn)
+        conn.close()
+        self.assertEqual(len(df), 1)
+
+        with get_connection(self.db_path) as conn2:
+            self.assertIs(conn2, conn)
+        self.assertEqual(get_pool(self.db_path).stats['created'], 1)
+
+    def test_read_only_and_wal(self):
+        """Пул только читает (журнал не меняет); WAL включает миграция"""
+        with get_connection(self.db_path) as conn:
+            self.assertNotEqual(conn.execute("PRAGMA journal_mode").fetchone()[0].lower(), 'wal')
+            with self.assertRaises(sqlite3.OperationalError):
+                conn.execute("INSERT INTO restaurants (name) VALUES ('x')")
+        self.assertFalse(os.path.exists(self.db_path + '-wal'))
+
+        close_all_pools()
+        self.assertTrue(apply_migrations(self.db_path, verbose=False)['wal_enabled'])
+        with get_connection(self.db_path) as conn:
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0].lower(), 'wal')
+
+    def test_read_sql_with_params(self):
+        """read_sql поддерживает параметры"""
+        df = read_sql("SELECT id FROM restaurants WHERE name = ?", ('Only Eggs',), self.db_path)
+        self.assertEqual(df.iloc[0]['id'], 1)
+
+
+
+class TestRestaurantPeriodLoader(unittest.TestCase):
+    """Тесты для загрузчика данных ресторана за период"""
+
+    def setUp(self):
+        """Создаем временную базу с обеими платформами"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, 'test.sqlite')
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("CREATE TABLE restaurants (id INTEGER PRIMARY KEY, name TEXT, latitude REAL, longitude REAL)")
+        conn.execute("CREATE TABLE grab_stats (restaurant_id INTEGER, stat_date TEXT, sales REAL, orders INTEGER, "
+                     "driver_waiting_time TEXT)")
+        conn.execute("CREATE TABLE gojek_stats (restaurant_id INTEGER, stat_date TEXT, sales REAL, orders INTEGER, "
+                     "close_time TEXT)")
+        conn.execute("INSERT INTO restaurants VALUES (1, 'Only Eggs', -8.65, 115.13)")
+        conn.executemany("INSERT INTO grab_stats VALUES (1, ?, ?, ?, ?)", [
+            ('2025-04-01', 100.0, 2, '{"min": 5}'),
+            ('2025-04-02', 200.0, 3, None),
+            ('2025-05-01', 300.0, 4, None),
+        ])
+        conn.executemany("INSERT INTO gojek_stats VALUES (1, ?, ?, ?, ?)", [
+            ('2025-04-02', 50.0, 1, '01:30:00'),
+            ('2025-06-01', 999.0, 9, None),
+        ])
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        close_all_pools()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_totals_and_daily_sales(self):
+        """Суммы и продажи по дням считаются из одного набора"""
+        period = load_restaurant_period('Only Eggs', '2025-04-01', '2025-05-31', self.db_path)
+        self.assertEqual(period.restaurant_id, 1)
+        self.assertEqual(period.totals('grab', ['sales', 'orders']), {'sales': 600, 'orders': 9})
+        self.assertEqual(period.totals('gojek', ['sales']), {'sales': 50})
+        self.assertEqual(period.monthly_totals('grab', ['orders']), {'2025-04': {'orders': 5}, '2025-05': {'orders': 4}})
+
+        daily = period.daily_sales()
+        self.assertEqual(list(daily['daily_total']), [100, 250, 300])
+
+    def test_immutable_and_missing_restaurant(self):
+        """Набор неизменяем, неизвестный ресторан -> None"""
+        period = load_restaurant_period('Only Eggs', '2025-04-01', '2025-05-31', self.db_path)
+        with self.assertRaises(AttributeError):
+            period.restaurant_id = 2
+        grab = period.grab
+        grab.iloc[0, grab.columns.get_loc('sales')] = -1
+        grab['sales'] = 0
+        self.assertEqual(list(period.grab['sales']), [100, 200, 300])
+        self.assertEqual(period.totals('grab', ['sales'])['sales'], 600)
+        self.assertIsNone(load_restaurant_period('Nope', '2025-04-01', '2025-05-31', self.db_path))
+
+        # Имя из CLI разрешается в название из базы
+        alias = load_restaurant_period('Only_Eggs', '2025-04-01', '2025-05-31', self.db_path)
+        self.assertEqual(alias.restaurant_id, 1)
+
+    def test_time_helpers(self):
+        """Нормализация HH:MM:SS и JSON ожидания водителя"""
+        self.assertEqual(time_to_minutes('01:30:00'), 90.0)
+        self.assertEqual(time_to_minutes(None), 0.0)
+        self.assertEqual(driver_waiting_to_minutes('{"min": 5}'), 5.0)
+        self.assertIsNone(driver_waiting_to_minutes('bad'))
+
+
+
+class TestDatabaseMigrations(unittest.TestCase):
+    """Тесты для миграции индексов"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, 'test.sqlite')
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("CREATE TABLE restaurants (id INTEGER PRIMARY KEY, name TEXT)")
+        for table in ('grab_stats', 'gojek_stats'):
+            conn.execute(f"CREATE TABLE {table} (restaurant_id INTEGER, stat_date TEXT, sales REAL, "
+                         f"orders INTEGER, rating REAL, ads_spend REAL, ads_sales REAL)")
+        conn.execute("INSERT INTO restaurants (name) VALUES ('Only Eggs')")
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_indexes_created_and_used(self):
+        """Индексы создаются один раз, горячие запросы без полного скана"""
+        first = apply_migrations(self.db_path, verbose=False)
+        self.assertEqual(len(first['created']), 3)
+        self.assertTrue(first['analyzed'])
+
+        second = apply_migrations(self.db_path, verbose=False)
+        self.assertEqual(second['created'], [])
+        self.assertFalse(second['analyzed'])
+
+        self.assertTrue(all(verify_indexes(self.db_path).values()))
+        plans = explain_hot_queries(self.db_path)
+        self.assertFalse(any(info['full_scan'] for info in plans.values()))
+
+    def test_duplicate_names_fall_back(self):
+        """Дубликаты имен -> неуникальный индекс и предупреждение"""
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO restaurants (name) VALUES ('Only Eggs')")
+        conn.commit()
+        conn.close()
+
+        result = apply_migrations(self.db_path, verbose=False)
+        self.assertIn('idx_restaurants_name', result['created'])
+        self.assertTrue(any('Only Eggs' in w for w in result['warnings']))
+        self.assertTrue(verify_indexes(self.db_path)['ux_restaurants_name'])
+
+
+
+class DailyFactsTestCase(unittest.TestCase):
+    """Временная база с исходными таблицами Grab/Gojek"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, 'test.sqlite')
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("CREATE TABLE restaurants (id INTEGER PRIMARY KEY, name TEXT)")
+        conn.execute("CREATE TABLE grab_stats (restaurant_id INTEGER, stat_date TEXT, sales INTEGER, orders INTEGER, "
+                     "offline_rate REAL, driver_waiting_time TEXT)")
+        conn.execute("CREATE TABLE gojek_stats (restaurant_id INTEGER, stat_date TEXT, sales INTEGER, orders INTEGER, "
+                     "close_time TEXT, preparation_time TEXT)")
+        conn.execute("INSERT INTO restaurants VALUES (1, 'Only Eggs')")
+        conn.execute("INSERT INTO grab_stats VALUES (1, '2025-04-01', 100, 2, 90, '{\"min\": 7}')")
+        conn.execute("INSERT INTO gojek_stats VALUES (1, '2025-04-01', 50, 1, '02:10:00', '00:18:30')")
+        conn.execute("INSERT INTO gojek_stats VALUES (1, '2025-04-02', 70, 1, '00:00:00', NULL)")
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        close_all_pools()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+# Шаги refresh по самой базе (погода и хранилище признаков ML - отдельно)
+DB_STEPS = ['daily_facts', 'market_cube']
+
+
+class TestDailyFacts(DailyFactsTestCase):
+    """Тесты для таблицы дневных фактов"""
+
+    def test_one_row_per_restaurant_day(self):
+        """Полное внешнее объединение платформ и нормализация минут"""
+        self.assertEqual(build_daily_facts(self.db_path, verbose=False)['mode'], 'full')
+        facts = load_daily_facts(db_path=self.db_path)
+
+        self.assertEqual(list(facts['stat_date']), ['2025-04-01', '2025-04-02'])
+        first, second = facts.iloc[0], facts.iloc[1]
+        self.assertEqual(first['total_sales'], 150)
+        self.assertEqual(first['grab_offline_minutes'], 90)
+        self.assertEqual(first['gojek_offline_minutes'], 130)
+        self.assertEqual(first['grab_driver_waiting_min'], 7)
+        self.assertAlmostEqual(first['gojek_preparation_min'], 18.5)
+        self.assertEqual((second['has_grab'], second['has_gojek'], second['total_sales']), (0, 1, 70))
+
+    def test_incremental_update(self):
+        """Новые дни дописываются, старые не пересчитываются"""
+        build_daily_facts(self.db_path, verbose=False)
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO grab_stats VALUES (1, '2025-04-03', 300, 3, 0, NULL)")
+        conn.commit()
+        conn.close()
+
+        self.assertFalse(daily_facts_is_current(self.db_path))
+        result = build_daily_facts(self.db_path, verbose=False)
+        self.assertEqual((result['mode'], result['rows'], result['since']), ('incremental', 1, '2025-04-03'))
+        self.assertTrue(daily_facts_is_current(self.db_path))
+        self.assertEqual(len(load_daily_facts(db_path=self.db_path)), 3)
+
+    def test_late_platform_row_and_backfill(self):
+        """Строка второй платформы за уже обработанный день и старая дата пересчитываются"""
+        build_daily_facts(self.db_path, verbose=False)
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO grab_stats VALUES (1, '2025-04-02', 30, 1, 0, NULL)")
+        conn.commit()
+        conn.close()
+
+        self.assertFalse(daily_facts_is_current(self.db_path))
+        result = build_daily_facts(self.db_path, verbose=False)
+        self.assertEqual((result['mode'], result['rows'], result['since']), ('incremental', 1, '2025-04-02'))
+        second = load_daily_facts('2025-04-02', '2025-04-02', db_path=self.db_path).iloc[0]
+        self.assertEqual((second['has_grab'], second['has_gojek'], second['total_sales']), (1, 1, 100))
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO gojek_stats VALUES (1, '2025-03-15', 40, 1, NULL, NULL)")
+        conn.commit()
+        conn.close()
+        self.assertEqual(build_daily_facts(self.db_path, verbose=False)['since'], '2025-03-15')
+        self.assertTrue(daily_facts_is_current(self.db_path))
+        self.assertEqual(len(load_daily_facts(db_path=self.db_path)), 3)
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("DELETE FROM gojek_stats WHERE stat_date = '2025-03-15'")
+        conn.commit()
+        conn.close()
+        self.assertEqual(build_daily_facts(self.db_path, verbose=False)['mode'], 'full')
+        self.assertEqual(len(load_daily_facts(db_path=self.db_path)), 2)
+
+    def test_update_in_place_is_detected(self):
+        """Правка строки (UPDATE) и перенос на другой день попадают в дельту"""
+        refresh(self.db_path, verbose=False, steps=DB_STEPS)
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("UPDATE gojek_stats SET sales = 90 WHERE stat_date = '2025-04-02'")
+        conn.commit()
+        conn.close()
+
+        self.assertFalse(daily_facts_is_current(self.db_path))
+        result = refresh(self.db_path, verbose=False, steps=DB_STEPS)
+        self.assertEqual((result['new_days'], result['partitions']), (1, 1))
+        self.assertIn('(incremental)', result['steps']['daily_facts'])
+        self.assertEqual(load_daily_facts('2025-04-02', '2025-04-02', db_path=self.db_path).iloc[0]['total_sales'], 90)
+        self.assertEqual(partition_versions(1, db_path=self.db_path), {(1, '2025-04'): 2})
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("UPDATE gojek_stats SET stat_date = '2025-05-02' WHERE stat_date = '2025-04-02'")
+        conn.commit()
+        conn.close()
+        refresh(self.db_path, verbose=False, steps=DB_STEPS)
+        self.assertTrue(daily_facts_is_current(self.db_path))
+        self.assertEqual(list(load_daily_facts(db_path=self.db_path)['stat_date']), ['2025-04-01', '2025-05-02'])
+
+    def test_backfill_changes_restaurant_signature(self):
+        """Дозагрузка старой даты и правка меняют подпись ресторана, водяной знак - нет"""
+        build_daily_facts(self.db_path, verbose=False)
+        watermark = restaurant_watermark(1, self.db_path)
+        signature = restaurant_data_signature(1, watermark, self.db_path)
+        self.assertEqual((watermark, signature), ('2025-04-02', '3:2025-04-02:0'))
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO gojek_stats VALUES (1, '2025-03-15', 40, 1, NULL, NULL)")
+        conn.commit()
+        conn.close()
+        self.assertEqual(restaurant_watermark(1, self.db_path), watermark)
+        backfilled = restaurant_data_signature(1, watermark, self.db_path)
+        self.assertNotEqual(backfilled, signature)
+
+        # Новые дни после знака подпись по знаку не меняют, правка на месте - меняет
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO grab_stats VALUES (1, '2025-04-05', 10, 1, 0, NULL)")
+        conn.commit()
+        self.assertEqual(restaurant_watermark(1, self.db_path), '2025-04-05')
+        self.assertEqual(restaurant_data_signature(1, watermark, self.db_path), backfilled)
+        conn.execute("UPDATE grab_stats SET sales = 110 WHERE stat_date = '2025-04-01'")
+        conn.commit()
+        conn.close()
+        self.assertNotEqual(restaurant_data_signature(1, watermark, self.db_path), backfilled)
+
+    def test_refresh_invalidates_only_new_partitions(self):
+        """refresh обрабатывает дельту и поднимает версии только затронутых месяцев"""
+        first = refresh(self.db_path, verbose=False, steps=DB_STEPS)
+        self.assertEqual(first['new_days'], 2)
+        self.assertEqual(partition_versions(1, db_path=self.db_path), {(1, '2025-04'): 1})
+
+        self.assertEqual(refresh(self.db_path, verbose=False, steps=DB_STEPS)['new_days'], 0)
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO gojek_stats VALUES (1, '2025-05-01', 10, 1, NULL, NULL)")
+        conn.commit()
+        conn.close()
+
+        second = refresh(self.db_path, verbose=False, steps=DB_STEPS)
+        self.assertEqual((second['new_days'], second['partitions']), (1, 1))
+        self.assertEqual(partition_versions(1, db_path=self.db_path), {(1, '2025-04'): 1, (1, '2025-05'): 1})
+        self.assertEqual(len(load_daily_facts(db_path=self.db_path)), 3)
+
+        # Поздняя строка Grab за день водяного знака и дозагрузка старой даты
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO grab_stats VALUES (1, '2025-05-01', 20, 1, 0, NULL)")
+        conn.execute("INSERT INTO grab_stats VALUES (1, '2025-03-20', 5, 1, 0, NULL)")
+        conn.commit()
+        conn.close()
+
+        third = refresh(self.db_path, verbose=False, steps=DB_STEPS)
+        self.assertEqual((third['new_days'], third['partitions']), (2, 2))
+        self.assertEqual(partition_versions(1, db_path=self.db_path),
+                         {(1, '2025-03'): 1, (1, '2025-04'): 1, (1, '2025-05'): 2})
+
+
+class TestMarketCube(DailyFactsTestCase):
+    """Тесты для куба рыночных агрегатов"""
+
+    def test_rollup_matches_daily_facts(self):
+        """Полные месяцы из куба + неполные отрезки из daily_facts"""
+        self.assertEqual(split_period('2025-03-15', '2025-05-31'),
+                         (['2025-04', '2025-05'], [('2025-03-15', '2025-03-31')]))
+        build_daily_facts(self.db_path, verbose=False)
+        self.assertEqual(build_market_cube(self.db_path, verbose=False)['mode'], 'full')
+
+        april = market_rollup('2025-04-01', '2025-04-30', db_path=self.db_path).iloc[0]
+        self.assertEqual((april['name'], april['days'], april['sales'], april['orders']), ('Only Eggs', 2, 220, 4))
+        second_day = market_rollup('2025-04-02', '2025-04-30', 'gojek', db_path=self.db_path).iloc[0]
+        self.assertEqual((second_day['days'], second_day['sales']), (1, 70))
+        self.assertEqual(market_benchmarks(db_path=self.db_path)['avg_order_value'], 55)
+
+    def test_refresh_updates_only_new_months(self):
+        refresh(self.db_path, verbose=False, steps=DB_STEPS)
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO gojek_stats VALUES (1, '2025-05-01', 10, 1, NULL, NULL)")
+        conn.commit()
+        conn.close()
+
+        self.assertIn('(incremental)', refresh(self.db_path, verbose=False, steps=DB_STEPS)['steps']['market_cube'])
+        may = market_rollup('2025-05-01', '2025-05-31', db_path=self.db_path).iloc[0]
+        self.assertEqual((may['days'], may['sales']), (1, 10))
+        self.assertEqual(market_rollup(db_path=self.db_path).iloc[0]['sales'], 230)
+
+    def test_stale_tables_are_read_not_rebuilt(self):
+        """Чтение не перестраивает производные таблицы: отстающие - обход через факты/исходные"""
+        refresh(self.db_path, verbose=False, steps=DB_STEPS)
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO grab_stats VALUES (1, '2025-04-02', 30, 1, 0, NULL)")
+        conn.commit()
+        conn.close()
+
+        april = market_rollup('2025-04-01', '2025-04-30', db_path=self.db_path).iloc[0]
+        self.assertEqual((april['days'], april['sales']), (2, 250))
+        self.assertEqual(market_benchmarks(db_path=self.db_path)['avg_order_value'], 50)
+        self.assertFalse(daily_facts_is_current(self.db_path))
+
+        build_daily_facts(self.db_path, verbose=False)
+        self.assertEqual(market_rollup('2025-04-01', '2025-04-30', db_path=self.db_path).iloc[0]['sales'], 250)
+        result = build_market_cube(self.db_path, verbose=False)
+        self.assertEqual((result['mode'], result['months']), ('incremental', ['2025-04']))
+
+
+class TestFeatureStore(DailyFactsTestCase):
+    """Тесты для хранилища признаков"""
+
+    def _builder(self, start_date, end_date):
+        self.built.append((start_date, end_date))
+        facts = load_daily_facts(start_date, end_date, db_path=self.db_path)
+        return facts.assign(sales_per_order=facts['total_sales'] / facts['total_orders'])
+
+    def test_incremental_append_and_projection(self):
+        """Пересобирается только новый месяц; чтение - нужные колонки и месяцы"""
+        self.built = []
+        store = FeatureStore('facts', root=self.tmp_dir, db_path=self.db_path)
+        refresh(self.db_path, verbose=False, steps=DB_STEPS)
+        self.assertEqual(store.sync(self._builder, verbose=False)['mode'], 'full')
+        self.assertEqual(store.sync(self._builder, verbose=False)['mode'], 'up-to-date')
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO gojek_stats VALUES (1, '2025-05-01', 10, 1, NULL, NULL)")
+        conn.commit()
+        conn.close()
+        refresh(self.db_path, verbose=False, steps=DB_STEPS)
+
+        result = store.sync(self._builder, verbose=False)
+        self.assertEqual((result['mode'], result['months']), ('incremental', ['2025-05']))
+        self.assertEqual(self.built[-1], ('2025-05-01', '2025-05-31'))
+        self.assertEqual(store.months(), ['2025-04', '2025-05'])
+
+        projected = store.read(columns=['sales_per_order'], start_date='2025-04-02')
+        self.assertEqual(list(projected.columns), ['stat_date', 'restaurant_id', 'sales_per_order'])
+        self.assertEqual(list(projected['stat_date']), ['2025-04-02', '2025-05-01'])
+        self.assertEqual(list(projected['sales_per_order']), [70, 10])
+
+        # Устаревшие месяцы не подряд - отдельный вызов построителя на каждый отрезок
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO gojek_stats VALUES (1, '2025-04-03', 20, 1, NULL, NULL)")
+        conn.execute("INSERT INTO gojek_stats VALUES (1, '2025-07-01', 30, 1, NULL, NULL)")
+        conn.commit()
+        conn.close()
+        refresh(self.db_path, verbose=False, steps=DB_STEPS)
+
+        del self.built[:]
+        self.assertEqual(store.sync(self._builder, verbose=False)['months'], ['2025-04', '2025-07'])
+        self.assertEqual(self.built, [('2025-04-01', '2025-04-31'), ('2025-07-01', '2025-07-31')])
+        self.assertEqual(store.months(), ['2025-04', '2025-05', '2025-07'])
+
+    def test_month_inputs_and_stale_facts(self):
+        """Докачанная погода месяца - пересборка месяца; отставание daily_facts базу не меняет"""
+        self.built = []
+        store = FeatureStore('facts', root=self.tmp_dir, db_path=self.db_path)
+        coverage = {}
+        self.assertEqual(store.sync(self._builder, verbose=False, month_inputs=lambda: coverage)['mode'], 'full')
+        self.assertFalse(daily_facts_is_current(self.db_path))
+
+        refresh(self.db_path, verbose=False, steps=DB_STEPS)
+        store.sync(self._builder, verbose=False, month_inputs=lambda: coverage)
+        self.assertEqual(store.sync(self._builder, verbose=False, month_inputs=lambda: coverage)['mode'],
+                         'up-to-date')
+        coverage['2025-04'] = 30
+        self.assertEqual(store.sync(self._builder, verbose=False, month_inputs=lambda: coverage)['months'],
+                         ['2025-04'])
+
+
+class TestCalendarDimension(unittest.TestCase):
+    """Тесты для календарного измерения"""
+
+    def test_calendar_fields(self):
+        """Каждый день диапазона; праздник, выходной и сезон Бали"""
+        holidays = {'2025-03-29': {'name': 'Nyepi', 'type': 'balinese', 'category': 'Балийский'}}
+        calendar = build_calendar('2025-03-29', '2025-04-01', holidays=holidays)
+        self.assertEqual(list(calendar['stat_date']), ['2025-03-29', '2025-03-30', '2025-03-31', '2025-04-01'])
+        self.assertEqual(list(calendar['is_holiday']), [1, 0, 0, 0])
+        self.assertEqual(list(calendar['holiday_type']), ['balinese', 'none', 'none', 'none'])
+        self.assertEqual(list(calendar['day_of_week']), [6, 0, 1, 2])
+        self.assertEqual(list(calendar['is_weekend']), [1, 1, 0, 0])
+        self.assertEqual(list(calendar['season']), ['wet', 'wet', 'wet', 'dry'])
+
+    def test_join_keeps_rows(self):
+        """Join по строкам и datetime сохраняет порядок и индекс строк"""
+        df = pd.DataFrame({'stat_date': ['2025-04-06', '2025-01-05', '2025-04-06']}, index=[7, 3, 5])
+        joined = join_calendar(df, columns=['is_weekend', 'tourist_seasonal_coeff'])
+        self.assertEqual(list(joined.index), [7, 3, 5])
+        self.assertEqual(list(joined['is_weekend']), [1, 1, 1])
+        self.assertEqual(joined['tourist_seasonal_coeff'].iloc[0], joined['tourist_seasonal_coeff'].iloc[2])
+
+        by_datetime = join_calendar(df.assign(stat_date=pd.to_datetime(df['stat_date'])), columns=['month'])
+        self.assertEqual(list(by_datetime['month']), [4, 1, 4])
+
+    def test_known_holidays_fallback(self):
+        """Без полной базы - известные праздники"""
+        holidays = load_holidays(files=[os.path.join(tempfile.gettempdir(), 'missing_holidays.json')])
+        self.assertEqual(set(holidays), set(KNOWN_HOLIDAYS))
+        self.assertEqual(holidays['2025-05-01']['type'], 'Labor Day')
+
+
+class TestTourismStore(unittest.TestCase):
+    """Тесты для таблицы туристических данных"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, 'test.sqlite')
+        sqlite3.connect(self.db_path).close()
+        self.csv_path = os.path.join(self.tmp_dir, 'Kunjungan_Wisatawan_Bali_2024.xls')
+        self._write_csv(100)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _write_csv(self, australia_jan):
+        months = ','.join(['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'])
+        with open(self.csv_path, 'w') as f:
+            f.write(f"Kunjungan Wisatawan Bali 2024\nCountry,{months},Total\n")
+            f.write(f"AUSTRALIA,{australia_jan}" + ",10" * 11 + f",{australia_jan + 110}\n")
+            f.write("RUSSIA" + ",5" * 12 + ",60\n")
+            f.write(f"TOTAL,{australia_jan + 5}" + ",15" * 11 + f",{australia_jan + 170}\n")
+
+    def test_ingest_once_and_on_change(self):
+        """Файл разбирается один раз; итоговая строка - country TOTAL, а не еще одна страна"""
+        first = ingest_tourism(self.db_path, files=[self.csv_path], verbose=False)
+        self.assertEqual(first['parsed'], ['Kunjungan_Wisatawan_Bali_2024.xls'])
+        self.assertEqual(ingest_tourism(self.db_path, files=[self.csv_path], verbose=False)['parsed'], [])
+
+        arrivals = load_tourism(self.db_path, kind='by_country', files=[self.csv_path])
+        self.assertEqual(sorted(arrivals['country'].unique()), ['AUSTRALIA', 'RUSSIA', 'TOTAL'])
+        self.assertEqual(monthly_totals(self.db_path, files=[self.csv_path])['arrivals'].iloc[0], 105)
+
+        self._write_csv(200)
+        os.utime(self.csv_path, (0, 0))
+        self.assertEqual(ingest_tourism(self.db_path, files=[self.csv_path], verbose=False)['parsed'],
+                         ['Kunjungan_Wisatawan_Bali_2024.xls'])
+        self.assertEqual(monthly_totals(self.db_path, files=[self.csv_path])['arrivals'].iloc[0], 205)
+
+
+class TestReportModel(unittest.TestCase):
+    """Тесты для модели отчета и рендеров"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.report = RestaurantReport('Only Eggs', '2025-06-01', '2025-06-30', created_at='2025-07-01 10:00:00')
+        self.report.section('summary', "📊 1. ИСПОЛНИТЕЛЬНОЕ РЕЗЮМЕ")
+        self.report.add("💰 Общая выручка: 1,000 IDR\n📦 Заказов: 10")
+        self.report.metric('total_sales', np.int64(1000))
+        self.report.metric('roas_by_month', {'Июнь': np.float64(4.5)})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_renderers_share_sections(self):
+        """Консоль и файл выводят одни и те же строки разделов"""
+        self.assertEqual(self.report.days, 30)
+        self.assertEqual(self.report.get('summary').lines, ["💰 Общая выручка: 1,000 IDR", "📦 Заказов: 10"])
+        for fmt in ('console', 'txt', 'html'):
+            self.assertIn("Заказов: 10", render(self.report, fmt))
+        self.assertIn("<td>total_sales</td>", render(self.report, 'html'))
+        with self.assertRaises(ValueError):
+            render(self.report, 'pdf')
+
+    def test_json_round_trip(self):
+        paths = save_report(self.report, formats=('txt', 'json'), directory=self.tmp_dir, timestamp='t')
+        self.assertTrue(paths['txt'].endswith('detailed_analysis_Only_Eggs_t.txt'))
+        loaded = load_report(paths['json'])
+        self.assertEqual(loaded.to_dict(), self.report.to_dict())
+        self.assertEqual(loaded.get('summary').metrics, {'total_sales': 1000, 'roas_by_month': {'Июнь': 4.5}})
+
+
+class TestReportCache(DailyFactsTestCase):
+    """Тесты для кеша отчетов"""
+
+    def setUp(self):
+        super().setUp()
+        self.registry = ModelRegistry(root=os.path.join(self.tmp_dir, 'models'))
+        self.cache = ReportCache(root=os.path.join(self.tmp_dir, 'cache'), db_path=self.db_path,
+                                 registry=self.registry)
+
+    def _report(self):
+        report = RestaurantReport('Only Eggs', '2025-04-01', '2025-04-30')
+        report.section('summary', "📊 1. ИСПОЛНИТЕЛЬНОЕ РЕЗЮМЕ")
+        report.add("x" * 2000)
+        return report
+
+    def test_hit_until_data_changes(self):
+        key = self.cache.key('Only Eggs', '2025-04-01', '2025-04-30')
+        self.assertIsNone(self.cache.get(key))
+        self.cache.put(key, self._report())
+        self.assertEqual(self.cache.key('Only Eggs', '2025-04-01', '2025-04-30'), key)
+        self.assertEqual(self.cache.get(key).get('summary').lines, ["x" * 2000])
+        self.assertIsNone(self.cache.key('Unknown', '2025-04-01', '2025-04-30'))
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO grab_stats VALUES (1, '2025-04-03', 300, 3, 0, NULL)")
+        conn.commit()
+        conn.close()
+        changed = self.cache.key('Only Eggs', '2025-04-01', '2025-04-30')
+        self.assertNotEqual(changed, key)
+
+        # Переобучение ultimate_rf меняет ключ (ML разделы отчета)
+        self.registry.save('ultimate_rf', {'model': None}, ['x'])
+        self.assertNotEqual(self.cache.key('Only Eggs', '2025-04-01', '2025-04-30'), changed)
+
+    def test_lru_eviction_by_size(self):
+        """Превышение размера вытесняет давно неиспользуемый отчет"""
+        cache = ReportCache(root=self.cache.root, max_mb=5000 / 1024 / 1024, db_path=self.db_path)
+        cache.put('a', self._report())
+        cache.put('b', self._report())
+        os.utime(cache._path('a'), (1, 1))
+        os.utime(cache._path('b'), (2, 2))
+        self.assertIsNotNone(cache.get('a'))
+        cache.put('c', self._report())
+        self.assertEqual(sorted(os.path.basename(item['path']) for item in cache.entries()), ['a.json', 'c.json'])
+
+
+class TestSectionGraph(unittest.TestCase):
+    """Тесты для графа разделов отчета"""
+
+    def test_independent_nodes_overlap(self):
+        """Независимые узлы идут параллельно, зависимый получает их результаты"""
+        def slow(value):
+            time.sleep(0.2)
+            return value
+
+        started = time.monotonic()
+        with SectionGraph(max_workers=3) as graph:
+            graph.add('weather', slow, 1)
+            graph.add('holidays', slow, 2)
+            graph.add('ai', lambda weather, holidays: weather + holidays, after=['weather', 'holidays'])
+            graph.add('benchmarks', slow, 3)
+            self.assertEqual((graph.result('ai'), graph.result('benchmarks')), (3, 3))
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_errors_and_unknown_dependencies(self):
+        with SectionGraph(max_workers=2) as graph:
+            graph.add('broken', lambda: 1 / 0)
+            graph.add('after_broken', lambda broken: broken, after=['broken'])
+            with self.assertRaises(ValueError):
+                graph.add('orphan', lambda missing: missing, after=['missing'])
+            with self.assertRaises(ZeroDivisionError):
+                graph.result('after_broken')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Тесты для ML инфраструктуры (реестр моделей)
+"""
+
+import unittest
+import tempfile
+import shutil
+import sys
+import os
+
+# Добавляем корень проекта в путь
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import importlib.util
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+from src.ml_models.model_registry import ModelRegistry, get_model, clear_model_handles
+from src.ml_models.shap_explainer import get_tree_explainer, explain_batch, clear_explainers, SHAP_AVAILABLE
+from src.ml_models.incremental_training import decide_retrain, next_lineage, warm_start_forest
+from src.ml_models.restaurant_model_cache import RestaurantModelCache
+from src.ml_models.batch_predictor import predict_in_chunks, write_predictions, PREDICTIONS_TABLE
+from src.ml_models.compact_model import distill_ultimate_model, get_interactive_model, COMPACT_MODEL_NAME
+from src.utils.ml_executor import submit_ml, run_with_deadline, MLTimeoutError
+
+
+class TestModelRegistry(unittest.TestCase):
+    """Тесты для версионированного реестра моделей"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.registry = ModelRegistry(self.tmp_dir)
+        rng = np.random.RandomState(0)
+        self.X = rng.rand(200, 4)
+        self.y = self.X @ np.array([3.0, 1.0, 0.5, 0.0])
+        self.features = ['ads_spend', 'rating', 'weather_rain', 'is_holiday']
+
+    def tearDown(self):
+        clear_model_handles()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _train(self, seed):
+        return RandomForestRegressor(n_estimators=20, random_state=seed).fit(self.X, self.y)
+
+    def test_versions_and_metadata(self):
+        """Каждое сохранение - новая версия со схемой, водяным знаком и метриками"""
+        v1 = self.registry.save('rf', {'model': self._train(0)}, self.features,
+                                metrics={'r2': 0.9}, data_watermark='2025-05-31')
+        v2 = self.registry.save('rf', {'model': self._train(1)}, self.features,
+                                metrics={'r2': 0.95}, data_watermark='2025-06-30')
+        self.assertEqual((v1, v2), ('v0001', 'v0002'))
+        self.assertEqual(self.registry.versions('rf'), ['v0001', 'v0002'])
+        self.assertEqual(self.registry.latest_version('rf'), 'v0002')
+        meta = self.registry.metadata('rf', 'v0001')
+        self.assertEqual(meta['feature_names'], self.features)
+        self.assertEqual(meta['data_watermark'], '2025-05-31')
+        self.assertEqual(meta['metrics']['r2'], 0.9)
+
+    def test_mmap_load_and_process_handle(self):
+        """Загрузка через mmap дает те же прогнозы; дескриптор переиспользуется"""
+        model = self._train(0)
+        self.registry.save('rf', {'model': model}, self.features)
+
+        handle = get_model('rf', registry=self.registry)
+        self.assertIs(get_model('rf', registry=self.registry), handle)
+        np.testing.assert_array_equal(handle.model.predict(self.X), model.predict(self.X))
+
+        # Новая версия подхватывается следующим вызовом
+        self.registry.save('rf', {'model': self._train(1)}, self.features)
+        self.assertEqual(get_model('rf', registry=self.registry).version, 'v0002')
+
+    def test_missing_model(self):
+        """Пустой реестр: None вместо исключения"""
+        self.assertIsNone(get_model('absent', registry=self.registry))
+
+
+class TestIncrementalRetrain(unittest.TestCase):
+    """Тесты для политики дообучения"""
+
+    def setUp(self):
+        self.features = ['ads_spend', 'rating']
+        self.meta = {
+            'version': 'v0003',
+            'feature_names': self.features,
+            'trained_range': {'start': '2024-01-01', 'end': '2025-05-31'},
+            'lineage': {'mode': 'full', 'base_version': None, 'increments': 0},
+        }
+
+    def test_policy(self):
+        """Новое окно - дообучение; нет новых дней - пропуск; иначе полная пересборка"""
+        decide = lambda **kw: decide_retrain(**dict(dict(
+            metadata=self.meta, data_start='2024-01-01', data_end='2025-06-30',
+            feature_names=self.features, new_rows=300, total_rows=5000), **kw))[0]
+        self.assertEqual(decide(), 'incremental')
+        self.assertEqual(decide(data_end='2025-05-31', new_rows=0), 'skip')
+        self.assertEqual(decide(metadata=None), 'full')
+        self.assertEqual(decide(force_full=True), 'full')
+        self.assertEqual(decide(feature_names=['ads_spend']), 'full')
+        self.assertEqual(decide(data_start='2023-06-01'), 'full')
+        self.assertEqual(decide(new_rows=4000), 'full')
+        self.assertEqual(decide(feature_schema=2), 'full')
+        self.meta['params'] = {'feature_schema': 2}
+        self.assertEqual(decide(feature_schema=2), 'incremental')
+        self.meta['lineage']['increments'] = 99
+        self.assertEqual(decide(), 'full')
+
+    def test_lineage_and_warm_start(self):
+        """Дообучение считает цепочку и добавляет деревья к лесу"""
+        lineage = next_lineage(self.meta, 'incremental')
+        self.assertEqual(lineage, {'mode': 'incremental', 'base_version': 'v0003', 'increments': 1})
+        self.assertEqual(next_lineage(self.meta, 'full')['increments'], 0)
+
+        rng = np.random.RandomState(0)
+        X = rng.rand(100, 2)
+        model = RandomForestRegressor(n_estimators=10, random_state=0).fit(X, X[:, 0])
+        old_trees = list(model.estimators_)
+        warm_start_forest(model, X[:30], X[:30, 0], add_trees=5)
+        self.assertEqual(len(model.estimators_), 15)
+        self.assertEqual(model.estimators_[:10], old_trees)
+
+
+class TestRestaurantModelCache(unittest.TestCase):
+    """Тесты для кеша моделей ресторанов"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        rng = np.random.RandomState(0)
+        X = rng.rand(50, 2)
+        self.entry = {
+            'model': RandomForestRegressor(n_estimators=5, random_state=0).fit(X, X[:, 0]),
+            'feature_names': ['ads_spend', 'rating'],
+            'trained_range': {'start': '2025-01-01', 'end': '2025-06-30'},
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_lru_and_disk(self):
+        """LRU ограничивает память; вытесненная запись читается с диска и в новом процессе"""
+        cache = RestaurantModelCache(self.tmp_dir, max_entries=2)
+        for restaurant_id in (1, 2, 3):
+            cache.put(f"restaurant_{restaurant_id}", dict(self.entry))
+        self.assertEqual(len(cache), 2)
+        self.assertNotIn('restaurant_1', cache._entries)
+
+        restored = RestaurantModelCache(self.tmp_dir).get('restaurant_1')
+        self.assertEqual(restored['trained_range'], self.entry['trained_range'])
+        X = np.array([[0.5, 0.5]])
+        np.testing.assert_array_equal(restored['model'].predict(X), self.entry['model'].predict(X))
+        self.assertIsNone(cache.get('restaurant_99'))
+
+
+class TestBatchPredictor(unittest.TestCase):
+    """Тесты для пакетного прогноза"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_chunks_match_single_predict(self):
+        """Параллельные блоки дают тот же прогноз, что один вызов predict"""
+        rng = np.random.RandomState(0)
+        X = rng.rand(103, 3)
+        model = RandomForestRegressor(n_estimators=10, random_state=0, n_jobs=2).fit(X, X[:, 0])
+        np.testing.assert_allclose(predict_in_chunks(model, X, chunk_rows=10, workers=4), model.predict(X))
+        self.assertEqual(model.n_jobs, 2)
+
+    def test_write_replaces_restaurant_day(self):
+        """Повторный прогноз дня заменяет строку, а не дублирует"""
+        import sqlite3
+        db_path = os.path.join(self.tmp_dir, 'test.sqlite')
+        predictions = pd.DataFrame({'restaurant_id': [1, 1], 'stat_date': ['2025-06-01', '2025-06-02'],
+                                    'expected_sales': [100.0, 200.0], 'actual_sales': [90.0, 210.0]})
+        predictions['residual'] = predictions['actual_sales'] - predictions['expected_sales']
+        write_predictions(predictions, 'v0001', db_path)
+        write_predictions(predictions.iloc[:1].assign(expected_sales=95.0, residual=-5.0), 'v0002', db_path)
+
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute(f"SELECT stat_date, expected_sales, residual, model_version FROM {PREDICTIONS_TABLE} "
+                            f"ORDER BY stat_date").fetchall()
+        conn.close()
+        self.assertEqual(rows, [('2025-06-01', 95.0, -5.0, 'v0002'), ('2025-06-02', 200.0, 10.0, 'v0001')])
+
+
+class TestCompactModel(unittest.TestCase):
+    """Тесты для компактной модели интерактивных запросов"""
+
+    def setUp(self):
+        from types import SimpleNamespace
+        from sklearn.preprocessing import StandardScaler
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.registry = ModelRegistry(self.tmp_dir)
+        rng = np.random.RandomState(0)
+        self.data = pd.DataFrame(rng.rand(400, 3), columns=['ads_spend', 'rating', 'weather_rain'])
+        self.data['total_sales'] = self.data['ads_spend'] * 1000 + self.data['rating'] * 300
+        scaler = StandardScaler().fit(self.data[['ads_spend', 'rating', 'weather_rain']].values)
+        teacher = RandomForestRegressor(n_estimators=50, random_state=0).fit(
+            scaler.transform(self.data[['ads_spend', 'rating', 'weather_rain']].values), self.data['total_sales'])
+        features = ['ads_spend', 'rating', 'weather_rain']
+        version = self.registry.save('ultimate_rf', {'model': teacher, 'scaler': scaler}, features)
+        self.system = SimpleNamespace(trained_model=teacher, scaler=scaler, feature_names=features,
+                                      model_version=version, data_watermark=None, trained_range=None)
+
+    def tearDown(self):
+        clear_model_handles()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_distill_and_select(self):
+        """Компактная модель верна полной и выбирается, пока полная не переобучена"""
+        version = distill_ultimate_model(self.system, self.data, registry=self.registry, verbose=False)
+        metrics = self.registry.metadata(COMPACT_MODEL_NAME)['metrics']
+        self.assertGreater(metrics['fidelity_r2'], 0.9)
+        self.assertEqual(get_interactive_model(self.registry).name, COMPACT_MODEL_NAME)
+
+        # Повторный вызов для той же версии полной модели ничего не обучает
+        self.assertEqual(distill_ultimate_model(self.system, self.data, registry=self.registry), version)
+
+        # Новая версия полной модели - компактная устарела, отвечает полная
+        self.registry.save('ultimate_rf', {'model': self.system.trained_model, 'scaler': self.system.scaler},
+                           self.system.feature_names)
+        self.assertEqual(get_interactive_model(self.registry).name, 'ultimate_rf')
+
+
+@unittest.skipUnless(SHAP_AVAILABLE, "shap не установлен")
+class TestShapExplainerCache(unittest.TestCase):
+    """Тесты для кеша SHAP объяснителей"""
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.X = rng.rand(100, 3)
+        self.model = RandomForestRegressor(n_estimators=10, random_state=0).fit(self.X, self.X[:, 0] * 10)
+
+    def tearDown(self):
+        clear_explainers()
+
+    def test_explainer_built_once_per_version(self):
+        """Один объяснитель на версию модели; новая модель - новый объяснитель"""
+        explainer = get_tree_explainer(self.model, 'v0001')
+        self.assertIs(get_tree_explainer(self.model, 'v0001'), explainer)
+        other = RandomForestRegressor(n_estimators=10, random_state=1).fit(self.X, self.X[:, 1])
+        self.assertIsNot(get_tree_explainer(other, 'v0002'), explainer)
+
+    def test_batch_matches_per_row(self):
+        """SHAP для всей матрицы одним вызовом = построчные значения"""
+        batch = explain_batch(self.model, self.X[:15])
+        self.assertEqual(batch.shape, (15, 3))
+        for i in (0, 7, 14):
+            np.testing.assert_allclose(batch[i], explain_batch(self.model, self.X[i:i + 1])[0])
+
+
+@unittest.skipUnless(importlib.util.find_spec('lightgbm'), "lightgbm не установлен")
+class TestParallelTimeSeriesCV(unittest.TestCase):
+    """Тесты для параллельной кросс-валидации ProfessionalMLSystem"""
+
+    def test_parallel_matches_serial(self):
+        """Детерминированный режим: фолды в пуле = последовательные побитово"""
+        from src.ml_models.professional_ml_system import ProfessionalMLSystem
+
+        rng = np.random.RandomState(0)
+        n = 600
+        df = pd.DataFrame({
+            'stat_date': pd.date_range('2024-01-01', periods=n, freq='h'),
+            'restaurant_id': 1,
+            'ads_spend': rng.rand(n),
+            'rating': rng.rand(n),
+        })
+        df['total_sales'] = df['ads_spend'] * 100 + df['rating'] * 10 + rng.rand(n)
+
+        serial = ProfessionalMLSystem(cv_workers=1, cv_threads_per_worker=1, deterministic=True)
+        parallel = ProfessionalMLSystem(cv_workers=3, cv_threads_per_worker=1, deterministic=True)
+        serial_results = serial.train_with_time_series_cv(df)
+        parallel_results = parallel.train_with_time_series_cv(df)
+
+        np.testing.assert_array_equal(serial_results['oof_predictions'], parallel_results['oof_predictions'])
+        self.assertEqual(serial_results['cv_scores'], parallel_results['cv_scores'])
+
+
+class TestMLExecutor(unittest.TestCase):
+    """Тесты для исполнителя ML задач с дедлайнами"""
+
+    def test_result_with_timing(self):
+        result, elapsed = run_with_deadline(lambda deadline, x: x * 2, 21, timeout=5)
+        self.assertEqual(result, 42)
+        self.assertGreaterEqual(elapsed, 0)
+
+    def test_timeout_cancels_running_task(self):
+        """Дедлайн работает вне главного потока; задача останавливается на deadline.check()"""
+        import threading
+        import time
+
+        stopped = threading.Event()
+
+        def slow(deadline):
+            try:
+                while True:
+                    deadline.check()
+                    time.sleep(0.01)
+            finally:
+                stopped.set()
+
+        outcome = {}
+
+        def caller():
+            try:
+                submit_ml(slow, timeout=0.1).result()
+            except MLTimeoutError:
+                outcome['timeout'] = True
+
+        thread = threading.Thread(target=caller)
+        thread.start()
+        thread.join(5)
+        self.assertTrue(outcome.get('timeout'))
+        self.assertTrue(stopped.wait(5))
+
+
+if __name__ == '__main__':
+    unittest.main()
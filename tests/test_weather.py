@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Тесты для погодного хранилища (с локальной заменой Open-Meteo)
+"""
+
+import unittest
+import tempfile
+import shutil
+import threading
+import json
+import time
+import sys
+import os
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Добавляем корень проекта в путь
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.utils.weather_store import WeatherStore, grid_cell, load_restaurant_locations
+from src.utils.weather_prefetcher import AsyncWeatherPrefetcher, TokenBucket
+
+
+class FakeOpenMeteoHandler(BaseHTTPRequestHandler):
+    """Отвечает как архив Open-Meteo: daily + hourly за запрошенный диапазон"""
+
+    requests_log = []
+    # Управление из тестов: первые N ответов - 503, задержка ответа, пик параллельности
+    failures_left = 0
+    delay = 0.0
+    # Дни с этой даты - без значений (архив еще не опубликовал)
+    null_from = None
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        cls = FakeOpenMeteoHandler
+        with cls.lock:
+            self.requests_log.append(params)
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+            fail = cls.failures_left > 0
+            cls.failures_left -= int(fail)
+        try:
+            time.sleep(cls.delay)
+            if fail:
+                self.send_response(503)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self._send_weather(params)
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def _send_weather(self, params):
+        start = datetime.strptime(params['start_date'], '%Y-%m-%d')
+        end = datetime.strptime(params['end_date'], '%Y-%m-%d')
+        days = [(start + timedelta(days=i)).strftime('%Y-%m-%d') for i in range((end - start).days + 1)]
+        hours = [f"{day}T{hour:02d}:00" for day in days for hour in range(24)]
+        null_from = FakeOpenMeteoHandler.null_from or '9999-12-31'
+        payload = {
+            'daily': {
+                'time': days,
+                'temperature_2m_mean': [27.5 if day < null_from else None for day in days],
+                'precipitation_sum': [2.4] * len(days),
+                'wind_speed_10m_max': [9.0] * len(days),
+            },
+            'hourly': {
+                'time': hours,
+                'temperature_2m': [27.0] * len(hours),
+                'relative_humidity_2m': [80] * len(hours),
+                'precipitation': [0.1] * len(hours),
+                'weather_code': [61] * len(hours),
+                'cloud_cover': [50] * len(hours),
+                'wind_speed_10m': [5.0] * len(hours),
+            },
+        }
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeOpenMeteoTestCase(unittest.TestCase):
+    """Локальный сервер Open-Meteo и временное хранилище на каждый тест"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOpenMeteoHandler)
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/v1/archive"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        FakeOpenMeteoHandler.requests_log.clear()
+        FakeOpenMeteoHandler.failures_left = 0
+        FakeOpenMeteoHandler.delay = 0.0
+        FakeOpenMeteoHandler.null_from = None
+        FakeOpenMeteoHandler.max_in_flight = 0
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, 'weather.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+class TestWeatherStore(FakeOpenMeteoTestCase):
+    """Тесты для дискового хранилища погоды"""
+
+    def test_range_fetched_once_and_served_from_disk(self):
+        """90 дней = один запрос; повтор и новый процесс - с диска"""
+        store = WeatherStore(self.db_path, base_url=self.url)
+        daily = store.get_daily(-8.65, 115.13, '2025-04-01', '2025-06-29')
+        self.assertEqual(len(daily), 90)
+        self.assertEqual(len(FakeOpenMeteoHandler.requests_log), 1)
+        self.assertIn('hourly', FakeOpenMeteoHandler.requests_log[0])
+
+        for day in ('2025-04-01', '2025-05-15', '2025-06-29'):
+            self.assertEqual(store.get_day(-8.65, 115.13, day)['temperature_mean'], 27.5)
+        self.assertEqual(len(store.get_hourly(-8.65, 115.13, '2025-05-15')), 24)
+
+        reopened = WeatherStore(self.db_path, base_url=self.url)
+        self.assertEqual(len(reopened.get_daily(-8.65, 115.13, '2025-04-01', '2025-06-29')), 90)
+        self.assertEqual(len(FakeOpenMeteoHandler.requests_log), 1)
+
+    def test_single_day_miss_fetches_month(self):
+        """Промах по дню докачивает месяц, следующие дни без запросов"""
+        store = WeatherStore(self.db_path, base_url=self.url)
+        store.get_day(-8.65, 115.13, '2025-02-10')
+        store.get_day(-8.65, 115.13, '2025-02-20')
+        self.assertEqual(len(FakeOpenMeteoHandler.requests_log), 1)
+        self.assertEqual(FakeOpenMeteoHandler.requests_log[0]['start_date'], '2025-02-01')
+        self.assertEqual(FakeOpenMeteoHandler.requests_log[0]['end_date'], '2025-02-28')
+
+    def test_unpublished_days_do_not_refetch_month(self):
+        """Дни, которые архив вернул пустыми, не перекачивают месяц на каждом обращении"""
+        FakeOpenMeteoHandler.null_from = '2025-02-25'
+        store = WeatherStore(self.db_path, base_url=self.url)
+        self.assertEqual(store.get_day(-8.65, 115.13, '2025-02-10')['temperature_mean'], 27.5)
+        self.assertIsNone(store.get_day(-8.65, 115.13, '2025-02-26'))
+        self.assertIsNone(store.get_day(-8.65, 115.13, '2025-02-27'))
+        store.get_hourly(-8.65, 115.13, '2025-02-26')
+        self.assertEqual(len(FakeOpenMeteoHandler.requests_log), 1)
+
+    def test_unavailable_api_is_not_retried_per_day(self):
+        """Недоступный API: один неудачный запрос, дальше - fallback без сети"""
+        store = WeatherStore(self.db_path, base_url='http://127.0.0.1:9/v1/archive', timeout=1)
+        self.assertIsNone(store.get_day(-8.65, 115.13, '2025-03-01'))
+        self.assertIsNone(store.get_day(-8.65, 115.13, '2025-03-02'))
+        self.assertEqual(store.stats['requests'], 1)
+
+    def test_nearby_restaurants_share_grid_cell(self):
+        """Рестораны одной ячейки сетки делят один запрос и один ряд погоды"""
+        store = WeatherStore(self.db_path, base_url=self.url)
+        # Два ресторана Canggu в ~2 км друг от друга
+        self.assertEqual(grid_cell(-8.641, 115.131), grid_cell(-8.627, 115.148))
+        store.prefetch(-8.641, 115.131, '2025-03-01', '2025-03-31')
+        store.prefetch(-8.627, 115.148, '2025-03-01', '2025-03-31')
+        self.assertEqual(len(store.get_daily(-8.627, 115.148, '2025-03-01', '2025-03-31')), 31)
+        self.assertEqual(len(FakeOpenMeteoHandler.requests_log), 1)
+
+    def test_restaurant_locations_file(self):
+        """Геолокации ресторанов: ячеек сетки заметно меньше, чем ресторанов"""
+        path = os.path.join(os.path.dirname(__file__), '..', 'data', 'bali_restaurant_locations.json')
+        locations = load_restaurant_locations(path)
+        if not locations:
+            self.skipTest("Нет файла геолокаций")
+        cells = {grid_cell(lat, lon) for lat, lon in locations.values()}
+        self.assertLess(len(cells), len(locations))
+
+
+class TestAsyncWeatherPrefetcher(FakeOpenMeteoTestCase):
+    """Тесты параллельной предзагрузки погоды"""
+
+    def test_concurrent_prefetch_is_bounded(self):
+        """Много ячеек: параллельно, но не больше concurrency запросов сразу"""
+        FakeOpenMeteoHandler.delay = 0.05
+        store = WeatherStore(self.db_path, base_url=self.url)
+        needs = [(-8.0 - i, 115.0, '2024-01-01', '2024-12-31') for i in range(8)]
+        # Повтор той же ячейки и уже покрытый диапазон не дают новых запросов
+        needs.append((-8.01, 115.02, '2024-03-01', '2024-03-31'))
+
+        prefetcher = AsyncWeatherPrefetcher(store, concurrency=3, rate_limit=0)
+        stats = prefetcher.prefetch(needs)
+
+        self.assertEqual(stats['planned'], 8)
+        self.assertEqual(stats['requests'], 8)
+        self.assertEqual(stats['days'], 8 * 366)
+        self.assertLessEqual(FakeOpenMeteoHandler.max_in_flight, 3)
+        self.assertGreater(FakeOpenMeteoHandler.max_in_flight, 1)
+        self.assertEqual(prefetcher.prefetch(needs)['requests'], 0)
+
+    def test_retries_with_backoff(self):
+        """503 повторяются с задержкой, данные в итоге сохраняются"""
+        FakeOpenMeteoHandler.failures_left = 2
+        store = WeatherStore(self.db_path, base_url=self.url)
+        prefetcher = AsyncWeatherPrefetcher(store, rate_limit=0, max_retries=2, backoff=0.01)
+        stats = prefetcher.prefetch([(-8.65, 115.13, '2025-01-01', '2025-01-31')])
+
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['retries'], 2)
+        self.assertEqual(stats['failed'], 0)
+        self.assertFalse(store.missing_dates(-8.65, 115.13, '2025-01-01', '2025-01-31'))
+
+    def test_token_bucket_limits_rate(self):
+        """10 запросов/сек без запаса: 6 токенов не раньше чем через ~0.5 сек"""
+        import asyncio
+
+        async def take(bucket, n):
+            for _ in range(n):
+                await bucket.acquire()
+
+        bucket = TokenBucket(rate=10, capacity=1)
+        started = time.monotonic()
+        asyncio.run(take(bucket, 6))
+        self.assertGreaterEqual(time.monotonic() - started, 0.45)
+
+
+if __name__ == '__main__':
+    unittest.main()